@@ -1,23 +1,27 @@
 import base64
 import logging
 from datetime import date
-from typing import Dict
+from typing import Any, AsyncIterator, Dict, Union
 
 from bson import ObjectId
 from bson import errors as bson_errors
 from fastapi import APIRouter, HTTPException, Request
 from pymongo import UpdateOne
+from starlette.datastructures import FormData
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
 
 from geopy.distance import geodesic
 from app.core.config import (
     ML_CONFIDENT_THRESHOLD,
+    ML_MARK_DETECTION_MODEL,
     ML_UNCERTAIN_THRESHOLD,
     RATE_LIMIT_ATTENDANCE_MARK,
 )
 from app.db.mongo import db
 from app.services.attendance_daily import save_daily_summary
 from app.services.attendance import log_grouped_attendance
-from app.services.ml_client import ml_client
+from app.services.face_gallery import load_roster, recognize_subject
 from app.schemas.attendance import AttendanceConfirm
 from app.utils.geo import calculate_distance
 from app.schemas.attendance import QRAttendanceRequest
@@ -37,6 +41,10 @@ from app.core.limiter import limiter, get_teacher_rate_limit_key
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/attendance", tags=["Attendance"])
 
+MAX_MARK_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB, the ML service's image limit
+# Room for the multipart boundaries and the non-file form fields
+MULTIPART_OVERHEAD = 64 * 1024
+
 
 @router.post("/stop-session/{session_id}")
 async def stop_session(session_id: str, current_user: dict = Depends(get_current_user)):
@@ -382,6 +390,121 @@ async def mark_attendance(request: Request, payload: Dict):
       "X-Device-ID": "unique-device-uuid"
     }
     """
+    await _authorize_mark_request(request)
+
+    image_b64 = payload.get("image")
+    subject_id = payload.get("subject_id")
+
+    if not image_b64 or not subject_id:
+        raise HTTPException(status_code=400, detail="image and subject_id required")
+
+    subject = await _load_subject_for_mark(
+        subject_id, payload.get("latitude"), payload.get("longitude")
+    )
+
+    # Strip base64 header
+    if "," in image_b64:
+        _, image_b64 = image_b64.split(",", 1)
+
+    try:
+        _ = base64.b64decode(image_b64)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid base64 image")
+
+    return await _recognize_for_mark(subject_id, subject, image_b64)
+
+
+@router.post("/mark/upload")
+@limiter.limit(
+    RATE_LIMIT_ATTENDANCE_MARK,
+    key_func=get_teacher_rate_limit_key,
+    override_defaults=True,
+)
+async def mark_attendance_upload(request: Request):
+    """
+    Mark attendance from a multipart classroom photo upload
+
+    Same as /attendance/mark, but the image is sent as a file instead of a
+    base64 data URL. The upload is size-checked while it streams in and the
+    raw bytes are forwarded to the ML service without base64 encoding.
+
+    form fields:
+      image: JPEG/PNG file
+      subject_id: "..."
+      latitude, longitude: required when the subject has a location
+
+    headers:
+    {
+      "X-Device-ID": "unique-device-uuid"
+    }
+    """
+    await _authorize_mark_request(request)
+
+    form = await _parse_mark_upload(request)
+    try:
+        upload = form.get("image")
+        subject_id = form.get("subject_id")
+        if not isinstance(upload, StarletteUploadFile) or not subject_id:
+            raise HTTPException(status_code=400, detail="image and subject_id required")
+
+        subject = await _load_subject_for_mark(
+            subject_id, form.get("latitude"), form.get("longitude")
+        )
+        image = await upload.read()
+    finally:
+        await form.close()
+
+    if not image:
+        raise HTTPException(status_code=400, detail="Empty image upload")
+
+    return await _recognize_for_mark(subject_id, subject, image)
+
+
+def _image_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=(
+            f"Image too large. Maximum size is {MAX_MARK_IMAGE_SIZE // 1024 // 1024}MB"
+        ),
+    )
+
+
+async def _limited_stream(
+    stream: AsyncIterator[bytes], limit: int
+) -> AsyncIterator[bytes]:
+    """Pass a request body through, failing with 413 once it exceeds limit."""
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > limit:
+            raise _image_too_large()
+        yield chunk
+
+
+async def _parse_mark_upload(request: Request) -> FormData:
+    """Parse the multipart body, enforcing the size limit while it streams."""
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+
+    limit = MAX_MARK_IMAGE_SIZE + MULTIPART_OVERHEAD
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > limit:
+        raise _image_too_large()
+
+    parser = MultiPartParser(
+        request.headers,
+        _limited_stream(request.stream(), limit),
+        max_files=1,
+        max_fields=10,
+    )
+    try:
+        return await parser.parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+
+async def _authorize_mark_request(request: Request) -> None:
+    """Authenticate the caller and enforce student device binding."""
     # Extract device ID from header
     device_id = request.headers.get("X-Device-ID")
     if not device_id:
@@ -454,12 +577,11 @@ async def mark_attendance(request: Request, payload: Dict):
             user_role,
         )
 
-    image_b64 = payload.get("image")
-    subject_id = payload.get("subject_id")
-
-    if not image_b64 or not subject_id:
-        raise HTTPException(status_code=400, detail="image and subject_id required")
 
+async def _load_subject_for_mark(
+    subject_id: str, req_lat: Any, req_long: Any
+) -> Dict[str, Any]:
+    """Load the subject's roster and location, enforcing its geofence."""
     # Load subject
     try:
         subject = await db.subjects.find_one(
@@ -478,9 +600,6 @@ async def mark_attendance(request: Request, payload: Dict):
         and location_cfg.get("lat") is not None
         and location_cfg.get("long") is not None
     ):
-        req_lat = payload.get("latitude")
-        req_long = payload.get("longitude")
-
         if req_lat is None or req_long is None:
             raise HTTPException(
                 status_code=400,
@@ -506,23 +625,30 @@ async def mark_attendance(request: Request, payload: Dict):
         except (ValueError, TypeError):
             raise HTTPException(status_code=400, detail="Invalid coordinates format")
 
+    return subject
+
+
+async def _recognize_for_mark(
+    subject_id: str, subject: Dict[str, Any], image: Union[str, bytes]
+) -> Dict[str, Any]:
+    """Recognize faces against the subject's roster and build the mark response."""
     student_user_ids = [
         s["student_id"] for s in subject.get("students", []) if s.get("verified", False)
     ]
 
-    # Strip base64 header
-    if "," in image_b64:
-        _, image_b64 = image_b64.split(",", 1)
-
-    try:
-        _ = base64.b64decode(image_b64)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid base64 image")
+    # Load the subject roster (without embeddings); detection and matching
+    # against the gallery cached on the ML service happen in one call
+    students = await load_roster(student_user_ids)
 
-    # Call ML service to detect faces
     try:
-        ml_response = await ml_client.detect_faces(
-            image_base64=image_b64, min_face_area_ratio=0.01, num_jitters=3, model="hog"
+        ml_response = await recognize_subject(
+            subject_id=subject_id,
+            roster=students,
+            image=image,
+            confident_threshold=ML_CONFIDENT_THRESHOLD,
+            uncertain_threshold=ML_UNCERTAIN_THRESHOLD,
+            min_face_area_ratio=0.01,
+            model=ML_MARK_DETECTION_MODEL,
         )
 
         if not ml_response.get("success"):
@@ -534,64 +660,21 @@ async def mark_attendance(request: Request, payload: Dict):
         detected_faces = ml_response.get("faces", [])
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to detect faces: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to recognize faces: {str(e)}"
+        )
 
     if not detected_faces:
         return {"faces": [], "count": 0}
 
-    # Load students of this subject with embeddings
-    students_cursor = db.students.find(
-        {
-            "userId": {"$in": student_user_ids},
-            "verified": True,
-            "face_embeddings": {"$exists": True, "$ne": []},
-        }
-    )
-
-    students = await students_cursor.to_list(length=500)
-
-    # Prepare candidate embeddings for batch matching
-    candidate_embeddings = []
-    for student in students:
-        candidate_embeddings.append(
-            {
-                "student_id": str(student["userId"]),
-                "embeddings": student["face_embeddings"],
-            }
-        )
-
-    # Call ML service to match faces
-    try:
-        match_response = await ml_client.batch_match(
-            detected_faces=[
-                {"embedding": face["embedding"]} for face in detected_faces
-            ],
-            candidate_embeddings=candidate_embeddings,
-            confident_threshold=ML_CONFIDENT_THRESHOLD,
-            uncertain_threshold=ML_UNCERTAIN_THRESHOLD,
-        )
-
-        if not match_response.get("success"):
-            raise HTTPException(
-                status_code=500,
-                detail=(
-                    f"ML service error: {match_response.get('error', 'Unknown error')}"
-                ),  # noqa: E501
-            )
-
-        matches = match_response.get("matches", [])
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to match faces: {str(e)}")
-
     # Build results
     results = []
     logger.info("Faces detected: %d", len(detected_faces))
 
-    for i, (face, match) in enumerate(zip(detected_faces, matches)):
-        student_id = match.get("student_id")
-        distance = match.get("distance")
-        status = match.get("status")  # "present" or "unknown"
+    for i, face in enumerate(detected_faces):
+        student_id = face.get("student_id")
+        distance = face.get("distance")
+        status = face.get("status")  # "present", "unknown" or "spoof"
 
         # Find student details
         best_match = None
@@ -609,6 +692,10 @@ async def mark_attendance(request: Request, payload: Dict):
             status = "unknown"
             best_match = None
 
+        # Another face in the photo competed for the same student
+        if status == "present" and face.get("uncertain"):
+            status = "uncertain"
+
         # Check for Liveness (Anti-Spoofing)
         is_live = face.get("is_live", True)
         if not is_live:
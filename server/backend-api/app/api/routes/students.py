@@ -4,7 +4,8 @@ from datetime import datetime, timezone
 
 from ...db.mongo import db
 from ...core.security import get_current_user
-from app.services.students import get_student_profile
+from app.core.config import FACE_MIN_QUALITY
+from app.services.students import add_face_embedding, get_student_profile
 
 from cloudinary.uploader import upload
 import base64
@@ -187,6 +188,18 @@ async def upload_image_url(
             raise HTTPException(status_code=status_code, detail=detail)
 
         embedding = ml_response.get("embedding")
+        embedding_version = ml_response.get("embedding_version")
+        quality = ((ml_response.get("metadata") or {}).get("quality") or {}).get(
+            "score"
+        )
+        if quality is not None and quality < FACE_MIN_QUALITY:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    "Photo quality too low. Please upload a sharp, well-lit photo "
+                    "looking straight at the camera"
+                ),
+            )
 
     except HTTPException:
         raise
@@ -205,12 +218,8 @@ async def upload_image_url(
     image_url = upload_result.get("secure_url")
 
     # 6. Store image_url + embeddings
-    await db.students.update_one(
-        {"userId": student_user_id},
-        {
-            "$set": {"image_url": image_url, "verified": True},
-            "$push": {"face_embeddings": embedding},
-        },
+    await add_face_embedding(
+        student_user_id, embedding, embedding_version, image_url, quality
     )
 
     return {
@@ -64,7 +64,33 @@ brevo_settings = BrevoSettings()
 ML_SERVICE_URL = os.getenv("ML_SERVICE_URL", "http://localhost:8001")
 ML_SERVICE_TIMEOUT = float(os.getenv("ML_SERVICE_TIMEOUT", "30"))
 ML_SERVICE_MAX_RETRIES = int(os.getenv("ML_SERVICE_MAX_RETRIES", "3"))
+# Seconds one call may take overall, retries and backoff included
+ML_SERVICE_DEADLINE = float(os.getenv("ML_SERVICE_DEADLINE", "60"))
+# Retry backoff: full jitter over base * 2^attempt seconds, capped at max
+ML_SERVICE_BACKOFF_BASE = float(os.getenv("ML_SERVICE_BACKOFF_BASE", "0.2"))
+ML_SERVICE_BACKOFF_MAX = float(os.getenv("ML_SERVICE_BACKOFF_MAX", "5"))
+# Circuit breaker per ML replica: consecutive failures that open it, and
+# seconds before a half-open probe request is let through
+ML_SERVICE_BREAKER_FAILURES = int(os.getenv("ML_SERVICE_BREAKER_FAILURES", "5"))
+ML_SERVICE_BREAKER_RESET = float(os.getenv("ML_SERVICE_BREAKER_RESET", "30"))
+# Comma-separated extra ML replicas for hedged requests, and seconds to wait
+# on a replica before hedging a stateless call to the next one (0 = never)
+ML_SERVICE_HEDGE_URLS = [
+    url.strip()
+    for url in os.getenv("ML_SERVICE_HEDGE_URLS", "").split(",")
+    if url.strip()
+]
+ML_SERVICE_HEDGE_DELAY = float(os.getenv("ML_SERVICE_HEDGE_DELAY", "0"))
 ML_API_KEY = os.getenv("ML_API_KEY")
+# Embedding wire format: "base64-f32", "base64-f16" or "json" (legacy float lists)
+ML_EMBEDDING_ENCODING = os.getenv("ML_EMBEDDING_ENCODING", "base64-f32")
+# How db.students.face_embeddings are stored: "float16", "int8", "float32" as
+# BSON binaries, or "list" (legacy arrays of doubles)
+FACE_EMBEDDING_STORAGE = os.getenv("FACE_EMBEDDING_STORAGE", "float16")
+# Best-scoring embeddings kept per student (plus one running mean template)
+FACE_TEMPLATE_MAX_EMBEDDINGS = int(os.getenv("FACE_TEMPLATE_MAX_EMBEDDINGS", "5"))
+# Enrollment photos scored below this quality (0-1) by the ML service are rejected
+FACE_MIN_QUALITY = float(os.getenv("FACE_MIN_QUALITY", "0.3"))
 
 # Rate Limiting Configuration
 RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")
@@ -79,6 +105,9 @@ TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "")
 # ML Thresholds
 ML_CONFIDENT_THRESHOLD = float(os.getenv("ML_CONFIDENT_THRESHOLD", "0.50"))
 ML_UNCERTAIN_THRESHOLD = float(os.getenv("ML_UNCERTAIN_THRESHOLD", "0.60"))
+# Detection mode of /attendance/mark photos: "tiled" also searches full-resolution
+# tiles, finding the small back-row faces of large rooms at some extra cost
+ML_MARK_DETECTION_MODEL = os.getenv("ML_MARK_DETECTION_MODEL", "hog")
 
 CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
 CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
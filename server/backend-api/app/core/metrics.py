@@ -13,3 +13,28 @@ STUDENT_REGISTRATION = Counter(
 # but usually business metrics are what we add manually.
 
 ACTIVE_TEACHERS = Gauge("active_teachers_total", "Number of currently active teachers")
+
+# ML service client resilience
+ML_CLIENT_RETRIES = Counter(
+    "ml_client_retries_total",
+    "Requests to the ML service retried",
+    ["reason"],  # "timeout", "connection" or "unavailable"
+)
+
+ML_CLIENT_BREAKER_TRIPS = Counter(
+    "ml_client_breaker_trips_total",
+    "Times the circuit breaker of an ML replica opened",
+    ["replica"],
+)
+
+ML_CLIENT_BREAKER_STATE = Gauge(
+    "ml_client_breaker_state",
+    "Circuit breaker of an ML replica: 0 closed, 1 open, 2 half-open",
+    ["replica"],
+)
+
+ML_CLIENT_HEDGES = Counter(
+    "ml_client_hedged_requests_total",
+    "Calls hedged to a second ML replica, by the replica that answered first",
+    ["winner"],  # "primary" or "hedge"
+)
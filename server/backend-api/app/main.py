@@ -21,6 +21,7 @@ from app.services.attendance import ensure_indexes as ensure_attendance_indexes
 from app.services.schedule_service import ensure_indexes as ensure_schedule_indexes
 from app.services.ml_client import ml_client
 from app.services.attendance_socket_service import sio
+import app.services.face_stream_service  # noqa: F401 (registers /face-stream)
 from app.db.nonce_store import close_redis
 from app.core.scheduler import start_scheduler, shutdown_scheduler
 from app.db.mongo import db
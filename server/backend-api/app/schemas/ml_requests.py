@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
 class EncodeFaceRequest(BaseModel):
@@ -25,12 +25,14 @@ class CandidateEmbedding(BaseModel):
 
     student_id: str
     embeddings: List[List[float]]
+    embedding_version: Optional[str] = None
 
 
 class MatchFacesRequest(BaseModel):
     """Request to match a single face embedding against candidates"""
 
     query_embedding: List[float]
+    query_embedding_version: Optional[str] = None
     candidate_embeddings: List[CandidateEmbedding]
     threshold: float = 0.6
     return_all_distances: bool = False
@@ -40,12 +42,29 @@ class DetectedFace(BaseModel):
     """A detected face with embedding"""
 
     embedding: List[float]
+    embedding_version: Optional[str] = None
 
 
 class BatchMatchRequest(BaseModel):
     """Request to match multiple detected faces against candidates"""
 
     detected_faces: List[DetectedFace]
-    candidate_embeddings: List[CandidateEmbedding]
+    candidate_embeddings: Optional[List[CandidateEmbedding]] = None
+    gallery_id: Optional[str] = None
+    gallery_version: Optional[str] = None
     confident_threshold: float = 0.50
     uncertain_threshold: float = 0.60
+
+
+class UpsertGalleryRequest(BaseModel):
+    """Request to create or replace a cached roster gallery"""
+
+    version: str
+    candidate_embeddings: List[CandidateEmbedding]
+
+
+class ConvertEmbeddingsRequest(BaseModel):
+    """Request to re-encode stored embeddings into the ML service's version"""
+
+    embeddings: List[List[float]]
+    embedding_version: Optional[str] = None
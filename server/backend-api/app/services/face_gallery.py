@@ -0,0 +1,268 @@
+"""
+Roster galleries cached on the ML service.
+
+Instead of shipping every student's face embeddings with each classroom photo,
+the backend keeps a per-subject gallery on the ML service keyed by
+``subject:<id>`` and versioned by a hash of the roster. Embeddings are only
+loaded from Mongo and uploaded when the ML service reports a miss.
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Union
+
+from app.db.mongo import db
+from app.services.ml_client import ml_client
+from app.utils.embedding_codec import unpack_stored_embedding
+
+logger = logging.getLogger(__name__)
+
+GALLERY_NOT_FOUND = "GALLERY_NOT_FOUND"
+
+# Everything about a student the mark route needs, minus the embeddings
+# themselves. embedding_count covers documents written before
+# face_embeddings_rev existed.
+ROSTER_PROJECTION = {
+    "userId": 1,
+    "name": 1,
+    "face_embeddings_rev": 1,
+    "embedding_count": {"$size": "$face_embeddings"},
+}
+
+
+def subject_gallery_id(subject_id: str) -> str:
+    return f"subject:{subject_id}"
+
+
+async def load_roster(student_user_ids: List[Any]) -> List[Dict[str, Any]]:
+    """Verified students with embeddings, without loading the embeddings."""
+    cursor = db.students.find(
+        {
+            "userId": {"$in": student_user_ids},
+            "verified": True,
+            "face_embeddings": {"$exists": True, "$ne": []},
+        },
+        ROSTER_PROJECTION,
+    ).sort("userId", 1)
+    return await cursor.to_list(length=500)
+
+
+def roster_version(roster: List[Dict[str, Any]]) -> str:
+    """Hash of who is on the roster and which revision of embeddings they have."""
+    digest = hashlib.sha256()
+    for student in sorted(roster, key=lambda s: str(s["userId"])):
+        digest.update(
+            (
+                f"{student['userId']}:{student.get('face_embeddings_rev', 0)}:"
+                f"{student.get('embedding_count', 0)};"
+            ).encode()
+        )
+    return digest.hexdigest()[:32]
+
+
+async def load_candidate_embeddings(
+    roster: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Load embeddings and templates for the roster, in roster order."""
+    user_ids = [s["userId"] for s in roster]
+    cursor = db.students.find(
+        {"userId": {"$in": user_ids}},
+        {
+            "userId": 1,
+            "face_embeddings": 1,
+            "face_embedding_version": 1,
+            "face_template": 1,
+        },
+    )
+    docs = {str(doc["userId"]): doc async for doc in cursor}
+
+    candidates = []
+    for student in roster:
+        doc = docs.get(str(student["userId"]))
+        if not doc or not doc.get("face_embeddings"):
+            continue
+        candidate = {
+            "student_id": str(student["userId"]),
+            "embeddings": [
+                unpack_stored_embedding(emb) for emb in doc["face_embeddings"]
+            ],
+            "embedding_version": doc.get("face_embedding_version"),
+        }
+        if doc.get("face_template") is not None:
+            candidate["template"] = unpack_stored_embedding(doc["face_template"])
+        candidates.append(candidate)
+    return candidates
+
+
+async def batch_match_subject(
+    subject_id: str,
+    roster: List[Dict[str, Any]],
+    detected_faces: List[Dict[str, Any]],
+    confident_threshold: float,
+    uncertain_threshold: float,
+) -> Dict[str, Any]:
+    """
+    Batch-match faces against the subject's cached gallery.
+
+    On a gallery miss the roster embeddings are uploaded and the match is
+    retried once. If the ML service refuses the gallery (e.g. over its memory
+    budget) or it is evicted again before the retry, the embeddings are sent
+    inline as before.
+    """
+    gallery_id = subject_gallery_id(subject_id)
+    version = roster_version(roster)
+
+    response = await ml_client.batch_match(
+        detected_faces=detected_faces,
+        confident_threshold=confident_threshold,
+        uncertain_threshold=uncertain_threshold,
+        gallery_id=gallery_id,
+        gallery_version=version,
+    )
+    if response.get("error_code") != GALLERY_NOT_FOUND:
+        return response
+
+    return await _match_after_miss(
+        gallery_id,
+        version,
+        roster,
+        detected_faces,
+        confident_threshold,
+        uncertain_threshold,
+    )
+
+
+async def recognize_subject(
+    subject_id: str,
+    roster: List[Dict[str, Any]],
+    image: Union[str, bytes],
+    confident_threshold: float,
+    uncertain_threshold: float,
+    min_face_area_ratio: float = 0.01,
+    model: str = "hog",
+) -> Dict[str, Any]:
+    """
+    Detect and match faces against the subject's cached gallery in one call.
+
+    ``image`` is a base64 string or raw JPEG/PNG bytes; bytes are sent to the
+    ML service's binary route as they are. ``model`` is the ML service's
+    detection mode ("tiled" for large rooms).
+
+    On a gallery miss the ML service still returns the detected faces (with
+    embeddings), so the gallery is uploaded and those faces batch-matched
+    without running detection again.
+    """
+    gallery_id = subject_gallery_id(subject_id)
+    version = roster_version(roster)
+
+    options = {
+        "gallery_id": gallery_id,
+        "gallery_version": version,
+        "min_face_area_ratio": min_face_area_ratio,
+        "model": model,
+        "confident_threshold": confident_threshold,
+        "uncertain_threshold": uncertain_threshold,
+    }
+    if isinstance(image, bytes):
+        response = await ml_client.recognize_upload(image, **options)
+    else:
+        response = await ml_client.recognize(image_base64=image, **options)
+    if response.get("error_code") != GALLERY_NOT_FOUND:
+        return response
+
+    faces = response.get("faces", [])
+    if not faces:
+        return {"success": True, "faces": [], "count": 0}
+
+    match_response = await _match_after_miss(
+        gallery_id,
+        version,
+        roster,
+        [_face_to_match(face) for face in faces],
+        confident_threshold,
+        uncertain_threshold,
+    )
+    if not match_response.get("success"):
+        return match_response
+
+    for face, match in zip(faces, match_response.get("matches", [])):
+        face.pop("embedding", None)
+        face.pop("embedding_version", None)
+        face["student_id"] = match.get("student_id")
+        face["distance"] = match.get("distance")
+        face["status"] = match.get("status")
+        face["uncertain"] = match.get("uncertain", False)
+
+    return {"success": True, "faces": faces, "count": len(faces)}
+
+
+async def start_subject_stream(
+    subject_id: str,
+    roster: List[Dict[str, Any]],
+    confident_threshold: float,
+) -> Dict[str, Any]:
+    """
+    Open a video-stream session on the ML service for the subject's gallery.
+
+    On a gallery miss the roster embeddings are uploaded and the stream is
+    opened again; the ML service keeps the gallery for the stream's lifetime.
+    """
+    gallery_id = subject_gallery_id(subject_id)
+    version = roster_version(roster)
+
+    response = await ml_client.start_stream(
+        gallery_id, version, confident_threshold=confident_threshold
+    )
+    if response.get("error_code") != GALLERY_NOT_FOUND:
+        return response
+
+    candidate_embeddings = await load_candidate_embeddings(roster)
+    upsert = await ml_client.upsert_gallery(gallery_id, version, candidate_embeddings)
+    if not upsert.get("success"):
+        return upsert
+    return await ml_client.start_stream(
+        gallery_id, version, confident_threshold=confident_threshold
+    )
+
+
+def _face_to_match(face: Dict[str, Any]) -> Dict[str, Any]:
+    """A face returned by recognize, as a detected face for batch_match."""
+    detected = {"embedding": face["embedding"], "is_live": face.get("is_live", True)}
+    if face.get("embedding_version"):
+        detected["embedding_version"] = face["embedding_version"]
+    return detected
+
+
+async def _match_after_miss(
+    gallery_id: str,
+    version: str,
+    roster: List[Dict[str, Any]],
+    detected_faces: List[Dict[str, Any]],
+    confident_threshold: float,
+    uncertain_threshold: float,
+) -> Dict[str, Any]:
+    """Upload the gallery and batch-match, falling back to inline candidates."""
+    candidate_embeddings = await load_candidate_embeddings(roster)
+    upsert = await ml_client.upsert_gallery(gallery_id, version, candidate_embeddings)
+
+    if upsert.get("success"):
+        response = await ml_client.batch_match(
+            detected_faces=detected_faces,
+            confident_threshold=confident_threshold,
+            uncertain_threshold=uncertain_threshold,
+            gallery_id=gallery_id,
+            gallery_version=version,
+        )
+        if response.get("error_code") != GALLERY_NOT_FOUND:
+            return response
+    else:
+        logger.warning(
+            "Gallery upsert failed for %s: %s", gallery_id, upsert.get("error")
+        )
+
+    return await ml_client.batch_match(
+        detected_faces=detected_faces,
+        candidate_embeddings=candidate_embeddings,
+        confident_threshold=confident_threshold,
+        uncertain_threshold=uncertain_threshold,
+    )
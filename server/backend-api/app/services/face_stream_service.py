@@ -0,0 +1,256 @@
+"""
+Video-stream attendance over Socket.IO.
+
+Teachers connect to the ``/face-stream`` namespace of ``sio`` with their JWT
+(``auth={"token": "<access token>"}``), start a stream for a subject they
+teach (admins for any subject) and send JPEG frames as binary ``frame`` events
+while panning across the room. Frames are relayed to a stream session on the
+ML service, which samples them, tracks faces across frames and matches each
+tracked face once, so the CPU spent per second stays bounded however fast the
+phone sends.
+
+Only one frame per stream is in flight at a time, and frames sent before the
+ML service's ``retry_after_ms`` are dropped here instead of being uploaded.
+
+Client -> server:
+  start_stream  {subjectId}
+  frame         <JPEG bytes>
+  stop_stream
+
+Server -> client:
+  stream_started  {streamId, subjectId}
+  stream_update   {frame, tracks, newStudents}
+  stream_summary  {students, framesReceived, framesProcessed}
+  stream_error    {detail}
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from socketio.exceptions import ConnectionRefusedError
+
+from app.core.config import ML_CONFIDENT_THRESHOLD
+from app.db.mongo import db
+from app.services.attendance_socket_service import sio
+from app.services.face_gallery import load_roster, start_subject_stream
+from app.services.ml_client import ml_client
+from app.utils.jwt_token import decode_jwt
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "/face-stream"
+
+STREAM_NOT_FOUND = "STREAM_NOT_FOUND"
+
+# Open streams per socket
+# Key: sid
+# Value: { streamId, subjectId, names: {student_id: name}, nextFrameAt, busy }
+streams: Dict[str, Dict[str, Any]] = {}
+
+# Authenticated user and role per socket (sid -> user_id, sid -> role)
+stream_users: Dict[str, str] = {}
+stream_roles: Dict[str, str] = {}
+
+
+@sio.on("connect", namespace=NAMESPACE)
+async def stream_connect(sid, environ, auth=None):
+    token = (auth or {}).get("token")
+    try:
+        decoded = decode_jwt(token) if token else None
+    except Exception:
+        decoded = None
+    if not decoded or decoded.get("role") not in ("teacher", "admin"):
+        raise ConnectionRefusedError("Teacher authorization required")
+
+    stream_users[sid] = decoded.get("user_id")
+    stream_roles[sid] = decoded.get("role")
+    logger.info(f"Face stream socket connected: {sid}")
+
+
+@sio.on("disconnect", namespace=NAMESPACE)
+async def stream_disconnect(sid):
+    stream_users.pop(sid, None)
+    stream_roles.pop(sid, None)
+    stream = streams.pop(sid, None)
+    if stream:
+        try:
+            await ml_client.close_stream(stream["streamId"])
+        except Exception as e:
+            logger.warning(f"Failed to close stream {stream['streamId']}: {e}")
+    logger.info(f"Face stream socket disconnected: {sid}")
+
+
+@sio.on("start_stream", namespace=NAMESPACE)
+async def handle_start_stream(sid, data):
+    """
+    Open a stream for a subject, replacing any stream the socket had open.
+    Data: { subjectId }
+    """
+    subject_id = (data or {}).get("subjectId")
+    subject = await _load_subject(subject_id)
+    if subject is None:
+        await _emit_error(sid, "Subject not found")
+        return
+    if not _may_stream(sid, subject):
+        logger.warning(
+            f"User {stream_users.get(sid)} denied face stream for {subject_id}"
+        )
+        await _emit_error(sid, "Not authorized for this subject")
+        return
+
+    student_user_ids = [
+        s["student_id"] for s in subject.get("students", []) if s.get("verified")
+    ]
+    roster = await load_roster(student_user_ids)
+
+    try:
+        previous = streams.pop(sid, None)
+        if previous:
+            await ml_client.close_stream(previous["streamId"])
+        response = await start_subject_stream(
+            subject_id, roster, confident_threshold=ML_CONFIDENT_THRESHOLD
+        )
+    except Exception as e:
+        logger.error(f"Failed to start face stream for {subject_id}: {e}")
+        await _emit_error(sid, "ML service unavailable")
+        return
+
+    if not response.get("success"):
+        await _emit_error(sid, response.get("error") or "Could not start stream")
+        return
+
+    streams[sid] = {
+        "streamId": response["session_id"],
+        "subjectId": subject_id,
+        "names": {str(s["userId"]): s.get("name") for s in roster},
+        "nextFrameAt": 0.0,
+        "busy": False,
+    }
+    logger.info(f"Teacher {stream_users.get(sid)} started face stream for {subject_id}")
+    await sio.emit(
+        "stream_started",
+        {"streamId": response["session_id"], "subjectId": subject_id},
+        room=sid,
+        namespace=NAMESPACE,
+    )
+
+
+@sio.on("frame", namespace=NAMESPACE)
+async def handle_frame(sid, data):
+    """Relay one JPEG frame, unless the ML service would skip it anyway."""
+    stream = streams.get(sid)
+    if not stream or not isinstance(data, (bytes, bytearray)) or not data:
+        return
+    if stream["busy"] or time.monotonic() < stream["nextFrameAt"]:
+        return
+
+    stream["busy"] = True
+    try:
+        response = await ml_client.send_stream_frame(stream["streamId"], bytes(data))
+    except Exception as e:
+        logger.warning(f"Face stream frame failed for {sid}: {e}")
+        return
+    finally:
+        stream["busy"] = False
+
+    stream["nextFrameAt"] = (
+        time.monotonic() + response.get("retry_after_ms", 0) / 1000.0
+    )
+
+    if response.get("error_code") == STREAM_NOT_FOUND:
+        streams.pop(sid, None)
+        await _emit_error(sid, "Stream expired; start a new one")
+        return
+    if not response.get("processed"):
+        return
+
+    names = stream["names"]
+    await sio.emit(
+        "stream_update",
+        {
+            "frame": response.get("frame_index"),
+            "tracks": [_track_payload(t, names) for t in response.get("tracks", [])],
+            "newStudents": [
+                _student_payload(s, names) for s in response.get("new_students", [])
+            ],
+        },
+        room=sid,
+        namespace=NAMESPACE,
+    )
+
+
+@sio.on("stop_stream", namespace=NAMESPACE)
+async def handle_stop_stream(sid, data=None):
+    """Close the stream and send every student recognised on it."""
+    stream = streams.pop(sid, None)
+    if not stream:
+        return
+
+    try:
+        response = await ml_client.close_stream(stream["streamId"])
+    except Exception as e:
+        logger.error(f"Failed to close face stream {stream['streamId']}: {e}")
+        await _emit_error(sid, "ML service unavailable")
+        return
+
+    names = stream["names"]
+    await sio.emit(
+        "stream_summary",
+        {
+            "subjectId": stream["subjectId"],
+            "students": [
+                _student_payload(s, names) for s in response.get("students", [])
+            ],
+            "framesReceived": response.get("frames_received", 0),
+            "framesProcessed": response.get("frames_processed", 0),
+        },
+        room=sid,
+        namespace=NAMESPACE,
+    )
+
+
+async def _load_subject(subject_id: Any) -> Optional[Dict[str, Any]]:
+    try:
+        return await db.subjects.find_one(
+            {"_id": ObjectId(subject_id)}, {"students": 1, "professor_ids": 1}
+        )
+    except Exception:
+        return None
+
+
+def _may_stream(sid: str, subject: Dict[str, Any]) -> bool:
+    """Whether the socket's user teaches ``subject`` or is an admin."""
+    if stream_roles.get(sid) == "admin":
+        return True
+    user_id = stream_users.get(sid)
+    return user_id is not None and user_id in {
+        str(professor) for professor in subject.get("professor_ids", [])
+    }
+
+
+async def _emit_error(sid: str, detail: str) -> None:
+    await sio.emit("stream_error", {"detail": detail}, room=sid, namespace=NAMESPACE)
+
+
+def _student_payload(student: Dict[str, Any], names: Dict[str, str]) -> Dict:
+    distance = student.get("distance")
+    return {
+        "id": student["student_id"],
+        "name": names.get(student["student_id"]),
+        "distance": round(distance, 4),
+        "confidence": round(max(0.0, 1.0 - distance), 3),
+    }
+
+
+def _track_payload(track: Dict[str, Any], names: Dict[str, str]) -> Dict:
+    student_id = track.get("student_id")
+    return {
+        "trackId": track["track_id"],
+        "box": track.get("location", {}),
+        "status": track.get("status"),
+        "student": (
+            {"id": student_id, "name": names.get(student_id)} if student_id else None
+        ),
+    }
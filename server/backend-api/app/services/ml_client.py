@@ -1,12 +1,132 @@
+import asyncio
+import json
+import random
+import time
+
 import httpx
-from typing import Optional, List, Dict, Any
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 from app.core.config import (
     ML_API_KEY,
+    ML_EMBEDDING_ENCODING,
+    ML_SERVICE_BACKOFF_BASE,
+    ML_SERVICE_BACKOFF_MAX,
+    ML_SERVICE_BREAKER_FAILURES,
+    ML_SERVICE_BREAKER_RESET,
+    ML_SERVICE_DEADLINE,
+    ML_SERVICE_HEDGE_DELAY,
+    ML_SERVICE_HEDGE_URLS,
     ML_SERVICE_MAX_RETRIES,
     ML_SERVICE_TIMEOUT,
     ML_SERVICE_URL,
 )
+from app.core.metrics import (
+    ML_CLIENT_BREAKER_STATE,
+    ML_CLIENT_BREAKER_TRIPS,
+    ML_CLIENT_HEDGES,
+    ML_CLIENT_RETRIES,
+)
+from app.utils.embedding_codec import (
+    EMBEDDING_ENCODING_HEADER,
+    SUPPORTED_ENCODINGS,
+    decode_embedding,
+    encode_embedding,
+)
+
+# Seconds this client waits for a response; the ML service sheds requests it
+# cannot answer in time instead of queueing them past the deadline
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
+# Priority class of a request; the ML service serves interactive ones (live
+# attendance) ahead of bulk ones (enrollment, re-encoding) when both queue
+REQUEST_PRIORITY_HEADER = "X-Request-Priority"
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+
+# Responses worth retrying, on this replica later or on another: overload
+# shedding (503) and proxy errors in front of a replica
+RETRYABLE_STATUS = (502, 503, 504)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one ML replica.
+
+    Closed, it lets calls through and counts consecutive failures (transport
+    errors, timeouts and 5xx responses). After ``failure_threshold`` of them
+    it opens and calls fail fast, so an overloaded replica gets room to
+    recover instead of more load. After ``reset_timeout`` seconds it goes
+    half-open and lets a single probe through, which closes it on success
+    and reopens it on failure.
+    """
+
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        ML_CLIENT_BREAKER_STATE.labels(replica=name).set(self.state)
+
+    def allow(self) -> bool:
+        """Whether a call may go to the replica now; in half-open state, the
+        caller that gets True is the probe and must report how it went."""
+        if self.state == self.OPEN:
+            if self.clock() - self.opened_at < self.reset_timeout:
+                return False
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self.probing:
+                return False
+            self.probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.probing = False
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.opened_at = self.clock()
+            self._set_state(self.OPEN)
+            ML_CLIENT_BREAKER_TRIPS.labels(replica=self.name).inc()
+
+    def record_abandoned(self) -> None:
+        """The call was cancelled before it told anything about the replica."""
+        self.probing = False
+
+    def _set_state(self, state: int) -> None:
+        self.state = state
+        ML_CLIENT_BREAKER_STATE.labels(replica=self.name).set(state)
+
+
+class _RetryableError(Exception):
+    """A failed attempt worth retrying, with the error to raise if not."""
+
+    def __init__(self, reason: str, error: Exception, retry_after: float = 0.0):
+        super().__init__(str(error))
+        self.reason = reason
+        self.error = error
+        self.retry_after = retry_after
 
 
 class MLClient:
@@ -17,19 +137,49 @@ class MLClient:
         self.api_key = ML_API_KEY
         self.timeout = ML_SERVICE_TIMEOUT
         self.max_retries = ML_SERVICE_MAX_RETRIES
+        self.deadline = ML_SERVICE_DEADLINE
+        self.backoff_base = ML_SERVICE_BACKOFF_BASE
+        self.backoff_max = ML_SERVICE_BACKOFF_MAX
+        self.hedge_delay = ML_SERVICE_HEDGE_DELAY
+        self.embedding_encoding = ML_EMBEDDING_ENCODING.lower()
+
+        if self.embedding_encoding not in SUPPORTED_ENCODINGS:
+            raise ValueError(
+                f"Unsupported ML_EMBEDDING_ENCODING '{ML_EMBEDDING_ENCODING}'. "
+                f"Supported: {', '.join(sorted(SUPPORTED_ENCODINGS))}"
+            )
 
         # Create httpx client with connection pooling.
         # Only attach API key header when configured.
         # Missing key is validated lazily.
+        headers = {EMBEDDING_ENCODING_HEADER: self.embedding_encoding}
+        if self.api_key:
+            headers["X-API-Key"] = self.api_key
+
         client_kwargs = {
             "base_url": self.base_url,
             "timeout": self.timeout,
             "limits": httpx.Limits(max_keepalive_connections=5, max_connections=10),
+            "headers": headers,
         }
-        if self.api_key:
-            client_kwargs["headers"] = {"X-API-Key": self.api_key}
 
         self.client = httpx.AsyncClient(**client_kwargs)
+        self.breaker = self._breaker(self.base_url)
+
+        # Replicas that stateless calls are hedged to
+        self.hedge_clients = [
+            httpx.AsyncClient(**{**client_kwargs, "base_url": url})
+            for url in ML_SERVICE_HEDGE_URLS
+        ]
+        self.hedge_breakers = [self._breaker(url) for url in ML_SERVICE_HEDGE_URLS]
+
+    @staticmethod
+    def _breaker(url: str) -> CircuitBreaker:
+        return CircuitBreaker(
+            url,
+            failure_threshold=ML_SERVICE_BREAKER_FAILURES,
+            reset_timeout=ML_SERVICE_BREAKER_RESET,
+        )
 
     def _ensure_ml_api_key_configured(self) -> None:
         """Fail only when ML functionality is actually invoked."""
@@ -39,9 +189,34 @@ class MLClient:
                 "Set ML_API_KEY to use ML-powered endpoints."
             )
 
+    def _pack(self, embedding: Any) -> Any:
+        return encode_embedding(embedding, self.embedding_encoding)
+
+    def _unpack(self, embedding: Any) -> Any:
+        return decode_embedding(embedding, self.embedding_encoding)
+
+    def _pack_candidates(
+        self, candidate_embeddings: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        packed = []
+        for c in candidate_embeddings:
+            candidate = {**c, "embeddings": [self._pack(e) for e in c["embeddings"]]}
+            if c.get("template") is not None:
+                candidate["template"] = self._pack(c["template"])
+            packed.append(candidate)
+        return packed
+
+    def _unpack_faces(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        for face in response.get("faces") or []:
+            if face.get("embedding") is not None:
+                face["embedding"] = self._unpack(face["embedding"])
+        return response
+
     async def close(self):
-        """Close the HTTP client"""
+        """Close the HTTP clients"""
         await self.client.aclose()
+        for client in self.hedge_clients:
+            await client.aclose()
 
     async def _make_request(
         self,
@@ -49,37 +224,175 @@ class MLClient:
         endpoint: str,
         json_data: Optional[Dict] = None,
         retries: int = 0,
+        content: Optional[bytes] = None,
+        params: Optional[Dict[str, Any]] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        hedge: bool = False,
     ) -> Dict[str, Any]:
         """
         Make HTTP request to ML service with retry logic
+
+        Sends json_data as JSON, or content as a raw binary body. Timeouts,
+        connection errors and 502/503/504 responses are retried up to
+        max_retries times (retries counts attempts already spent) with
+        jittered exponential backoff, honouring Retry-After, as long as the
+        call stays within its deadline. Calls to a replica whose circuit
+        breaker is open fail fast. With hedge, a call to a stateless endpoint
+        is also sent to the next replica if the first is slow to answer.
         """
         self._ensure_ml_api_key_configured()
 
-        try:
-            response = await self.client.request(
-                method=method, url=endpoint, json=json_data
+        deadline = time.monotonic() + self.deadline
+        attempt = retries
+        while True:
+            timeout = min(self.timeout, deadline - time.monotonic())
+            try:
+                return await self._attempt(
+                    method,
+                    endpoint,
+                    json_data=json_data,
+                    content=content,
+                    params=params,
+                    priority=priority,
+                    timeout=timeout,
+                    hedge=hedge,
+                )
+            except _RetryableError as e:
+                if attempt >= self.max_retries:
+                    if e.reason == "timeout":
+                        raise Exception(
+                            f"ML Service timeout after {self.max_retries} retries"
+                        )
+                    raise e.error
+                delay = max(e.retry_after, self._backoff(attempt))
+                if time.monotonic() + delay >= deadline:
+                    raise Exception(
+                        f"ML Service deadline of {self.deadline:g}s exceeded: {e.error}"
+                    )
+                ML_CLIENT_RETRIES.labels(reason=e.reason).inc()
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: spreads the retries of callers that failed together."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _replicas(self) -> List[Tuple[httpx.AsyncClient, CircuitBreaker]]:
+        return [(self.client, self.breaker)] + list(
+            zip(self.hedge_clients, self.hedge_breakers)
+        )
+
+    async def _attempt(self, method: str, endpoint: str, hedge: bool, **request):
+        """
+        One attempt: the first replica whose breaker lets it through, and with
+        hedge, the next one too if the first has not answered within
+        hedge_delay. The first successful response wins.
+        """
+        replicas = self._replicas() if hedge and self.hedge_delay > 0 else None
+        if replicas is None or len(replicas) < 2:
+            if not self.breaker.allow():
+                raise Exception(
+                    f"ML Service unavailable: circuit breaker open for {self.base_url}"
+                )
+            return await self._send(
+                self.client, self.breaker, method, endpoint, **request
             )
-            response.raise_for_status()
-            return response.json()
 
-        except httpx.TimeoutException:
-            if retries < self.max_retries:
-                return await self._make_request(
-                    method, endpoint, json_data, retries + 1
+        # Take a breaker's permit only when the call is actually sent to it
+        candidates = iter(replicas)
+
+        def send_next() -> Optional[asyncio.Task]:
+            for client, breaker in candidates:
+                if breaker.allow():
+                    return asyncio.ensure_future(
+                        self._send(client, breaker, method, endpoint, **request)
+                    )
+            return None
+
+        primary = send_next()
+        if primary is None:
+            raise Exception("ML Service unavailable: all circuit breakers open")
+        racing = {primary}
+        try:
+            done, _ = await asyncio.wait(racing, timeout=self.hedge_delay)
+            second = None if done else send_next()
+            if second is None:
+                return await primary
+            racing.add(second)
+
+            error = None
+            while racing:
+                done, racing = await asyncio.wait(
+                    racing, return_when=asyncio.FIRST_COMPLETED
                 )
-            raise Exception(f"ML Service timeout after {self.max_retries} retries")
-
-        except httpx.HTTPStatusError as e:
-            raise Exception(
-                f"ML Service error: {e.response.status_code} - {e.response.text}"
+                for task in done:
+                    if task.exception() is None:
+                        winner = "primary" if task is primary else "hedge"
+                        ML_CLIENT_HEDGES.labels(winner=winner).inc()
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # The losing request, or both when the caller gave up
+            for task in racing:
+                task.cancel()
+
+    async def _send(
+        self,
+        client: httpx.AsyncClient,
+        breaker: CircuitBreaker,
+        method: str,
+        endpoint: str,
+        json_data: Optional[Dict] = None,
+        content: Optional[bytes] = None,
+        params: Optional[Dict[str, Any]] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        timeout: float = None,
+    ) -> Dict[str, Any]:
+        """Send the request to one replica and report the outcome to its
+        breaker."""
+        headers = {
+            REQUEST_TIMEOUT_HEADER: f"{timeout:g}",
+            REQUEST_PRIORITY_HEADER: priority,
+        }
+        if content is not None:
+            headers["Content-Type"] = "application/octet-stream"
+        try:
+            response = await client.request(
+                method=method,
+                url=endpoint,
+                json=json_data if content is None else None,
+                content=content,
+                params=params,
+                headers=headers,
+                timeout=timeout,
             )
-
-        except Exception as e:
-            if retries < self.max_retries:
-                return await self._make_request(
-                    method, endpoint, json_data, retries + 1
+        except httpx.TimeoutException as e:
+            breaker.record_failure()
+            raise _RetryableError("timeout", e)
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            raise _RetryableError(
+                "connection", Exception(f"ML Service communication error: {str(e)}")
+            )
+        except BaseException:
+            breaker.record_abandoned()
+            raise
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if response.is_error:
+            error = Exception(
+                f"ML Service error: {response.status_code} - {response.text}"
+            )
+            if response.status_code in RETRYABLE_STATUS:
+                raise _RetryableError(
+                    "unavailable", error, _retry_after(response.headers)
                 )
-            raise Exception(f"ML Service communication error: {str(e)}")
+            raise error
+        return response.json()
 
     async def encode_face(
         self,
@@ -87,14 +400,18 @@ class MLClient:
         validate_single: bool = True,
         min_face_area_ratio: float = 0.05,
         num_jitters: int = 5,
+        priority: str = PRIORITY_BULK,
     ) -> Dict[str, Any]:
         """
         Encode a single face from an image
 
+        Enrollment traffic, so bulk priority by default.
+
         Returns:
             {
                 "success": bool,
                 "embedding": List[float],
+                "embedding_version": str,
                 "face_location": {...},
                 "metadata": {...},
                 "error": str (optional)
@@ -107,7 +424,74 @@ class MLClient:
             "num_jitters": num_jitters,
         }
 
-        return await self._make_request("POST", "/api/ml/encode-face", request_data)
+        response = await self._make_request(
+            "POST", "/api/ml/encode-face", request_data, priority=priority, hedge=True
+        )
+        if response.get("embedding") is not None:
+            response["embedding"] = self._unpack(response["embedding"])
+        return response
+
+    async def encode_faces_batch(
+        self,
+        images: List[Tuple[str, str]],
+        validate_single: bool = True,
+        min_face_area_ratio: float = 0.05,
+        num_jitters: int = 5,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Encode one face per image for many images in a single request
+
+        images: [(image_id, image_base64), ...]
+
+        Results are yielded as the ML service streams them (completion order,
+        not input order); each has the encode_face fields plus "index" and
+        "image_id". Not retried, since results may already have been consumed.
+
+        Yields:
+            {
+                "index": int,
+                "image_id": str,
+                "success": bool,
+                "embedding": List[float],
+                "face_location": {...},
+                "metadata": {...},
+                "error": str (optional),
+                "error_code": str (optional)
+            }
+        """
+        self._ensure_ml_api_key_configured()
+
+        request_data = {
+            "images": [
+                {"image_id": image_id, "image_base64": image_base64}
+                for image_id, image_base64 in images
+            ],
+            "validate_single": validate_single,
+            "min_face_area_ratio": min_face_area_ratio,
+            "num_jitters": num_jitters,
+        }
+
+        try:
+            async with self.client.stream(
+                "POST",
+                "/api/ml/encode-faces-batch",
+                json=request_data,
+                headers={REQUEST_PRIORITY_HEADER: PRIORITY_BULK},
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    raise Exception(
+                        f"ML Service error: {response.status_code} - {response.text}"
+                    )
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    result = json.loads(line)
+                    if result.get("embedding") is not None:
+                        result["embedding"] = self._unpack(result["embedding"])
+                    yield result
+        except httpx.HTTPError as e:
+            raise Exception(f"ML Service communication error: {str(e)}")
 
     async def detect_faces(
         self,
@@ -138,7 +522,36 @@ class MLClient:
             "model": model,
         }
 
-        return await self._make_request("POST", "/api/ml/detect-faces", request_data)
+        response = await self._make_request(
+            "POST", "/api/ml/detect-faces", request_data, hedge=True
+        )
+        return self._unpack_faces(response)
+
+    async def detect_faces_upload(
+        self,
+        image: bytes,
+        min_face_area_ratio: float = 0.04,
+        num_jitters: int = 3,
+        model: str = "hog",
+    ) -> Dict[str, Any]:
+        """
+        Same as detect_faces, with the image sent as raw bytes (no base64) to
+        /api/ml/detect-faces/upload.
+        """
+        params = {
+            "min_face_area_ratio": min_face_area_ratio,
+            "num_jitters": num_jitters,
+            "model": model,
+        }
+
+        response = await self._make_request(
+            "POST",
+            "/api/ml/detect-faces/upload",
+            content=image,
+            params=params,
+            hedge=True,
+        )
+        return self._unpack_faces(response)
 
     async def match_faces(
         self,
@@ -171,24 +584,33 @@ class MLClient:
             }
         """
         request_data = {
-            "query_embedding": query_embedding,
-            "candidate_embeddings": candidate_embeddings,
+            "query_embedding": self._pack(query_embedding),
+            "candidate_embeddings": self._pack_candidates(candidate_embeddings),
             "threshold": threshold,
             "return_all_distances": return_all_distances,
         }
 
-        return await self._make_request("POST", "/api/ml/match-faces", request_data)
+        return await self._make_request(
+            "POST", "/api/ml/match-faces", request_data, hedge=True
+        )
 
     async def batch_match(
         self,
         detected_faces: List[Dict[str, Any]],
-        candidate_embeddings: List[Dict[str, Any]],
+        candidate_embeddings: Optional[List[Dict[str, Any]]] = None,
         confident_threshold: float = 0.50,
         uncertain_threshold: float = 0.60,
+        gallery_id: Optional[str] = None,
+        gallery_version: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Match multiple detected faces against candidate embeddings
 
+        Either candidate_embeddings or gallery_id must be given. With
+        gallery_id the ML service matches against its cached gallery and
+        returns error_code "GALLERY_NOT_FOUND" when it is missing or its
+        version differs from gallery_version.
+
         detected_faces format: [
             {"embedding": [float, ...]},
             ...
@@ -209,18 +631,277 @@ class MLClient:
                     "face_index": int,
                     "student_id": str or None,
                     "distance": float,
-                    "status": str  # "present" or "unknown"
-                }]
+                    "status": str,  # "present" or "unknown"
+                    "uncertain": bool  # another face competed for the student
+                }],
+                "error_code": str (optional)
             }
         """
         request_data = {
-            "detected_faces": detected_faces,
-            "candidate_embeddings": candidate_embeddings,
+            "detected_faces": [
+                {**face, "embedding": self._pack(face["embedding"])}
+                for face in detected_faces
+            ],
             "confident_threshold": confident_threshold,
             "uncertain_threshold": uncertain_threshold,
         }
+        if gallery_id is not None:
+            request_data["gallery_id"] = gallery_id
+            request_data["gallery_version"] = gallery_version
+        else:
+            request_data["candidate_embeddings"] = self._pack_candidates(
+                candidate_embeddings or []
+            )
 
-        return await self._make_request("POST", "/api/ml/batch-match", request_data)
+        # A cached gallery lives on one replica; inline candidates go anywhere
+        return await self._make_request(
+            "POST", "/api/ml/batch-match", request_data, hedge=gallery_id is None
+        )
+
+    async def recognize(
+        self,
+        image_base64: str,
+        candidate_embeddings: Optional[List[Dict[str, Any]]] = None,
+        gallery_id: Optional[str] = None,
+        gallery_version: Optional[str] = None,
+        min_face_area_ratio: float = 0.01,
+        num_jitters: int = 3,
+        model: str = "hog",
+        confident_threshold: float = 0.50,
+        uncertain_threshold: float = 0.60,
+        return_embeddings: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Detect and match faces in a single call
+
+        Either candidate_embeddings or gallery_id must be given. On a gallery
+        miss the response has error_code "GALLERY_NOT_FOUND" and the faces
+        carry their embeddings so they can be batch-matched after uploading
+        the gallery.
+
+        Returns:
+            {
+                "success": bool,
+                "faces": [{
+                    "face_index": int,
+                    "location": {...},
+                    "face_area_ratio": float,
+                    "is_live": bool,
+                    "student_id": str or None,
+                    "distance": float,
+                    "status": str,  # "present", "unknown" or "spoof"
+                    "uncertain": bool,
+                    "embedding": List[float] or None
+                }],
+                "count": int,
+                "metadata": {...},
+                "error_code": str (optional)
+            }
+        """
+        request_data = {
+            "image_base64": image_base64,
+            "min_face_area_ratio": min_face_area_ratio,
+            "num_jitters": num_jitters,
+            "model": model,
+            "confident_threshold": confident_threshold,
+            "uncertain_threshold": uncertain_threshold,
+            "return_embeddings": return_embeddings,
+        }
+        if gallery_id is not None:
+            request_data["gallery_id"] = gallery_id
+            request_data["gallery_version"] = gallery_version
+        else:
+            request_data["candidate_embeddings"] = self._pack_candidates(
+                candidate_embeddings or []
+            )
+
+        response = await self._make_request(
+            "POST", "/api/ml/recognize", request_data, hedge=gallery_id is None
+        )
+        return self._unpack_faces(response)
+
+    async def recognize_upload(
+        self,
+        image: bytes,
+        gallery_id: str,
+        gallery_version: Optional[str] = None,
+        min_face_area_ratio: float = 0.01,
+        num_jitters: int = 3,
+        model: str = "hog",
+        confident_threshold: float = 0.50,
+        uncertain_threshold: float = 0.60,
+        return_embeddings: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Same as recognize against a cached gallery, with the image sent as raw
+        bytes (no base64) to /api/ml/recognize/upload.
+
+        Returns the same shape as recognize.
+        """
+        params = {
+            "gallery_id": gallery_id,
+            "min_face_area_ratio": min_face_area_ratio,
+            "num_jitters": num_jitters,
+            "model": model,
+            "confident_threshold": confident_threshold,
+            "uncertain_threshold": uncertain_threshold,
+            "return_embeddings": return_embeddings,
+        }
+        if gallery_version is not None:
+            params["gallery_version"] = gallery_version
+
+        response = await self._make_request(
+            "POST", "/api/ml/recognize/upload", content=image, params=params
+        )
+        return self._unpack_faces(response)
+
+    async def upsert_gallery(
+        self,
+        gallery_id: str,
+        version: str,
+        candidate_embeddings: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Create or replace a cached roster gallery on the ML service
+
+        Returns:
+            {
+                "success": bool,
+                "gallery_id": str,
+                "version": str,
+                "num_students": int,
+                "num_embeddings": int,
+                "size_bytes": int,
+                "error_code": str (optional)
+            }
+        """
+        request_data = {
+            "version": version,
+            "candidate_embeddings": self._pack_candidates(candidate_embeddings),
+        }
+
+        return await self._make_request(
+            "PUT", f"/api/ml/galleries/{gallery_id}", request_data
+        )
+
+    async def convert_embeddings(
+        self,
+        embeddings: List[List[float]],
+        embedding_version: Optional[str],
+        priority: str = PRIORITY_BULK,
+    ) -> Dict[str, Any]:
+        """
+        Re-encode stored embeddings into the ML service's embedding version
+
+        embedding_version None means embeddings stored before version tags
+        (the raw format). Embeddings of another projection cannot be
+        converted and come back with error_code "EMBEDDING_VERSION_MISMATCH".
+
+        Returns:
+            {
+                "success": bool,
+                "embeddings": [[float], ...],
+                "embedding_version": str,
+                "error_code": str (optional)
+            }
+        """
+        request_data = {
+            "embeddings": [self._pack(emb) for emb in embeddings],
+            "embedding_version": embedding_version,
+        }
+
+        response = await self._make_request(
+            "POST",
+            "/api/ml/embeddings/convert",
+            request_data,
+            priority=priority,
+            hedge=True,
+        )
+        if response.get("embeddings") is not None:
+            response["embeddings"] = [
+                self._unpack(emb) for emb in response["embeddings"]
+            ]
+        return response
+
+    async def invalidate_gallery(self, gallery_id: str) -> Dict[str, Any]:
+        """
+        Drop a cached roster gallery from the ML service
+
+        Returns:
+            {"success": bool, "gallery_id": str, "removed": bool}
+        """
+        return await self._make_request("DELETE", f"/api/ml/galleries/{gallery_id}")
+
+    async def start_stream(
+        self,
+        gallery_id: str,
+        gallery_version: Optional[str] = None,
+        confident_threshold: float = 0.50,
+        min_face_area_ratio: float = 0.002,
+    ) -> Dict[str, Any]:
+        """
+        Open a video-stream session against a cached gallery
+
+        Returns:
+            {
+                "success": bool,
+                "session_id": str,
+                "gallery_id": str,
+                "error_code": str (optional, "GALLERY_NOT_FOUND" on a miss)
+            }
+        """
+        request_data = {
+            "gallery_id": gallery_id,
+            "gallery_version": gallery_version,
+            "confident_threshold": confident_threshold,
+            "min_face_area_ratio": min_face_area_ratio,
+        }
+
+        return await self._make_request("POST", "/api/ml/streams", request_data)
+
+    async def send_stream_frame(self, session_id: str, frame: bytes) -> Dict[str, Any]:
+        """
+        Send one raw JPEG/PNG frame to a video stream
+
+        Frames are not retried: a lost frame is superseded by the next one.
+
+        Returns:
+            {
+                "success": bool,
+                "frame_index": int,
+                "processed": bool,
+                "retry_after_ms": int,
+                "tracks": [{"track_id": int, "location": {...},
+                            "student_id": str, "distance": float,
+                            "status": str}, ...],
+                "new_students": [{"student_id": str, "distance": float,
+                                  "track_id": int,
+                                  "first_seen_frame": int}, ...],
+                "error_code": str (optional, "STREAM_NOT_FOUND" once expired)
+            }
+        """
+        return await self._make_request(
+            "POST",
+            f"/api/ml/streams/{session_id}/frames",
+            content=frame,
+            retries=self.max_retries,
+        )
+
+    async def close_stream(self, session_id: str) -> Dict[str, Any]:
+        """
+        Close a video stream
+
+        Returns:
+            {
+                "success": bool,
+                "frames_received": int,
+                "frames_processed": int,
+                "tracks_seen": int,
+                "students": [{"student_id": str, "distance": float,
+                              "track_id": int, "first_seen_frame": int}, ...]
+            }
+        """
+        return await self._make_request("DELETE", f"/api/ml/streams/{session_id}")
 
     async def health_check(self) -> Dict[str, Any]:
         """
@@ -238,5 +919,13 @@ class MLClient:
         return await self._make_request("GET", "/health")
 
 
+def _retry_after(headers: httpx.Headers) -> float:
+    """Seconds from a Retry-After header (0 when absent or an HTTP date)."""
+    try:
+        return max(0.0, float(headers.get("Retry-After", 0)))
+    except ValueError:
+        return 0.0
+
+
 # Global ML client instance
 ml_client = MLClient()
@@ -1,5 +1,29 @@
+import logging
+from typing import Any, List, Optional
+
+from app.core.config import FACE_EMBEDDING_STORAGE, FACE_TEMPLATE_MAX_EMBEDDINGS
 from app.db.mongo import db
+from app.services.ml_client import ml_client
+from app.utils.embedding_codec import (
+    STORAGE_FLOAT32,
+    pack_stored_embedding,
+    unpack_stored_embedding,
+)
+from app.utils.face_templates import (
+    DEFAULT_EMBEDDING_QUALITY,
+    add_to_template,
+    keep_best,
+    template_from,
+)
 from bson import ObjectId
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_VERSION_MISMATCH = "EMBEDDING_VERSION_MISMATCH"
+
+# Reads of a student's embeddings before a concurrent enrollment gives up
+FACE_EMBEDDING_UPDATE_ATTEMPTS = 5
 
 
 async def get_student_profile(user_id: str):
@@ -105,3 +129,152 @@ async def build_attendance_summary(student_doc_id: ObjectId):
         "forecasted_score": forecasted_score,
         "recent_attendance": recent,
     }
+
+
+async def add_face_embedding(
+    student_user_id: ObjectId,
+    embedding: List[float],
+    embedding_version: Optional[str],
+    image_url: Optional[str],
+    quality: Optional[float] = None,
+) -> None:
+    """
+    Store a newly encoded face embedding and mark the student verified.
+
+    Embeddings are packed in the FACE_EMBEDDING_STORAGE format. A student's
+    embeddings always share one version: when the ML service has moved to a
+    new one, the existing embeddings are converted first, or dropped if the
+    ML service cannot convert them.
+
+    Only the FACE_TEMPLATE_MAX_EMBEDDINGS best embeddings by enrollment
+    ``quality`` are kept, and every enrollment is folded into the student's
+    running mean template (see app.utils.face_templates).
+
+    The update only applies if ``face_embeddings_rev`` is still the one read,
+    so concurrent enrollments of a student are retried on top of each other
+    instead of overwriting one another.
+
+    Raises:
+        HTTPException: 409 if the student kept changing for
+            FACE_EMBEDDING_UPDATE_ATTEMPTS attempts.
+    """
+    if quality is None:
+        quality = DEFAULT_EMBEDDING_QUALITY
+
+    for _ in range(FACE_EMBEDDING_UPDATE_ATTEMPTS):
+        student = await db.students.find_one(
+            {"userId": student_user_id},
+            {
+                "face_embeddings": 1,
+                "face_embedding_version": 1,
+                "face_embedding_quality": 1,
+                "face_embeddings_rev": 1,
+                "face_template": 1,
+                "face_template_weight": 1,
+            },
+        )
+        if student is None:
+            logger.warning(f"No student profile to enroll for user {student_user_id}")
+            return
+
+        update = await _face_embedding_update(
+            student, embedding, embedding_version, image_url, quality
+        )
+        rev = student.get("face_embeddings_rev")
+        result = await db.students.update_one(
+            {
+                "userId": student_user_id,
+                "face_embeddings_rev": rev if rev is not None else {"$exists": False},
+            },
+            update,
+        )
+        if result.matched_count:
+            return
+        logger.info(f"Face embeddings of {student_user_id} changed meanwhile, retrying")
+
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Face enrollment conflicted with another update, please try again",
+    )
+
+
+async def _face_embedding_update(
+    student: dict,
+    embedding: List[float],
+    embedding_version: Optional[str],
+    image_url: Optional[str],
+    quality: float,
+) -> dict:
+    existing = student.get("face_embeddings") or []
+    stored_version = student.get("face_embedding_version")
+    qualities = _stored_qualities(student, len(existing))
+    template = student.get("face_template")
+    template = unpack_stored_embedding(template) if template is not None else None
+    weight = student.get("face_template_weight") or 0.0
+
+    packed = pack_stored_embedding(embedding, FACE_EMBEDDING_STORAGE)
+    update: dict[str, Any] = {
+        "$set": {
+            "image_url": image_url,
+            "verified": True,
+            "face_embedding_version": embedding_version,
+        },
+        # Bumped on every embedding change so cached ML galleries go stale
+        "$inc": {"face_embeddings_rev": 1},
+    }
+
+    converted = bool(existing) and stored_version != embedding_version
+    if converted:
+        existing = await _convert_stored_embeddings(existing, stored_version)
+        qualities = qualities[: len(existing)]
+        template = None
+    if not template:
+        # First enrollment, a new version, or stored before templates existed
+        template, weight = template_from(
+            [(unpack_stored_embedding(e), q) for e, q in zip(existing, qualities)]
+        )
+    template, weight = add_to_template(template, weight, embedding, quality)
+
+    if converted or len(existing) >= FACE_TEMPLATE_MAX_EMBEDDINGS:
+        kept = keep_best(
+            list(zip(existing, qualities)) + [(packed, quality)],
+            FACE_TEMPLATE_MAX_EMBEDDINGS,
+        )
+        update["$set"]["face_embeddings"] = [emb for emb, _ in kept]
+        update["$set"]["face_embedding_quality"] = [q for _, q in kept]
+    else:
+        update["$push"] = {"face_embeddings": packed}
+        update["$set"]["face_embedding_quality"] = qualities + [quality]
+
+    # The template is rewritten on every enrollment, so it is kept at float32
+    # rather than accumulating FACE_EMBEDDING_STORAGE rounding
+    update["$set"]["face_template"] = pack_stored_embedding(template, STORAGE_FLOAT32)
+    update["$set"]["face_template_weight"] = weight
+    return update
+
+
+def _stored_qualities(student: dict, count: int) -> List[float]:
+    """Enrollment quality of each stored embedding, defaulted when unscored."""
+    qualities = list(student.get("face_embedding_quality") or [])[:count]
+    return qualities + [DEFAULT_EMBEDDING_QUALITY] * (count - len(qualities))
+
+
+async def _convert_stored_embeddings(
+    stored: List[Any], stored_version: Optional[str]
+) -> List[Any]:
+    response = await ml_client.convert_embeddings(
+        [unpack_stored_embedding(emb) for emb in stored], stored_version
+    )
+    if response.get("success"):
+        return [
+            pack_stored_embedding(emb, FACE_EMBEDDING_STORAGE)
+            for emb in response["embeddings"]
+        ]
+    if response.get("error_code") == EMBEDDING_VERSION_MISMATCH:
+        logger.warning(
+            "Dropping %d face embeddings of version %s that cannot be converted",
+            len(stored),
+            stored_version,
+        )
+        return []
+    raise Exception(f"Embedding conversion failed: {response.get('error')}")
@@ -0,0 +1,102 @@
+"""
+Packed embedding formats shared with the ML service and Mongo.
+
+Embeddings travel as base64 of little-endian float32 ("base64-f32"), float16
+("base64-f16") or int8 ("base64-i8") when negotiated with the
+X-Embedding-Encoding header, instead of JSON float lists. Everything outside
+MLClient keeps working with plain lists.
+
+``db.students.face_embeddings`` stores each embedding as a BSON binary in the
+FACE_EMBEDDING_STORAGE format rather than an array of doubles. Documents
+written before that still hold float lists; ``unpack_stored_embedding`` reads
+both.
+"""
+
+import base64
+import struct
+from typing import Any, List
+
+from bson.binary import Binary
+
+EMBEDDING_ENCODING_HEADER = "X-Embedding-Encoding"
+
+ENCODING_JSON = "json"
+ENCODING_BASE64_F32 = "base64-f32"
+ENCODING_BASE64_F16 = "base64-f16"
+ENCODING_BASE64_I8 = "base64-i8"
+
+# struct format characters for each packed encoding
+_STRUCT_CODES = {
+    ENCODING_BASE64_F32: "f",
+    ENCODING_BASE64_F16: "e",
+    ENCODING_BASE64_I8: "b",
+}
+
+SUPPORTED_ENCODINGS = {ENCODING_JSON, *_STRUCT_CODES}
+
+STORAGE_LIST = "list"
+STORAGE_FLOAT32 = "float32"
+STORAGE_FLOAT16 = "float16"
+STORAGE_INT8 = "int8"
+
+# BSON binary subtypes (user-defined range) and struct codes per storage format
+_STORAGE_FORMATS = {
+    STORAGE_FLOAT32: (0x80, "f"),
+    STORAGE_FLOAT16: (0x81, "e"),
+    STORAGE_INT8: (0x82, "b"),
+}
+_STORAGE_CODES = {subtype: code for subtype, code in _STORAGE_FORMATS.values()}
+
+SUPPORTED_STORAGE = {STORAGE_LIST, *_STORAGE_FORMATS}
+
+
+def _pack(embedding: List[float], code: str) -> bytes:
+    if code == "b":
+        # Matching is by cosine similarity, so the per-vector scale is dropped
+        scale = max((abs(v) for v in embedding), default=0.0)
+        scale = 127.0 / scale if scale else 0.0
+        embedding = [round(v * scale) for v in embedding]
+    return struct.pack(f"<{len(embedding)}{code}", *embedding)
+
+
+def _unpack(raw: bytes, code: str) -> List[float]:
+    size = struct.calcsize(code)
+    return [float(v) for v in struct.unpack(f"<{len(raw) // size}{code}", raw)]
+
+
+def encode_embedding(embedding: Any, encoding: str) -> Any:
+    """Pack a float list for the wire; lists and already packed values pass."""
+    code = _STRUCT_CODES.get(encoding)
+    if code is None or isinstance(embedding, str):
+        return embedding
+    return base64.b64encode(_pack(embedding, code)).decode("ascii")
+
+
+def decode_embedding(value: Any, encoding: str) -> List[float]:
+    """Unpack an embedding from the wire; float lists are returned unchanged."""
+    if not isinstance(value, str):
+        return value
+    code = _STRUCT_CODES.get(encoding)
+    if code is None:
+        raise ValueError(
+            f"Received a packed embedding without a packed {EMBEDDING_ENCODING_HEADER}"
+        )
+    return _unpack(base64.b64decode(value), code)
+
+
+def pack_stored_embedding(embedding: List[float], storage: str) -> Any:
+    """Embedding as stored in ``face_embeddings`` under the given format."""
+    if storage == STORAGE_LIST:
+        return list(embedding)
+    subtype, code = _STORAGE_FORMATS[storage]
+    return Binary(_pack(embedding, code), subtype)
+
+
+def unpack_stored_embedding(value: Any) -> List[float]:
+    """Float list from a stored embedding, packed or legacy list."""
+    if isinstance(value, Binary):
+        code = _STORAGE_CODES.get(value.subtype)
+        if code is None:
+            raise ValueError(f"Unknown stored embedding subtype {value.subtype:#x}")
+        return _unpack(bytes(value), code)
+    return value
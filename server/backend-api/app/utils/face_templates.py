@@ -0,0 +1,71 @@
+"""
+Per-student face template store.
+
+Each enrollment photo is scored by the ML service (sharpness, face size and
+pose). Instead of keeping every embedding, a student keeps:
+
+- ``face_embeddings``: the FACE_TEMPLATE_MAX_EMBEDDINGS best-scoring
+  embeddings, with their scores in ``face_embedding_quality``
+- ``face_template``: a quality-weighted running mean over every accepted
+  enrollment, including ones that dropped out of the top-K, with its total
+  weight in ``face_template_weight``
+
+Storage per student is therefore capped, and the ML service can score a face
+against one compact template per student before looking at the full set.
+"""
+
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+
+# Quality assumed for embeddings stored before enrollments were scored
+DEFAULT_EMBEDDING_QUALITY = 0.5
+
+
+def normalize(embedding: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in embedding))
+    if norm == 0:
+        return list(embedding)
+    return [v / norm for v in embedding]
+
+
+def keep_best(
+    entries: List[Tuple[Any, float]], max_embeddings: int
+) -> List[Tuple[Any, float]]:
+    """
+    The ``max_embeddings`` highest-quality ``(embedding, quality)`` entries.
+
+    Ties go to the later entry, so a re-enrollment replaces an equally good
+    older photo. Kept entries stay in enrollment order.
+    """
+    if len(entries) <= max_embeddings:
+        return list(entries)
+    ranked = sorted(range(len(entries)), key=lambda i: (entries[i][1], i))
+    kept = sorted(ranked[-max_embeddings:]) if max_embeddings > 0 else []
+    return [entries[i] for i in kept]
+
+
+def add_to_template(
+    template: Optional[List[float]],
+    weight: float,
+    embedding: Sequence[float],
+    quality: float,
+) -> Tuple[List[float], float]:
+    """Fold one normalised embedding into a weighted running mean."""
+    vector = normalize(embedding)
+    if not template or weight <= 0 or len(template) != len(vector):
+        return vector, quality
+    total = weight + quality
+    if total <= 0:
+        return list(template), weight
+    return [(t * weight + v * quality) / total for t, v in zip(template, vector)], total
+
+
+def template_from(
+    entries: List[Tuple[List[float], float]],
+) -> Tuple[List[float], float]:
+    """Weighted mean template of ``(embedding, quality)`` entries."""
+    template: Optional[List[float]] = None
+    weight = 0.0
+    for embedding, quality in entries:
+        template, weight = add_to_template(template, weight, embedding, quality)
+    return template or [], weight
@@ -0,0 +1,184 @@
+"""
+Convert stored face embeddings to the ML service's embedding version and the
+compact FACE_EMBEDDING_STORAGE format.
+
+Each student's embeddings are sent to the ML service's
+/api/ml/embeddings/convert endpoint (raw embeddings are projected when the ML
+service has ML_EMBEDDING_PROJECTION_PATH set) and written back packed, with
+face_embedding_version updated and face_embeddings_rev bumped so cached
+galleries are rebuilt. When the version changes, face_template is rebuilt
+from the converted embeddings so it stays comparable. Students already in
+the target version and format are left alone. Embeddings of a version the ML
+service cannot convert are reported and kept; those students need to
+re-upload a photo.
+
+A student who enrolls a photo while their embeddings are being converted is
+left as is (updates are conditional on face_embeddings_rev); running the
+script again migrates them.
+
+--export writes every student's raw embeddings as JSONL instead, for fitting a
+projection with the ML service's fit_embedding_projection.py.
+
+Usage:
+    python scripts/migrate_face_embeddings.py --dry-run
+    python scripts/migrate_face_embeddings.py
+    python scripts/migrate_face_embeddings.py --export raw_embeddings.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from bson.binary import Binary
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import FACE_EMBEDDING_STORAGE  # noqa: E402
+from app.db.mongo import MONGO_DB as DB_NAME  # noqa: E402
+from app.services.ml_client import ml_client  # noqa: E402
+from app.utils.embedding_codec import (  # noqa: E402
+    STORAGE_FLOAT32,
+    STORAGE_LIST,
+    pack_stored_embedding,
+    unpack_stored_embedding,
+)
+from app.utils.face_templates import (  # noqa: E402
+    DEFAULT_EMBEDDING_QUALITY,
+    template_from,
+)
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+
+PROJECTION = {
+    "userId": 1,
+    "face_embeddings": 1,
+    "face_embedding_version": 1,
+    "face_embedding_quality": 1,
+    "face_embeddings_rev": 1,
+}
+
+
+def is_stored_compact(stored) -> bool:
+    """Whether every embedding is already in the FACE_EMBEDDING_STORAGE format."""
+    if FACE_EMBEDDING_STORAGE == STORAGE_LIST:
+        return all(isinstance(emb, list) for emb in stored)
+    subtype = pack_stored_embedding([0.0], FACE_EMBEDDING_STORAGE).subtype
+    return all(isinstance(emb, Binary) and emb.subtype == subtype for emb in stored)
+
+
+def rebuilt_template(doc: dict, embeddings) -> dict:
+    """face_template fields for a student whose embeddings changed version.
+
+    The old template is in the old dimension, so it is replaced by the
+    quality-weighted mean of the converted embeddings.
+    """
+    qualities = list(doc.get("face_embedding_quality") or [])[: len(embeddings)]
+    qualities += [DEFAULT_EMBEDDING_QUALITY] * (len(embeddings) - len(qualities))
+    template, weight = template_from(list(zip(embeddings, qualities)))
+    return {
+        "face_template": pack_stored_embedding(template, STORAGE_FLOAT32),
+        "face_template_weight": weight,
+    }
+
+
+async def export_raw(collection, path: str) -> None:
+    count = 0
+    with open(path, "w") as f:
+        async for doc in collection.find(
+            {"face_embeddings": {"$exists": True, "$ne": []}}, PROJECTION
+        ):
+            # Only raw (untagged) embeddings can be used to fit a projection
+            if doc.get("face_embedding_version") not in (None, "raw96-v1"):
+                continue
+            embeddings = [unpack_stored_embedding(e) for e in doc["face_embeddings"]]
+            f.write(
+                json.dumps({"student_id": str(doc["userId"]), "embeddings": embeddings})
+                + "\n"
+            )
+            count += 1
+    print(f"Exported raw embeddings of {count} students to {path}")
+
+
+async def migrate_face_embeddings(dry_run: bool) -> None:
+    print(f"Connecting to {MONGO_URI} / {DB_NAME}")
+    client = AsyncIOMotorClient(MONGO_URI)
+    collection = client[DB_NAME]["students"]
+
+    migrated = skipped = failed = conflicted = 0
+    async for doc in collection.find(
+        {"face_embeddings": {"$exists": True, "$ne": []}}, PROJECTION
+    ):
+        stored = doc["face_embeddings"]
+        version = doc.get("face_embedding_version")
+
+        response = await ml_client.convert_embeddings(
+            [unpack_stored_embedding(emb) for emb in stored], version
+        )
+        if not response.get("success"):
+            print(f"Cannot convert {doc['userId']} ({version}): {response['error']}")
+            failed += 1
+            continue
+
+        target = response["embedding_version"]
+        if target == version and is_stored_compact(stored):
+            skipped += 1
+            continue
+
+        if dry_run:
+            migrated += 1
+            continue
+        update = {
+            "face_embeddings": [
+                pack_stored_embedding(emb, FACE_EMBEDDING_STORAGE)
+                for emb in response["embeddings"]
+            ],
+            "face_embedding_version": target,
+        }
+        if target != version:
+            update.update(rebuilt_template(doc, response["embeddings"]))
+        # Only if no photo was enrolled while the embeddings were converted
+        rev = doc.get("face_embeddings_rev")
+        result = await collection.update_one(
+            {
+                "_id": doc["_id"],
+                "face_embeddings_rev": rev if rev is not None else {"$exists": False},
+            },
+            {"$set": update, "$inc": {"face_embeddings_rev": 1}},
+        )
+        if result.matched_count:
+            migrated += 1
+        else:
+            print(f"Skipped {doc['userId']}: face embeddings changed meanwhile")
+            conflicted += 1
+
+    action = "Would migrate" if dry_run else "Migrated"
+    print(
+        f"{action} {migrated} students; {skipped} already up to date, "
+        f"{failed} could not be converted."
+    )
+    if conflicted:
+        print(f"{conflicted} students changed during migration; run it again.")
+    await ml_client.close()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--export", metavar="PATH", help="Export raw embeddings")
+    args = parser.parse_args()
+
+    if args.export:
+        client = AsyncIOMotorClient(MONGO_URI)
+        await export_raw(client[DB_NAME]["students"], args.export)
+    else:
+        await migrate_face_embeddings(args.dry_run)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
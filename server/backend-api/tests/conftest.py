@@ -83,6 +83,7 @@ async def db(db_client):
         "app.services.notification_service.db",
         "app.services.webauthn_service.db",
         "app.services.attendance_socket_service.db",
+        "app.services.face_gallery.db",
         "app.api.routes.webauthn.db",
         "app.api.routes.reports.db",
         "app.api.routes.notifications.db",
@@ -181,6 +182,7 @@ def mock_ml_client():
     with patch("app.services.ml_client.ml_client") as mock:
         mock.close = AsyncMock()
         mock.detect_faces = AsyncMock(return_value={"success": True, "faces": []})
+        mock.recognize = AsyncMock(return_value={"success": True, "faces": []})
         mock.get_embeddings = AsyncMock(
             return_value={"success": True, "embeddings": []}
         )
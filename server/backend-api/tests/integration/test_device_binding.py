@@ -86,9 +86,9 @@ async def test_teacher_exempt_from_device_binding(client: AsyncClient, db):
 
     # 5. Attempt to mark attendance from Device A
     with patch(
-        "app.services.ml_client.ml_client.detect_faces", new_callable=AsyncMock
-    ) as mock_detect:
-        mock_detect.return_value = {"success": True, "faces": []}
+        "app.services.ml_client.ml_client.recognize", new_callable=AsyncMock
+    ) as mock_recognize:
+        mock_recognize.return_value = {"success": True, "faces": []}
 
         response = await client.post(
             "/attendance/mark",
@@ -110,9 +110,9 @@ async def test_teacher_exempt_from_device_binding(client: AsyncClient, db):
 
     # 6. Attempt to mark attendance from Device B (different device)
     with patch(
-        "app.services.ml_client.ml_client.detect_faces", new_callable=AsyncMock
-    ) as mock_detect:
-        mock_detect.return_value = {"success": True, "faces": []}
+        "app.services.ml_client.ml_client.recognize", new_callable=AsyncMock
+    ) as mock_recognize:
+        mock_recognize.return_value = {"success": True, "faces": []}
 
         response = await client.post(
             "/attendance/mark",
@@ -215,9 +215,9 @@ async def test_student_device_binding_enforcement(client: AsyncClient, db):
 
     # 5. First attendance from Device A (should auto-bind)
     with patch(
-        "app.services.ml_client.ml_client.detect_faces", new_callable=AsyncMock
-    ) as mock_detect:
-        mock_detect.return_value = {"success": True, "faces": []}
+        "app.services.ml_client.ml_client.recognize", new_callable=AsyncMock
+    ) as mock_recognize:
+        mock_recognize.return_value = {"success": True, "faces": []}
 
         response = await client.post(
             "/attendance/mark",
@@ -244,9 +244,9 @@ async def test_student_device_binding_enforcement(client: AsyncClient, db):
 
     # 7. Attempt attendance from Device B (should be blocked)
     with patch(
-        "app.services.ml_client.ml_client.detect_faces", new_callable=AsyncMock
-    ) as mock_detect:
-        mock_detect.return_value = {"success": True, "faces": []}
+        "app.services.ml_client.ml_client.recognize", new_callable=AsyncMock
+    ) as mock_recognize:
+        mock_recognize.return_value = {"success": True, "faces": []}
 
         response = await client.post(
             "/attendance/mark",
@@ -0,0 +1,91 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.api.routes.attendance import MAX_MARK_IMAGE_SIZE, _parse_mark_upload
+
+BOUNDARY = "testboundary"
+
+
+def _request(chunks, headers):
+    """A Starlette request whose body arrives in the given chunks."""
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks
+    ] + [{"type": "http.request", "body": b"", "more_body": False}]
+    received = []
+
+    async def receive():
+        message = messages.pop(0)
+        received.append(message)
+        return message
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/attendance/mark/upload",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    return Request(scope, receive), received
+
+
+def _multipart(image: bytes) -> bytes:
+    return (
+        (
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="subject_id"\r\n\r\n'
+            f"abc\r\n--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="image"; filename="a.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode()
+        + image
+        + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+
+
+MULTIPART_HEADERS = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+@pytest.mark.asyncio
+async def test_parse_mark_upload_reads_image_and_fields():
+    request, _ = _request([_multipart(b"jpeg-bytes")], MULTIPART_HEADERS)
+
+    form = await _parse_mark_upload(request)
+
+    assert form["subject_id"] == "abc"
+    assert await form["image"].read() == b"jpeg-bytes"
+    await form.close()
+
+
+@pytest.mark.asyncio
+async def test_parse_mark_upload_rejects_declared_oversize_without_reading():
+    headers = {**MULTIPART_HEADERS, "Content-Length": str(MAX_MARK_IMAGE_SIZE * 2)}
+    request, received = _request([b"x"], headers)
+
+    with pytest.raises(HTTPException) as exc:
+        await _parse_mark_upload(request)
+
+    assert exc.value.status_code == 413
+    assert received == []
+
+
+@pytest.mark.asyncio
+async def test_parse_mark_upload_stops_streaming_past_the_limit():
+    body = _multipart(b"\0" * (MAX_MARK_IMAGE_SIZE + 1024 * 1024))
+    chunks = [body[i : i + 65536] for i in range(0, len(body), 65536)]
+    request, received = _request(chunks, MULTIPART_HEADERS)
+
+    with pytest.raises(HTTPException) as exc:
+        await _parse_mark_upload(request)
+
+    assert exc.value.status_code == 413
+    assert len(received) < len(chunks)
+
+
+@pytest.mark.asyncio
+async def test_parse_mark_upload_requires_multipart():
+    request, _ = _request([b"{}"], {"Content-Type": "application/json"})
+
+    with pytest.raises(HTTPException) as exc:
+        await _parse_mark_upload(request)
+
+    assert exc.value.status_code == 415
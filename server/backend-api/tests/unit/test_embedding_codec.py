@@ -0,0 +1,109 @@
+import base64
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from bson import BSON
+from bson.binary import Binary
+
+from app.services.ml_client import MLClient
+from app.utils.embedding_codec import (
+    ENCODING_BASE64_F16,
+    ENCODING_BASE64_F32,
+    ENCODING_BASE64_I8,
+    ENCODING_JSON,
+    STORAGE_FLOAT16,
+    STORAGE_INT8,
+    STORAGE_LIST,
+    decode_embedding,
+    encode_embedding,
+    pack_stored_embedding,
+    unpack_stored_embedding,
+)
+
+
+def test_f32_round_trip():
+    emb = [0.5, -0.25, 0.125]
+    packed = encode_embedding(emb, ENCODING_BASE64_F32)
+
+    assert isinstance(packed, str)
+    assert len(base64.b64decode(packed)) == 3 * 4
+    assert decode_embedding(packed, ENCODING_BASE64_F32) == emb
+
+
+def test_f16_round_trip():
+    emb = [0.5, -0.25, 0.1]
+    decoded = decode_embedding(
+        encode_embedding(emb, ENCODING_BASE64_F16), ENCODING_BASE64_F16
+    )
+    assert all(abs(a - b) < 1e-3 for a, b in zip(decoded, emb))
+
+
+def test_i8_round_trip_keeps_direction():
+    emb = [0.5, -0.25, 0.1]
+    packed = encode_embedding(emb, ENCODING_BASE64_I8)
+
+    assert len(base64.b64decode(packed)) == 3
+    assert decode_embedding(packed, ENCODING_BASE64_I8) == [127.0, -64.0, 25.0]
+
+
+def test_stored_embeddings_are_compact_binaries():
+    emb = [0.1 * i for i in range(256)]
+    as_list = len(BSON.encode({"e": pack_stored_embedding(emb, STORAGE_LIST)}))
+    as_f16 = len(BSON.encode({"e": pack_stored_embedding(emb, STORAGE_FLOAT16)}))
+    as_i8 = len(BSON.encode({"e": pack_stored_embedding(emb, STORAGE_INT8)}))
+
+    assert as_i8 < as_f16 < as_list / 3
+    assert isinstance(pack_stored_embedding(emb, STORAGE_INT8), Binary)
+
+
+def test_unpack_stored_embedding_reads_packed_and_legacy_lists():
+    emb = [0.5, -0.25, 0.125]
+    packed = pack_stored_embedding(emb, STORAGE_FLOAT16)
+
+    assert unpack_stored_embedding(packed) == emb
+    assert unpack_stored_embedding(emb) is emb
+    with pytest.raises(ValueError):
+        unpack_stored_embedding(Binary(b"\x00\x00", 0x90))
+
+
+def test_json_encoding_passes_lists_through():
+    emb = [0.5, 0.25]
+    assert encode_embedding(emb, ENCODING_JSON) is emb
+    assert decode_embedding(emb, ENCODING_BASE64_F32) is emb
+
+
+def test_packed_value_without_packed_encoding_is_rejected():
+    packed = encode_embedding([1.0], ENCODING_BASE64_F32)
+    with pytest.raises(ValueError):
+        decode_embedding(packed, ENCODING_JSON)
+
+
+@pytest.mark.asyncio
+async def test_ml_client_packs_requests_and_unpacks_responses():
+    client = MLClient()
+    client.embedding_encoding = ENCODING_BASE64_F32
+    emb = [1.0, 0.0]
+    packed = encode_embedding(emb, ENCODING_BASE64_F32)
+
+    with patch.object(
+        client,
+        "_make_request",
+        new_callable=AsyncMock,
+        return_value={"success": True, "faces": [{"embedding": packed}]},
+    ) as mock_request:
+        await client.batch_match(
+            detected_faces=[{"embedding": emb}],
+            candidate_embeddings=[
+                {"student_id": "a", "embeddings": [emb], "template": emb}
+            ],
+        )
+        sent = mock_request.await_args.args[2]
+        assert sent["detected_faces"][0]["embedding"] == packed
+        assert sent["candidate_embeddings"][0]["embeddings"] == [packed]
+        assert sent["candidate_embeddings"][0]["template"] == packed
+
+        response = await client.detect_faces(image_base64="img")
+        assert response["faces"][0]["embedding"] == emb
+
+    await client.close()
@@ -0,0 +1,274 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+
+from app.services.face_gallery import (
+    GALLERY_NOT_FOUND,
+    batch_match_subject,
+    load_candidate_embeddings,
+    recognize_subject,
+    roster_version,
+    start_subject_stream,
+)
+from app.utils.embedding_codec import (
+    STORAGE_FLOAT16,
+    STORAGE_FLOAT32,
+    pack_stored_embedding,
+)
+
+
+def _roster():
+    return [
+        {"userId": ObjectId(), "name": "A", "embedding_count": 1},
+        {"userId": ObjectId(), "name": "B", "embedding_count": 2},
+    ]
+
+
+def test_roster_version_is_order_independent_and_tracks_revisions():
+    roster = _roster()
+    assert roster_version(roster) == roster_version(list(reversed(roster)))
+
+    bumped = [dict(roster[0], face_embeddings_rev=1), roster[1]]
+    assert roster_version(bumped) != roster_version(roster)
+
+    grown = [roster[0], dict(roster[1], embedding_count=3)]
+    assert roster_version(grown) != roster_version(roster)
+
+
+@pytest.mark.asyncio
+async def test_batch_match_subject_hit_skips_embedding_load():
+    mock_client = AsyncMock()
+    mock_client.batch_match.return_value = {"success": True, "matches": []}
+
+    with (
+        patch("app.services.face_gallery.ml_client", mock_client),
+        patch(
+            "app.services.face_gallery.load_candidate_embeddings",
+            new_callable=AsyncMock,
+        ) as mock_load,
+    ):
+        response = await batch_match_subject(
+            "subj", _roster(), [{"embedding": [1.0]}], 0.5, 0.6
+        )
+
+    assert response["success"] is True
+    mock_load.assert_not_awaited()
+    mock_client.upsert_gallery.assert_not_awaited()
+    kwargs = mock_client.batch_match.await_args.kwargs
+    assert kwargs["gallery_id"] == "subject:subj"
+    assert "candidate_embeddings" not in kwargs
+
+
+@pytest.mark.asyncio
+async def test_batch_match_subject_miss_uploads_and_retries():
+    mock_client = AsyncMock()
+    mock_client.batch_match.side_effect = [
+        {"success": False, "error_code": GALLERY_NOT_FOUND},
+        {"success": True, "matches": []},
+    ]
+    mock_client.upsert_gallery.return_value = {"success": True}
+    candidates = [{"student_id": "a", "embeddings": [[1.0]]}]
+
+    with (
+        patch("app.services.face_gallery.ml_client", mock_client),
+        patch(
+            "app.services.face_gallery.load_candidate_embeddings",
+            new_callable=AsyncMock,
+            return_value=candidates,
+        ),
+    ):
+        response = await batch_match_subject(
+            "subj", _roster(), [{"embedding": [1.0]}], 0.5, 0.6
+        )
+
+    assert response["success"] is True
+    gallery_id, version, uploaded = mock_client.upsert_gallery.await_args.args
+    assert gallery_id == "subject:subj"
+    assert uploaded == candidates
+    assert mock_client.batch_match.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_match_subject_falls_back_to_inline_candidates():
+    mock_client = AsyncMock()
+    mock_client.batch_match.side_effect = [
+        {"success": False, "error_code": GALLERY_NOT_FOUND},
+        {"success": True, "matches": []},
+    ]
+    mock_client.upsert_gallery.return_value = {
+        "success": False,
+        "error_code": "GALLERY_TOO_LARGE",
+    }
+    candidates = [{"student_id": "a", "embeddings": [[1.0]]}]
+
+    with (
+        patch("app.services.face_gallery.ml_client", mock_client),
+        patch(
+            "app.services.face_gallery.load_candidate_embeddings",
+            new_callable=AsyncMock,
+            return_value=candidates,
+        ),
+    ):
+        response = await batch_match_subject(
+            "subj", _roster(), [{"embedding": [1.0]}], 0.5, 0.6
+        )
+
+    assert response["success"] is True
+    kwargs = mock_client.batch_match.await_args.kwargs
+    assert kwargs["candidate_embeddings"] == candidates
+    assert "gallery_id" not in kwargs
+
+
+@pytest.mark.asyncio
+async def test_recognize_subject_hit_is_single_call():
+    mock_client = AsyncMock()
+    mock_client.recognize.return_value = {
+        "success": True,
+        "faces": [{"face_index": 0, "student_id": "a", "status": "present"}],
+        "count": 1,
+    }
+
+    with patch("app.services.face_gallery.ml_client", mock_client):
+        response = await recognize_subject("subj", _roster(), "b64", 0.5, 0.6)
+
+    assert response["faces"][0]["student_id"] == "a"
+    assert mock_client.recognize.await_args.kwargs["gallery_id"] == "subject:subj"
+    mock_client.batch_match.assert_not_awaited()
+    mock_client.upsert_gallery.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_recognize_subject_miss_matches_returned_faces():
+    mock_client = AsyncMock()
+    mock_client.recognize.return_value = {
+        "success": False,
+        "error_code": GALLERY_NOT_FOUND,
+        "faces": [
+            {"face_index": 0, "embedding": [1.0], "is_live": True, "location": {}}
+        ],
+    }
+    mock_client.upsert_gallery.return_value = {"success": True}
+    mock_client.batch_match.return_value = {
+        "success": True,
+        "matches": [
+            {
+                "face_index": 0,
+                "student_id": "a",
+                "distance": 0.1,
+                "status": "present",
+                "uncertain": True,
+            }
+        ],
+    }
+
+    with (
+        patch("app.services.face_gallery.ml_client", mock_client),
+        patch(
+            "app.services.face_gallery.load_candidate_embeddings",
+            new_callable=AsyncMock,
+            return_value=[{"student_id": "a", "embeddings": [[1.0]]}],
+        ),
+    ):
+        response = await recognize_subject("subj", _roster(), "b64", 0.5, 0.6)
+
+    assert response["success"] is True
+    face = response["faces"][0]
+    assert face["student_id"] == "a"
+    assert face["status"] == "present"
+    assert face["uncertain"] is True
+    assert "embedding" not in face
+    mock_client.recognize.assert_awaited_once()
+    sent = mock_client.batch_match.await_args.kwargs["detected_faces"]
+    assert sent == [{"embedding": [1.0], "is_live": True}]
+
+
+@pytest.mark.asyncio
+async def test_recognize_subject_sends_raw_bytes_to_upload_route():
+    mock_client = AsyncMock()
+    mock_client.recognize_upload.return_value = {"success": True, "faces": []}
+
+    with patch("app.services.face_gallery.ml_client", mock_client):
+        response = await recognize_subject("subj", _roster(), b"jpeg", 0.5, 0.6)
+
+    assert response["success"] is True
+    mock_client.recognize.assert_not_awaited()
+    args, kwargs = mock_client.recognize_upload.await_args
+    assert args == (b"jpeg",)
+    assert kwargs["gallery_id"] == "subject:subj"
+
+
+@pytest.mark.asyncio
+async def test_load_candidate_embeddings_unpacks_storage_and_tags_versions():
+    roster = _roster()
+    docs = [
+        {
+            "userId": roster[0]["userId"],
+            "face_embeddings": [pack_stored_embedding([0.5, 0.25], STORAGE_FLOAT16)],
+            "face_embedding_version": "pca2-v1",
+            "face_template": pack_stored_embedding([0.5, 0.5], STORAGE_FLOAT32),
+        },
+        {"userId": roster[1]["userId"], "face_embeddings": [[1.0, 0.0]]},
+    ]
+
+    class Cursor:
+        def __aiter__(self):
+            async def gen():
+                for doc in docs:
+                    yield doc
+
+            return gen()
+
+    mock_db = MagicMock()
+    mock_db.students.find.return_value = Cursor()
+
+    with patch("app.services.face_gallery.db", mock_db):
+        candidates = await load_candidate_embeddings(roster)
+
+    assert candidates == [
+        {
+            "student_id": str(roster[0]["userId"]),
+            "embeddings": [[0.5, 0.25]],
+            "embedding_version": "pca2-v1",
+            "template": [0.5, 0.5],
+        },
+        {
+            "student_id": str(roster[1]["userId"]),
+            "embeddings": [[1.0, 0.0]],
+            "embedding_version": None,
+        },
+    ]
+
+
+@pytest.mark.asyncio
+async def test_start_subject_stream_uploads_gallery_on_miss():
+    mock_client = AsyncMock()
+    mock_client.start_stream.side_effect = [
+        {"success": False, "error_code": GALLERY_NOT_FOUND},
+        {"success": True, "session_id": "s1"},
+    ]
+    mock_client.upsert_gallery.return_value = {"success": True}
+
+    with (
+        patch("app.services.face_gallery.ml_client", mock_client),
+        patch(
+            "app.services.face_gallery.load_candidate_embeddings",
+            new_callable=AsyncMock,
+            return_value=[{"student_id": "a", "embeddings": [[1.0]]}],
+        ),
+    ):
+        response = await start_subject_stream("subj", _roster(), 0.5)
+
+    assert response["session_id"] == "s1"
+    assert mock_client.upsert_gallery.await_args.args[0] == "subject:subj"
+    assert mock_client.start_stream.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_recognize_subject_passes_the_detection_model():
+    mock_client = AsyncMock()
+    mock_client.recognize.return_value = {"success": True, "faces": []}
+
+    with patch("app.services.face_gallery.ml_client", mock_client):
+        await recognize_subject("subj", _roster(), "b64", 0.5, 0.6, model="tiled")
+
+    assert mock_client.recognize.await_args.kwargs["model"] == "tiled"
@@ -0,0 +1,167 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+from socketio.exceptions import ConnectionRefusedError
+
+from app.services import face_stream_service as svc
+
+
+@pytest.fixture(autouse=True)
+def clean_streams():
+    svc.streams.clear()
+    svc.stream_users.clear()
+    svc.stream_roles.clear()
+    yield
+    svc.streams.clear()
+    svc.stream_users.clear()
+    svc.stream_roles.clear()
+
+
+def _open_stream(sid="sid1"):
+    svc.streams[sid] = {
+        "streamId": "s1",
+        "subjectId": "subj",
+        "names": {"u1": "Alice"},
+        "nextFrameAt": 0.0,
+        "busy": False,
+    }
+
+
+@pytest.mark.asyncio
+async def test_connect_requires_teacher_token():
+    with pytest.raises(ConnectionRefusedError):
+        await svc.stream_connect("sid1", {}, {})
+
+    claims = {"token-s": {"user_id": "user1", "role": "student"}}
+    claims["token-t"] = {"user_id": "user1", "role": "teacher"}
+    with patch.object(svc, "decode_jwt", side_effect=claims.get):
+        with pytest.raises(ConnectionRefusedError):
+            await svc.stream_connect("sid1", {}, {"token": "token-s"})
+        await svc.stream_connect("sid1", {}, {"token": "token-t"})
+
+    assert svc.stream_users["sid1"] == "user1"
+
+
+@pytest.mark.asyncio
+async def test_start_stream_rejects_teachers_of_other_subjects():
+    subject_id = str(ObjectId())
+    svc.stream_users["sid1"] = str(ObjectId())
+    svc.stream_roles["sid1"] = "teacher"
+    mock_db = AsyncMock()
+    mock_db.subjects.find_one.return_value = {
+        "_id": ObjectId(subject_id),
+        "professor_ids": [ObjectId()],
+        "students": [{"student_id": ObjectId(), "verified": True}],
+    }
+    mock_client = AsyncMock()
+
+    with (
+        patch.object(svc, "db", mock_db),
+        patch.object(svc, "ml_client", mock_client),
+        patch.object(svc, "load_roster", new_callable=AsyncMock) as mock_roster,
+        patch.object(svc.sio, "emit", new_callable=AsyncMock) as mock_emit,
+    ):
+        await svc.handle_start_stream("sid1", {"subjectId": subject_id})
+
+    event, payload = mock_emit.await_args.args
+    assert event == "stream_error"
+    assert payload == {"detail": "Not authorized for this subject"}
+    mock_roster.assert_not_awaited()
+    assert "sid1" not in svc.streams
+    projection = mock_db.subjects.find_one.await_args.args[1]
+    assert projection["professor_ids"] == 1
+
+
+@pytest.mark.asyncio
+async def test_start_stream_allows_the_subjects_teachers_and_admins():
+    teacher_id = ObjectId()
+    subject = {"professor_ids": [teacher_id], "students": []}
+    svc.stream_users.update({"sid1": str(teacher_id), "sid2": str(ObjectId())})
+    svc.stream_roles.update({"sid1": "teacher", "sid2": "admin"})
+
+    assert svc._may_stream("sid1", subject)
+    assert svc._may_stream("sid2", subject)
+    svc.stream_roles["sid2"] = "teacher"
+    assert not svc._may_stream("sid2", subject)
+
+
+@pytest.mark.asyncio
+async def test_frame_relays_result_and_drops_frames_until_retry_after():
+    _open_stream()
+    mock_client = AsyncMock()
+    mock_client.send_stream_frame.return_value = {
+        "success": True,
+        "processed": True,
+        "frame_index": 1,
+        "retry_after_ms": 60_000,
+        "tracks": [
+            {
+                "track_id": 1,
+                "location": {"top": 1, "right": 2, "bottom": 3, "left": 0},
+                "student_id": "u1",
+                "status": "present",
+            }
+        ],
+        "new_students": [
+            {"student_id": "u1", "distance": 0.2, "track_id": 1, "first_seen_frame": 1}
+        ],
+    }
+
+    with (
+        patch.object(svc, "ml_client", mock_client),
+        patch.object(svc.sio, "emit", new_callable=AsyncMock) as mock_emit,
+    ):
+        await svc.handle_frame("sid1", b"jpeg")
+        await svc.handle_frame("sid1", b"jpeg")
+
+    mock_client.send_stream_frame.assert_awaited_once_with("s1", b"jpeg")
+    event, payload = mock_emit.await_args.args
+    assert event == "stream_update"
+    assert payload["tracks"][0]["student"] == {"id": "u1", "name": "Alice"}
+    assert payload["newStudents"][0]["name"] == "Alice"
+    assert payload["newStudents"][0]["confidence"] == 0.8
+
+
+@pytest.mark.asyncio
+async def test_expired_stream_is_dropped():
+    _open_stream()
+    mock_client = AsyncMock()
+    mock_client.send_stream_frame.return_value = {
+        "success": False,
+        "error_code": "STREAM_NOT_FOUND",
+    }
+
+    with (
+        patch.object(svc, "ml_client", mock_client),
+        patch.object(svc.sio, "emit", new_callable=AsyncMock) as mock_emit,
+    ):
+        await svc.handle_frame("sid1", b"jpeg")
+
+    assert "sid1" not in svc.streams
+    assert mock_emit.await_args.args[0] == "stream_error"
+
+
+@pytest.mark.asyncio
+async def test_stop_stream_sends_summary():
+    _open_stream()
+    mock_client = AsyncMock()
+    mock_client.close_stream.return_value = {
+        "success": True,
+        "frames_received": 30,
+        "frames_processed": 6,
+        "students": [
+            {"student_id": "u1", "distance": 0.25, "track_id": 1, "first_seen_frame": 2}
+        ],
+    }
+
+    with (
+        patch.object(svc, "ml_client", mock_client),
+        patch.object(svc.sio, "emit", new_callable=AsyncMock) as mock_emit,
+    ):
+        await svc.handle_stop_stream("sid1")
+
+    event, payload = mock_emit.await_args.args
+    assert event == "stream_summary"
+    assert payload["students"][0]["id"] == "u1"
+    assert payload["framesProcessed"] == 6
+    assert "sid1" not in svc.streams
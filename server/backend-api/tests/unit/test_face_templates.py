@@ -0,0 +1,29 @@
+import pytest
+
+from app.utils.face_templates import add_to_template, keep_best, template_from
+
+
+def test_keep_best_keeps_highest_quality_in_enrollment_order():
+    entries = [("a", 0.9), ("b", 0.2), ("c", 0.7), ("d", 0.5)]
+    assert keep_best(entries, 2) == [("a", 0.9), ("c", 0.7)]
+    assert keep_best(entries, 10) == entries
+
+
+def test_keep_best_prefers_newer_entry_on_ties():
+    assert keep_best([("old", 0.5), ("new", 0.5)], 1) == [("new", 0.5)]
+
+
+def test_template_is_quality_weighted_mean_of_normalised_embeddings():
+    template, weight = template_from([([2.0, 0.0], 0.75), ([0.0, 5.0], 0.25)])
+    assert template == pytest.approx([0.75, 0.25])
+    assert weight == 1.0
+
+    template, weight = add_to_template(template, weight, [0.0, 1.0], 1.0)
+    assert template == pytest.approx([0.375, 0.625])
+    assert weight == 2.0
+
+
+def test_template_restarts_when_dimension_changes():
+    template, weight = add_to_template([1.0, 0.0], 3.0, [0.0, 0.0, 4.0], 0.5)
+    assert template == [0.0, 0.0, 1.0]
+    assert weight == 0.5
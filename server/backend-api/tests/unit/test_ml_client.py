@@ -0,0 +1,241 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import app.services.ml_client as ml_client_module
+from app.services.ml_client import CircuitBreaker, MLClient
+from app.utils.embedding_codec import encode_embedding
+
+
+def _client(handler):
+    client = MLClient()
+    client.api_key = "test-key"
+    client.client = httpx.AsyncClient(
+        base_url="http://ml", transport=httpx.MockTransport(handler)
+    )
+    return client
+
+
+@pytest.mark.asyncio
+async def test_encode_faces_batch_streams_and_unpacks():
+    def handler(request):
+        body = json.loads(request.content)
+        assert request.url.path == "/api/ml/encode-faces-batch"
+        assert [image["image_id"] for image in body["images"]] == ["a", "b"]
+        lines = [
+            {
+                "index": 1,
+                "image_id": "b",
+                "success": False,
+                "error_code": "NO_FACE_FOUND",
+            },
+            {
+                "index": 0,
+                "image_id": "a",
+                "success": True,
+                "embedding": encode_embedding([0.5, 0.25], "base64-f32"),
+            },
+        ]
+        content = "".join(json.dumps(line) + "\n" for line in lines)
+        return httpx.Response(200, text=content)
+
+    client = _client(handler)
+    client.embedding_encoding = "base64-f32"
+
+    results = [r async for r in client.encode_faces_batch([("a", "x"), ("b", "y")])]
+
+    assert [r["image_id"] for r in results] == ["b", "a"]
+    assert results[0]["error_code"] == "NO_FACE_FOUND"
+    assert results[1]["embedding"] == [0.5, 0.25]
+
+
+@pytest.mark.asyncio
+async def test_encode_faces_batch_raises_on_http_error():
+    client = _client(lambda request: httpx.Response(503, text="busy"))
+
+    with pytest.raises(Exception, match="503"):
+        async for _ in client.encode_faces_batch([("a", "x")]):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_recognize_upload_sends_raw_bytes_with_query_options():
+    def handler(request):
+        assert request.url.path == "/api/ml/recognize/upload"
+        assert request.headers["content-type"] == "application/octet-stream"
+        assert request.headers["x-request-timeout"] == f"{client.timeout:g}"
+        assert request.headers["x-request-priority"] == "interactive"
+        assert request.content == b"\xff\xd8jpeg"
+        assert request.url.params["gallery_id"] == "subject:s"
+        assert request.url.params["gallery_version"] == "v1"
+        return httpx.Response(
+            200,
+            json={
+                "success": False,
+                "error_code": "GALLERY_NOT_FOUND",
+                "faces": [{"embedding": encode_embedding([1.0], "base64-f32")}],
+            },
+        )
+
+    client = _client(handler)
+    client.embedding_encoding = "base64-f32"
+
+    response = await client.recognize_upload(b"\xff\xd8jpeg", "subject:s", "v1")
+
+    assert response["faces"][0]["embedding"] == [1.0]
+
+
+@pytest.mark.asyncio
+async def test_send_stream_frame_is_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("down")
+
+    client = _client(handler)
+    client.max_retries = 2
+    with pytest.raises(Exception):
+        await client.send_stream_frame("s1", b"\xff\xd8jpeg")
+
+    assert len(calls) == 1
+    assert calls[0].url.path == "/api/ml/streams/s1/frames"
+    assert calls[0].content == b"\xff\xd8jpeg"
+
+
+@pytest.mark.asyncio
+async def test_enrollment_requests_are_sent_as_bulk():
+    priorities = []
+
+    def handler(request):
+        priorities.append(request.headers["x-request-priority"])
+        return httpx.Response(200, json={"success": False, "error_code": "X"})
+
+    client = _client(handler)
+    await client.encode_face("aW1n")
+    await client.convert_embeddings([[1.0]], None)
+    await client.encode_face("aW1n", priority="interactive")
+
+    assert priorities == ["bulk", "bulk", "interactive"]
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(ml_client_module.asyncio, "sleep", sleep)
+    return delays
+
+
+@pytest.mark.asyncio
+async def test_retries_overload_with_backoff_honouring_retry_after(no_sleep):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503, headers={"Retry-After": "2"}, text="busy")
+        return httpx.Response(200, json={"success": True})
+
+    client = _client(handler)
+    client.backoff_base = 0.5
+
+    assert await client.match_faces([1.0], []) == {"success": True}
+    assert len(calls) == 3
+    assert no_sleep == [2.0, 2.0]
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(no_sleep):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(422, text="bad")
+
+    client = _client(handler)
+
+    with pytest.raises(Exception, match="422"):
+        await client.match_faces([1.0], [])
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_retries_stop_at_the_call_deadline(no_sleep):
+    client = _client(lambda request: httpx.Response(503, headers={"Retry-After": "30"}))
+    client.deadline = 10
+
+    with pytest.raises(Exception, match="deadline"):
+        await client.match_faces([1.0], [])
+    assert no_sleep == []
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_then_probes_half_open(no_sleep):
+    now = [0.0]
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("refused")
+
+    client = _client(handler)
+    client.max_retries = 0
+    client.breaker = CircuitBreaker(
+        "ml", failure_threshold=2, reset_timeout=30, clock=lambda: now[0]
+    )
+
+    for _ in range(2):
+        with pytest.raises(Exception, match="communication error"):
+            await client.match_faces([1.0], [])
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # Open: fails fast without touching the replica
+    with pytest.raises(Exception, match="circuit breaker open"):
+        await client.match_faces([1.0], [])
+    assert len(calls) == 2
+
+    # Half-open after the reset timeout: one probe, which fails and reopens
+    now[0] = 31.0
+    with pytest.raises(Exception, match="communication error"):
+        await client.match_faces([1.0], [])
+    assert len(calls) == 3
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    now[0] = 62.0
+    client.client = httpx.AsyncClient(
+        base_url="http://ml",
+        transport=httpx.MockTransport(lambda r: httpx.Response(200, json={})),
+    )
+    await client.match_faces([1.0], [])
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_slow_replica_is_hedged_to_the_next_one():
+    slow = asyncio.Event()
+
+    async def primary(request):
+        await slow.wait()
+        return httpx.Response(200, json={"replica": "primary"})
+
+    async def hedge(request):
+        return httpx.Response(200, json={"replica": "hedge"})
+
+    client = _client(primary)
+    client.hedge_delay = 0.01
+    client.hedge_clients = [
+        httpx.AsyncClient(base_url="http://ml2", transport=httpx.MockTransport(hedge))
+    ]
+    client.hedge_breakers = [CircuitBreaker("ml2")]
+
+    assert await client.match_faces([1.0], []) == {"replica": "hedge"}
+    # Stream frames stay on the replica holding the session
+    slow.set()
+    response = await client.send_stream_frame("s1", b"frame")
+    assert response == {"replica": "primary"}
@@ -1,11 +1,12 @@
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from bson import ObjectId
 from fastapi import HTTPException
 
 # Adjust import based on your actual structure
 # Assuming app.api.routes.students is where the router is
 from app.api.routes.students import api_get_my_today_schedule
+from app.utils.embedding_codec import unpack_stored_embedding
 
 
 @pytest.mark.asyncio
@@ -75,3 +76,163 @@ async def test_get_my_today_schedule_student_not_found():
 
         assert excinfo.value.status_code == 404
         assert excinfo.value.detail == "Student profile not found"
+
+
+@pytest.mark.asyncio
+async def test_add_face_embedding_converts_embeddings_of_an_older_version():
+    from app.services.students import add_face_embedding
+
+    user_id = ObjectId()
+    mock_db = AsyncMock()
+    mock_db.students.find_one.return_value = {"face_embeddings": [[1.0, 0.0, 0.0]]}
+    mock_client = AsyncMock()
+    mock_client.convert_embeddings.return_value = {
+        "success": True,
+        "embeddings": [[0.5, 0.5]],
+        "embedding_version": "pca2-v1",
+    }
+
+    with (
+        patch("app.services.students.db", mock_db),
+        patch("app.services.students.ml_client", mock_client),
+        patch("app.services.students.FACE_EMBEDDING_STORAGE", "list"),
+    ):
+        await add_face_embedding(user_id, [0.0, 1.0], "pca2-v1", "url")
+
+    mock_client.convert_embeddings.assert_awaited_once_with([[1.0, 0.0, 0.0]], None)
+    update = mock_db.students.update_one.await_args.args[1]
+    assert update["$set"]["face_embeddings"] == [[0.5, 0.5], [0.0, 1.0]]
+    assert update["$set"]["face_embedding_version"] == "pca2-v1"
+    assert "$push" not in update
+
+
+@pytest.mark.asyncio
+async def test_add_face_embedding_pushes_packed_embedding_of_same_version():
+    from app.services.students import add_face_embedding
+
+    mock_db = AsyncMock()
+    mock_db.students.find_one.return_value = {
+        "face_embeddings": [[1.0]],
+        "face_embedding_version": "raw96-v1",
+    }
+    mock_client = AsyncMock()
+
+    with (
+        patch("app.services.students.db", mock_db),
+        patch("app.services.students.ml_client", mock_client),
+        patch("app.services.students.FACE_EMBEDDING_STORAGE", "int8"),
+    ):
+        await add_face_embedding(ObjectId(), [0.5, -1.0], "raw96-v1", "url")
+
+    mock_client.convert_embeddings.assert_not_awaited()
+    update = mock_db.students.update_one.await_args.args[1]
+    assert unpack_stored_embedding(update["$push"]["face_embeddings"]) == [64.0, -127.0]
+    assert update["$inc"] == {"face_embeddings_rev": 1}
+
+
+@pytest.mark.asyncio
+async def test_add_face_embedding_keeps_best_embeddings_and_updates_template():
+    from app.services.students import add_face_embedding
+
+    mock_db = AsyncMock()
+    mock_db.students.find_one.return_value = {
+        "face_embeddings": [[1.0, 0.0], [0.0, 1.0]],
+        "face_embedding_quality": [0.9, 0.4],
+        "face_embedding_version": "raw96-v1",
+        "face_template": [1.0, 0.0],
+        "face_template_weight": 1.0,
+    }
+
+    with (
+        patch("app.services.students.db", mock_db),
+        patch("app.services.students.FACE_EMBEDDING_STORAGE", "list"),
+        patch("app.services.students.FACE_TEMPLATE_MAX_EMBEDDINGS", 2),
+    ):
+        await add_face_embedding(ObjectId(), [0.0, 2.0], "raw96-v1", "url", 0.6)
+
+    update = mock_db.students.update_one.await_args.args[1]
+    # The 0.4 photo is replaced; the running mean still covers every enrollment
+    assert update["$set"]["face_embeddings"] == [[1.0, 0.0], [0.0, 2.0]]
+    assert update["$set"]["face_embedding_quality"] == [0.9, 0.6]
+    assert "$push" not in update
+    template = unpack_stored_embedding(update["$set"]["face_template"])
+    assert template == pytest.approx([1.0 / 1.6, 0.6 / 1.6])
+    assert update["$set"]["face_template_weight"] == pytest.approx(1.6)
+
+
+@pytest.mark.asyncio
+async def test_add_face_embedding_builds_template_for_unscored_students():
+    from app.services.students import add_face_embedding
+
+    mock_db = AsyncMock()
+    mock_db.students.find_one.return_value = {
+        "face_embeddings": [[3.0, 0.0]],
+        "face_embedding_version": "raw96-v1",
+    }
+
+    with (
+        patch("app.services.students.db", mock_db),
+        patch("app.services.students.FACE_EMBEDDING_STORAGE", "list"),
+    ):
+        await add_face_embedding(ObjectId(), [0.0, 1.0], "raw96-v1", "url", 0.5)
+
+    update = mock_db.students.update_one.await_args.args[1]
+    assert update["$push"]["face_embeddings"] == [0.0, 1.0]
+    assert update["$set"]["face_embedding_quality"] == [0.5, 0.5]
+    template = unpack_stored_embedding(update["$set"]["face_template"])
+    assert template == pytest.approx([0.5, 0.5])
+    assert update["$set"]["face_template_weight"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_add_face_embedding_retries_when_a_concurrent_enrollment_wins():
+    from app.services.students import add_face_embedding
+
+    user_id = ObjectId()
+    mock_db = AsyncMock()
+    mock_db.students.find_one.side_effect = [
+        {"face_embeddings": [[1.0, 0.0]], "face_embedding_version": "raw96-v1"},
+        {
+            "face_embeddings": [[1.0, 0.0], [0.0, 1.0]],
+            "face_embedding_version": "raw96-v1",
+            "face_embeddings_rev": 1,
+        },
+    ]
+    mock_db.students.update_one.side_effect = [
+        MagicMock(matched_count=0),
+        MagicMock(matched_count=1),
+    ]
+
+    with (
+        patch("app.services.students.db", mock_db),
+        patch("app.services.students.FACE_EMBEDDING_STORAGE", "list"),
+    ):
+        await add_face_embedding(user_id, [1.0, 1.0], "raw96-v1", "url")
+
+    first, second = mock_db.students.update_one.await_args_list
+    assert first.args[0] == {
+        "userId": user_id,
+        "face_embeddings_rev": {"$exists": False},
+    }
+    # The retry builds on the embedding stored meanwhile
+    assert second.args[0] == {"userId": user_id, "face_embeddings_rev": 1}
+    assert second.args[1]["$set"]["face_embedding_quality"] == [0.5, 0.5, 0.5]
+
+
+@pytest.mark.asyncio
+async def test_add_face_embedding_gives_up_after_repeated_conflicts():
+    from app.services.students import add_face_embedding
+
+    mock_db = AsyncMock()
+    mock_db.students.find_one.return_value = {"face_embeddings_rev": 3}
+    mock_db.students.update_one.return_value = MagicMock(matched_count=0)
+
+    with (
+        patch("app.services.students.db", mock_db),
+        patch("app.services.students.FACE_EMBEDDING_UPDATE_ATTEMPTS", 2),
+    ):
+        with pytest.raises(HTTPException) as excinfo:
+            await add_face_embedding(ObjectId(), [1.0], "raw96-v1", "url")
+
+    assert excinfo.value.status_code == 409
+    assert mock_db.students.update_one.await_count == 2
@@ -1,70 +1,443 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+import asyncio
+import math
 import time
+from typing import Annotated, AsyncIterator, List, Optional, Tuple, Union
+
 import numpy as np
 
 from app.schemas.requests import (
     EncodeFaceRequest,
+    EncodeFacesBatchOptions,
+    EncodeFacesBatchRequest,
+    DetectFacesOptions,
     DetectFacesRequest,
     MatchFacesRequest,
     BatchMatchRequest,
+    CandidateEmbedding,
+    RecognizeOptions,
+    RecognizeRequest,
+    RecognizeUploadOptions,
+    UpsertGalleryRequest,
+    ConvertEmbeddingsRequest,
+    IndexStudentsRequest,
+    TrainIndexRequest,
+    SearchFacesRequest,
+    StartStreamRequest,
 )
 from app.schemas.responses import (
     EncodeFaceResponse,
+    EncodeFaceBatchItem,
     DetectFacesResponse,
     MatchFacesResponse,
     BatchMatchResponse,
     FaceLocation,
     EncodeFaceMetadata,
+    FaceQuality,
     DetectedFaceInfo,
     DetectFacesMetadata,
+    ProfileDetectFacesResponse,
+    ProfileStage,
     MatchResult,
     DistanceInfo,
     BatchMatchResult,
+    GalleryResponse,
+    InvalidateGalleryResponse,
+    RecognizedFace,
+    RecognizeResponse,
+    ConvertEmbeddingsResponse,
+    IndexResponse,
+    SearchHit,
+    SearchResult,
+    SearchFacesResponse,
+    StreamFrameResponse,
+    StreamSessionResponse,
+    StreamStudent,
+    StreamTrack,
 )
 from app.core.constants import (
     ERROR_NO_FACE,
     ERROR_MULTIPLE_FACES,
     ERROR_FACE_TOO_SMALL,
     ERROR_PROCESSING,
+    ERROR_GALLERY_NOT_FOUND,
+    ERROR_GALLERY_TOO_LARGE,
+    ERROR_INDEX_EMPTY,
+    ERROR_EMBEDDING_VERSION,
+    ERROR_STREAM_LIMIT,
+    ERROR_STREAM_NOT_FOUND,
+    MAX_BATCH_IMAGES,
+)
+from app.core.exceptions import ExecutorSaturatedError
+from app.core.metrics import (
+    ANN_INDEX_EMBEDDINGS,
+    FACES_DETECTED_TOTAL,
+    ML_ERRORS,
+    STREAM_FRAMES,
+    STREAM_TRACKS_EMBEDDED,
 )
+from app.core.executor import ml_executor
+from app.core.profiling import label_stages, profile, stage
 from app.core.security import verify_api_key
-from app.utils.image_validation import validate_and_decode_image
+from app.utils.embedding_codec import (
+    decode_embeddings,
+    encode_embedding,
+    get_embedding_encoding,
+)
+from app.utils.image_validation import decode_image_array, read_image_body
 
-from app.ml.face_detector import detect_faces
+from app.ml.face_assignment import assign_faces
+from app.ml.face_detector import detect_faces, detect_faces_tiled, face_keypoints
+from app.ml.face_quality import face_quality
+from app.ml.embedding_format import EmbeddingFormat, EmbeddingVersionError
 from app.ml.face_encoder import get_face_embedding
-from app.ml.face_matcher import cosine_similarity
-from app.ml.liveness import is_live
+from app.ml.ann_index import ann_index
+from app.ml.face_matcher import FaceMatcher
+from app.ml.face_tracker import Track
+from app.ml.gallery_cache import GalleryTooLargeError, gallery_cache
+from app.ml.liveness import analyze_faces, are_live
+from app.ml.preprocessor import Box, detect_on_downscaled
+from app.ml.result_cache import content_key, detection_cache
+from app.ml.stream_session import StreamLimitError, StreamSession, stream_sessions
+from app.ml.tiling import DETECTION_MODEL_TILED
 from app.core.config import settings
 
+# Request body of the binary upload routes, for the OpenAPI schema
+IMAGE_BODY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            media_type: {"schema": {"type": "string", "format": "binary"}}
+            for media_type in ("image/jpeg", "image/png", "application/octet-stream")
+        },
+    }
+}
+
 router = APIRouter(
     prefix="/api/ml", tags=["ML"], dependencies=[Depends(verify_api_key)]
 )
 
+# Embedding version produced by this service (raw unless a projection is set)
+embedding_format = EmbeddingFormat.from_path(settings.ML_EMBEDDING_PROJECTION_PATH)
 
-@router.post("/encode-face", response_model=EncodeFaceResponse)
-async def encode_face(request: EncodeFaceRequest):
+
+def _embed(face_img: np.ndarray) -> List[float]:
+    """Embedding of a face crop in the active embedding format."""
+    embedding = get_face_embedding(face_img)
+    if embedding_format.projection is None:
+        return embedding
+    return embedding_format.encode(embedding).tolist()
+
+
+def _extract_faces(
+    image_np: np.ndarray, min_face_area_ratio: float, tiled: bool = False
+) -> List[DetectedFaceInfo]:
+    """Detect, crop, liveness-check and embed every face above the size floor.
+
+    ``tiled`` adds full-resolution tiles to detection, for large group photos;
+    the size floor then applies to a tile's area rather than the photo's, so
+    the small faces the tiles find are kept.
+    """
+    h, w, _ = image_np.shape
+    image_area = h * w
+    floor_area = image_area
+    with stage("detect"):
+        if tiled:
+            faces = detect_faces_tiled(image_np)
+            side = settings.ML_DETECTION_TILE_SIDE
+            if side > 0:
+                floor_area = min(h, side) * min(w, side)
+        else:
+            faces = detect_on_downscaled(image_np, detect_faces)
+
+    kept = []
+    for face_tuple in faces:
+        # faces detected are already in (top, right, bottom, left) format
+        top, right, bottom, left = face_tuple
+
+        face_width = right - left
+        face_height = bottom - top
+        face_area = face_width * face_height
+
+        if face_area / floor_area < min_face_area_ratio:
+            continue
+
+        # Ensure coordinates are within image bounds
+        top = max(0, top)
+        left = max(0, left)
+        bottom = min(h, bottom)
+        right = min(w, right)
+
+        kept.append(((top, right, bottom, left), face_area / image_area))
+
+    with stage("crop"):
+        # Views into the decoded image, not copies
+        crops = [image_np[top:bottom, left:right] for (top, _, bottom, left), _ in kept]
+    # Liveness Check, one face mesh batch for every face of the photo
+    liveness = [True] * len(crops)
+    if settings.ML_LIVENESS_CHECK and crops:
+        with stage("liveness"):
+            liveness = are_live(crops)
+
+    detected = []
+    for ((top, right, bottom, left), area_ratio), face_img, live in zip(
+        kept, crops, liveness
+    ):
+        with stage("embed"):
+            embedding = _embed(face_img)
+        detected.append(
+            DetectedFaceInfo(
+                embedding=embedding,
+                location=FaceLocation(top=top, right=right, bottom=bottom, left=left),
+                face_area_ratio=area_ratio,
+                is_live=live,
+                embedding_version=embedding_format.version,
+            )
+        )
+
+    return detected
+
+
+def _detect_in_image(
+    image: Union[str, bytes], min_face_area_ratio: float, tiled: bool = False
+) -> Tuple[Optional[List[DetectedFaceInfo]], List[int], Optional[str], Optional[str]]:
+    """Decode the image (base64 or raw bytes) and extract faces; runs on the ML
+    executor.
+
+    Returns:
+        ``(faces, image_dimensions, error, error_code)``; ``faces`` is None
+        when the image could not be decoded or processed.
+    """
     try:
         # Validate and decode image with size/format checks
-        success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-            request.image_base64
+        with stage("decode"):
+            image_np, error_msg, error_code = decode_image_array(
+                image, settings.ML_DECODE_MAX_SIDE
+            )
+        if image_np is None:
+            ML_ERRORS.labels(error_type=error_code).inc()
+            return None, [], error_msg, error_code
+
+        detected = _extract_faces(image_np, min_face_area_ratio, tiled)
+        h, w, _ = image_np.shape
+        label_stages(max(h, w), len(detected))
+        FACES_DETECTED_TOTAL.inc(len(detected))
+        return detected, [w, h], None, None
+
+    except Exception as e:
+        ML_ERRORS.labels(error_type=ERROR_PROCESSING).inc()
+        return None, [], str(e), ERROR_PROCESSING
+
+
+async def _run_detection(
+    image: Union[str, bytes], min_face_area_ratio: float, tiled: bool = False
+) -> Tuple[Optional[List[DetectedFaceInfo]], List[int], Optional[str], Optional[str]]:
+    """``_detect_in_image`` on the ML executor, with repeats of the same image
+    served from the result cache."""
+    key = None
+    if detection_cache.enabled:
+        # Hash off the event loop but outside the ML pool, so hits never queue
+        # behind running detections
+        key = await asyncio.to_thread(
+            content_key,
+            image,
+            min_face_area_ratio,
+            embedding_format.version,
+            settings.ML_DETECTION_MAX_SIDE,
+            settings.ML_DECODE_MAX_SIDE,
+            settings.ML_LIVENESS_CHECK,
+            _tile_params() if tiled else None,
         )
+        cached = detection_cache.get(key) if key else None
+        if cached is not None:
+            faces, image_dimensions = cached
+            # Callers re-encode embeddings on the returned faces; hand out copies
+            return [face.model_copy() for face in faces], image_dimensions, None, None
+
+    detected, image_dimensions, error, error_code = await ml_executor.run(
+        _detect_in_image, image, min_face_area_ratio, tiled
+    )
+    if detected is not None and key:
+        detection_cache.put(
+            key, ([face.model_copy() for face in detected], image_dimensions)
+        )
+    return detected, image_dimensions, error, error_code
+
+
+def _is_tiled(options: DetectFacesOptions) -> bool:
+    return options.model.lower() == DETECTION_MODEL_TILED
+
+
+def _tile_params() -> Tuple[int, float]:
+    return settings.ML_DETECTION_TILE_SIDE, settings.ML_DETECTION_TILE_OVERLAP
+
 
-        if not success:
+def _resolve_matcher(
+    candidate_embeddings: Optional[List[CandidateEmbedding]],
+    gallery_id: Optional[str],
+    gallery_version: Optional[str],
+    encoding: str,
+) -> Optional[FaceMatcher]:
+    """Cached gallery matcher, or one built from inline candidates.
+
+    Returns None when the requested gallery is missing or stale.
+    """
+    if gallery_id is not None:
+        gallery = gallery_cache.get(gallery_id, gallery_version)
+        return gallery.matcher if gallery is not None else None
+    return _build_matcher(candidate_embeddings, encoding)
+
+
+def _build_matcher(
+    candidate_embeddings: List[CandidateEmbedding], encoding: str
+) -> FaceMatcher:
+    # A student may be sent once per embedding version; merge after converting
+    grouped = {}
+    templates = {}
+    for c in candidate_embeddings:
+        vectors = _decode_versioned(c.embeddings, c.embedding_version, encoding)
+        if vectors.size:
+            grouped.setdefault(c.student_id, []).append(vectors)
+        if c.template is not None and c.student_id not in templates:
+            templates[c.student_id] = _decode_versioned(
+                [c.template], c.embedding_version, encoding
+            )[0]
+    return FaceMatcher.from_candidates(
+        (
+            (student_id, np.concatenate(blocks))
+            for student_id, blocks in grouped.items()
+        ),
+        templates=templates,
+        template_margin=settings.ML_TEMPLATE_MARGIN,
+        shortlist=settings.ML_MATCH_SHORTLIST,
+    )
+
+
+def _decode_versioned(
+    values: List, embedding_version: Optional[str], encoding: str
+) -> np.ndarray:
+    """Decode wire embeddings and convert them into the active format."""
+    return embedding_format.convert(
+        decode_embeddings(values, encoding), embedding_version
+    )
+
+
+def _match_embeddings(
+    matcher: FaceMatcher,
+    embeddings: List[np.ndarray],
+    liveness: List[bool],
+    confident_threshold: float,
+) -> List[BatchMatchResult]:
+    """Students of the faces in one photo; spoofed faces are reported without
+    matching.
+
+    Live faces are assigned one-to-one over their top candidates, so two faces
+    never both claim a student (see ``assign_faces``).
+    """
+    # Score every live face in a single GEMM against the stacked gallery
+    live_indices = [idx for idx, live in enumerate(liveness) if live]
+    best_by_face = {}
+    if live_indices:
+        with stage("match"):
+            live_embeddings = [embeddings[idx] for idx in live_indices]
+            if settings.ML_ASSIGNMENT_TOP_K > 0:
+                top_idx, top_scores = matcher.top_matches(
+                    live_embeddings, settings.ML_ASSIGNMENT_TOP_K
+                )
+                best_idx, best_scores, uncertain = assign_faces(
+                    top_idx,
+                    top_scores,
+                    confident_threshold,
+                    settings.ML_ASSIGNMENT_MARGIN,
+                )
+            else:
+                best_idx, best_scores = matcher.best_matches(live_embeddings)
+                uncertain = np.zeros(len(live_indices), dtype=bool)
+            for idx, student_idx, score, contested in zip(
+                live_indices, best_idx, best_scores, uncertain
+            ):
+                student_id = (
+                    matcher.student_ids[student_idx] if student_idx >= 0 else None
+                )
+                best_by_face[idx] = (student_id, float(score), bool(contested))
+
+    results = []
+    for idx in range(len(embeddings)):
+        if idx not in best_by_face:
+            results.append(
+                BatchMatchResult(
+                    face_index=idx,
+                    student_id=None,
+                    distance=1.0,
+                    status="spoof",
+                    liveness=False,
+                )
+            )
+            continue
+
+        best_id, best_score, contested = best_by_face[idx]
+        confident = best_id is not None and best_score >= confident_threshold
+        status = "present" if confident else "unknown"
+
+        results.append(
+            BatchMatchResult(
+                face_index=idx,
+                student_id=best_id if status == "present" else None,
+                distance=1 - best_score,
+                status=status,
+                liveness=True,
+                uncertain=contested,
+            )
+        )
+
+    return results
+
+
+@router.post("/encode-face", response_model=EncodeFaceResponse)
+async def encode_face(
+    request: EncodeFaceRequest, encoding: str = Depends(get_embedding_encoding)
+):
+    return await ml_executor.run(
+        _encode_face,
+        request.image_base64,
+        request.validate_single,
+        request.min_face_area_ratio,
+        encoding,
+    )
+
+
+def _encode_face(
+    image: Union[str, bytes],
+    validate_single: bool,
+    min_face_area_ratio: float,
+    encoding: str,
+) -> EncodeFaceResponse:
+    """Encode the face in a base64 string or raw image bytes."""
+    try:
+        # Validate and decode image with size/format checks
+        with stage("decode"):
+            image_np, error_msg, error_code = decode_image_array(
+                image, settings.ML_DECODE_MAX_SIDE
+            )
+        if image_np is None:
+            ML_ERRORS.labels(error_type=error_code).inc()
             return EncodeFaceResponse(
                 success=False, error=error_msg, error_code=error_code
             )
 
-        # Convert PIL image to numpy array
-        image_np = np.array(image)
-
-        faces = detect_faces(image_np)
+        with stage("detect"):
+            faces = detect_on_downscaled(image_np, detect_faces)
+        label_stages(max(image_np.shape[:2]), len(faces))
 
         if not faces:
             return EncodeFaceResponse(
                 success=False, error="No face detected", error_code=ERROR_NO_FACE
             )
 
-        if request.validate_single and len(faces) > 1:
+        if validate_single and len(faces) > 1:
             return EncodeFaceResponse(
                 success=False,
                 error="Multiple faces detected",
@@ -80,93 +453,200 @@ async def encode_face(request: EncodeFaceRequest):
         face_area = face_w * face_h
         image_area = im_h * im_w
 
-        if (face_area / image_area) < request.min_face_area_ratio:
+        if (face_area / image_area) < min_face_area_ratio:
             return EncodeFaceResponse(
                 success=False, error="Face too small", error_code=ERROR_FACE_TOO_SMALL
             )
 
         face_img = image_np[top:bottom, left:right]
-        embedding = get_face_embedding(face_img)
+        with stage("embed"):
+            embedding = _embed(face_img)
+        quality = face_quality(face_img, face_keypoints(image_np, faces[0]))
 
         return EncodeFaceResponse(
             success=True,
-            embedding=embedding,
+            embedding=encode_embedding(embedding, encoding),
+            embedding_version=embedding_format.version,
             face_location=FaceLocation(top=top, right=right, bottom=bottom, left=left),
             metadata=EncodeFaceMetadata(
-                face_area_ratio=face_area / image_area, image_dimensions=[im_w, im_h]
+                face_area_ratio=face_area / image_area,
+                image_dimensions=[im_w, im_h],
+                quality=FaceQuality(**quality),
             ),
         )
 
     except Exception as e:
+        ML_ERRORS.labels(error_type=ERROR_PROCESSING).inc()
         return EncodeFaceResponse(
             success=False, error=str(e), error_code=ERROR_PROCESSING
         )
 
 
-@router.post("/detect-faces", response_model=DetectFacesResponse)
-async def detect_faces_api(request: DetectFacesRequest):
-    start = time.time()
+@router.post(
+    "/encode-faces-batch",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def encode_faces_batch(
+    request: Request, encoding: str = Depends(get_embedding_encoding)
+):
+    """Encode one face per image for many images, streaming NDJSON results.
 
+    Accepts either a JSON ``EncodeFacesBatchRequest`` or ``multipart/form-data``
+    with repeated ``images`` file parts plus the option fields. Each line is an
+    ``EncodeFaceBatchItem`` in completion order; ``index`` (and ``image_id``,
+    or the upload filename) ties it back to the input.
+    """
+    content_type = request.headers.get("content-type", "")
     try:
-        # Validate and decode image with size/format checks
-        success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-            request.image_base64
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            options = EncodeFacesBatchOptions.model_validate(
+                {
+                    key: form[key]
+                    for key in EncodeFacesBatchOptions.model_fields
+                    if key in form
+                }
+            )
+            images = [
+                (upload.filename, await upload.read())
+                for upload in form.getlist("images")
+                if not isinstance(upload, str)
+            ]
+        else:
+            body = EncodeFacesBatchRequest.model_validate_json(await request.body())
+            options = body
+            images = [(image.image_id, image.image_base64) for image in body.images]
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+    if not images:
+        raise HTTPException(status_code=422, detail="No images provided")
+    if len(images) > MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BATCH_IMAGES} images per batch",
         )
 
-        if not success:
-            return DetectFacesResponse(success=False, error=error_msg)
+    return StreamingResponse(
+        _stream_encoded_faces(images, options, encoding),
+        media_type="application/x-ndjson",
+    )
 
-        # Convert PIL image to numpy array
-        image_np = np.array(image)
 
-        faces = detect_faces(image_np)
-        h, w, _ = image_np.shape
-        image_area = h * w
-
-        detected = []
-        for face_tuple in faces:
-            # faces detected are already in (top, right, bottom, left) format
-            top, right, bottom, left = face_tuple
-
-            face_width = right - left
-            face_height = bottom - top
-            face_area = face_width * face_height
-
-            if face_area / image_area < request.min_face_area_ratio:
-                continue
-
-            # Ensure coordinates are within image bounds
-            top = max(0, top)
-            left = max(0, left)
-            bottom = min(h, bottom)
-            right = min(w, right)
-
-            face_img = image_np[top:bottom, left:right]
-
-            # Liveness Check
-            live = True
-            if settings.ML_LIVENESS_CHECK:
-                live = is_live(face_img)
-
-            embedding = get_face_embedding(face_img)
-
-            detected.append(
-                DetectedFaceInfo(
-                    embedding=embedding,
-                    location=FaceLocation(
-                        top=top, right=right, bottom=bottom, left=left
-                    ),
-                    face_area_ratio=face_area / image_area,
-                    is_live=live,
-                )
+async def _stream_encoded_faces(
+    images: List[Tuple[Optional[str], Union[str, bytes]]],
+    options: EncodeFacesBatchOptions,
+    encoding: str,
+) -> AsyncIterator[str]:
+    # Keep every worker busy without claiming the whole executor queue
+    window = ml_executor.workers
+    pending = set()
+    queued = iter(enumerate(images))
+
+    def submit_next() -> bool:
+        item = next(queued, None)
+        if item is None:
+            return False
+        index, (image_id, image) = item
+        pending.add(
+            asyncio.ensure_future(
+                _encode_batch_item(index, image_id, image, options, encoding)
+            )
+        )
+        return True
+
+    try:
+        while len(pending) < window and submit_next():
+            pass
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                submit_next()
+                yield task.result().model_dump_json() + "\n"
+    finally:
+        # Client went away: drop images that have not started yet
+        for task in pending:
+            task.cancel()
+
+
+async def _encode_batch_item(
+    index: int,
+    image_id: Optional[str],
+    image: Union[str, bytes],
+    options: EncodeFacesBatchOptions,
+    encoding: str,
+) -> EncodeFaceBatchItem:
+    while True:
+        try:
+            result = await ml_executor.run(
+                _encode_face,
+                image,
+                options.validate_single,
+                options.min_face_area_ratio,
+                encoding,
             )
+            break
+        except ExecutorSaturatedError:
+            # Other traffic filled the queue; wait rather than fail the image
+            await asyncio.sleep(ml_executor.retry_after)
+        except Exception as e:
+            result = EncodeFaceResponse(
+                success=False, error=str(e), error_code=ERROR_PROCESSING
+            )
+            break
+    return EncodeFaceBatchItem(index=index, image_id=image_id, **result.model_dump())
+
+
+@router.post("/detect-faces", response_model=DetectFacesResponse)
+async def detect_faces_api(
+    request: DetectFacesRequest, encoding: str = Depends(get_embedding_encoding)
+):
+    return await _detect_faces(request.image_base64, request, encoding)
+
+
+@router.post(
+    "/detect-faces/upload",
+    response_model=DetectFacesResponse,
+    openapi_extra=IMAGE_BODY_OPENAPI,
+)
+async def detect_faces_upload(
+    request: Request,
+    options: Annotated[DetectFacesOptions, Query()],
+    encoding: str = Depends(get_embedding_encoding),
+):
+    """Binary variant of ``/detect-faces``: the body is the raw JPEG/PNG and the
+    options are query parameters, so the image is neither base64-inflated nor
+    buffered past the size limit."""
+    image, error, error_code = await read_image_body(request)
+    if image is None:
+        return DetectFacesResponse(success=False, error=error, error_code=error_code)
+    return await _detect_faces(image, options, encoding)
+
+
+async def _detect_faces(
+    image: Union[str, bytes], options: DetectFacesOptions, encoding: str
+) -> DetectFacesResponse:
+    start = time.time()
+
+    detected, image_dimensions, error, error_code = await _run_detection(
+        image, options.min_face_area_ratio, _is_tiled(options)
+    )
+    if detected is None:
+        return DetectFacesResponse(success=False, error=error, error_code=error_code)
+
+    try:
+        for face in detected:
+            face.embedding = encode_embedding(face.embedding, encoding)
 
         return DetectFacesResponse(
             success=True,
             faces=detected,
             count=len(detected),
             metadata=DetectFacesMetadata(
-                image_dimensions=[w, h], processing_time_ms=(time.time() - start) * 1000
+                image_dimensions=image_dimensions,
+                processing_time_ms=(time.time() - start) * 1000,
             ),
         )
 
@@ -174,30 +654,90 @@ async def detect_faces_api(request: DetectFacesRequest):
         return DetectFacesResponse(success=False, error=str(e))
 
 
+@router.post(
+    "/profile/detect-faces",
+    response_model=ProfileDetectFacesResponse,
+    openapi_extra=IMAGE_BODY_OPENAPI,
+)
+async def profile_detect_faces(
+    request: Request, options: Annotated[DetectFacesOptions, Query()]
+):
+    """Run ``/detect-faces/upload`` once without the result cache and report
+    the latency and memory allocated by each stage (decode, detect, crop,
+    liveness, embed). Only served with ``ML_PROFILING_ENABLED``."""
+    if not settings.ML_PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+
+    image, error, error_code = await read_image_body(request)
+    if image is None:
+        return ProfileDetectFacesResponse(
+            success=False, error=error, error_code=error_code
+        )
+    # Stages are recorded per thread, so this runs in-process
+    return await ml_executor.run_in_thread(_profile_detection, image, options)
+
+
+def _profile_detection(
+    image: bytes, options: DetectFacesOptions
+) -> ProfileDetectFacesResponse:
+    start = time.time()
+    with profile() as stages:
+        detected, image_dimensions, error, error_code = _detect_in_image(
+            image, options.min_face_area_ratio, _is_tiled(options)
+        )
+    if detected is None:
+        return ProfileDetectFacesResponse(
+            success=False, error=error, error_code=error_code
+        )
+
+    return ProfileDetectFacesResponse(
+        success=True,
+        stages=[
+            ProfileStage(
+                name=record.name,
+                calls=record.calls,
+                total_ms=record.seconds * 1000,
+                peak_bytes=record.peak_bytes,
+                retained_bytes=record.retained_bytes,
+            )
+            for record in stages.values()
+        ],
+        count=len(detected),
+        metadata=DetectFacesMetadata(
+            image_dimensions=image_dimensions,
+            processing_time_ms=(time.time() - start) * 1000,
+        ),
+    )
+
+
 @router.post("/match-faces", response_model=MatchFacesResponse)
-async def match_faces(request: MatchFacesRequest):
+async def match_faces(
+    request: MatchFacesRequest, encoding: str = Depends(get_embedding_encoding)
+):
+    return await ml_executor.run(_match_faces, request, encoding)
+
+
+def _match_faces(request: MatchFacesRequest, encoding: str) -> MatchFacesResponse:
     try:
+        matcher = _build_matcher(request.candidate_embeddings, encoding)
+        query = _decode_versioned(
+            [request.query_embedding], request.query_embedding_version, encoding
+        )
+        scores = matcher.student_scores(query)[0]
+
         best_match = None
         best_score = -1.0
-        all_distances = []
+        if scores.size:
+            best_idx = int(np.argmax(scores))
+            best_match = matcher.student_ids[best_idx]
+            best_score = float(scores[best_idx])
 
-        for candidate in request.candidate_embeddings:
-            scores = [
-                cosine_similarity(request.query_embedding, emb)
-                for emb in candidate.embeddings
+        all_distances = None
+        if request.return_all_distances:
+            all_distances = [
+                DistanceInfo(student_id=student_id, min_distance=1 - float(score))
+                for student_id, score in zip(matcher.student_ids, scores)
             ]
-            score = max(scores)
-
-            if request.return_all_distances:
-                all_distances.append(
-                    DistanceInfo(
-                        student_id=candidate.student_id, min_distance=1 - score
-                    )
-                )
-
-            if score > best_score:
-                best_score = score
-                best_match = candidate.student_id
 
         if best_score >= request.threshold:
             return MatchFacesResponse(
@@ -208,7 +748,7 @@ async def match_faces(request: MatchFacesRequest):
                     confidence=best_score,
                     status="confident",
                 ),
-                all_distances=all_distances if request.return_all_distances else None,
+                all_distances=all_distances,
             )
 
         return MatchFacesResponse(success=True, match=None)
@@ -218,53 +758,648 @@ async def match_faces(request: MatchFacesRequest):
 
 
 @router.post("/batch-match", response_model=BatchMatchResponse)
-async def batch_match(request: BatchMatchRequest):
+async def batch_match(
+    request: BatchMatchRequest, encoding: str = Depends(get_embedding_encoding)
+):
+    # Cached galleries live in this process, so match on a thread
+    return await ml_executor.run_in_thread(_batch_match, request, encoding)
+
+
+def _batch_match(request: BatchMatchRequest, encoding: str) -> BatchMatchResponse:
     try:
-        results = []
-
-        for idx, face in enumerate(request.detected_faces):
-            # Check liveness first
-            if not getattr(face, "is_live", True):
-                results.append(
-                    BatchMatchResult(
-                        face_index=idx,
-                        student_id=None,
-                        distance=1.0,
-                        status="spoof",
-                        liveness=False,
-                    )
-                )
-                continue
+        matcher = _resolve_matcher(
+            request.candidate_embeddings,
+            request.gallery_id,
+            request.gallery_version,
+            encoding,
+        )
+        if matcher is None:
+            return BatchMatchResponse(
+                success=False,
+                error=f"Gallery '{request.gallery_id}' is not cached",
+                error_code=ERROR_GALLERY_NOT_FOUND,
+            )
 
-            best_id = None
-            best_score = -1.0
+        label_stages(None, len(request.detected_faces))
+        results = _match_embeddings(
+            matcher,
+            [
+                _decode_versioned([face.embedding], face.embedding_version, encoding)[0]
+                for face in request.detected_faces
+            ],
+            [getattr(face, "is_live", True) for face in request.detected_faces],
+            request.confident_threshold,
+        )
 
-            for candidate in request.candidate_embeddings:
-                scores = [
-                    cosine_similarity(face.embedding, emb)
-                    for emb in candidate.embeddings
-                ]
-                score = max(scores)
+        return BatchMatchResponse(success=True, matches=results)
 
-                if score > best_score:
-                    best_score = score
-                    best_id = candidate.student_id
+    except EmbeddingVersionError as e:
+        return BatchMatchResponse(
+            success=False, error=str(e), error_code=ERROR_EMBEDDING_VERSION
+        )
+    except Exception as e:
+        return BatchMatchResponse(success=False, error=str(e))
 
-            status = (
-                "present" if best_score >= request.confident_threshold else "unknown"
-            )
 
-            results.append(
-                BatchMatchResult(
+@router.post("/recognize", response_model=RecognizeResponse)
+async def recognize(
+    request: RecognizeRequest, encoding: str = Depends(get_embedding_encoding)
+):
+    """Detect, liveness-check, embed and match in a single call.
+
+    Embeddings stay inside the service unless ``return_embeddings`` is set. On
+    a gallery miss the faces are returned with embeddings and
+    ``GALLERY_NOT_FOUND`` so the caller can upload the gallery and batch-match
+    them without re-running detection.
+    """
+    return await _recognize(
+        request.image_base64, request, request.candidate_embeddings, encoding
+    )
+
+
+@router.post(
+    "/recognize/upload",
+    response_model=RecognizeResponse,
+    openapi_extra=IMAGE_BODY_OPENAPI,
+)
+async def recognize_upload(
+    request: Request,
+    options: Annotated[RecognizeUploadOptions, Query()],
+    encoding: str = Depends(get_embedding_encoding),
+):
+    """Binary variant of ``/recognize`` against a cached gallery: the body is
+    the raw JPEG/PNG and the options are query parameters."""
+    image, error, error_code = await read_image_body(request)
+    if image is None:
+        return RecognizeResponse(success=False, error=error, error_code=error_code)
+    return await _recognize(image, options, None, encoding)
+
+
+async def _recognize(
+    image: Union[str, bytes],
+    options: RecognizeOptions,
+    candidate_embeddings: Optional[List[CandidateEmbedding]],
+    encoding: str,
+) -> RecognizeResponse:
+    start = time.time()
+
+    detected, image_dimensions, error, error_code = await _run_detection(
+        image, options.min_face_area_ratio, _is_tiled(options)
+    )
+    if detected is None:
+        return RecognizeResponse(success=False, error=error, error_code=error_code)
+
+    return await ml_executor.run_in_thread(
+        _recognize_faces,
+        options,
+        candidate_embeddings,
+        detected,
+        image_dimensions,
+        encoding,
+        start,
+    )
+
+
+def _recognize_faces(
+    request: RecognizeOptions,
+    candidate_embeddings: Optional[List[CandidateEmbedding]],
+    detected: List[DetectedFaceInfo],
+    image_dimensions: List[int],
+    encoding: str,
+    start: float,
+) -> RecognizeResponse:
+    try:
+        matcher = _resolve_matcher(
+            candidate_embeddings,
+            request.gallery_id,
+            request.gallery_version,
+            encoding,
+        )
+        if matcher is None:
+            faces = [
+                RecognizedFace(
                     face_index=idx,
-                    student_id=best_id if status == "present" else None,
-                    distance=1 - best_score,
-                    status=status,
-                    liveness=True,
+                    location=face.location,
+                    face_area_ratio=face.face_area_ratio,
+                    is_live=face.is_live,
+                    embedding=encode_embedding(face.embedding, encoding),
+                    embedding_version=face.embedding_version,
                 )
+                for idx, face in enumerate(detected)
+            ]
+            return RecognizeResponse(
+                success=False,
+                faces=faces,
+                count=len(faces),
+                error=f"Gallery '{request.gallery_id}' is not cached",
+                error_code=ERROR_GALLERY_NOT_FOUND,
             )
 
-        return BatchMatchResponse(success=True, matches=results)
+        label_stages(max(image_dimensions, default=None), len(detected))
+        matches = _match_embeddings(
+            matcher,
+            [np.asarray(face.embedding, dtype=np.float32) for face in detected],
+            [face.is_live for face in detected],
+            request.confident_threshold,
+        )
+
+        faces = [
+            RecognizedFace(
+                face_index=match.face_index,
+                location=face.location,
+                face_area_ratio=face.face_area_ratio,
+                is_live=face.is_live,
+                student_id=match.student_id,
+                distance=match.distance,
+                status=match.status,
+                uncertain=match.uncertain,
+                embedding=(
+                    encode_embedding(face.embedding, encoding)
+                    if request.return_embeddings
+                    else None
+                ),
+                embedding_version=(
+                    face.embedding_version if request.return_embeddings else None
+                ),
+            )
+            for face, match in zip(detected, matches)
+        ]
+
+        return RecognizeResponse(
+            success=True,
+            faces=faces,
+            count=len(faces),
+            metadata=DetectFacesMetadata(
+                image_dimensions=image_dimensions,
+                processing_time_ms=(time.time() - start) * 1000,
+            ),
+        )
 
     except Exception as e:
-        return BatchMatchResponse(success=False, error=str(e))
+        return RecognizeResponse(
+            success=False, error=str(e), error_code=ERROR_PROCESSING
+        )
+
+
+def _gallery_response(gallery) -> GalleryResponse:
+    return GalleryResponse(
+        success=True,
+        gallery_id=gallery.gallery_id,
+        version=gallery.version,
+        num_students=gallery.matcher.num_students,
+        num_embeddings=gallery.matcher.num_embeddings,
+        size_bytes=gallery.nbytes,
+    )
+
+
+@router.put("/galleries/{gallery_id}", response_model=GalleryResponse)
+async def upsert_gallery(
+    gallery_id: str,
+    request: UpsertGalleryRequest,
+    encoding: str = Depends(get_embedding_encoding),
+):
+    return await ml_executor.run_in_thread(
+        _upsert_gallery, gallery_id, request, encoding
+    )
+
+
+def _upsert_gallery(
+    gallery_id: str, request: UpsertGalleryRequest, encoding: str
+) -> GalleryResponse:
+    try:
+        matcher = _build_matcher(request.candidate_embeddings, encoding)
+        gallery = gallery_cache.upsert(gallery_id, request.version, matcher)
+        return _gallery_response(gallery)
+
+    except GalleryTooLargeError as e:
+        return GalleryResponse(
+            success=False,
+            gallery_id=gallery_id,
+            error=str(e),
+            error_code=ERROR_GALLERY_TOO_LARGE,
+        )
+    except EmbeddingVersionError as e:
+        return GalleryResponse(
+            success=False,
+            gallery_id=gallery_id,
+            error=str(e),
+            error_code=ERROR_EMBEDDING_VERSION,
+        )
+    except Exception as e:
+        return GalleryResponse(
+            success=False,
+            gallery_id=gallery_id,
+            error=str(e),
+            error_code=ERROR_PROCESSING,
+        )
+
+
+@router.get("/galleries/{gallery_id}", response_model=GalleryResponse)
+async def get_gallery(gallery_id: str):
+    gallery = gallery_cache.peek(gallery_id)
+    if gallery is None:
+        return GalleryResponse(
+            success=False,
+            gallery_id=gallery_id,
+            error=f"Gallery '{gallery_id}' is not cached",
+            error_code=ERROR_GALLERY_NOT_FOUND,
+        )
+    return _gallery_response(gallery)
+
+
+@router.delete("/galleries/{gallery_id}", response_model=InvalidateGalleryResponse)
+async def invalidate_gallery(gallery_id: str):
+    removed = gallery_cache.invalidate(gallery_id)
+    return InvalidateGalleryResponse(
+        success=True, gallery_id=gallery_id, removed=removed
+    )
+
+
+def _index_response(removed: Optional[int] = None) -> IndexResponse:
+    ANN_INDEX_EMBEDDINGS.set(ann_index.size)
+    return IndexResponse(
+        success=True,
+        size=ann_index.size,
+        num_students=ann_index.num_students,
+        trained=ann_index.trained,
+        nlist=ann_index.nlist,
+        size_bytes=ann_index.nbytes,
+        removed=removed,
+    )
+
+
+@router.get("/index", response_model=IndexResponse)
+async def get_index():
+    return _index_response()
+
+
+@router.put("/index/students", response_model=IndexResponse)
+async def index_students(
+    request: IndexStudentsRequest, encoding: str = Depends(get_embedding_encoding)
+):
+    return await ml_executor.run_in_thread(_index_students, request, encoding)
+
+
+def _index_students(request: IndexStudentsRequest, encoding: str) -> IndexResponse:
+    try:
+        for candidate in request.candidate_embeddings:
+            embeddings = _decode_versioned(
+                candidate.embeddings, candidate.embedding_version, encoding
+            )
+            if request.replace:
+                ann_index.remove(candidate.student_id)
+            ann_index.add(candidate.student_id, embeddings)
+        return _index_response()
+
+    except Exception as e:
+        return IndexResponse(success=False, error=str(e), error_code=ERROR_PROCESSING)
+
+
+@router.delete("/index/students/{student_id}", response_model=IndexResponse)
+async def remove_indexed_student(student_id: str):
+    removed = await ml_executor.run_in_thread(ann_index.remove, student_id)
+    return _index_response(removed=removed)
+
+
+@router.post("/index/train", response_model=IndexResponse)
+async def train_index(request: TrainIndexRequest):
+    return await ml_executor.run_in_thread(_train_index, request)
+
+
+def _train_index(request: TrainIndexRequest) -> IndexResponse:
+    if ann_index.size == 0:
+        return IndexResponse(
+            success=False, error="Search index is empty", error_code=ERROR_INDEX_EMPTY
+        )
+    try:
+        ann_index.train(request.nlist)
+        if settings.ML_ANN_INDEX_PATH:
+            ann_index.save(settings.ML_ANN_INDEX_PATH)
+        return _index_response()
+
+    except Exception as e:
+        return IndexResponse(success=False, error=str(e), error_code=ERROR_PROCESSING)
+
+
+@router.post("/search", response_model=SearchFacesResponse)
+async def search_faces(
+    request: SearchFacesRequest, encoding: str = Depends(get_embedding_encoding)
+):
+    """Identify faces against every indexed student (approximate top-k)."""
+    return await ml_executor.run_in_thread(_search_faces, request, encoding)
+
+
+def _search_faces(request: SearchFacesRequest, encoding: str) -> SearchFacesResponse:
+    if ann_index.size == 0:
+        return SearchFacesResponse(
+            success=False, error="Search index is empty", error_code=ERROR_INDEX_EMPTY
+        )
+    try:
+        queries = _decode_versioned(
+            request.query_embeddings, request.embedding_version, encoding
+        )
+        hits = ann_index.search(
+            queries,
+            top_k=request.top_k,
+            nprobe=request.nprobe or settings.ML_ANN_NPROBE,
+        )
+        results = [
+            SearchResult(
+                query_index=idx,
+                matches=[
+                    SearchHit(
+                        student_id=student_id, similarity=score, distance=1 - score
+                    )
+                    for student_id, score in query_hits
+                    if score >= request.threshold
+                ],
+            )
+            for idx, query_hits in enumerate(hits)
+        ]
+        return SearchFacesResponse(success=True, results=results)
+
+    except Exception as e:
+        return SearchFacesResponse(
+            success=False, error=str(e), error_code=ERROR_PROCESSING
+        )
+
+
+@router.post("/embeddings/convert", response_model=ConvertEmbeddingsResponse)
+async def convert_embeddings(
+    request: ConvertEmbeddingsRequest, encoding: str = Depends(get_embedding_encoding)
+):
+    """Re-encode stored embeddings into the active format (used by migrations)."""
+    return await ml_executor.run_in_thread(_convert_embeddings, request, encoding)
+
+
+def _convert_embeddings(
+    request: ConvertEmbeddingsRequest, encoding: str
+) -> ConvertEmbeddingsResponse:
+    try:
+        vectors = _decode_versioned(
+            request.embeddings, request.embedding_version, encoding
+        )
+        return ConvertEmbeddingsResponse(
+            success=True,
+            embeddings=[encode_embedding(v, encoding) for v in vectors],
+            embedding_version=embedding_format.version,
+        )
+
+    except EmbeddingVersionError as e:
+        return ConvertEmbeddingsResponse(
+            success=False, error=str(e), error_code=ERROR_EMBEDDING_VERSION
+        )
+    except Exception as e:
+        return ConvertEmbeddingsResponse(
+            success=False, error=str(e), error_code=ERROR_PROCESSING
+        )
+
+
+@router.post("/streams", response_model=StreamSessionResponse)
+async def start_stream(request: StartStreamRequest):
+    """Open a video-stream attendance session against a cached gallery.
+
+    Frames are then posted to ``/streams/{session_id}/frames``. The gallery is
+    held by the stream until it is closed, even if the cache evicts it.
+    """
+    gallery = gallery_cache.get(request.gallery_id, request.gallery_version)
+    if gallery is None:
+        return StreamSessionResponse(
+            success=False,
+            gallery_id=request.gallery_id,
+            error=f"Gallery '{request.gallery_id}' is not cached",
+            error_code=ERROR_GALLERY_NOT_FOUND,
+        )
+    try:
+        session = stream_sessions.open(
+            request.gallery_id,
+            gallery.matcher,
+            confident_threshold=request.confident_threshold,
+            min_face_area_ratio=request.min_face_area_ratio,
+        )
+    except StreamLimitError as e:
+        return StreamSessionResponse(
+            success=False,
+            gallery_id=request.gallery_id,
+            error=str(e),
+            error_code=ERROR_STREAM_LIMIT,
+        )
+    return _stream_response(session)
+
+
+@router.post(
+    "/streams/{session_id}/frames",
+    response_model=StreamFrameResponse,
+    openapi_extra=IMAGE_BODY_OPENAPI,
+)
+async def send_stream_frame(session_id: str, request: Request):
+    """Send one frame (raw JPEG/PNG body) to a video stream.
+
+    Frames arriving before the stream's next sample is due are skipped without
+    reading the body; ``retry_after_ms`` says when a frame will be processed
+    again, so clients can drop frames instead of uploading them.
+    """
+    session = stream_sessions.get(session_id)
+    if session is None:
+        return _stream_not_found(session_id)
+
+    session.frames_received += 1
+    frame_index = session.frames_received
+    wait = session.sampler.admit()
+    if wait > 0:
+        STREAM_FRAMES.labels(result="skipped").inc()
+        return StreamFrameResponse(
+            success=True,
+            session_id=session_id,
+            frame_index=frame_index,
+            retry_after_ms=math.ceil(wait * 1000),
+        )
+
+    idle = False
+    try:
+        image, error, error_code = await read_image_body(request)
+        if image is None:
+            return StreamFrameResponse(
+                success=False,
+                session_id=session_id,
+                frame_index=frame_index,
+                error=error,
+                error_code=error_code,
+            )
+        response, idle = await ml_executor.run_in_thread(
+            _process_stream_frame, session, image, frame_index
+        )
+    finally:
+        wait = session.sampler.finish(idle)
+
+    STREAM_FRAMES.labels(result="processed").inc()
+    response.retry_after_ms = math.ceil(wait * 1000)
+    return response
+
+
+@router.get("/streams/{session_id}", response_model=StreamSessionResponse)
+async def get_stream(session_id: str):
+    session = stream_sessions.get(session_id)
+    if session is None:
+        return _stream_not_found(session_id, StreamSessionResponse)
+    return _stream_response(session)
+
+
+@router.delete("/streams/{session_id}", response_model=StreamSessionResponse)
+async def close_stream(session_id: str):
+    """Close a video stream, returning every student recognised on it."""
+    session = stream_sessions.close(session_id)
+    if session is None:
+        return _stream_not_found(session_id, StreamSessionResponse)
+    return _stream_response(session)
+
+
+def _stream_not_found(session_id: str, response_model=StreamFrameResponse):
+    return response_model(
+        success=False,
+        session_id=session_id,
+        error=f"Stream '{session_id}' is not open",
+        error_code=ERROR_STREAM_NOT_FOUND,
+    )
+
+
+def _stream_student(session: StreamSession, student_id: str) -> StreamStudent:
+    distance, track_id, first_seen_frame = session.students[student_id]
+    return StreamStudent(
+        student_id=student_id,
+        distance=distance,
+        track_id=track_id,
+        first_seen_frame=first_seen_frame,
+    )
+
+
+def _stream_response(session: StreamSession) -> StreamSessionResponse:
+    students = [_stream_student(session, sid) for sid in session.students]
+    return StreamSessionResponse(
+        success=True,
+        session_id=session.session_id,
+        gallery_id=session.gallery_id,
+        frames_received=session.frames_received,
+        frames_processed=session.frames_processed,
+        tracks_seen=session.tracker.total_tracks,
+        students=sorted(students, key=lambda s: s.first_seen_frame),
+    )
+
+
+def _clip_box(box: Box, height: int, width: int) -> Box:
+    top, right, bottom, left = box
+    return max(0, top), min(width, right), min(height, bottom), max(0, left)
+
+
+def _stream_track(track: Track) -> StreamTrack:
+    top, right, bottom, left = track.box
+    return StreamTrack(
+        track_id=track.track_id,
+        location=FaceLocation(top=top, right=right, bottom=bottom, left=left),
+        student_id=track.student_id,
+        distance=track.distance,
+        status=track.status,
+    )
+
+
+def _process_stream_frame(
+    session: StreamSession, image: bytes, frame_index: int
+) -> Tuple[StreamFrameResponse, bool]:
+    """Track the faces on a sampled frame, advance the liveness of undecided
+    tracks and match the unidentified ones; runs on an ML executor thread
+    (sessions live in-process).
+
+    Returns:
+        ``(response, idle)``; ``idle`` is True when no visible face needs
+        matching or a liveness decision any more, so sampling can slow down.
+    """
+    start = time.time()
+    try:
+        with stage("decode"):
+            image_np, error_msg, error_code = decode_image_array(
+                image, settings.ML_DECODE_MAX_SIDE
+            )
+        if image_np is None:
+            ML_ERRORS.labels(error_type=error_code).inc()
+            response = StreamFrameResponse(
+                success=False,
+                session_id=session.session_id,
+                frame_index=frame_index,
+                error=error_msg,
+                error_code=error_code,
+            )
+            return response, False
+
+        h, w, _ = image_np.shape
+        boxes = []
+        with stage("detect"):
+            detected = detect_on_downscaled(image_np, detect_faces)
+        for box in detected:
+            top, right, bottom, left = _clip_box(box, h, w)
+            area = max(0, right - left) * max(0, bottom - top)
+            if area and area / (h * w) >= session.min_face_area_ratio:
+                boxes.append((top, right, bottom, left))
+        label_stages(max(h, w), len(boxes))
+
+        tracks = session.track(boxes)
+        pending = session.pending(tracks)
+        crops = {}
+        for track in pending:
+            top, right, bottom, left = track.box
+            crops[track.track_id] = image_np[top:bottom, left:right]
+        checking = [track for track in pending if session.needs_liveness(track)]
+        if checking:
+            # One face mesh per face and frame serves both the single-frame
+            # checks and the track's blink/motion signals
+            with stage("liveness"):
+                analyses = analyze_faces([crops[track.track_id] for track in checking])
+            for track, (passed, landmarks) in zip(checking, analyses):
+                session.update_liveness(track, landmarks, passed)
+        to_match = [
+            (track, crops[track.track_id])
+            for track in pending
+            if session.needs_match(track)
+        ]
+
+        if to_match:
+            with stage("embed"):
+                embeddings = [
+                    np.asarray(_embed(crop), dtype=np.float32) for _, crop in to_match
+                ]
+            matches = _match_embeddings(
+                session.matcher,
+                embeddings,
+                # Liveness is decided per track above, not per crop
+                [True] * len(to_match),
+                session.confident_threshold,
+            )
+            for (track, _), match in zip(to_match, matches):
+                track.attempts += 1
+                track.student_id = match.student_id
+                track.distance = match.distance
+            STREAM_TRACKS_EMBEDDED.inc(len(to_match))
+
+        new_students = session.record(pending, frame_index)
+        session.frames_processed += 1
+        response = StreamFrameResponse(
+            success=True,
+            session_id=session.session_id,
+            frame_index=frame_index,
+            processed=True,
+            tracks=[_stream_track(track) for track in tracks],
+            new_students=[_stream_student(session, sid) for sid in new_students],
+            embedded=len(to_match),
+            processing_time_ms=(time.time() - start) * 1000,
+        )
+        return response, not session.pending(tracks)
+
+    except Exception as e:
+        ML_ERRORS.labels(error_type=ERROR_PROCESSING).inc()
+        response = StreamFrameResponse(
+            success=False,
+            session_id=session.session_id,
+            frame_index=frame_index,
+            error=str(e),
+            error_code=ERROR_PROCESSING,
+        )
+        return response, False
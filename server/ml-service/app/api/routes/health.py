@@ -1,8 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from datetime import datetime, timezone
 import psutil
 import shutil
 
+from app.ml.warmup import model_readiness
+
 router = APIRouter()
 
 
@@ -30,9 +32,32 @@ def get_cpu_usage():
         return 0.0
 
 
+def get_models_status():
+    if model_readiness.models_loaded:
+        status = "healthy"
+    elif model_readiness.error:
+        status = "unhealthy"
+    else:
+        status = "starting"
+    return status, {
+        "models_loaded": model_readiness.models_loaded,
+        "warmup_seconds": model_readiness.warmup_seconds,
+        "error": model_readiness.error,
+    }
+
+
 @router.get("/health")
-async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
+async def health_check(response: Response):
+    """Readiness probe: 503 until the models are loaded and warmed up"""
+    status, models = get_models_status()
+    if not models["models_loaded"]:
+        response.status_code = 503
+    return {
+        "status": status,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "models_loaded": models["models_loaded"],
+        "warmup_seconds": models["warmup_seconds"],
+    }
 
 
 @router.get("/health/detailed")
@@ -47,10 +72,13 @@ async def detailed_health():
     except Exception:
         storage = {"healthy": False}
 
+    status, models = get_models_status()
+    models["healthy"] = models["models_loaded"]
+
     return {
-        "status": "healthy",
+        "status": status,
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "checks": {"storage": storage},
+        "checks": {"storage": storage, "models": models},
         "metrics": {
             "uptime_seconds": get_uptime(),
             "memory": get_memory_usage(),
@@ -0,0 +1,220 @@
+"""
+Adaptive admission control for the ``/api/ml/*`` routes.
+
+The executor's queue bound is static: under an exam-day peak it admits work
+up to that bound, latency climbs until callers time out, and their retries
+add more load. ``AdaptiveLimiter`` instead caps the requests in flight at a
+limit it steers from observed latency (AIMD). Every ``window`` completed
+requests it compares their p95 latency with the target: above it, or when
+the executor turned requests away, the limit is cut by ``backoff``; below it,
+and with the limit fully used, the limit grows by one.
+
+Requests over the limit wait for a slot, in arrival order within their
+priority class (see ``app.core.priority``), but only as long as their caller
+will: the ``X-Request-Timeout`` header (seconds), or
+``ML_CONCURRENCY_QUEUE_TIMEOUT``. A request that cannot be served in time,
+given the queue ahead of it and recent latency, is rejected at once with a
+503 and a ``Retry-After`` rather than after holding a place in the queue.
+"""
+
+import asyncio
+import math
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedError
+from app.core.metrics import (
+    ML_CONCURRENCY_IN_FLIGHT,
+    ML_CONCURRENCY_LIMIT,
+    ML_CONCURRENCY_QUEUED,
+    ML_CONCURRENCY_REJECTED,
+)
+from app.core.priority import PRIORITY_INTERACTIVE, PriorityLanes, lane_weights
+
+# Seconds the caller will wait for the response, sent by MLClient
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
+# Weight of the newest request in the running latency estimate
+LATENCY_SMOOTHING = 0.2
+
+
+def request_timeout(value: Optional[str]) -> Optional[float]:
+    """``X-Request-Timeout`` header value in seconds; None if absent or invalid."""
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        return None
+    return timeout if timeout > 0 and math.isfinite(timeout) else None
+
+
+class AdaptiveLimiter:
+    """Latency-steered concurrency limit with a deadline-aware wait queue.
+
+    Runs on the event loop only; it is not thread-safe.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        target_latency: float = 5.0,
+        window: int = 20,
+        backoff: float = 0.75,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.target_latency = target_latency
+        self.window = max(1, window)
+        self.backoff = backoff
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.limit = min(self.max_limit, max(self.min_limit, initial_limit))
+        self.in_flight = 0
+        # Smoothed seconds per request, 0 until the first one completes
+        self.latency = 0.0
+        self._waiters = PriorityLanes(lane_weights())
+        self._samples: List[float] = []
+        self._overloaded = False
+        self._peak_in_flight = 0
+        self._update_gauges()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """Seconds a ``priority`` request joining the queue now would likely
+        wait for a slot."""
+        ahead = self._waiters.count(priority) + 1
+        return ahead * self.latency / (self.limit * self._waiters.share(priority))
+
+    async def acquire(
+        self, timeout: Optional[float] = None, priority: str = PRIORITY_INTERACTIVE
+    ) -> None:
+        """
+        Take a slot, waiting for one if the limit is reached.
+
+        Args:
+            timeout: Seconds the caller will wait for the whole request
+                (default: ``queue_timeout``).
+            priority: Priority class whose queue the request waits in.
+
+        Raises:
+            ServiceOverloadedError: The queue is full, the request would not
+                be served within ``timeout``, or no slot freed up in time.
+        """
+        if timeout is None:
+            timeout = self.queue_timeout
+        if self.in_flight < self.limit and not self._waiters:
+            self._take_slot()
+            return
+
+        wait = self.expected_wait(priority)
+        if self._waiters.count(priority) >= self.max_queue:
+            self._reject("queue_full", wait)
+        if wait + self.latency > timeout:
+            self._reject("deadline", wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(priority, waiter)
+        self._update_gauges()
+        try:
+            # Leave the caller time to be served once a slot frees up
+            await asyncio.wait({waiter}, timeout=max(0.0, timeout - self.latency))
+        except asyncio.CancelledError:
+            # The caller went away; give back a slot handed over meanwhile
+            if waiter.done():
+                self.release(0.0, counted=False)
+            else:
+                self._leave_queue(priority, waiter)
+            raise
+        if not waiter.done():
+            self._leave_queue(priority, waiter)
+            self._reject("timeout", self.expected_wait(priority))
+
+    def release(
+        self, latency: float, overloaded: bool = False, counted: bool = True
+    ) -> None:
+        """
+        Return a slot and record how the request went.
+
+        Args:
+            latency: Seconds the request held the slot.
+            overloaded: The request was turned away further in (e.g. by a
+                saturated executor); counts as above target.
+            counted: False for a slot given back unused.
+        """
+        self.in_flight -= 1
+        if counted:
+            self._record(latency, overloaded)
+        self._hand_over()
+        self._update_gauges()
+
+    def _take_slot(self) -> None:
+        self.in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self.in_flight)
+        self._update_gauges()
+
+    def _leave_queue(self, priority: str, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        self._waiters.remove(priority, waiter)
+        self._update_gauges()
+
+    def _hand_over(self) -> None:
+        # Slots go to waiters in arrival order within each priority class
+        while self._waiters and self.in_flight < self.limit:
+            self._take_slot()
+            self._waiters.popleft().set_result(None)
+
+    def _record(self, latency: float, overloaded: bool) -> None:
+        if overloaded:
+            # A rejection's latency says nothing about how long serving takes
+            self._overloaded = True
+        else:
+            self.latency = (
+                latency
+                if self.latency == 0.0
+                else (1 - LATENCY_SMOOTHING) * self.latency
+                + LATENCY_SMOOTHING * latency
+            )
+        self._samples.append(latency)
+        if len(self._samples) < self.window:
+            return
+
+        samples = sorted(self._samples)
+        p95 = samples[math.ceil(0.95 * len(samples)) - 1]
+        if self._overloaded or p95 > self.target_latency:
+            self.limit = max(
+                self.min_limit, min(self.limit - 1, int(self.limit * self.backoff))
+            )
+        elif self._peak_in_flight >= self.limit:
+            # Only grow a limit that is actually holding requests back
+            self.limit = min(self.max_limit, self.limit + 1)
+        self._samples = []
+        self._overloaded = False
+        self._peak_in_flight = self.in_flight
+
+    def _reject(self, reason: str, wait: float) -> None:
+        ML_CONCURRENCY_REJECTED.labels(reason=reason).inc()
+        raise ServiceOverloadedError(retry_after=max(1, math.ceil(wait)))
+
+    def _update_gauges(self) -> None:
+        ML_CONCURRENCY_LIMIT.set(self.limit)
+        ML_CONCURRENCY_IN_FLIGHT.set(self.in_flight)
+        ML_CONCURRENCY_QUEUED.set(len(self._waiters))
+
+
+concurrency_limiter = AdaptiveLimiter(
+    initial_limit=settings.ML_CONCURRENCY_INITIAL_LIMIT
+    or 2 * settings.ML_WORKER_THREADS,
+    min_limit=settings.ML_CONCURRENCY_MIN_LIMIT,
+    max_limit=settings.ML_CONCURRENCY_MAX_LIMIT,
+    target_latency=settings.ML_CONCURRENCY_TARGET_LATENCY,
+    window=settings.ML_CONCURRENCY_WINDOW,
+    backoff=settings.ML_CONCURRENCY_BACKOFF,
+    max_queue=settings.ML_CONCURRENCY_MAX_QUEUE,
+    queue_timeout=settings.ML_CONCURRENCY_QUEUE_TIMEOUT,
+)
@@ -1,4 +1,5 @@
 import json
+import os
 from pydantic_settings import BaseSettings
 from pydantic import model_validator
 from typing import List, Union
@@ -15,13 +16,121 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8001
 
-    ML_MODEL: str = "hog"
+    # Inference backend for face detection and landmarks: "mediapipe" or
+    # "onnx" (ONNX Runtime CPU); the legacy "hog"/"cnn" values mean mediapipe
+    ML_MODEL: str = "mediapipe"
+    # ONNX Runtime threads per inference; each executor worker runs its own
+    ML_ORT_INTRA_OP_THREADS: int = 1
+    ML_ORT_INTER_OP_THREADS: int = 1
+    # Inputs stacked into one ONNX Runtime run (models with a dynamic batch)
+    ML_ORT_MAX_BATCH: int = 16
+    # Exported .onnx models; empty uses app/ml/face_detection_short_range.onnx
+    # and app/ml/face_landmark.onnx
+    ML_ORT_DETECTOR_PATH: str = ""
+    ML_ORT_LANDMARK_PATH: str = ""
     NUM_JITTERS: int = 5
     MIN_FACE_AREA_RATIO: float = 0.04
 
+    # Detection runs on a copy downscaled to this longest side (0 = full size)
+    ML_DETECTION_MAX_SIDE: int = 1024
+    # Decode JPEGs at reduced scale down to this longest side (0 = full size);
+    # crops for embedding and liveness then come from the reduced image
+    ML_DECODE_MAX_SIDE: int = 0
+    # Tiled detection (model="tiled"): side in full-resolution pixels of each
+    # tile, and the share of it overlapping the next tile
+    ML_DETECTION_TILE_SIDE: int = 640
+    ML_DETECTION_TILE_OVERLAP: float = 0.25
+
     # Liveness Detection (Anti-Spoofing)
     ML_LIVENESS_CHECK: bool = True
 
+    # Worker threads for CPU-bound ML work; also sizes per-thread model pools
+    ML_WORKER_THREADS: int = min(4, os.cpu_count() or 1)
+    # Seconds to wait for a free FaceMesh before failing the liveness check
+    ML_FACE_MESH_POOL_TIMEOUT: float = 30.0
+
+    # Execution layer for CPU-bound handlers: "thread" or "process"
+    ML_EXECUTOR: str = "thread"
+    # Jobs allowed to queue behind busy workers, per priority class, before
+    # requests get a 503
+    ML_EXECUTOR_MAX_QUEUE: int = 32
+    # Retry-After seconds sent with the 503 when the executor is saturated
+    ML_EXECUTOR_RETRY_AFTER: int = 1
+
+    # Adaptive concurrency limit on /api/ml/* requests (AIMD): every WINDOW
+    # completed requests the limit is cut by BACKOFF if their p95 latency was
+    # above TARGET_LATENCY seconds, and grows by one if it was below and the
+    # limit was fully used. An initial limit of 0 means 2 x ML_WORKER_THREADS
+    ML_CONCURRENCY_LIMIT_ENABLED: bool = True
+    ML_CONCURRENCY_INITIAL_LIMIT: int = 0
+    ML_CONCURRENCY_MIN_LIMIT: int = 1
+    ML_CONCURRENCY_MAX_LIMIT: int = 64
+    ML_CONCURRENCY_TARGET_LATENCY: float = 5.0
+    ML_CONCURRENCY_WINDOW: int = 20
+    ML_CONCURRENCY_BACKOFF: float = 0.75
+    # Requests waiting for a slot at most per priority class, and seconds a
+    # request waits when the caller sends no X-Request-Timeout
+    ML_CONCURRENCY_MAX_QUEUE: int = 64
+    ML_CONCURRENCY_QUEUE_TIMEOUT: float = 10.0
+
+    # Freed slots and workers go to interactive and bulk requests (header
+    # X-Request-Priority) in this ratio to 1 while both are waiting
+    ML_INTERACTIVE_WEIGHT: int = 4
+
+    # Roster gallery cache (stacked embedding matrices kept between requests)
+    ML_GALLERY_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Detection results cached by image content hash, for re-submitted photos
+    # (0 bytes or 0 seconds disables the cache)
+    ML_RESULT_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    ML_RESULT_CACHE_TTL: float = 60.0
+
+    # Serve /profile/detect-faces (per-stage latency and allocations; runs
+    # tracemalloc, which slows the whole process while a profile runs)
+    ML_PROFILING_ENABLED: bool = False
+    # OpenTelemetry span per pipeline stage (needs opentelemetry-api, and an
+    # SDK configured to export them, e.g. via opentelemetry-instrument)
+    ML_TRACING_ENABLED: bool = False
+
+    # Video-stream attendance: frames per second processed per stream at most,
+    # and the share of one worker a stream may use (frames are skipped so the
+    # processing time per wall-clock second stays under it)
+    ML_STREAM_MAX_FPS: float = 5.0
+    ML_STREAM_CPU_BUDGET: float = 0.5
+    # Seconds between sampled frames while every visible face is identified
+    ML_STREAM_IDLE_INTERVAL: float = 1.0
+    # Embedding attempts per tracked face before it is left as unknown
+    ML_STREAM_MAX_ATTEMPTS: int = 3
+    # Sampled frames a track may go undetected before it ends
+    ML_STREAM_TRACK_MAX_MISSES: int = 5
+    # Concurrent streams, and seconds without frames before a stream expires
+    ML_STREAM_MAX_SESSIONS: int = 32
+    ML_STREAM_IDLE_TIMEOUT: float = 120.0
+
+    # Coarse-to-fine matching: a face whose best student template beats the
+    # runner-up by this cosine gap is scored against that student's embeddings
+    # only (0 disables the early exit)
+    ML_TEMPLATE_MARGIN: float = 0.1
+    # Other faces are scored exactly against the students with this many best
+    # templates (0 scores them against the full gallery)
+    ML_MATCH_SHORTLIST: int = 10
+    # Faces of one photo are assigned students one-to-one over each face's
+    # top-k candidates (0 matches every face independently). A face that exits
+    # early on ML_TEMPLATE_MARGIN gets its runners-up by template score
+    ML_ASSIGNMENT_TOP_K: int = 5
+    # A match is flagged uncertain when another face in the photo scored the
+    # same student within this cosine gap
+    ML_ASSIGNMENT_MARGIN: float = 0.05
+
+    # Fitted embedding projection (.npz from fit_embedding_projection.py);
+    # empty keeps the raw 9216-dim embedding format
+    ML_EMBEDDING_PROJECTION_PATH: str = ""
+
+    # Institution-wide ANN search index; empty path keeps it in memory only
+    ML_ANN_INDEX_PATH: str = ""
+    # IVF cells scanned per query (higher = better recall, slower)
+    ML_ANN_NPROBE: int = 8
+
     CORS_ORIGINS: Union[str, List[str]] = [
         "https://studentcheck.vercel.app",
         "http://localhost:5173",
@@ -19,6 +19,7 @@ MAX_IMAGE_SIZE_BYTES = 5_242_880  # 5MB
 MAX_BASE64_SIZE = int(MAX_IMAGE_SIZE_BYTES * 1.37)  # Base64 is ~37% larger
 MAX_IMAGE_DIMENSION = 4096  # Max width or height
 ALLOWED_IMAGE_FORMATS = {"JPEG", "PNG", "JPG"}
+MAX_BATCH_IMAGES = 500  # Images per /encode-faces-batch request
 
 # Error Codes
 ERROR_NO_FACE = "NO_FACE_FOUND"
@@ -29,3 +30,9 @@ ERROR_IMAGE_TOO_LARGE = "IMAGE_TOO_LARGE"
 ERROR_INVALID_FORMAT = "INVALID_FORMAT"
 ERROR_INVALID_DIMENSIONS = "INVALID_DIMENSIONS"
 ERROR_PROCESSING = "PROCESSING_ERROR"
+ERROR_GALLERY_NOT_FOUND = "GALLERY_NOT_FOUND"
+ERROR_GALLERY_TOO_LARGE = "GALLERY_TOO_LARGE"
+ERROR_INDEX_EMPTY = "INDEX_EMPTY"
+ERROR_EMBEDDING_VERSION = "EMBEDDING_VERSION_MISMATCH"
+ERROR_STREAM_NOT_FOUND = "STREAM_NOT_FOUND"
+ERROR_STREAM_LIMIT = "STREAM_LIMIT_REACHED"
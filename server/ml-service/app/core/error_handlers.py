@@ -22,6 +22,7 @@ async def smart_attendance_exception_handler(
             "message": exc.message,
             "correlation_id": getattr(request.state, "correlation_id", None),
         },
+        headers=getattr(exc, "headers", None),
     )
 
 
@@ -30,3 +30,15 @@ class ValidationError(SmartAttendanceException):
 class MLServiceError(SmartAttendanceException):
     def __init__(self, message: str = "ML service error"):
         super().__init__(message, status_code=503)
+
+
+class ExecutorSaturatedError(SmartAttendanceException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__("ML workers are saturated, retry later", status_code=503)
+        self.headers = {"Retry-After": str(retry_after)}
+
+
+class ServiceOverloadedError(SmartAttendanceException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__("ML service is overloaded, retry later", status_code=503)
+        self.headers = {"Retry-After": str(retry_after)}
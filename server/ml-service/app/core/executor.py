@@ -0,0 +1,313 @@
+"""
+Execution layer for CPU-bound ML work.
+
+Route handlers are ``async def`` but image decoding, MediaPipe detection,
+FaceMesh and NumPy matching are synchronous. Running them inline blocks the
+event loop, so one large photo stalls every other request (including
+``/health``). Handlers dispatch that work here instead.
+
+``ML_EXECUTOR`` selects a thread pool (default) or a process pool. In process
+mode each worker process loads its own detector and FaceMesh on start-up, and
+work that needs in-process state such as the gallery cache still runs on the
+thread pool via ``run_in_thread``.
+
+Jobs are handed to the pool only when a worker is free. Until then they
+wait in a queue per priority class (see ``app.core.priority``), from which
+freed workers take interactive and bulk jobs in a weighted ratio, so an
+enrollment import never sits in front of a roll call. Admission is bounded:
+once every worker is busy and ``ML_EXECUTOR_MAX_QUEUE`` jobs of the job's
+class are waiting, new ones are rejected with ``ExecutorSaturatedError``
+(HTTP 503 with ``Retry-After``) instead of piling up behind the backlog.
+
+A running job can split its own work over idle worker threads with
+``fan_out`` (tiled detection does this for its tiles). Every job records its
+pipeline stage times (see ``app.core.profiling``).
+"""
+
+import asyncio
+import contextvars
+import multiprocessing
+import threading
+import time
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, Callable, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import ExecutorSaturatedError
+from app.core.metrics import (
+    ML_EXECUTOR_IN_FLIGHT,
+    ML_EXECUTOR_QUEUE_DEPTH,
+    ML_EXECUTOR_QUEUE_WAIT,
+    ML_EXECUTOR_REJECTED,
+)
+from app.core.priority import PriorityLanes, current_priority, lane_weights
+from app.core.profiling import run_tracked
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+
+def _init_worker_process() -> None:
+    """Load models once per worker process instead of on the first request."""
+    from app.ml.inference import get_backend
+
+    try:
+        get_backend().load()
+    except Exception:
+        # Missing model file; detect_faces will report it per request
+        pass
+
+
+class _Job:
+    """A submitted call, from admission until its result is set."""
+
+    def __init__(
+        self, pool: Executor, kind: str, fn: Callable[..., Any], args, priority: str
+    ):
+        self.pool = pool
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.context: Optional[contextvars.Context] = None
+        self.queued_at = time.perf_counter()
+        # What the awaiting handler sees, whichever pool runs the call
+        self.result: Future = Future()
+
+
+class MLExecutor:
+    """Bounded dispatcher from async handlers onto a worker pool."""
+
+    def __init__(
+        self,
+        kind: str = EXECUTOR_THREAD,
+        workers: int = 1,
+        max_queue: int = 0,
+        retry_after: int = 1,
+    ):
+        if kind not in (EXECUTOR_THREAD, EXECUTOR_PROCESS):
+            raise ValueError(f"Unknown ML executor '{kind}'")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._admitted = 0
+        # Per pool: jobs handed to it, and jobs waiting for one of its workers
+        self._running = {EXECUTOR_THREAD: 0, EXECUTOR_PROCESS: 0}
+        self._queued = {
+            EXECUTOR_THREAD: PriorityLanes(lane_weights()),
+            EXECUTOR_PROCESS: PriorityLanes(lane_weights()),
+        }
+        self._lock = threading.Lock()
+
+    @property
+    def admitted(self) -> int:
+        return self._admitted
+
+    def start(self) -> None:
+        """Create the pools up front (otherwise they start on first use)."""
+        self._thread_pool()
+        if self.kind == EXECUTOR_PROCESS:
+            self._process_pool()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` on the configured pool.
+
+        In process mode ``fn`` and its arguments must be picklable.
+        """
+        if self.kind == EXECUTOR_PROCESS:
+            return await self._submit(self._process_pool(), fn, args)
+        return await self._submit(self._thread_pool(), fn, args)
+
+    async def run_in_thread(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` on a thread, for work that needs in-process state."""
+        return await self._submit(self._thread_pool(), fn, args)
+
+    def fan_out(self, fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """
+        ``[fn(item) for item in items]`` from inside a job, helped by idle
+        worker threads.
+
+        The calling thread works through the items itself while helper tasks
+        on the thread pool take the ones it has not reached yet. Helpers only
+        take worker slots that are free, counted like jobs so new jobs queue
+        behind them, and give them back as soon as the items run out. A busy
+        pool therefore never stalls the job (it just runs the items in turn)
+        and a job never waits on work queued behind it.
+
+        Runs in turn outside thread mode, since a worker process has no pool
+        of its own to spread over.
+        """
+        items = list(items)
+        if len(items) < 2 or self.workers < 2 or self.kind != EXECUTOR_THREAD:
+            return [fn(item) for item in items]
+
+        results: List[Any] = [None] * len(items)
+        claimed = iter(range(len(items)))
+        claim_lock = threading.Lock()
+
+        def work() -> None:
+            while True:
+                with claim_lock:
+                    index = next(claimed, None)
+                if index is None:
+                    return
+                results[index] = fn(items[index])
+
+        def help_out() -> None:
+            try:
+                work()
+            finally:
+                self._start(self._finish(EXECUTOR_THREAD))
+
+        pool = self._thread_pool()
+        with self._lock:
+            free = self.workers - self._running[EXECUTOR_THREAD]
+            slots = max(0, min(free, len(items) - 1))
+            self._running[EXECUTOR_THREAD] += slots
+            self._admitted += slots
+            self._update_gauges()
+        helpers = []
+        try:
+            for _ in range(slots):
+                helpers.append(pool.submit(help_out))
+            work()
+        finally:
+            # Slots of helpers that never started (or were never submitted)
+            for _ in range(slots - len(helpers)):
+                self._start(self._finish(EXECUTOR_THREAD))
+            for helper in helpers:
+                if helper.cancel():
+                    self._start(self._finish(EXECUTOR_THREAD))
+        for helper in helpers:
+            if not helper.cancelled():
+                helper.result()
+        return results
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pools = [self._threads, self._processes]
+            self._threads = self._processes = None
+            queued = [job for lanes in self._queued.values() for job in lanes.items()]
+        for job in queued:
+            job.result.cancel()
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=wait, cancel_futures=True)
+
+    async def _submit(self, pool: Executor, fn: Callable[..., Any], args) -> Any:
+        kind = (
+            EXECUTOR_THREAD
+            if isinstance(pool, ThreadPoolExecutor)
+            else EXECUTOR_PROCESS
+        )
+        job = _Job(pool, kind, fn, args, current_priority())
+        if kind == EXECUTOR_THREAD:
+            # Run in the request's context (log fields, tracing spans)
+            job.context = contextvars.copy_context()
+        queued = self._queued[job.kind]
+        with self._lock:
+            busy = self._running[job.kind] >= self.workers
+            if busy and queued.count(job.priority) >= self.max_queue:
+                ML_EXECUTOR_REJECTED.inc()
+                raise ExecutorSaturatedError(retry_after=self.retry_after)
+            self._admitted += 1
+            if busy:
+                queued.append(job.priority, job)
+                start = None
+            else:
+                self._running[job.kind] += 1
+                start = job
+            self._update_gauges()
+        if start is not None:
+            self._start(start)
+        # Cancelling the request cancels a job that is still queued; it is
+        # dropped when its turn comes. A running job finishes regardless
+        return await asyncio.wrap_future(job.result)
+
+    def _start(self, job: Optional[_Job]) -> None:
+        """Hand ``job`` to its pool on a worker slot already counted for it, and
+        any job the slot passes on to if that fails."""
+        while job is not None:
+            if not job.result.set_running_or_notify_cancel():
+                job = self._finish(job.kind)
+                continue
+            ML_EXECUTOR_QUEUE_WAIT.labels(priority=job.priority).observe(
+                time.perf_counter() - job.queued_at
+            )
+            try:
+                if job.context is not None:
+                    future = job.pool.submit(
+                        job.context.run, run_tracked, job.fn, *job.args
+                    )
+                else:
+                    future = job.pool.submit(run_tracked, job.fn, *job.args)
+            except BaseException as e:
+                job.result.set_exception(e)
+                job = self._finish(job.kind)
+                continue
+            future.add_done_callback(lambda done, job=job: self._complete(job, done))
+            return
+
+    def _complete(self, job: _Job, done: Future) -> None:
+        # Free the slot before the handler sees the result
+        following = self._finish(job.kind)
+        if done.cancelled():
+            # The pool shut down before a worker picked the job up
+            job.result.set_exception(RuntimeError("ML executor shut down"))
+        elif done.exception() is not None:
+            job.result.set_exception(done.exception())
+        else:
+            job.result.set_result(done.result())
+        self._start(following)
+
+    def _finish(self, kind: str) -> Optional[_Job]:
+        """Free a worker slot of the ``kind`` pool; returns the queued job it
+        passes to, if any."""
+        with self._lock:
+            self._admitted -= 1
+            self._running[kind] -= 1
+            job = None
+            if self._queued[kind]:
+                job = self._queued[kind].popleft()
+                self._running[kind] += 1
+            self._update_gauges()
+            return job
+
+    def _update_gauges(self) -> None:
+        ML_EXECUTOR_IN_FLIGHT.set(sum(self._running.values()))
+        ML_EXECUTOR_QUEUE_DEPTH.set(sum(len(lanes) for lanes in self._queued.values()))
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="ml-worker"
+                )
+            return self._threads
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._processes is None:
+                # spawn rather than fork: the parent already runs threads
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker_process,
+                )
+            return self._processes
+
+
+ml_executor = MLExecutor(
+    kind=settings.ML_EXECUTOR,
+    workers=settings.ML_WORKER_THREADS,
+    max_queue=settings.ML_EXECUTOR_MAX_QUEUE,
+    retry_after=settings.ML_EXECUTOR_RETRY_AFTER,
+)
@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Gauge
+from prometheus_client import Counter, Gauge, Histogram
 
 FACE_DETECTION_ACCURACY = Gauge(
     "face_detection_confidence", "Confidence score of face detection"
@@ -9,3 +9,152 @@ FACES_DETECTED_TOTAL = Counter(
 )
 
 ML_ERRORS = Counter("ml_service_errors_total", "ML service errors", ["error_type"])
+
+# Pipeline stages (see app.core.profiling)
+ML_STAGE_DURATION = Histogram(
+    "ml_stage_duration_seconds",
+    "Time a request spent in each ML pipeline stage",
+    # stage: decode, detect, crop, liveness, liveness.blur, liveness.color,
+    # liveness.mesh, embed or match; image_size: longest side bucket (le640,
+    # le1280, le2560, gt2560); faces: 0, 1, 2-5, 6-20 or 21+
+    ["stage", "image_size", "faces"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# Roster gallery cache
+GALLERY_CACHE_HITS = Counter(
+    "gallery_cache_hits_total", "Batch-match requests served from a cached gallery"
+)
+
+GALLERY_CACHE_MISSES = Counter(
+    "gallery_cache_misses_total",
+    "Gallery lookups that missed the cache",
+    ["reason"],  # "absent" or "stale"
+)
+
+GALLERY_CACHE_EVICTIONS = Counter(
+    "gallery_cache_evictions_total", "Galleries evicted to stay within memory budget"
+)
+
+GALLERY_CACHE_BYTES = Gauge(
+    "gallery_cache_bytes", "Memory held by cached gallery matrices"
+)
+
+GALLERY_CACHE_ENTRIES = Gauge("gallery_cache_entries", "Number of cached galleries")
+
+MATCHER_QUERIES = Counter(
+    "face_matcher_queries_total",
+    "Faces matched, by the matching stage that decided them",
+    ["stage"],  # "template" (early exit), "shortlist" or "full"
+)
+
+# Content-hash cache of detection results
+RESULT_CACHE_HITS = Counter(
+    "result_cache_hits_total", "Detections served from the result cache"
+)
+
+RESULT_CACHE_MISSES = Counter(
+    "result_cache_misses_total", "Detections not found in the result cache"
+)
+
+RESULT_CACHE_HIT_RATIO = Gauge(
+    "result_cache_hit_ratio", "Share of result cache lookups that hit"
+)
+
+RESULT_CACHE_EVICTIONS = Counter(
+    "result_cache_evictions_total",
+    "Entries dropped from the result cache",
+    ["reason"],  # "expired" or "capacity"
+)
+
+RESULT_CACHE_BYTES = Gauge(
+    "result_cache_bytes", "Estimated memory held by cached detection results"
+)
+
+RESULT_CACHE_ENTRIES = Gauge("result_cache_entries", "Number of cached results")
+
+# Institution-wide ANN search index
+ANN_INDEX_EMBEDDINGS = Gauge(
+    "ann_index_embeddings", "Embeddings held by the face search index"
+)
+
+# Startup model warm-up
+MODELS_LOADED = Gauge(
+    "ml_models_loaded", "1 once the models are loaded and warmed up, else 0"
+)
+
+MODEL_WARMUP_SECONDS = Gauge(
+    "ml_model_warmup_seconds", "Time spent loading and warming up models at startup"
+)
+
+# Liveness FaceMesh pool
+FACE_MESH_POOL_WAIT = Histogram(
+    "face_mesh_pool_wait_seconds",
+    "Time spent waiting to check out a FaceMesh instance",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+FACE_MESH_POOL_IN_USE = Gauge(
+    "face_mesh_pool_in_use", "FaceMesh instances currently checked out"
+)
+
+LIVENESS_FRAMES_PER_DECISION = Histogram(
+    "liveness_frames_per_decision",
+    "Frames analysed per tracked face before its multi-frame liveness decision",
+    ["decision"],  # "live" or "spoof"
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15),
+)
+
+# Worker pool for CPU-bound handlers
+ML_EXECUTOR_QUEUE_DEPTH = Gauge(
+    "ml_executor_queue_depth", "Jobs waiting for a free ML worker"
+)
+
+ML_EXECUTOR_IN_FLIGHT = Gauge(
+    "ml_executor_in_flight", "Jobs currently running on ML workers"
+)
+
+ML_EXECUTOR_QUEUE_WAIT = Histogram(
+    "ml_executor_queue_wait_seconds",
+    "Seconds jobs waited for a free ML worker",
+    ["priority"],  # "interactive" or "bulk"
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+ML_EXECUTOR_REJECTED = Counter(
+    "ml_executor_rejected_total", "Jobs rejected because the ML workers were saturated"
+)
+
+# Adaptive concurrency limit on /api/ml/*
+ML_CONCURRENCY_LIMIT = Gauge(
+    "ml_concurrency_limit", "Requests allowed in flight by the adaptive limiter"
+)
+
+ML_CONCURRENCY_IN_FLIGHT = Gauge(
+    "ml_concurrency_in_flight", "Requests holding an adaptive limiter slot"
+)
+
+ML_CONCURRENCY_QUEUED = Gauge(
+    "ml_concurrency_queued", "Requests waiting for an adaptive limiter slot"
+)
+
+ML_CONCURRENCY_REJECTED = Counter(
+    "ml_concurrency_rejected_total",
+    "Requests shed by the adaptive limiter",
+    ["reason"],  # "queue_full", "deadline" or "timeout"
+)
+
+# Video-stream attendance sessions
+STREAM_SESSIONS_ACTIVE = Gauge(
+    "stream_sessions_active", "Open video-stream attendance sessions"
+)
+
+STREAM_FRAMES = Counter(
+    "stream_frames_total",
+    "Frames received on video streams",
+    ["result"],  # "processed" or "skipped"
+)
+
+STREAM_TRACKS_EMBEDDED = Counter(
+    "stream_tracks_embedded_total", "Tracked faces embedded and matched"
+)
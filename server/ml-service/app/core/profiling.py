@@ -0,0 +1,229 @@
+"""
+Per-stage instrumentation of the ML pipeline.
+
+Pipeline code marks its stages (decode, detect, crop, liveness and its
+sub-checks, embed, match) with ``stage(name)``. What a stage records depends
+on what is active on the running thread:
+
+- Every ML executor job runs inside ``track_stages()``. The time spent in
+  each stage is summed over the job and observed into the
+  ``ml_stage_duration_seconds`` histogram when the job ends, labelled with
+  the image size and face count the job reported via ``label_stages``, which
+  are only known part-way through.
+- With ``ML_TRACING_ENABLED`` and the ``opentelemetry-api`` package
+  installed, each stage is also an OpenTelemetry span. Executor jobs run in
+  the request's context, so the spans nest under the request's server span
+  when the service runs with an OpenTelemetry SDK configured (e.g. through
+  ``opentelemetry-instrument``).
+- Inside ``profile()``, which the ``/profile/detect-faces`` route wraps
+  around one detection, stages also record the memory allocated while they
+  ran, from ``tracemalloc``. NumPy arrays, including the ones OpenCV
+  returns, are traced, so an extra full-image copy shows up as a stage's
+  peak. tracemalloc traces the whole process and slows it down, so profiles
+  run one at a time and only when ``ML_PROFILING_ENABLED`` is set. Numbers
+  include anything else the instance does meanwhile, so profile an idle one.
+
+Outside all three, ``stage`` is a thread-local lookup and nothing else.
+"""
+
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import ML_STAGE_DURATION
+
+try:
+    from opentelemetry import trace
+except ImportError:  # optional: pip install opentelemetry-api
+    trace = None
+
+# Longest image side (px) at most -> image_size label; larger is "gt2560"
+IMAGE_SIZE_BUCKETS = ((640, "le640"), (1280, "le1280"), (2560, "le2560"))
+# Face count at most -> faces label; more is "21+"
+FACE_COUNT_BUCKETS = ((0, "0"), (1, "1"), (5, "2-5"), (20, "6-20"))
+UNKNOWN_LABEL = "unknown"
+
+_local = threading.local()
+_profile_lock = threading.Lock()
+
+
+def _create_tracer():
+    if trace is None or not settings.ML_TRACING_ENABLED:
+        return None
+    return trace.get_tracer("app.ml.pipeline")
+
+
+_tracer = _create_tracer()
+
+
+def image_size_bucket(longest_side: Optional[int]) -> str:
+    if longest_side is None:
+        return UNKNOWN_LABEL
+    for limit, label in IMAGE_SIZE_BUCKETS:
+        if longest_side <= limit:
+            return label
+    return "gt2560"
+
+
+def face_count_bucket(faces: Optional[int]) -> str:
+    if faces is None:
+        return UNKNOWN_LABEL
+    for limit, label in FACE_COUNT_BUCKETS:
+        if faces <= limit:
+            return label
+    return "21+"
+
+
+class StageTimings:
+    """Time spent per stage by one executor job."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.longest_side: Optional[int] = None
+        self.faces: Optional[int] = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def observe(self) -> None:
+        image_size = image_size_bucket(self.longest_side)
+        faces = face_count_bucket(self.faces)
+        for name, seconds in self.seconds.items():
+            ML_STAGE_DURATION.labels(
+                stage=name, image_size=image_size, faces=faces
+            ).observe(seconds)
+
+
+class StageProfile:
+    """Totals of one named stage within a profile."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        # Most memory in use above the stage's starting point, over its calls
+        self.peak_bytes = 0
+        # Memory still held when the stage ended, summed over its calls
+        self.retained_bytes = 0
+
+
+class _ProfiledStage:
+    """An open stage of a profile; tracks its peak across inner stages, whose
+    ``reset_peak`` would otherwise hide it."""
+
+    def __init__(self, record: StageProfile):
+        self.record = record
+        self.start_bytes, _ = tracemalloc.get_traced_memory()
+        self.peak = self.start_bytes
+
+
+@contextmanager
+def track_stages() -> Iterator[StageTimings]:
+    """Collect the stage times of the enclosed job and observe them into the
+    stage histogram when it ends."""
+    previous = getattr(_local, "timings", None)
+    timings = _local.timings = StageTimings()
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+        timings.observe()
+
+
+def run_tracked(fn: Callable[..., Any], *args: Any) -> Any:
+    """``fn(*args)`` inside ``track_stages``; how the ML executor runs jobs."""
+    with track_stages():
+        return fn(*args)
+
+
+def label_stages(longest_side: Optional[int], faces: Optional[int]) -> None:
+    """Set the image size and face count the running job's stages are
+    observed under (and add them to its span when tracing)."""
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings.longest_side = longest_side
+        timings.faces = faces
+    if _tracer is not None:
+        span = trace.get_current_span()
+        if longest_side is not None:
+            span.set_attribute("ml.image.longest_side", longest_side)
+        if faces is not None:
+            span.set_attribute("ml.faces", faces)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record the enclosed block as stage ``name`` of the running job."""
+    timings = getattr(_local, "timings", None)
+    profiled = getattr(_local, "stages", None)
+    if timings is None and profiled is None and _tracer is None:
+        yield
+        return
+
+    with ExitStack() as spans:
+        if _tracer is not None:
+            spans.enter_context(_tracer.start_as_current_span(f"ml.{name}"))
+        if profiled is not None:
+            record = profiled.get(name)
+            if record is None:
+                record = profiled[name] = StageProfile(name)
+            _enter_profiled(record)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if timings is not None:
+                timings.add(name, elapsed)
+            if profiled is not None:
+                _exit_profiled(elapsed)
+
+
+@contextmanager
+def profile() -> Iterator[Dict[str, StageProfile]]:
+    """
+    Profile the stages this thread runs inside the block.
+
+    Yields the stages by name, in the order they first ran; they are filled
+    in as they finish.
+    """
+    with _profile_lock:
+        tracemalloc.start()
+        _local.stages = {}
+        _local.open_stages = []
+        try:
+            yield _local.stages
+        finally:
+            _local.stages = None
+            _local.open_stages = None
+            tracemalloc.stop()
+
+
+def _carry_peak(open_stages: List[_ProfiledStage]) -> None:
+    # Fold the peak since the last reset into every open stage, then reset so
+    # the innermost stage measures from here
+    _, peak = tracemalloc.get_traced_memory()
+    for open_stage in open_stages:
+        open_stage.peak = max(open_stage.peak, peak)
+    tracemalloc.reset_peak()
+
+
+def _enter_profiled(record: StageProfile) -> None:
+    open_stages = _local.open_stages
+    _carry_peak(open_stages)
+    open_stages.append(_ProfiledStage(record))
+
+
+def _exit_profiled(elapsed: float) -> None:
+    open_stages = _local.open_stages
+    _carry_peak(open_stages)
+    closing = open_stages.pop()
+    current, _ = tracemalloc.get_traced_memory()
+    record = closing.record
+    record.calls += 1
+    record.seconds += elapsed
+    record.peak_bytes = max(record.peak_bytes, closing.peak - closing.start_bytes)
+    record.retained_bytes += current - closing.start_bytes
@@ -1,6 +1,7 @@
 import os
 import time
 import logging
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,7 +14,11 @@ from sentry_sdk.integrations.fastapi import FastApiIntegration
 
 from app.core.config import settings
 from app.api.routes.face_recognition import router as ml_router
+from app.core.executor import ml_executor
 from app.core.security import verify_api_key
+from app.ml.ann_index import ann_index
+from app.ml.inference import close_backend
+from app.ml.warmup import model_readiness, warm_up_models
 
 # New Imports
 from prometheus_fastapi_instrumentator import Instrumentator
@@ -23,6 +28,7 @@ from .core.error_handlers import (
     generic_exception_handler,
 )
 from .core.exceptions import SmartAttendanceException
+from .middleware.concurrency import ConcurrencyLimitMiddleware
 from .middleware.correlation import CorrelationIdMiddleware
 from .middleware.timing import TimingMiddleware
 
@@ -44,6 +50,34 @@ if SENTRY_DSN := os.getenv("SENTRY_DSN"):
 service_start_time = time.time()
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load and warm up models before serving and release them on shutdown"""
+    if settings.ML_ANN_INDEX_PATH and os.path.exists(settings.ML_ANN_INDEX_PATH):
+        ann_index.load(settings.ML_ANN_INDEX_PATH)
+        logger.info(f"Loaded face search index with {ann_index.size} embeddings")
+    ml_executor.start()
+    logger.info(
+        f"ML executor started: {ml_executor.kind} x {ml_executor.workers}, "
+        f"queue limit {ml_executor.max_queue}"
+    )
+    try:
+        seconds = await warm_up_models(ml_executor)
+    except Exception as e:
+        # Keep serving so /health can report it; load balancers see a 503
+        logger.error(f"Model warm-up failed: {e}")
+        model_readiness.mark_failed(str(e))
+    else:
+        model_readiness.mark_loaded(seconds)
+        logger.info(f"Models loaded and warmed up in {seconds:.2f}s")
+    yield
+    model_readiness.reset()
+    ml_executor.shutdown()
+    close_backend()
+    if settings.ML_ANN_INDEX_PATH and ann_index.size:
+        ann_index.save(settings.ML_ANN_INDEX_PATH)
+
+
 def create_app() -> FastAPI:
     """Create and configure the ML Service FastAPI application"""
 
@@ -51,6 +85,12 @@ def create_app() -> FastAPI:
         title=settings.SERVICE_NAME,
         version=settings.SERVICE_VERSION,
         description="Machine Learning Service for Face Recognition",
+        lifespan=lifespan,
+    )
+
+    # Added first so it runs inside the API key check
+    app.add_middleware(
+        ConcurrencyLimitMiddleware, limit=settings.ML_CONCURRENCY_LIMIT_ENABLED
     )
 
     @app.middleware("http")
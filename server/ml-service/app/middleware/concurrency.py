@@ -0,0 +1,59 @@
+import time
+
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.concurrency import (
+    REQUEST_TIMEOUT_HEADER,
+    concurrency_limiter,
+    request_timeout,
+)
+from app.core.error_handlers import smart_attendance_exception_handler
+from app.core.exceptions import ServiceOverloadedError
+from app.core.priority import (
+    PRIORITY_HEADER,
+    request_priority,
+    reset_priority,
+    set_priority,
+)
+
+LIMITED_PATH_PREFIX = "/api/ml/"
+
+
+class ConcurrencyLimitMiddleware(BaseHTTPMiddleware):
+    """Set the priority class of ``/api/ml/*`` requests for the executor, and
+    admit them through the adaptive concurrency limiter (when enabled)."""
+
+    def __init__(self, app, limit: bool = True):
+        super().__init__(app)
+        self.limit = limit
+
+    async def dispatch(self, request, call_next):
+        if not request.url.path.startswith(LIMITED_PATH_PREFIX):
+            return await call_next(request)
+
+        priority = request_priority(request.headers.get(PRIORITY_HEADER))
+        token = set_priority(priority)
+        try:
+            if not self.limit:
+                return await call_next(request)
+            return await self._admit(request, call_next, priority)
+        finally:
+            reset_priority(token)
+
+    async def _admit(self, request, call_next, priority: str):
+        timeout = request_timeout(request.headers.get(REQUEST_TIMEOUT_HEADER))
+        try:
+            await concurrency_limiter.acquire(timeout, priority)
+        except ServiceOverloadedError as exc:
+            return await smart_attendance_exception_handler(request, exc)
+
+        start = time.perf_counter()
+        status_code = None
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            concurrency_limiter.release(
+                time.perf_counter() - start, overloaded=status_code == 503
+            )
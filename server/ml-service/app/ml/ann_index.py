@@ -0,0 +1,302 @@
+"""
+Approximate nearest neighbour index for institution-wide face search.
+
+``IVFIndex`` is an inverted-file (IVF-flat) index in plain NumPy. Embeddings
+are L2-normalised and partitioned into ``nlist`` cells by spherical k-means;
+a query only scans the ``nprobe`` cells whose centroids are closest to it, so
+search cost is roughly ``nprobe / nlist`` of an exact scan. With
+``nprobe >= nlist`` (or before the index is trained) search is exact.
+
+Vectors are stored per cell as contiguous float32 matrices, with a parallel
+array of student codes, so scanning a cell is a single matrix product as in
+``FaceMatcher``. Additions are appended as blocks and a cell is compacted the
+next time it is read, which keeps bulk loading linear.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.ml.face_matcher import ArrayLike, normalize_rows
+
+# Training iterations for spherical k-means; cells stabilise quickly
+KMEANS_ITERATIONS = 10
+# Training uses at most this many points per cell
+KMEANS_MAX_POINTS_PER_CELL = 256
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means on normalised rows; returns normalised centroids."""
+    sample_size = min(len(vectors), nlist * KMEANS_MAX_POINTS_PER_CELL)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+        # Re-seed empty cells from random points so every cell stays useful
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    IVF-flat index over student face embeddings.
+
+    Thread-safe: mutations and searches take an internal lock, so the index
+    can be shared by the ML executor's worker threads.
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim
+        self.centroids: Optional[np.ndarray] = None
+        self._student_ids: List[str] = []
+        self._codes: Dict[str, int] = {}
+        # Blocks of (vectors, student codes) per cell; a single cell until trained
+        self._cells: List[List[Tuple[np.ndarray, np.ndarray]]] = []
+        self._lock = threading.RLock()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids) if self.trained else 1
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return sum(len(c) for blocks in self._cells for _, c in blocks)
+
+    @property
+    def num_students(self) -> int:
+        with self._lock:
+            return len(np.unique(self._all()[1]))
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            cells = sum(
+                v.nbytes + c.nbytes for blocks in self._cells for v, c in blocks
+            )
+            return cells + (self.centroids.nbytes if self.trained else 0)
+
+    def add(self, student_id: str, embeddings: ArrayLike) -> int:
+        """Add embeddings for a student; returns how many were added."""
+        vectors = normalize_rows(embeddings)
+        if vectors.size == 0:
+            return 0
+
+        with self._lock:
+            self._check_dim(vectors.shape[1])
+            code = self._codes.get(student_id)
+            if code is None:
+                code = len(self._student_ids)
+                self._codes[student_id] = code
+                self._student_ids.append(student_id)
+            self._insert(vectors, np.full(len(vectors), code, dtype=np.int32))
+        return len(vectors)
+
+    def remove(self, student_id: str) -> int:
+        """Remove every embedding of a student; returns how many were removed."""
+        with self._lock:
+            code = self._codes.get(student_id)
+            if code is None:
+                return 0
+            removed = 0
+            for i in range(len(self._cells)):
+                vectors, codes = self._cell(i)
+                keep = codes != code
+                if not keep.all():
+                    removed += int(len(codes) - keep.sum())
+                    self._cells[i] = [(vectors[keep], codes[keep])]
+            return removed
+
+    def train(self, nlist: Optional[int] = None, seed: int = 0) -> int:
+        """
+        Partition the current embeddings into ``nlist`` cells.
+
+        ``nlist`` defaults to ``sqrt(size)``. Existing vectors are reassigned,
+        and later ``add`` calls use the trained cells. Returns the cell count.
+        """
+        with self._lock:
+            vectors, codes = self._all()
+            if len(vectors) == 0:
+                raise ValueError("Cannot train an empty index")
+            if nlist is None:
+                nlist = int(np.sqrt(len(vectors)))
+            nlist = max(1, min(nlist, len(vectors)))
+
+            self.centroids = _kmeans(vectors, nlist, np.random.default_rng(seed))
+            self._cells = [[] for _ in range(nlist)]
+            self._insert(vectors, codes)
+            return nlist
+
+    def search(
+        self, queries: ArrayLike, top_k: int = 5, nprobe: int = 8
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Top ``top_k`` students per query by best cosine similarity.
+
+        Returns:
+            One list of ``(student_id, similarity)`` per query, best first.
+            A student appears at most once, scored by its closest embedding.
+        """
+        q = normalize_rows(queries)
+        with self._lock:
+            if not any(blocks for blocks in self._cells):
+                return [[] for _ in range(len(q))]
+            self._check_dim(q.shape[1])
+
+            if self.trained and nprobe < self.nlist:
+                probes = np.argpartition(-(q @ self.centroids.T), nprobe - 1, axis=1)
+                probes = probes[:, :nprobe]
+            else:
+                probes = np.tile(np.arange(self.nlist), (len(q), 1))
+
+            # Score each probed cell once against every query that probes it
+            scores = [[] for _ in range(len(q))]
+            codes = [[] for _ in range(len(q))]
+            for cell in np.unique(probes):
+                vectors, cell_codes = self._cell(cell)
+                if not len(cell_codes):
+                    continue
+                members = np.nonzero((probes == cell).any(axis=1))[0]
+                block = vectors @ q[members].T
+                for column, qi in enumerate(members):
+                    scores[qi].append(block[:, column])
+                    codes[qi].append(cell_codes)
+
+            return [self._top_students(s, c, top_k) for s, c in zip(scores, codes)]
+
+    def save(self, path: str) -> None:
+        """Persist the index to an ``.npz`` file (written atomically)."""
+        with self._lock:
+            vectors, codes = self._all()
+            cell_sizes = np.array(
+                [len(self._cell(i)[1]) for i in range(len(self._cells))],
+                dtype=np.int64,
+            )
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    dim=np.int64(self.dim or 0),
+                    centroids=(
+                        self.centroids
+                        if self.trained
+                        else np.zeros((0, 0), dtype=np.float32)
+                    ),
+                    vectors=vectors,
+                    codes=codes,
+                    cell_sizes=cell_sizes,
+                    student_ids=np.array(self._student_ids, dtype=str),
+                )
+            os.replace(tmp_path, path)
+
+    def load(self, path: str) -> "IVFIndex":
+        """Replace this index's contents with a file written by ``save``."""
+        with np.load(path, allow_pickle=False) as data:
+            centroids = data["centroids"]
+            student_ids = [str(s) for s in data["student_ids"]]
+            bounds = np.cumsum(data["cell_sizes"])[:-1]
+            cells = [
+                [block]
+                for block in zip(
+                    np.split(data["vectors"].astype(np.float32), bounds),
+                    np.split(data["codes"].astype(np.int32), bounds),
+                )
+            ]
+            dim = int(data["dim"]) or None
+
+        with self._lock:
+            self.dim = dim
+            self.centroids = centroids.astype(np.float32) if centroids.size else None
+            self._student_ids = student_ids
+            self._codes = {s: i for i, s in enumerate(student_ids)}
+            self._cells = cells
+        return self
+
+    def _check_dim(self, dim: int) -> None:
+        if self.dim is None:
+            self.dim = dim
+        elif dim != self.dim:
+            raise ValueError(
+                f"Embedding dimension mismatch: got {dim}, index has {self.dim}"
+            )
+
+    def _insert(self, vectors: np.ndarray, codes: np.ndarray) -> None:
+        if not self._cells:
+            self._cells = [[]]
+        if self.trained:
+            assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        else:
+            assign = np.zeros(len(vectors), dtype=np.intp)
+        for cell in np.unique(assign):
+            mask = assign == cell
+            self._cells[cell].append((vectors[mask], codes[mask]))
+
+    def _cell(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Cell ``i`` as one contiguous block, compacting pending additions."""
+        blocks = self._cells[i]
+        if len(blocks) != 1:
+            if blocks:
+                block = (
+                    np.concatenate([v for v, _ in blocks]),
+                    np.concatenate([c for _, c in blocks]),
+                )
+            else:
+                block = (
+                    np.zeros((0, self.dim or 0), dtype=np.float32),
+                    np.zeros(0, dtype=np.int32),
+                )
+            self._cells[i] = blocks = [block]
+        return blocks[0]
+
+    def _all(self) -> Tuple[np.ndarray, np.ndarray]:
+        blocks = [block for cell in self._cells for block in cell]
+        if not blocks:
+            dim = self.dim or 0
+            return np.zeros((0, dim), dtype=np.float32), np.zeros(0, np.int32)
+        return (
+            np.concatenate([v for v, _ in blocks]),
+            np.concatenate([c for _, c in blocks]),
+        )
+
+    def _top_students(
+        self, scores: List[np.ndarray], codes: List[np.ndarray], top_k: int
+    ) -> List[Tuple[str, float]]:
+        """Best ``top_k`` students from scored rows, one entry per student."""
+        if not scores:
+            return []
+        scores = np.concatenate(scores)
+        codes = np.concatenate(codes)
+
+        # Only the best few rows can matter unless students repeat a lot
+        shortlist = min(len(scores), top_k * 8)
+        while True:
+            if shortlist < len(scores):
+                rows = np.argpartition(-scores, shortlist - 1)[:shortlist]
+            else:
+                rows = np.arange(len(scores))
+            rows = rows[np.argsort(-scores[rows], kind="stable")]
+            _, first = np.unique(codes[rows], return_index=True)
+            if len(first) >= top_k or len(rows) == len(scores):
+                break
+            shortlist *= 4
+
+        best = rows[np.sort(first)][:top_k]
+        return [(self._student_ids[codes[i]], float(scores[i])) for i in best]
+
+
+# Institution-wide index served by /api/ml/search, persisted to ML_ANN_INDEX_PATH
+ann_index = IVFIndex()
@@ -0,0 +1,147 @@
+"""
+Versioned embedding formats.
+
+``get_face_embedding`` produces the raw format: a normalised 96x96 grayscale
+crop flattened to 9216 floats (version ``RAW_VERSION``). An
+``EmbeddingProjection`` fitted offline (PCA over enrolled faces, or a seeded
+random projection) maps raw embeddings to 128-512 dims. When
+``ML_EMBEDDING_PROJECTION_PATH`` points at one, new embeddings are produced in
+its version (see ``embedding_format`` in the face recognition routes).
+
+Every embedding carries a version tag. Anything in the raw format can be
+projected into the active version, so galleries enrolled before a projection
+was introduced keep matching. Projected embeddings cannot be mapped back, and
+embeddings from a different projection cannot be compared at all.
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+
+from app.ml.face_matcher import ArrayLike, normalize_rows
+
+RAW_VERSION = "raw96-v1"
+RAW_DIM = 96 * 96
+
+
+class EmbeddingVersionError(ValueError):
+    """Embeddings of a version that cannot be compared with the active one."""
+
+
+class EmbeddingProjection:
+    """Linear map from raw embeddings to a compact space: ``(x - mean) @ W``."""
+
+    def __init__(self, version: str, mean: np.ndarray, components: np.ndarray):
+        if components.ndim != 2 or mean.shape != (components.shape[0],):
+            raise ValueError("Projection mean and components do not line up")
+        self.version = version
+        self.mean = mean.astype(np.float32)
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+
+    @property
+    def input_dim(self) -> int:
+        return int(self.components.shape[0])
+
+    @property
+    def output_dim(self) -> int:
+        return int(self.components.shape[1])
+
+    def project(self, raw: ArrayLike) -> np.ndarray:
+        """Project raw embeddings into normalised ``(n, output_dim)`` rows.
+
+        Inputs are normalised first, so scaled copies (e.g. int8 quantised
+        storage) project to the same vector.
+        """
+        x = normalize_rows(raw)
+        if x.shape[1] != self.input_dim:
+            raise EmbeddingVersionError(
+                f"Projection {self.version} expects {self.input_dim}-dim raw "
+                f"embeddings, got {x.shape[1]}"
+            )
+        return normalize_rows((x - self.mean) @ self.components)
+
+    @classmethod
+    def fit_pca(cls, samples: ArrayLike, dims: int, version: str):
+        """Fit PCA on raw embeddings; keeps the top ``dims`` components."""
+        x = normalize_rows(samples)
+        if dims > min(x.shape):
+            raise ValueError(
+                f"PCA to {dims} dims needs at least {dims} samples and input dims"
+            )
+        mean = x.mean(axis=0)
+        # Right singular vectors of the centred data are the principal axes
+        _, _, vt = np.linalg.svd(x - mean, full_matrices=False)
+        return cls(version, mean, vt[:dims].T)
+
+    @classmethod
+    def random(cls, input_dim: int, dims: int, version: str, seed: int = 0):
+        """Gaussian random projection (Johnson-Lindenstrauss); needs no data."""
+        rng = np.random.default_rng(seed)
+        components = rng.standard_normal((input_dim, dims)) / np.sqrt(dims)
+        return cls(version, np.zeros(input_dim, dtype=np.float32), components)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                version=np.array(self.version),
+                mean=self.mean,
+                components=self.components,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingProjection":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(str(data["version"]), data["mean"], data["components"])
+
+
+class EmbeddingFormat:
+    """The embedding version this service produces and matches in."""
+
+    def __init__(self, projection: Optional[EmbeddingProjection] = None):
+        self.projection = projection
+
+    @classmethod
+    def from_path(cls, path: str) -> "EmbeddingFormat":
+        """
+        The projection saved at ``path``, or the raw format if ``path`` is empty.
+
+        Raises:
+            FileNotFoundError: ``path`` is set but missing. Falling back to raw
+                would silently enroll and match in the wrong version.
+        """
+        if not path:
+            return cls()
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"ML_EMBEDDING_PROJECTION_PATH {path!r} does not exist"
+            )
+        return cls(EmbeddingProjection.load(path))
+
+    @property
+    def version(self) -> str:
+        return self.projection.version if self.projection else RAW_VERSION
+
+    def encode(self, raw: ArrayLike) -> np.ndarray:
+        """Raw embedding(s) from ``get_face_embedding`` in the active format."""
+        if self.projection is None:
+            return np.asarray(raw, dtype=np.float32)
+        projected = self.projection.project(raw)
+        return projected[0] if np.ndim(raw) == 1 else projected
+
+    def convert(self, vectors: ArrayLike, version: Optional[str]) -> np.ndarray:
+        """
+        Bring embeddings tagged ``version`` into the active format.
+
+        ``None`` means the embeddings predate version tags, i.e. raw.
+        """
+        version = version or RAW_VERSION
+        if version == self.version or np.size(vectors) == 0:
+            return np.asarray(vectors, dtype=np.float32)
+        if version == RAW_VERSION and self.projection is not None:
+            return self.projection.project(vectors)
+        raise EmbeddingVersionError(
+            f"Cannot compare embeddings of version '{version}' with "
+            f"'{self.version}'; re-encode them from the original images"
+        )
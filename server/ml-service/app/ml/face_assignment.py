@@ -0,0 +1,93 @@
+"""
+One-to-one assignment of the faces in a photo to students.
+
+Matching each face on its own lets two faces in the same photo claim the
+same student, and whichever one the caller keeps, the other is silently
+wrong. ``assign_faces`` instead solves the photo as a whole over a sparse
+score matrix: each face keeps only its top-k students above the confidence
+threshold, and the edges are taken best first, so a student goes to the face
+that matches it best and the other face falls back to its next candidate.
+
+Greedy best-first is exact whenever the winning edges do not compete, which
+is the normal case for a classroom, and runs in ``O(E log E)`` over at most
+``faces * k`` edges instead of Hungarian's cubic time on the dense matrix.
+Where faces did compete the result is flagged ``uncertain``:
+
+- the face lost its best student to another face
+- another face scored the face's student within ``margin`` of it
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+def assign_faces(
+    student_idx: np.ndarray,
+    scores: np.ndarray,
+    threshold: float,
+    margin: float = 0.0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Assign each face at most one student and each student at most one face.
+
+    Args:
+        student_idx: ``(num_faces, k)`` candidate students of each face, best
+            first (e.g. from ``FaceMatcher.top_matches``).
+        scores: ``(num_faces, k)`` cosine similarity of each candidate.
+        threshold: Minimum score for a face to be assigned a student.
+        margin: Score gap below which a rival face makes the match uncertain.
+
+    Returns:
+        ``(assigned, assigned_scores, uncertain)``. ``assigned[i]`` is the
+        student index of face ``i`` or ``-1``, with its score (or the face's
+        best score when unassigned). Ties go to the earlier face.
+    """
+    student_idx = np.asarray(student_idx, dtype=np.intp).reshape(len(scores), -1)
+    scores = np.asarray(scores, dtype=np.float64).reshape(student_idx.shape)
+    num_faces, k = scores.shape
+
+    assigned = np.full(num_faces, -1, dtype=np.intp)
+    assigned_scores = scores[:, 0].copy() if k else np.full(num_faces, -1.0)
+    assigned_rank = np.zeros(num_faces, dtype=np.intp)
+    uncertain = np.zeros(num_faces, dtype=bool)
+    if not num_faces or not k:
+        return assigned, assigned_scores, uncertain
+
+    eligible = (scores >= threshold) & (student_idx >= 0)
+    faces, ranks = np.nonzero(eligible)
+    edge_students = student_idx[faces, ranks]
+    edge_scores = scores[faces, ranks]
+    # np.nonzero yields edges face by face, so a stable sort keeps ties in
+    # face order
+    order = np.argsort(-edge_scores, kind="stable")
+
+    owner = {}  # student -> face it was assigned to
+    best = {}  # student -> (face, score) of its best edge
+    runner_up = {}  # student -> score of its second-best edge
+    for e in order:
+        face, student = faces[e], edge_students[e]
+        # Every edge counts towards the rivals, including those of faces
+        # already assigned another student
+        if student not in best:
+            best[student] = (face, edge_scores[e])
+        elif student not in runner_up:
+            runner_up[student] = edge_scores[e]
+        if student in owner or assigned[face] >= 0:
+            continue
+        owner[student] = face
+        assigned[face] = student
+        assigned_scores[face] = edge_scores[e]
+        assigned_rank[face] = ranks[e]
+
+    for student, face in owner.items():
+        # A face scores each student at most once, so the runner-up edge is
+        # always another face's
+        best_face, best_score = best[student]
+        rival = best_score if best_face != face else runner_up.get(student)
+        contested = rival is not None and rival >= assigned_scores[face] - margin
+        uncertain[face] = assigned_rank[face] > 0 or contested
+
+    # Faces with a confident candidate that every rival outscored
+    uncertain |= (assigned < 0) & eligible[:, 0]
+    return assigned, assigned_scores, uncertain
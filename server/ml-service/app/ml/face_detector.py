@@ -1,70 +1,108 @@
 import os
-import cv2
-import mediapipe as mp
+import threading
 import numpy as np
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 
+from app.core.config import settings
+from app.core.executor import ml_executor
+from app.core.metrics import FACE_DETECTION_ACCURACY
+from app.ml.inference import get_backend
+from app.ml.preprocessor import downscale_for_detection
+from app.ml.tiling import detect_tiled
+
 MIN_FACE_AREA_RATIO = 0.04
+# Score a BlazeFace detection needs to count as a face
+MIN_DETECTION_CONFIDENCE = 0.6
 NUM_JITTERS = 3
 
+# Margin around a face box, as a share of its size, when re-detecting keypoints
+KEYPOINT_CROP_MARGIN = 0.25
+
 # Use absolute path resolution to ensure it works in Docker and all environments
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 model_path = os.path.join(BASE_DIR, "blaze_face_short_range.tflite")
 
 # Lazy-initialized detector — created on first use to avoid import-time crash
-# if the model file has not yet been downloaded.
-_detector = None
+# if the model file has not yet been downloaded. One detector per worker thread
+# since a MediaPipe graph must not run concurrent detect() calls.
+_local = threading.local()
 
 
 def _get_detector():
-    global _detector
-    if _detector is None:
+    detector = getattr(_local, "detector", None)
+    if detector is None:
         base_options = python.BaseOptions(model_asset_path=model_path)
         options = vision.FaceDetectorOptions(
             base_options=base_options,
             running_mode=vision.RunningMode.IMAGE,
-            min_detection_confidence=0.6,
+            min_detection_confidence=MIN_DETECTION_CONFIDENCE,
         )
-        _detector = vision.FaceDetector.create_from_options(options)
-    return _detector
+        detector = vision.FaceDetector.create_from_options(options)
+        _local.detector = detector
+    return detector
 
 
 def detect_faces(image: np.ndarray) -> list[tuple[int, int, int, int]]:
     """Detect faces in image. Expects RGB (e.g. from PIL Image.convert('RGB'))."""
-    # API sends RGB from PIL; MediaPipe expects RGB — use as-is.
-    if image.ndim == 2:
-        image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-
-    # Create MediaPipe Image
-    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image)
-
-    # Detect faces
-    result = _get_detector().detect(mp_image)
-
-    if not result.detections:
-        return []
-
-    faces = []
-
-    # Parse results - FaceDetector returns bounding box in pixels
-    for detection in result.detections:
-        bbox = detection.bounding_box
-        x1 = bbox.origin_x
-        y1 = bbox.origin_y
-        w_box = bbox.width
-        h_box = bbox.height
-
-        x2 = x1 + w_box
-        y2 = y1 + h_box
-
-        # Ensure coordinates are within image bounds
-        h, w = image.shape[:2]
-        x1 = max(0, min(x1, w))
-        y1 = max(0, min(y1, h))
-        x2 = max(0, min(x2, w))
-        y2 = max(0, min(y2, h))
-
-        faces.append((y1, x2, y2, x1))
-
-    return faces
+    faces = get_backend().detect([image])[0]
+    _record_confidence(faces)
+    return [face.box for face in faces]
+
+
+def detect_faces_tiled(image: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """
+    ``detect_faces`` for large group photos: overlapping full-resolution
+    tiles plus the usual downscaled pass, merged with NMS (see
+    ``app.ml.tiling``).
+
+    The tiles are split into one detector call per ML worker; when this runs
+    on the ML executor, idle workers take some of those calls.
+    """
+    faces = detect_tiled(
+        image,
+        get_backend().detect,
+        settings.ML_DETECTION_TILE_SIDE,
+        settings.ML_DETECTION_TILE_OVERLAP,
+        overview=downscale_for_detection(image, settings.ML_DETECTION_MAX_SIDE),
+        chunks=ml_executor.workers,
+        map_fn=ml_executor.fan_out,
+    )
+    _record_confidence(faces)
+    return [face.box for face in faces]
+
+
+def _record_confidence(faces) -> None:
+    # Mean detector score of the latest image with faces
+    if faces:
+        FACE_DETECTION_ACCURACY.set(sum(face.score for face in faces) / len(faces))
+
+
+def face_keypoints(
+    image: np.ndarray, box: tuple[int, int, int, int]
+) -> list[tuple[float, float]] | None:
+    """
+    Detector keypoints of the face in ``box``, in image pixels.
+
+    Runs the detector again on a padded crop around the box, so it works on
+    boxes from a downscaled detection pass too. Returns BlazeFace's six points
+    (right eye, left eye, nose tip, mouth, right ear, left ear; "right" being
+    the subject's) or None when the face is not found again.
+    """
+    top, right, bottom, left = box
+    h, w = image.shape[:2]
+    pad_y = int((bottom - top) * KEYPOINT_CROP_MARGIN)
+    pad_x = int((right - left) * KEYPOINT_CROP_MARGIN)
+    y0, y1 = max(0, top - pad_y), min(h, bottom + pad_y)
+    x0, x1 = max(0, left - pad_x), min(w, right + pad_x)
+    crop = np.ascontiguousarray(image[y0:y1, x0:x1])
+    if crop.size == 0:
+        return None
+
+    detections = get_backend().detect([crop])[0]
+    if not detections:
+        return None
+
+    # The largest detection is the face the box was drawn around
+    detection = max(detections, key=lambda d: d.area)
+    return [(x0 + x, y0 + y) for x, y in detection.keypoints]
@@ -1,7 +1,11 @@
-from typing import List, Union
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 
+from app.core.metrics import MATCHER_QUERIES
+
+ArrayLike = Union[Sequence[Sequence[float]], np.ndarray]
+
 
 def cosine_similarity(
     a: Union[List[float], np.ndarray],
@@ -15,3 +19,323 @@ def cosine_similarity(
     if norm_a == 0 or norm_b == 0:
         return 0.0
     return float(np.dot(a_arr, b_arr) / (norm_a * norm_b))
+
+
+def normalize_rows(vectors: ArrayLike) -> np.ndarray:
+    """L2-normalise each row into a contiguous float32 matrix.
+
+    Zero rows are left as zeros so they score 0 against everything, matching
+    ``cosine_similarity``.
+    """
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2, copy=True)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return np.ascontiguousarray(matrix)
+
+
+class FaceMatcher:
+    """
+    Vectorised cosine matcher over a stacked candidate gallery.
+
+    All candidate embeddings are normalised once and stacked into a single
+    float32 matrix. Rows belonging to the same student are contiguous, so
+    ``offsets[i]:offsets[i + 1]`` is the slice for ``student_ids[i]`` and the
+    per-student score is a segmented max over one GEMM.
+
+    Each student also has a normalised mean template, and ``best_matches``
+    and ``top_matches`` can match coarse-to-fine. Stage one scores queries
+    against the templates, one row per student. A query whose best template
+    beats the runner-up by ``template_margin`` exits early and is scored
+    exactly against that student's embeddings only. The rest are scored
+    exactly against the ``shortlist`` students with the best templates, or
+    against the full gallery when ``shortlist`` is 0. Cost then grows with the
+    number of students rather than the number of embeddings.
+    """
+
+    # Below this many embeddings one GEMM over the whole gallery is faster than
+    # the per-face second stage
+    coarse_to_fine_min_embeddings = 4096
+
+    def __init__(
+        self,
+        student_ids: List[str],
+        matrix: np.ndarray,
+        offsets: np.ndarray,
+        templates: Optional[np.ndarray] = None,
+        template_margin: float = 0.0,
+        shortlist: int = 0,
+    ):
+        self.student_ids = student_ids
+        self.matrix = matrix
+        self.offsets = offsets
+        self.templates = templates
+        self.template_margin = template_margin
+        self.shortlist = shortlist
+
+    @classmethod
+    def from_candidates(
+        cls,
+        candidates: Iterable[Tuple[str, ArrayLike]],
+        templates: Optional[Dict[str, ArrayLike]] = None,
+        template_margin: float = 0.0,
+        shortlist: int = 0,
+    ) -> "FaceMatcher":
+        """
+        Build a matcher from ``(student_id, embeddings)`` pairs.
+
+        Students without any embeddings are skipped since they can never match.
+        A student's template is taken from ``templates`` when given there (e.g.
+        a running mean over every enrollment), else it is the mean of the
+        student's normalised embeddings.
+        """
+        student_ids: List[str] = []
+        blocks: List[np.ndarray] = []
+        offsets = [0]
+
+        for student_id, embeddings in candidates:
+            block = np.asarray(embeddings, dtype=np.float32)
+            if block.size == 0:
+                continue
+            if block.ndim == 1:
+                block = block[np.newaxis, :]
+            student_ids.append(student_id)
+            blocks.append(block)
+            offsets.append(offsets[-1] + block.shape[0])
+
+        if not blocks:
+            empty = np.zeros((0, 0), dtype=np.float32)
+            return cls(student_ids, empty, np.asarray(offsets, dtype=np.intp), empty)
+
+        matrix = normalize_rows(np.concatenate(blocks, axis=0))
+        rows = []
+        for i, student_id in enumerate(student_ids):
+            given = (templates or {}).get(student_id)
+            if given is not None and np.size(given) == matrix.shape[1]:
+                rows.append(np.asarray(given, dtype=np.float32).reshape(-1))
+            else:
+                rows.append(matrix[offsets[i] : offsets[i + 1]].mean(axis=0))
+
+        return cls(
+            student_ids,
+            matrix,
+            np.asarray(offsets, dtype=np.intp),
+            normalize_rows(np.stack(rows)),
+            template_margin,
+            shortlist,
+        )
+
+    @property
+    def num_students(self) -> int:
+        return len(self.student_ids)
+
+    @property
+    def num_embeddings(self) -> int:
+        return int(self.matrix.shape[0])
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0
+
+    @property
+    def nbytes(self) -> int:
+        templates = self.templates.nbytes if self.templates is not None else 0
+        return int(self.matrix.nbytes + self.offsets.nbytes + templates)
+
+    def student_scores(self, queries: ArrayLike) -> np.ndarray:
+        """
+        Score queries against every student.
+
+        Returns:
+            ``(num_queries, num_students)`` matrix holding, for each query, the
+            max cosine similarity over that student's embeddings.
+        """
+        q = self._normalize_queries(queries)
+        if self.num_students == 0:
+            return np.zeros((q.shape[0], 0), dtype=np.float32)
+        return self._segmented_max(q)
+
+    def best_matches(self, queries: ArrayLike) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best student per query.
+
+        Returns:
+            ``(indices, scores)``. ``indices[i]`` indexes ``student_ids`` and is
+            ``-1`` with score ``-1.0`` when the gallery is empty. Ties resolve to
+            the earliest student, as in the original sequential scan.
+        """
+        q = self._normalize_queries(queries)
+        n = q.shape[0]
+        if self.num_students == 0:
+            return np.full(n, -1, dtype=np.intp), np.full(n, -1.0)
+
+        best = np.empty(n, dtype=np.intp)
+        scores = np.empty(n, dtype=np.float64)
+        remaining = np.arange(n)
+        if self._coarse_to_fine:
+            template_scores = q @ self.templates.T
+            leaders = np.argmax(template_scores, axis=1)
+            early = np.zeros(n, dtype=bool)
+            if self.template_margin > 0:
+                top_two = np.partition(template_scores, -2, axis=1)[:, -2:]
+                early = top_two[:, 1] - top_two[:, 0] >= self.template_margin
+
+            if 0 < self.shortlist < self.num_students:
+                candidates = self._shortlist(template_scores, self.shortlist)
+                candidates[early] = leaders[early, np.newaxis]
+                selected = remaining
+                MATCHER_QUERIES.labels(stage="shortlist").inc(n - int(early.sum()))
+            else:
+                candidates = leaders[:, np.newaxis]
+                selected = np.flatnonzero(early)
+            MATCHER_QUERIES.labels(stage="template").inc(int(early.sum()))
+
+            for i in selected:
+                if early[i]:
+                    best[i] = leaders[i]
+                    scores[i] = self._exact_scores(q[i], candidates[i, :1])[0]
+                else:
+                    exact = self._exact_scores(q[i], candidates[i])
+                    top = int(np.argmax(exact))
+                    best[i] = candidates[i, top]
+                    scores[i] = exact[top]
+            remaining = np.setdiff1d(remaining, selected, assume_unique=True)
+
+        if remaining.size:
+            full = self._segmented_max(q[remaining])
+            full_best = np.argmax(full, axis=1)
+            best[remaining] = full_best
+            scores[remaining] = full[np.arange(remaining.size), full_best]
+            MATCHER_QUERIES.labels(stage="full").inc(remaining.size)
+        return best, scores
+
+    def top_matches(self, queries: ArrayLike, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The ``k`` best students per query, best first.
+
+        Large galleries match coarse-to-fine as in ``best_matches``. A query
+        whose best template beats the runner-up by ``template_margin`` is
+        scored exactly against that student's embeddings only; the students
+        with its next best templates follow with their template scores, capped
+        ``template_margin`` below the leader's, which is enough for one-to-one
+        assignment to fall back on and flag. Others are scored exactly against
+        the students with the ``max(k, shortlist)`` best templates, or against
+        every student when there is no shortlist.
+
+        Returns:
+            ``(indices, scores)``, both ``(num_queries, min(k, num_students))``.
+            Ties within the top ``k`` resolve to the earliest student.
+        """
+        q = self._normalize_queries(queries)
+        n = q.shape[0]
+        k = min(k, self.num_students)
+        if k <= 0:
+            return np.zeros((n, 0), dtype=np.intp), np.zeros((n, 0))
+
+        indices = np.empty((n, k), dtype=np.intp)
+        scores = np.empty((n, k), dtype=np.float64)
+        remaining = np.arange(n)
+        if self._coarse_to_fine:
+            template_scores = q @ self.templates.T
+            early = np.zeros(n, dtype=bool)
+            if self.template_margin > 0:
+                top_two = np.partition(template_scores, -2, axis=1)[:, -2:]
+                early = top_two[:, 1] - top_two[:, 0] >= self.template_margin
+
+            width = max(k, self.shortlist)
+            if 0 < self.shortlist and width < self.num_students:
+                selected = remaining
+                MATCHER_QUERIES.labels(stage="shortlist").inc(n - int(early.sum()))
+            else:
+                selected = np.flatnonzero(early)
+            MATCHER_QUERIES.labels(stage="template").inc(int(early.sum()))
+
+            rows = selected[early[selected]]
+            if rows.size:
+                indices[rows], scores[rows] = self._template_top_k(
+                    q[rows], template_scores[rows], k
+                )
+            rows = selected[~early[selected]]
+            if rows.size:
+                candidates = self._shortlist(template_scores[rows], width)
+                exact = np.stack(
+                    [self._exact_scores(q[i], c) for i, c in zip(rows, candidates)]
+                )
+                indices[rows], scores[rows] = self._top_k(candidates, exact, k)
+            remaining = np.setdiff1d(remaining, selected, assume_unique=True)
+
+        if remaining.size:
+            exact = self._segmented_max(q[remaining])
+            candidates = np.broadcast_to(np.arange(self.num_students), exact.shape)
+            indices[remaining], scores[remaining] = self._top_k(candidates, exact, k)
+            MATCHER_QUERIES.labels(stage="full").inc(remaining.size)
+        return indices, scores
+
+    def _template_top_k(
+        self, queries: np.ndarray, template_scores: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top ``k`` of queries whose template leader cleared the margin: the
+        leader scored exactly, the runners-up by template, capped the margin
+        below the leader."""
+        shortlist = self._shortlist(template_scores, k)
+        rows = np.arange(len(queries))[:, np.newaxis]
+        indices, scores = self._top_k(shortlist, template_scores[rows, shortlist], k)
+        for i, query in enumerate(queries):
+            scores[i, 0] = self._exact_scores(query, indices[i, :1])[0]
+        np.minimum(
+            scores[:, 1:], scores[:, :1] - self.template_margin, out=scores[:, 1:]
+        )
+        return indices, scores
+
+    @staticmethod
+    def _top_k(
+        candidates: np.ndarray, exact: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """The ``k`` best of each row's ``candidates`` by ``exact`` score."""
+        rows = np.arange(exact.shape[0])[:, np.newaxis]
+        top = np.argpartition(-exact, k - 1, axis=1)[:, :k]
+        # Best first, ties to the earliest student
+        top = top[rows, np.lexsort((candidates[rows, top], -exact[rows, top]))]
+        return candidates[rows, top], exact[rows, top].astype(np.float64)
+
+    @property
+    def _coarse_to_fine(self) -> bool:
+        return (
+            self.templates is not None
+            and self.num_students > 1
+            and self.num_embeddings >= self.coarse_to_fine_min_embeddings
+            and (self.template_margin > 0 or 0 < self.shortlist < self.num_students)
+        )
+
+    def _shortlist(self, template_scores: np.ndarray, size: int) -> np.ndarray:
+        """Students with the ``size`` best templates per query, ascending ids
+        so ties still go to the earliest student."""
+        return np.sort(
+            np.argpartition(-template_scores, size - 1, axis=1)[:, :size], axis=1
+        )
+
+    def _exact_scores(self, query: np.ndarray, students: np.ndarray) -> np.ndarray:
+        """Max cosine similarity of one query over each given student's rows."""
+        if len(students) == 1:
+            rows = self.matrix[
+                self.offsets[students[0]] : self.offsets[students[0] + 1]
+            ]
+            return np.array([np.max(rows @ query)], dtype=np.float64)
+        starts, ends = self.offsets[students], self.offsets[students + 1]
+        lengths = ends - starts
+        segments = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        rows = np.repeat(starts - segments, lengths) + np.arange(lengths.sum())
+        sims = self.matrix[rows] @ query
+        return np.maximum.reduceat(sims, segments).astype(np.float64)
+
+    def _normalize_queries(self, queries: ArrayLike) -> np.ndarray:
+        q = normalize_rows(queries)
+        if self.num_students and q.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dimension mismatch: query has {q.shape[1]}, "
+                f"gallery has {self.dim}"
+            )
+        return q
+
+    def _segmented_max(self, q: np.ndarray) -> np.ndarray:
+        sims = q @ self.matrix.T
+        return np.maximum.reduceat(sims, self.offsets[:-1], axis=1)
@@ -0,0 +1,92 @@
+"""
+Enrollment image quality.
+
+Every enrolled photo adds an embedding to the student's template store, and a
+blurry, tiny or turned-away face makes a poor reference. ``face_quality``
+scores a face crop on three components, each in [0, 1]:
+
+- sharpness: Laplacian variance of the crop at the encoder's input size
+- face size: the shorter side of the face box in pixels
+- pose: how frontal the face is, from the detector keypoints (nose offset
+  between the eyes for yaw, tilt of the eye line for roll)
+
+The overall score is their geometric mean, so one bad component is enough to
+pull it down. The backend rejects enrollments below its minimum and keeps the
+best-scoring embeddings per student.
+"""
+
+import math
+import os
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Laplacian variance (at 96x96) that counts as fully sharp
+QUALITY_SHARPNESS_TARGET = float(os.getenv("QUALITY_SHARPNESS_TARGET", "100"))
+# Shorter side of the face box, in pixels, that counts as full size
+QUALITY_FACE_SIZE_TARGET = float(os.getenv("QUALITY_FACE_SIZE_TARGET", "128"))
+# Nose offset from the eye midpoint, in eye distances, that scores 0 for yaw
+QUALITY_MAX_YAW = float(os.getenv("QUALITY_MAX_YAW", "0.35"))
+# Eye-line tilt in degrees that scores 0 for roll
+QUALITY_MAX_ROLL = float(os.getenv("QUALITY_MAX_ROLL", "30"))
+
+# Side of the grayscale crop the encoder embeds (see face_encoder)
+ENCODER_INPUT_SIDE = 96
+
+
+def _clip(value: float) -> float:
+    return float(min(1.0, max(0.0, value)))
+
+
+def sharpness_score(face_img: np.ndarray) -> float:
+    if face_img.ndim == 2:
+        gray = face_img
+    else:
+        gray = cv2.cvtColor(face_img, cv2.COLOR_RGB2GRAY)
+    resized = cv2.resize(gray, (ENCODER_INPUT_SIDE, ENCODER_INPUT_SIDE))
+    variance = cv2.Laplacian(resized, cv2.CV_64F).var()
+    return _clip(variance / QUALITY_SHARPNESS_TARGET)
+
+
+def pose_score(keypoints: List[Tuple[float, float]]) -> float:
+    """Frontalness from detector keypoints (right eye, left eye, nose tip, ...)."""
+    (rx, ry), (lx, ly), (nx, _) = keypoints[0], keypoints[1], keypoints[2]
+    eye_dx, eye_dy = lx - rx, ly - ry
+    eye_distance = math.hypot(eye_dx, eye_dy)
+    if eye_distance == 0:
+        return 0.0
+
+    yaw = abs(nx - (rx + lx) / 2) / eye_distance
+    roll = math.degrees(math.atan2(abs(eye_dy), abs(eye_dx)))
+    return _clip(1 - yaw / QUALITY_MAX_YAW) * _clip(1 - roll / QUALITY_MAX_ROLL)
+
+
+def face_quality(
+    face_img: np.ndarray,
+    keypoints: Optional[List[Tuple[float, float]]] = None,
+) -> dict:
+    """
+    Quality of a face crop for enrollment.
+
+    Args:
+        face_img: The face crop (RGB or grayscale).
+        keypoints: Detector keypoints of the face, or None when unavailable;
+            the pose is then left out of the score.
+
+    Returns:
+        ``{"score", "sharpness", "face_size", "pose"}``; ``pose`` is None
+        without keypoints.
+    """
+    sharpness = sharpness_score(face_img)
+    face_size = _clip(min(face_img.shape[:2]) / QUALITY_FACE_SIZE_TARGET)
+    pose = pose_score(keypoints) if keypoints and len(keypoints) >= 3 else None
+
+    components = [c for c in (sharpness, face_size, pose) if c is not None]
+    score = float(np.prod(components)) ** (1 / len(components))
+    return {
+        "score": score,
+        "sharpness": sharpness,
+        "face_size": face_size,
+        "pose": pose,
+    }
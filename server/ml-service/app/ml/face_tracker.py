@@ -0,0 +1,151 @@
+"""
+Face tracking across the sampled frames of a video stream.
+
+A teacher panning a phone across a room sends many frames showing the same
+faces. ``FaceTracker`` links the detections of each sampled frame to the
+tracks of the previous one by box overlap (IoU), falling back to centroid
+distance when the camera moved far enough between samples that the boxes no
+longer overlap. Stream sessions then embed and match a track until it is
+identified, and check its liveness over a few frames, instead of processing
+every face on every frame.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+from app.ml.preprocessor import Box
+from app.ml.temporal_liveness import TemporalLiveness
+
+
+class Track:
+    """A face followed across frames, with its match and liveness."""
+
+    def __init__(self, track_id: int, box: Box):
+        self.track_id = track_id
+        self.box = box
+        # Frames the track was detected on / consecutive frames it was not
+        self.hits = 1
+        self.misses = 0
+        # Times the face was embedded and matched
+        self.attempts = 0
+        self.student_id: Optional[str] = None
+        self.distance: Optional[float] = None
+        # Multi-frame liveness state and its decision (None while undecided)
+        self.liveness: Optional[TemporalLiveness] = None
+        self.live: Optional[bool] = None
+
+    @property
+    def status(self) -> Optional[str]:
+        """Match status as reported to clients.
+
+        "present", "unknown" or "spoof", "pending" while a matched face awaits
+        its liveness decision, and None before the face was first matched.
+        """
+        if self.live is False:
+            return "spoof"
+        if self.student_id is None:
+            return "unknown" if self.attempts else None
+        return "present" if self.live else "pending"
+
+
+def _as_array(boxes: List[Box]) -> np.ndarray:
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def iou_matrix(a: List[Box], b: List[Box]) -> np.ndarray:
+    """Pairwise intersection-over-union of (top, right, bottom, left) boxes."""
+    a, b = _as_array(a), _as_array(b)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def centroid_shift_matrix(a: List[Box], b: List[Box]) -> np.ndarray:
+    """Pairwise centroid distance in units of the larger box's diagonal."""
+    a, b = _as_array(a), _as_array(b)
+    ca = np.stack([(a[:, 0] + a[:, 2]) / 2, (a[:, 1] + a[:, 3]) / 2], axis=1)
+    cb = np.stack([(b[:, 0] + b[:, 2]) / 2, (b[:, 1] + b[:, 3]) / 2], axis=1)
+    distance = np.linalg.norm(ca[:, None, :] - cb[None, :, :], axis=2)
+
+    diag_a = np.hypot(a[:, 1] - a[:, 3], a[:, 2] - a[:, 0])
+    diag_b = np.hypot(b[:, 1] - b[:, 3], b[:, 2] - b[:, 0])
+    scale = np.maximum(diag_a[:, None], diag_b[None, :])
+    return np.divide(
+        distance, scale, out=np.full_like(distance, np.inf), where=scale > 0
+    )
+
+
+class FaceTracker:
+    """
+    Greedy IoU/centroid tracker over per-frame face boxes.
+
+    Pairs are assigned best first: any pair overlapping by at least
+    ``iou_threshold`` beats every centroid-only pair, and centroid pairs must
+    lie within ``max_centroid_shift`` diagonals. Unmatched detections start
+    new tracks; tracks unmatched for more than ``max_misses`` frames end.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        max_centroid_shift: float = 0.75,
+        max_misses: int = 5,
+    ):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_shift = max_centroid_shift
+        self.max_misses = max_misses
+        self.tracks: List[Track] = []
+        self.total_tracks = 0
+
+    def update(self, boxes: List[Box]) -> List[Track]:
+        """Advance one frame; returns the track of each box, in box order."""
+        assigned: List[Optional[Track]] = [None] * len(boxes)
+        if self.tracks and boxes:
+            previous = [track.box for track in self.tracks]
+            overlap = iou_matrix(previous, boxes)
+            shift = centroid_shift_matrix(previous, boxes)
+
+            # Overlap scores land in [1, 2], centroid-only scores in [0, 1)
+            score = np.where(
+                overlap >= self.iou_threshold,
+                1.0 + overlap,
+                np.where(
+                    shift <= self.max_centroid_shift,
+                    1.0 - shift / (self.max_centroid_shift or 1.0),
+                    -1.0,
+                ),
+            )
+            used_tracks = set()
+            for flat in np.argsort(-score, axis=None, kind="stable"):
+                t, d = np.unravel_index(flat, score.shape)
+                if score[t, d] < 0:
+                    break
+                if t in used_tracks or assigned[d] is not None:
+                    continue
+                used_tracks.add(t)
+                assigned[d] = self.tracks[t]
+
+        for track in self.tracks:
+            track.misses += 1
+        for d, box in enumerate(boxes):
+            track = assigned[d]
+            if track is None:
+                self.total_tracks += 1
+                track = Track(self.total_tracks, box)
+                self.tracks.append(track)
+                assigned[d] = track
+            else:
+                track.box = box
+                track.hits += 1
+            track.misses = 0
+
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return assigned
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import (
+    GALLERY_CACHE_BYTES,
+    GALLERY_CACHE_ENTRIES,
+    GALLERY_CACHE_EVICTIONS,
+    GALLERY_CACHE_HITS,
+    GALLERY_CACHE_MISSES,
+)
+from app.ml.face_matcher import FaceMatcher
+
+
+class GalleryTooLargeError(ValueError):
+    """Raised when a single gallery does not fit in the cache budget."""
+
+
+class Gallery:
+    """A named, versioned roster gallery held as a stacked FaceMatcher."""
+
+    def __init__(self, gallery_id: str, version: str, matcher: FaceMatcher):
+        self.gallery_id = gallery_id
+        self.version = version
+        self.matcher = matcher
+        self.updated_at = time.time()
+
+    @property
+    def nbytes(self) -> int:
+        return self.matcher.nbytes
+
+
+class GalleryCache:
+    """
+    LRU cache of roster galleries bounded by total matrix memory.
+
+    Callers key galleries by something stable (e.g. ``subject:<id>``) and pass
+    a version (e.g. a roster hash). A lookup with a different version counts as
+    a miss, so the caller re-uploads the gallery instead of matching against a
+    stale roster.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._galleries: "OrderedDict[str, Gallery]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, gallery_id: str, version: Optional[str] = None) -> Optional[Gallery]:
+        with self._lock:
+            gallery = self._galleries.get(gallery_id)
+            if gallery is None:
+                GALLERY_CACHE_MISSES.labels(reason="absent").inc()
+                return None
+            if version is not None and gallery.version != version:
+                GALLERY_CACHE_MISSES.labels(reason="stale").inc()
+                return None
+            self._galleries.move_to_end(gallery_id)
+            GALLERY_CACHE_HITS.inc()
+            return gallery
+
+    def peek(self, gallery_id: str) -> Optional[Gallery]:
+        """Look up a gallery without touching LRU order or hit/miss metrics."""
+        with self._lock:
+            return self._galleries.get(gallery_id)
+
+    def upsert(self, gallery_id: str, version: str, matcher: FaceMatcher) -> Gallery:
+        """
+        Insert or replace a gallery, evicting least recently used ones as needed.
+
+        Raises:
+            GalleryTooLargeError: If the gallery alone exceeds the memory budget.
+        """
+        gallery = Gallery(gallery_id, version, matcher)
+        if gallery.nbytes > self.max_bytes:
+            raise GalleryTooLargeError(
+                f"Gallery size {gallery.nbytes} bytes exceeds cache budget "
+                f"{self.max_bytes} bytes"
+            )
+
+        with self._lock:
+            self._remove(gallery_id)
+            while self._galleries and self._bytes + gallery.nbytes > self.max_bytes:
+                _, evicted = self._galleries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                GALLERY_CACHE_EVICTIONS.inc()
+
+            self._galleries[gallery_id] = gallery
+            self._bytes += gallery.nbytes
+            self._update_gauges()
+            return gallery
+
+    def invalidate(self, gallery_id: str) -> bool:
+        with self._lock:
+            removed = self._remove(gallery_id)
+            self._update_gauges()
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._galleries.clear()
+            self._bytes = 0
+            self._update_gauges()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._galleries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remove(self, gallery_id: str) -> bool:
+        gallery = self._galleries.pop(gallery_id, None)
+        if gallery is None:
+            return False
+        self._bytes -= gallery.nbytes
+        return True
+
+    def _update_gauges(self) -> None:
+        GALLERY_CACHE_BYTES.set(self._bytes)
+        GALLERY_CACHE_ENTRIES.set(len(self._galleries))
+
+
+gallery_cache = GalleryCache(settings.ML_GALLERY_CACHE_MAX_BYTES)
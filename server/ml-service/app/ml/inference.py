@@ -0,0 +1,112 @@
+"""
+Pluggable inference backends for face detection and landmarking.
+
+Face detection (BlazeFace short-range) and the liveness face mesh run through
+an ``InferenceBackend`` selected by ``ML_MODEL``:
+
+- ``mediapipe`` (default): the MediaPipe Tasks detector and the
+  ``mp.solutions`` FaceMesh, see ``mediapipe_backend``
+- ``onnx``: the same models exported to ONNX and run on ONNX Runtime's CPU
+  provider with configurable threads and batched inputs, see ``onnx_backend``
+
+Both take a list of images and return one result per image, so a caller with
+several inputs (every face crop of a photo for liveness, every tile of a
+photo for detection) makes a single call and a backend that can batch runs
+them together.
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml.preprocessor import Box
+
+BACKEND_MEDIAPIPE = "mediapipe"
+BACKEND_ONNX = "onnx"
+# ML_MODEL values from before backends were pluggable; both meant MediaPipe
+LEGACY_MODEL_NAMES = ("hog", "cnn")
+
+# (x, y) in image pixels
+Point = Tuple[float, float]
+
+
+class FaceDetection:
+    """A detected face: its box, keypoints and confidence."""
+
+    def __init__(self, box: Box, keypoints: List[Point], score: float):
+        self.box = box
+        # Right eye, left eye, nose tip, mouth, right ear, left ear ("right"
+        # being the subject's), in image pixels
+        self.keypoints = keypoints
+        self.score = score
+
+    @property
+    def area(self) -> int:
+        top, right, bottom, left = self.box
+        return max(0, right - left) * max(0, bottom - top)
+
+
+class InferenceBackend:
+    """Face detector and face mesh behind one interface."""
+
+    name = ""
+
+    def load(self) -> None:
+        """Load the models now instead of on first use."""
+
+    def detect(self, images: List[np.ndarray]) -> List[List[FaceDetection]]:
+        """Faces in each RGB (or grayscale) image, boxes clipped to the image."""
+        raise NotImplementedError
+
+    def landmarks(self, crops: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """
+        Face mesh of each RGB face crop.
+
+        Returns:
+            Per crop an ``(n, 3)`` float32 array of landmarks normalised like
+            FaceMesh's (x / width, y / height, z / width), or None when no
+            face mesh fits.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release the models; they are loaded again on next use."""
+
+
+def create_backend(name: str) -> InferenceBackend:
+    """Backend for an ``ML_MODEL`` value."""
+    name = name.lower()
+    if name == BACKEND_MEDIAPIPE or name in LEGACY_MODEL_NAMES:
+        from app.ml.mediapipe_backend import MediaPipeBackend
+
+        return MediaPipeBackend()
+    if name == BACKEND_ONNX:
+        from app.ml.onnx_backend import OnnxBackend
+
+        return OnnxBackend.from_settings()
+    raise ValueError(f"Unknown inference backend '{name}'")
+
+
+_backend: Optional[InferenceBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> InferenceBackend:
+    """The process-wide backend selected by ``ML_MODEL``, created on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(settings.ML_MODEL)
+    return _backend
+
+
+def close_backend() -> None:
+    """Close the process-wide backend; the next ``get_backend`` recreates it."""
+    global _backend
+    with _backend_lock:
+        backend, _backend = _backend, None
+    if backend is not None:
+        backend.close()
@@ -1,9 +1,17 @@
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
 import cv2
 import numpy as np
 import mediapipe as mp
 import logging
 from app.core.config import settings
+from app.core.metrics import FACE_MESH_POOL_IN_USE, FACE_MESH_POOL_WAIT
+from app.core.profiling import stage
+from app.ml.inference import get_backend
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -22,13 +30,122 @@ LIVENESS_FAIL_OPEN = os.getenv("LIVENESS_FAIL_OPEN", "false").lower() == "true"
 mp_face_mesh = mp.solutions.face_mesh
 
 
+def _create_face_mesh():
+    return mp_face_mesh.FaceMesh(
+        static_image_mode=True,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+    )
+
+
+class FaceMeshPool:
+    """
+    Pool of reusable FaceMesh instances.
+
+    Building a FaceMesh loads its graph and model, which used to happen for
+    every face crop. Instances are created up to ``size`` (lazily, or all at
+    once via ``warm_up``) and checked out by one thread at a time. With
+    ``static_image_mode=True`` each ``process`` call is independent, so an
+    instance can safely serve unrelated requests in turn.
+    """
+
+    def __init__(self, size: int, factory=_create_face_mesh):
+        self.size = max(1, size)
+        self._factory = factory
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def warm_up(self) -> int:
+        """Create every instance up front; returns how many were created."""
+        created = []
+        with self._lock:
+            while self._created < self.size:
+                created.append(self._factory())
+                self._created += 1
+        for mesh in created:
+            self._idle.put(mesh)
+        return len(created)
+
+    @contextmanager
+    def acquire(self, timeout: float = None):
+        """Check out a FaceMesh for the duration of the ``with`` block.
+
+        An instance that raises is closed and discarded rather than returned,
+        since its graph may be left in a bad state.
+        """
+        start = time.perf_counter()
+        mesh = self._checkout(timeout)
+        FACE_MESH_POOL_WAIT.observe(time.perf_counter() - start)
+        FACE_MESH_POOL_IN_USE.inc()
+        try:
+            yield mesh
+        except Exception:
+            self._discard(mesh)
+            raise
+        else:
+            self._idle.put(mesh)
+        finally:
+            FACE_MESH_POOL_IN_USE.dec()
+
+    def close(self) -> None:
+        """Close idle instances and reset the pool (checked-out ones are dropped)."""
+        with self._lock:
+            while True:
+                try:
+                    mesh = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._close(mesh)
+            self._created = 0
+
+    def _checkout(self, timeout: float = None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        return self._idle.get(timeout=timeout)
+
+    def _discard(self, mesh) -> None:
+        self._close(mesh)
+        with self._lock:
+            self._created = max(0, self._created - 1)
+
+    @staticmethod
+    def _close(mesh) -> None:
+        try:
+            mesh.close()
+        except Exception:
+            pass
+
+
+face_mesh_pool = FaceMeshPool(settings.ML_WORKER_THREADS)
+
+
 def is_live(face_crop: np.ndarray) -> bool:
     """
     Check if the provided face crop represents a live person.
 
     This function performs multiple checks to determine liveness:
-    1. **Face Mesh Validation**: Uses MediaPipe Face Mesh to ensure a valid 3D face
-       structure exists.
+    1. **Face Mesh Validation**: Uses the inference backend's face mesh (see
+       ``app.ml.inference``) to ensure a valid 3D face structure exists.
     2. **Laplacian Variance**: Analyzes image sharpness to detect:
        - Blurriness/Flatness (Variance too low -> likely a photo/screen)
        - Excessive Noise/Moiré patterns (Variance too high -> likely a screen capture)
@@ -36,24 +153,87 @@ def is_live(face_crop: np.ndarray) -> bool:
        out low-quality spoofs or flat masks.
 
     Args:
-        face_crop (np.ndarray): The cropped face image in BGR format (OpenCV default).
+        face_crop (np.ndarray): The cropped face image in RGB format, as
+            decoded by the routes (a view into the photo is fine).
 
     Returns:
         bool: True if the face passes checks or checks are disabled/fail-open.
               False if a potential spoof is detected.
     """
+    live, _ = analyze_face(face_crop, with_landmarks=False)
+    return live
+
+
+def are_live(face_crops: List[np.ndarray]) -> List[bool]:
+    """``is_live`` for several crops, fitting their face meshes in one batch."""
+    return [live for live, _ in analyze_faces(face_crops, with_landmarks=False)]
+
+
+def analyze_face(
+    face_crop: np.ndarray, with_landmarks: bool = True
+) -> Tuple[bool, Optional[np.ndarray]]:
+    """
+    Single-frame liveness checks of ``is_live``, plus the fitted landmarks.
+
+    Returns:
+        ``(live, landmarks)``; ``landmarks`` is an ``(n, 3)`` array of
+        FaceMesh points in crop pixels (z scaled like x), or None when no mesh
+        was fitted or checks are disabled. Multi-frame liveness reuses them
+        instead of running FaceMesh again.
+    """
+    return analyze_faces([face_crop], with_landmarks)[0]
+
+
+def analyze_faces(
+    face_crops: List[np.ndarray], with_landmarks: bool = True
+) -> List[Tuple[bool, Optional[np.ndarray]]]:
+    """``analyze_face`` for several crops; the crops that pass the quality
+    checks get their face meshes from a single inference backend call."""
     if not ML_LIVENESS_CHECK:
-        return True
+        return [(True, None)] * len(face_crops)
+
+    results = [(False, None)] * len(face_crops)
+    passed = [i for i, crop in enumerate(face_crops) if _passes_quality_checks(crop)]
+    if not passed:
+        return results
+
+    # Crops are already RGB, as the face mesh expects
+    try:
+        with stage("liveness.mesh"):
+            meshes = get_backend().landmarks([face_crops[i] for i in passed])
+    except Exception as e:
+        logger.error(f"Liveness check failed: {e}")
+        fallback = (True, None) if LIVENESS_FAIL_OPEN else (False, None)
+        for i in passed:
+            results[i] = fallback
+        return results
 
+    for i, mesh in zip(passed, meshes):
+        # If no landmarks detected, likely a spoof or bad crop
+        if mesh is None:
+            logger.warning("Spoof detected: No face mesh constructed.")
+            continue
+
+        # --- Future enhancements ---
+        # 3. Z-Depth Variance (Mesh flatness check)
+        # Blinks and head motion: see temporal_liveness (multi-frame)
+
+        if not with_landmarks:
+            results[i] = (True, None)
+            continue
+        h, w = face_crops[i].shape[:2]
+        results[i] = (True, mesh.reshape(-1, 3) * np.array([w, h, w], np.float32))
+    return results
+
+
+def _passes_quality_checks(face_crop: np.ndarray) -> bool:
     if face_crop is None or face_crop.size == 0:
         return False
 
-    # Ensure image is in RGB for MediaPipe
-    rgb = cv2.cvtColor(face_crop, cv2.COLOR_BGR2RGB)
-
     # --- Quality Checks ---
-    gray = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY)
-    variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+    with stage("liveness.blur"):
+        gray = cv2.cvtColor(face_crop, cv2.COLOR_RGB2GRAY)
+        variance = cv2.Laplacian(gray, cv2.CV_64F).var()
 
     # Range check on Variance:
     # - Too low (<10): Likely solid color, extremely blurry, or flat mask.
@@ -73,8 +253,9 @@ def is_live(face_crop: np.ndarray) -> bool:
         return False
 
     # Color Diversity Check
-    (mean, std) = cv2.meanStdDev(face_crop)
-    avg_std = np.mean(std)
+    with stage("liveness.color"):
+        (mean, std) = cv2.meanStdDev(face_crop)
+        avg_std = np.mean(std)
 
     if avg_std < LIVENESS_COLOR_MIN_STD:
         logger.warning(
@@ -87,26 +268,4 @@ def is_live(face_crop: np.ndarray) -> bool:
     logger.info(
         f"Liveness Checks Passed: Variance={variance:.2f}, StdDev={avg_std:.2f}"
     )
-    try:
-        with mp_face_mesh.FaceMesh(
-            static_image_mode=True,
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-        ) as face_mesh:
-            results = face_mesh.process(rgb)
-
-            # If no landmarks detected, likely a spoof or bad crop
-            if not results.multi_face_landmarks:
-                logger.warning("Spoof detected: No face mesh constructed.")
-                return False
-
-            # --- Future enhancements ---
-            # 3. Z-Depth Variance (Mesh flatness check)
-            # 4. Blink Integration (requires multi-frame)
-
-            return True
-
-    except Exception as e:
-        logger.error(f"Liveness check failed: {e}")
-        return True if LIVENESS_FAIL_OPEN else False
+    return True
@@ -0,0 +1,83 @@
+"""
+MediaPipe inference backend.
+
+Detection runs on the MediaPipe Tasks BlazeFace detector, one instance per
+worker thread (see ``face_detector._get_detector``). Landmarks come from the
+``mp.solutions`` FaceMesh, checked out of ``liveness.face_mesh_pool``. Neither
+API takes batches, so a list of inputs is processed one by one; a list of
+crops at least shares a single FaceMesh checkout.
+"""
+
+from typing import List, Optional
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from app.core.config import settings
+from app.ml import face_detector
+from app.ml.inference import BACKEND_MEDIAPIPE, FaceDetection, InferenceBackend
+from app.ml.liveness import face_mesh_pool
+
+
+class MediaPipeBackend(InferenceBackend):
+    name = BACKEND_MEDIAPIPE
+
+    def load(self) -> None:
+        face_detector._get_detector()
+        if settings.ML_LIVENESS_CHECK:
+            with face_mesh_pool.acquire():
+                pass
+
+    def detect(self, images: List[np.ndarray]) -> List[List[FaceDetection]]:
+        return [self._detect(image) for image in images]
+
+    def landmarks(self, crops: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        meshes = []
+        with face_mesh_pool.acquire(
+            timeout=settings.ML_FACE_MESH_POOL_TIMEOUT
+        ) as face_mesh:
+            for crop in crops:
+                # Crops are views into the photo; MediaPipe needs them packed
+                results = face_mesh.process(np.ascontiguousarray(crop))
+                if not results.multi_face_landmarks:
+                    meshes.append(None)
+                    continue
+                points = results.multi_face_landmarks[0].landmark
+                meshes.append(
+                    np.array([(p.x, p.y, p.z) for p in points], dtype=np.float32)
+                )
+        return meshes
+
+    def close(self) -> None:
+        face_mesh_pool.close()
+
+    @staticmethod
+    def _detect(image: np.ndarray) -> List[FaceDetection]:
+        # API sends RGB from PIL; MediaPipe expects RGB — use as-is.
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image)
+        result = face_detector._get_detector().detect(mp_image)
+        if not result.detections:
+            return []
+
+        h, w = image.shape[:2]
+        faces = []
+        # FaceDetector returns the box in pixels and keypoints normalised
+        for detection in result.detections:
+            bbox = detection.bounding_box
+            x1 = max(0, min(bbox.origin_x, w))
+            y1 = max(0, min(bbox.origin_y, h))
+            x2 = max(0, min(bbox.origin_x + bbox.width, w))
+            y2 = max(0, min(bbox.origin_y + bbox.height, h))
+            categories = getattr(detection, "categories", None)
+            faces.append(
+                FaceDetection(
+                    (y1, x2, y2, x1),
+                    [(point.x * w, point.y * h) for point in detection.keypoints],
+                    float(categories[0].score) if categories else 1.0,
+                )
+            )
+        return faces
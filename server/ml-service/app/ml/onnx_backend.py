@@ -0,0 +1,358 @@
+"""
+ONNX Runtime CPU inference backend.
+
+Runs the BlazeFace short-range detector and the FaceMesh landmark model,
+exported to ONNX from MediaPipe's ``.tflite`` files (see the README), on ONNX
+Runtime's CPU execution provider. Unlike the MediaPipe Python solutions it
+exposes the session options:
+
+- intra-op threads per inference (``ML_ORT_INTRA_OP_THREADS``) and inter-op
+  threads (``ML_ORT_INTER_OP_THREADS``). Every executor worker runs its own
+  inferences, so the default of one thread each keeps the service at
+  ``ML_WORKER_THREADS`` busy cores.
+- full graph optimisation (operator fusion, constant folding)
+- batching: inputs of one call are stacked into batches of up to
+  ``ML_ORT_MAX_BATCH`` per session run when the model's batch dimension is
+  dynamic, and run one by one when it is fixed at 1
+
+Pre- and post-processing follow MediaPipe's graphs. The detector sees the
+image letterboxed into 128x128 and scaled to [-1, 1]; its 896 SSD anchors are
+decoded and overlapping boxes merged by weighted non-max suppression. The
+mesh model sees the face crop, padded and resized to 192x192 in [0, 1], and
+returns 468 (or 478 with irises) landmarks plus a face-presence score.
+
+``onnxruntime`` is an optional dependency, only imported when this backend is
+selected.
+"""
+
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.ml.face_detector import MIN_DETECTION_CONFIDENCE
+from app.ml.inference import BACKEND_ONNX, FaceDetection, InferenceBackend
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DETECTOR_PATH = os.path.join(BASE_DIR, "face_detection_short_range.onnx")
+DEFAULT_LANDMARK_PATH = os.path.join(BASE_DIR, "face_landmark.onnx")
+
+DETECTOR_INPUT_SIDE = 128
+LANDMARK_INPUT_SIDE = 192
+# IoU above which detections are merged into one face
+DETECTION_SUPPRESSION_IOU = 0.3
+# Face-presence score below which the mesh is rejected
+MIN_FACE_PRESENCE = 0.5
+# Margin around a face crop, as a share of its size, before landmarking;
+# the mesh model is trained on face boxes enlarged by MediaPipe's ROI step
+LANDMARK_CROP_MARGIN = 0.25
+
+
+def blazeface_anchors() -> np.ndarray:
+    """``(896, 2)`` anchor centres of BlazeFace short-range, normalised.
+
+    Stride 8 gives a 16x16 grid with 2 anchors per cell, stride 16 an 8x8 grid
+    with 6, in the model's output order (row by row, anchors of a cell
+    together).
+    """
+    centres = []
+    for stride, per_cell in ((8, 2), (16, 6)):
+        grid = DETECTOR_INPUT_SIDE // stride
+        ys, xs = np.mgrid[0:grid, 0:grid]
+        cells = np.stack([(xs + 0.5) / grid, (ys + 0.5) / grid], axis=-1)
+        centres.append(np.repeat(cells.reshape(-1, 2), per_cell, axis=0))
+    return np.concatenate(centres).astype(np.float32)
+
+
+ANCHORS = blazeface_anchors()
+
+
+def letterbox(image: np.ndarray, side: int) -> Tuple[np.ndarray, float, int, int]:
+    """
+    Fit ``image`` into a ``side`` x ``side`` square, centred with black bars.
+
+    Returns:
+        ``(square, scale, pad_x, pad_y)``; an input pixel ``(x, y)`` lands at
+        ``(x * scale + pad_x, y * scale + pad_y)``.
+    """
+    h, w = image.shape[:2]
+    scale = side / max(h, w)
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    resized = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    pad_x, pad_y = (side - size[0]) // 2, (side - size[1]) // 2
+    square = np.zeros((side, side, 3), dtype=image.dtype)
+    square[pad_y : pad_y + size[1], pad_x : pad_x + size[0]] = resized
+    return square, scale, pad_x, pad_y
+
+
+def decode_detections(
+    regressors: np.ndarray, logits: np.ndarray, min_score: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decode one image's raw BlazeFace outputs.
+
+    Args:
+        regressors: ``(896, 16)`` box centre offset, size and six keypoint
+            offsets per anchor, in input pixels.
+        logits: ``(896,)`` or ``(896, 1)`` face scores before the sigmoid.
+
+    Returns:
+        ``(boxes, keypoints, scores)`` of the anchors scoring at least
+        ``min_score``: boxes as normalised ``(x1, y1, x2, y2)``, keypoints as
+        ``(n, 6, 2)`` normalised ``(x, y)``.
+    """
+    scores = _sigmoid(logits.reshape(-1))
+    keep = scores >= min_score
+    raw = regressors.reshape(-1, 16)[keep] / DETECTOR_INPUT_SIDE
+    anchors = ANCHORS[keep]
+
+    centre = raw[:, :2] + anchors
+    half = raw[:, 2:4] / 2
+    boxes = np.concatenate([centre - half, centre + half], axis=1)
+    keypoints = raw[:, 4:].reshape(-1, 6, 2) + anchors[:, np.newaxis, :]
+    return boxes, keypoints, scores[keep]
+
+
+def _sigmoid(logits: np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-np.clip(logits, -100, 100)))
+
+
+def _iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def weighted_nms(
+    boxes: np.ndarray,
+    keypoints: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float = DETECTION_SUPPRESSION_IOU,
+) -> List[Tuple[np.ndarray, np.ndarray, float]]:
+    """
+    MediaPipe's weighted non-max suppression.
+
+    The best remaining detection absorbs every detection overlapping it by
+    more than ``iou_threshold``; the merged box and keypoints are their
+    score-weighted mean, and the score is the best one's.
+    """
+    faces = []
+    remaining = np.argsort(-scores, kind="stable")
+    while remaining.size:
+        merged = _iou(boxes[remaining[0]], boxes[remaining]) > iou_threshold
+        merged[0] = True
+        group = remaining[merged]
+        weights = scores[group] / scores[group].sum()
+        faces.append(
+            (
+                weights @ boxes[group],
+                np.tensordot(weights, keypoints[group], axes=1),
+                float(scores[remaining[0]]),
+            )
+        )
+        remaining = remaining[~merged]
+    return faces
+
+
+def create_session(path: str, intra_op_threads: int, inter_op_threads: int):
+    """ONNX Runtime CPU session for the model at ``path``."""
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise RuntimeError(
+            "ML_MODEL=onnx requires onnxruntime (pip install onnxruntime)"
+        ) from e
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL
+        if inter_op_threads > 1
+        else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(
+        path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+class OnnxBackend(InferenceBackend):
+    name = BACKEND_ONNX
+
+    def __init__(
+        self,
+        detector_path: str = DEFAULT_DETECTOR_PATH,
+        landmark_path: str = DEFAULT_LANDMARK_PATH,
+        intra_op_threads: int = 1,
+        inter_op_threads: int = 1,
+        max_batch: int = 16,
+        detector_session=None,
+        landmark_session=None,
+    ):
+        self.detector_path = detector_path
+        self.landmark_path = landmark_path
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.max_batch = max(1, max_batch)
+        # Sessions are created on first use; run() is safe to call from
+        # several worker threads at once
+        self._detector = detector_session
+        self._landmarker = landmark_session
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "OnnxBackend":
+        return cls(
+            detector_path=settings.ML_ORT_DETECTOR_PATH or DEFAULT_DETECTOR_PATH,
+            landmark_path=settings.ML_ORT_LANDMARK_PATH or DEFAULT_LANDMARK_PATH,
+            intra_op_threads=settings.ML_ORT_INTRA_OP_THREADS,
+            inter_op_threads=settings.ML_ORT_INTER_OP_THREADS,
+            max_batch=settings.ML_ORT_MAX_BATCH,
+        )
+
+    def load(self) -> None:
+        self._detector_session()
+        if settings.ML_LIVENESS_CHECK:
+            self._landmark_session()
+
+    def detect(self, images: List[np.ndarray]) -> List[List[FaceDetection]]:
+        if not images:
+            return []
+        squares, transforms = [], []
+        for image in images:
+            if image.ndim == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+            square, scale, pad_x, pad_y = letterbox(image, DETECTOR_INPUT_SIDE)
+            squares.append(square)
+            transforms.append((scale, pad_x, pad_y, image.shape[:2]))
+
+        batch = np.stack(squares).astype(np.float32) / 127.5 - 1
+        outputs = self._run(self._detector_session(), batch)
+        regressors, logits = sorted(outputs, key=lambda out: -out.shape[-1])
+
+        faces = []
+        for i, (scale, pad_x, pad_y, (h, w)) in enumerate(transforms):
+            boxes, keypoints, scores = decode_detections(
+                regressors[i], logits[i], MIN_DETECTION_CONFIDENCE
+            )
+            faces.append(
+                [
+                    self._to_image(box, points, score, scale, pad_x, pad_y, h, w)
+                    for box, points, score in weighted_nms(boxes, keypoints, scores)
+                ]
+            )
+        return faces
+
+    def landmarks(self, crops: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        if not crops:
+            return []
+        squares, transforms = [], []
+        for crop in crops:
+            h, w = crop.shape[:2]
+            pad_y, pad_x = int(h * LANDMARK_CROP_MARGIN), int(w * LANDMARK_CROP_MARGIN)
+            padded = cv2.copyMakeBorder(
+                crop, pad_y, pad_y, pad_x, pad_x, cv2.BORDER_REPLICATE
+            )
+            square, scale, sq_x, sq_y = letterbox(padded, LANDMARK_INPUT_SIDE)
+            squares.append(square)
+            transforms.append((scale, sq_x + pad_x * scale, sq_y + pad_y * scale, h, w))
+
+        batch = np.stack(squares).astype(np.float32) / 255.0
+        outputs = self._run(self._landmark_session(), batch)
+        points, presence = sorted(outputs, key=lambda out: -out.shape[-1])
+
+        meshes = []
+        for i, (scale, offset_x, offset_y, h, w) in enumerate(transforms):
+            if _sigmoid(presence[i][0]) < MIN_FACE_PRESENCE:
+                meshes.append(None)
+                continue
+            mesh = points[i].reshape(-1, 3).astype(np.float32)
+            # Input pixels -> crop pixels -> normalised like FaceMesh
+            x = (mesh[:, 0] - offset_x) / scale / w
+            y = (mesh[:, 1] - offset_y) / scale / h
+            z = mesh[:, 2] / scale / w
+            meshes.append(np.stack([x, y, z], axis=1))
+        return meshes
+
+    def close(self) -> None:
+        with self._lock:
+            self._detector = None
+            self._landmarker = None
+
+    def _detector_session(self):
+        if self._detector is None:
+            with self._lock:
+                if self._detector is None:
+                    self._detector = create_session(
+                        self.detector_path,
+                        self.intra_op_threads,
+                        self.inter_op_threads,
+                    )
+        return self._detector
+
+    def _landmark_session(self):
+        if self._landmarker is None:
+            with self._lock:
+                if self._landmarker is None:
+                    self._landmarker = create_session(
+                        self.landmark_path,
+                        self.intra_op_threads,
+                        self.inter_op_threads,
+                    )
+        return self._landmarker
+
+    def _run(self, session, batch: np.ndarray) -> List[np.ndarray]:
+        """Run ``batch`` (NHWC) through ``session``, in chunks the model takes.
+
+        Returns the model's outputs concatenated over the batch.
+        """
+        model_input = session.get_inputs()[0]
+        shape = model_input.shape
+        if len(shape) == 4 and shape[1] == 3:
+            batch = batch.transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch)
+
+        step = 1 if shape[0] == 1 else self.max_batch
+        chunks = [
+            session.run(None, {model_input.name: batch[start : start + step]})
+            for start in range(0, len(batch), step)
+        ]
+        return [
+            np.concatenate([chunk[i].reshape(len(chunk[i]), -1) for chunk in chunks])
+            for i in range(len(chunks[0]))
+        ]
+
+    @staticmethod
+    def _to_image(
+        box: np.ndarray,
+        points: np.ndarray,
+        score: float,
+        scale: float,
+        pad_x: int,
+        pad_y: int,
+        h: int,
+        w: int,
+    ) -> FaceDetection:
+        """Map a normalised detection on the letterbox back to image pixels."""
+        side = DETECTOR_INPUT_SIDE
+        x1, y1, x2, y2 = (box * side - [pad_x, pad_y, pad_x, pad_y]) / scale
+        keypoints = (points * side - [pad_x, pad_y]) / scale
+        return FaceDetection(
+            (
+                int(max(0, min(y1, h))),
+                int(max(0, min(x2, w))),
+                int(max(0, min(y2, h))),
+                int(max(0, min(x1, w))),
+            ),
+            [(float(x), float(y)) for x, y in keypoints],
+            score,
+        )
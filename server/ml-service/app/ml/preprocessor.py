@@ -0,0 +1,74 @@
+"""
+Downscale-before-detect preprocessing.
+
+BlazeFace short-range works on a 128x128 input internally, so running it on a
+full 4096x4096 photo only costs conversion and resizing time. Detection runs
+on a copy whose longest side is at most ``ML_DETECTION_MAX_SIDE`` and the
+boxes are mapped back to full resolution, so face crops for embedding and
+liveness still come from the original pixels.
+"""
+
+from typing import Callable, List, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+# (top, right, bottom, left), as returned by face_detector.detect_faces
+Box = Tuple[int, int, int, int]
+
+
+def downscale_for_detection(
+    image: np.ndarray, max_side: int
+) -> Tuple[np.ndarray, float]:
+    """
+    Shrink ``image`` so its longest side is at most ``max_side``.
+
+    Returns:
+        ``(image, scale)`` where ``scale`` is the downscaled size divided by
+        the original. Images that already fit (or ``max_side <= 0``) are
+        returned unchanged with scale 1.0.
+    """
+    h, w = image.shape[:2]
+    longest = max(h, w)
+    if max_side <= 0 or longest <= max_side:
+        return image, 1.0
+
+    scale = max_side / longest
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    # INTER_AREA averages source pixels, avoiding aliasing on large reductions
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def map_boxes_to_original(
+    boxes: List[Box], scale: float, shape: Tuple[int, ...]
+) -> List[Box]:
+    """Scale boxes found on a downscaled copy back to ``shape`` (h, w, ...)."""
+    if scale == 1.0:
+        return list(boxes)
+
+    h, w = shape[:2]
+    mapped = []
+    for top, right, bottom, left in boxes:
+        mapped.append(
+            (
+                max(0, min(h, int(np.floor(top / scale)))),
+                max(0, min(w, int(np.ceil(right / scale)))),
+                max(0, min(h, int(np.ceil(bottom / scale)))),
+                max(0, min(w, int(np.floor(left / scale)))),
+            )
+        )
+    return mapped
+
+
+def detect_on_downscaled(
+    image: np.ndarray,
+    detect: Callable[[np.ndarray], List[Box]],
+    max_side: int = None,
+) -> List[Box]:
+    """Run ``detect`` on a downscaled copy and return full-resolution boxes."""
+    if max_side is None:
+        max_side = settings.ML_DETECTION_MAX_SIDE
+    small, scale = downscale_for_detection(image, max_side)
+    return map_boxes_to_original(detect(small), scale, image.shape)
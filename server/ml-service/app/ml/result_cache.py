@@ -0,0 +1,159 @@
+"""
+Content-addressed cache of detection results.
+
+Teachers re-submit the same classroom photo when a mark request times out, and
+the backend's ML client retries on timeout, so identical images arrive within
+seconds of each other. Results are keyed by a hash of the image bytes (after
+base64 decoding, so JSON and binary uploads share entries) plus everything
+else the result depends on, and served from memory until they expire.
+"""
+
+import base64
+import binascii
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.metrics import (
+    RESULT_CACHE_BYTES,
+    RESULT_CACHE_ENTRIES,
+    RESULT_CACHE_EVICTIONS,
+    RESULT_CACHE_HIT_RATIO,
+    RESULT_CACHE_HITS,
+    RESULT_CACHE_MISSES,
+)
+
+
+def content_key(image: Union[str, bytes], *params: Any) -> Optional[str]:
+    """
+    Cache key for an image (base64 or raw bytes) and the parameters that
+    shape its result; None when the base64 is invalid.
+    """
+    if isinstance(image, str):
+        try:
+            image = base64.b64decode(image, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+    digest = hashlib.blake2b(image, digest_size=16)
+    digest.update(repr(params).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache with a TTL, bounded by the estimated memory of its values.
+
+    ``sizeof`` estimates a value's footprint in bytes. Expired entries are
+    dropped when looked up or when space is needed.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float,
+        sizeof: Callable[[Any], int],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sizeof = sizeof
+        self._clock = clock
+        # key -> (expires_at, nbytes, value)
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._lookups = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl_seconds > 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                self._remove(key)
+                RESULT_CACHE_EVICTIONS.labels(reason="expired").inc()
+                self._update_gauges()
+                entry = None
+
+            self._lookups += 1
+            if entry is None:
+                RESULT_CACHE_MISSES.inc()
+            else:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                RESULT_CACHE_HITS.inc()
+            RESULT_CACHE_HIT_RATIO.set(self._hits / self._lookups)
+            return None if entry is None else entry[2]
+
+    def put(self, key: str, value: Any) -> bool:
+        """Store a value; returns False if it does not fit in the budget."""
+        nbytes = self._sizeof(value)
+        if not self.enabled or nbytes > self.max_bytes:
+            return False
+
+        with self._lock:
+            self._remove(key)
+            self._evict_expired()
+            while self._entries and self._bytes + nbytes > self.max_bytes:
+                _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                RESULT_CACHE_EVICTIONS.labels(reason="capacity").inc()
+
+            self._entries[key] = (self._clock() + self.ttl_seconds, nbytes, value)
+            self._bytes += nbytes
+            self._update_gauges()
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._update_gauges()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_ratio": self._hits / self._lookups if self._lookups else 0.0,
+            }
+
+    def _evict_expired(self) -> None:
+        now = self._clock()
+        expired = [key for key, entry in self._entries.items() if entry[0] <= now]
+        for key in expired:
+            self._remove(key)
+            RESULT_CACHE_EVICTIONS.labels(reason="expired").inc()
+
+    def _remove(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[1]
+        return True
+
+    def _update_gauges(self) -> None:
+        RESULT_CACHE_BYTES.set(self._bytes)
+        RESULT_CACHE_ENTRIES.set(len(self._entries))
+
+
+def _detection_nbytes(result) -> int:
+    # Embeddings are Python float lists: ~32 bytes per element (float object
+    # plus list slot), plus a rough allowance per face for the rest
+    faces = result[0]
+    return 512 + sum(len(face.embedding) * 32 + 1024 for face in faces)
+
+
+# ``(faces, image_dimensions)`` of successful detections, see _detect_in_image
+detection_cache = ResultCache(
+    settings.ML_RESULT_CACHE_MAX_BYTES,
+    settings.ML_RESULT_CACHE_TTL,
+    sizeof=_detection_nbytes,
+)
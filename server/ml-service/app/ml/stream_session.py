@@ -0,0 +1,239 @@
+"""
+Video-stream attendance sessions.
+
+A session belongs to one phone streaming frames of a classroom. Frames are
+sampled adaptively: after a frame that took ``cost`` seconds to process, the
+next one is accepted no sooner than ``cost / ML_STREAM_CPU_BUDGET`` (and
+``1 / ML_STREAM_MAX_FPS``) later, and no sooner than
+``ML_STREAM_IDLE_INTERVAL`` while every visible face is already identified.
+Frames arriving in between are skipped before they are decoded, so the CPU a
+stream uses per second stays bounded however fast the client sends.
+
+Faces are tracked across sampled frames by ``FaceTracker``. Each track is
+embedded and matched only until it is identified, and its liveness is decided
+over a short burst of frames by ``TemporalLiveness``. Students recognised
+(and live) on any frame accumulate over the session.
+"""
+
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import STREAM_SESSIONS_ACTIVE
+from app.ml.face_matcher import FaceMatcher
+from app.ml.face_tracker import FaceTracker, Track
+from app.ml.preprocessor import Box
+from app.ml.temporal_liveness import TemporalLiveness
+
+
+class StreamLimitError(RuntimeError):
+    """Raised when opening a stream would exceed ``ML_STREAM_MAX_SESSIONS``."""
+
+
+class FrameSampler:
+    """Decides which frames of a stream are processed.
+
+    One frame is processed at a time; ``admit`` claims it and ``finish``
+    releases it and schedules the next sample from the time it took.
+    """
+
+    def __init__(
+        self,
+        max_fps: float,
+        cpu_budget: float,
+        idle_interval: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.cpu_budget = cpu_budget
+        self.idle_interval = idle_interval
+        self._clock = clock
+        self._next_at = 0.0
+        self._started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def admit(self) -> float:
+        """Claim the current frame.
+
+        Returns 0.0 if it should be processed, otherwise the seconds until a
+        frame will be accepted.
+        """
+        with self._lock:
+            now = self._clock()
+            if self._started is not None:
+                return self.min_interval
+            if now < self._next_at:
+                return self._next_at - now
+            self._started = now
+            return 0.0
+
+    def finish(self, idle: bool = False) -> float:
+        """Release the claimed frame; returns seconds until the next sample."""
+        with self._lock:
+            now = self._clock()
+            started = self._started if self._started is not None else now
+            self._started = None
+
+            interval = self.min_interval
+            if self.cpu_budget > 0:
+                interval = max(interval, (now - started) / self.cpu_budget)
+            if idle:
+                interval = max(interval, self.idle_interval)
+            self._next_at = started + interval
+            return max(0.0, self._next_at - now)
+
+
+class StreamSession:
+    """Tracker, sampler and recognised students of one video stream."""
+
+    def __init__(
+        self,
+        session_id: str,
+        gallery_id: str,
+        matcher: FaceMatcher,
+        confident_threshold: float,
+        min_face_area_ratio: float,
+        tracker: Optional[FaceTracker] = None,
+        sampler: Optional[FrameSampler] = None,
+        max_attempts: Optional[int] = None,
+        liveness_check: Optional[bool] = None,
+    ):
+        self.session_id = session_id
+        self.gallery_id = gallery_id
+        # Held for the whole stream, so a gallery evicted meanwhile still works
+        self.matcher = matcher
+        self.confident_threshold = confident_threshold
+        self.min_face_area_ratio = min_face_area_ratio
+        self.tracker = tracker or FaceTracker(
+            max_misses=settings.ML_STREAM_TRACK_MAX_MISSES
+        )
+        self.sampler = sampler or FrameSampler(
+            settings.ML_STREAM_MAX_FPS,
+            settings.ML_STREAM_CPU_BUDGET,
+            settings.ML_STREAM_IDLE_INTERVAL,
+        )
+        self.max_attempts = (
+            settings.ML_STREAM_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        )
+        self.liveness_check = (
+            settings.ML_LIVENESS_CHECK if liveness_check is None else liveness_check
+        )
+        self.frames_received = 0
+        self.frames_processed = 0
+        # student_id -> (distance, track_id, frame_index) of the best sighting
+        self.students: Dict[str, Tuple[float, int, int]] = {}
+
+    def track(self, boxes: List[Box]) -> List[Track]:
+        """Advance the tracker by one frame; returns the track of each box."""
+        tracks = self.tracker.update(boxes)
+        for track in tracks:
+            if track.live is None and not self.liveness_check:
+                track.live = True
+        return tracks
+
+    def needs_match(self, track: Track) -> bool:
+        return (
+            track.live is not False
+            and track.student_id is None
+            and track.attempts < self.max_attempts
+        )
+
+    def needs_liveness(self, track: Track) -> bool:
+        return track.live is None
+
+    def pending(self, tracks: List[Track]) -> List[Track]:
+        """Tracks that still need matching or a liveness decision."""
+        return [t for t in tracks if self.needs_match(t) or self.needs_liveness(t)]
+
+    def update_liveness(self, track: Track, landmarks, passed_checks: bool) -> None:
+        """Feed one frame of the track's face to its multi-frame liveness."""
+        if track.liveness is None:
+            track.liveness = TemporalLiveness()
+        track.live = track.liveness.update(landmarks, passed_checks)
+
+    def record(self, tracks: List[Track], frame_index: int) -> List[str]:
+        """Accumulate identified live tracks; returns students new to the session."""
+        new_students = []
+        for track in tracks:
+            if track.status != "present" or track.student_id is None:
+                continue
+            best = self.students.get(track.student_id)
+            if best is None:
+                new_students.append(track.student_id)
+            if best is None or track.distance < best[0]:
+                self.students[track.student_id] = (
+                    track.distance,
+                    track.track_id,
+                    best[2] if best else frame_index,
+                )
+        return new_students
+
+
+class StreamSessionStore:
+    """Open stream sessions; idle ones expire after ``idle_timeout`` seconds."""
+
+    def __init__(
+        self,
+        max_sessions: int,
+        idle_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        # session_id -> (last_seen, session)
+        self._sessions: Dict[str, Tuple[float, StreamSession]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def open(self, gallery_id: str, matcher: FaceMatcher, **options) -> StreamSession:
+        """
+        Start a session matching against ``matcher``.
+
+        Raises:
+            StreamLimitError: If ``max_sessions`` streams are already open.
+        """
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                raise StreamLimitError(
+                    f"At most {self.max_sessions} video streams may be open"
+                )
+            session = StreamSession(uuid.uuid4().hex, gallery_id, matcher, **options)
+            self._sessions[session.session_id] = (self._clock(), session)
+            STREAM_SESSIONS_ACTIVE.set(len(self._sessions))
+            return session
+
+    def get(self, session_id: str) -> Optional[StreamSession]:
+        """Look up a session and mark it as active."""
+        with self._lock:
+            self._expire()
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (self._clock(), entry[1])
+            return entry[1]
+
+    def close(self, session_id: str) -> Optional[StreamSession]:
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            STREAM_SESSIONS_ACTIVE.set(len(self._sessions))
+            return entry[1] if entry else None
+
+    def _expire(self) -> None:
+        cutoff = self._clock() - self.idle_timeout
+        expired = [sid for sid, (seen, _) in self._sessions.items() if seen < cutoff]
+        for session_id in expired:
+            del self._sessions[session_id]
+        STREAM_SESSIONS_ACTIVE.set(len(self._sessions))
+
+
+# Streams opened through /api/ml/streams
+stream_sessions = StreamSessionStore(
+    settings.ML_STREAM_MAX_SESSIONS, settings.ML_STREAM_IDLE_TIMEOUT
+)
@@ -0,0 +1,177 @@
+"""
+Multi-frame liveness for faces tracked across a video stream.
+
+A single crop can only be judged on texture and on whether a face mesh fits
+(see ``is_live``). On a stream each tracked face is seen on several frames,
+so a printed photo or a phone screen can be told apart from a person by what
+moves: blinks, via the eye aspect ratio (EAR), and head rotation.
+
+``TemporalLiveness`` holds the state of one track. Every analysed frame feeds
+it the FaceMesh landmarks already computed for the single-frame check, and the
+signals are updated incrementally (open-eye EAR baseline, blink state, pose
+range), so earlier frames are never processed again. It decides as soon as
+the evidence is sufficient:
+
+- live: a blink (EAR drops below ``LIVENESS_BLINK_CLOSED_RATIO`` of the
+  open-eye baseline, then reopens) or a head turn/nod of at least
+  ``LIVENESS_MOTION_THRESHOLD``
+- spoof: ``LIVENESS_MAX_SPOOF_FRAMES`` frames fail the single-frame checks
+- after ``LIVENESS_MAX_FRAMES`` frames without either, the single-frame
+  majority decides, or the face counts as a spoof when
+  ``LIVENESS_REQUIRE_MOTION`` is set
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+
+from app.core.metrics import LIVENESS_FRAMES_PER_DECISION
+
+# EAR drop (fraction of the open-eye baseline) that counts as closed eyes
+LIVENESS_BLINK_CLOSED_RATIO = float(os.getenv("LIVENESS_BLINK_CLOSED_RATIO", "0.7"))
+# Change in the yaw/pitch ratios that counts as head motion
+LIVENESS_MOTION_THRESHOLD = float(os.getenv("LIVENESS_MOTION_THRESHOLD", "0.08"))
+# Frames analysed per face before falling back to the single-frame verdict
+LIVENESS_MAX_FRAMES = int(os.getenv("LIVENESS_MAX_FRAMES", "6"))
+LIVENESS_MAX_SPOOF_FRAMES = int(os.getenv("LIVENESS_MAX_SPOOF_FRAMES", "2"))
+# Treat faces that neither blink nor move within LIVENESS_MAX_FRAMES as spoofs
+LIVENESS_REQUIRE_MOTION = (
+    os.getenv("LIVENESS_REQUIRE_MOTION", "false").lower() == "true"
+)
+
+# FaceMesh landmark indices: eye contours as (p1..p6) for the EAR, the outer
+# eye corners, nose tip and chin for the pose ratios
+RIGHT_EYE = (33, 160, 158, 133, 153, 144)
+LEFT_EYE = (362, 385, 387, 263, 373, 380)
+NOSE_TIP = 1
+CHIN = 152
+RIGHT_EYE_OUTER = 33
+LEFT_EYE_OUTER = 263
+MESH_POINTS = 468
+
+
+def eye_aspect_ratio(landmarks: np.ndarray, eye=RIGHT_EYE) -> float:
+    """(|p2-p6| + |p3-p5|) / (2 |p1-p4|) of one eye; near 0 when closed."""
+    p1, p2, p3, p4, p5, p6 = (landmarks[i, :2] for i in eye)
+    width = np.linalg.norm(p1 - p4)
+    if width == 0:
+        return 0.0
+    return float((np.linalg.norm(p2 - p6) + np.linalg.norm(p3 - p5)) / (2.0 * width))
+
+
+def head_pose_ratios(landmarks: np.ndarray) -> np.ndarray:
+    """
+    ``[yaw, pitch]`` proxies: where the nose tip sits between the outer eye
+    corners, and between the eye line and the chin.
+
+    Both are ratios along the face, so moving or scaling a flat photo leaves
+    them unchanged while turning or nodding a real head shifts them.
+    """
+    right = landmarks[RIGHT_EYE_OUTER, :2]
+    left = landmarks[LEFT_EYE_OUTER, :2]
+    nose = landmarks[NOSE_TIP, :2]
+    chin = landmarks[CHIN, :2]
+
+    eye_axis = left - right
+    eye_span = float(eye_axis @ eye_axis)
+    eye_mid = (left + right) / 2
+    down = chin - eye_mid
+    face_len = float(down @ down)
+    if eye_span == 0 or face_len == 0:
+        return np.zeros(2)
+    return np.array(
+        [(nose - right) @ eye_axis / eye_span, (nose - eye_mid) @ down / face_len]
+    )
+
+
+class TemporalLiveness:
+    """Incremental blink/motion liveness state of one tracked face."""
+
+    def __init__(
+        self,
+        closed_ratio: float = LIVENESS_BLINK_CLOSED_RATIO,
+        motion_threshold: float = LIVENESS_MOTION_THRESHOLD,
+        max_frames: int = LIVENESS_MAX_FRAMES,
+        max_spoof_frames: int = LIVENESS_MAX_SPOOF_FRAMES,
+        require_motion: bool = LIVENESS_REQUIRE_MOTION,
+    ):
+        self.closed_ratio = closed_ratio
+        self.motion_threshold = motion_threshold
+        self.max_frames = max_frames
+        self.max_spoof_frames = max_spoof_frames
+        self.require_motion = require_motion
+
+        self.frames = 0
+        self.failed_frames = 0
+        self.decision: Optional[bool] = None
+        self.reason: Optional[str] = None
+        self._open_ear = 0.0
+        self._eyes_closed = False
+        self._pose_min: Optional[np.ndarray] = None
+        self._pose_max: Optional[np.ndarray] = None
+
+    def update(
+        self, landmarks: Optional[np.ndarray], passed_checks: bool
+    ) -> Optional[bool]:
+        """
+        Add one frame of the face.
+
+        Args:
+            landmarks: FaceMesh landmarks in pixels ``(n, 2+)``, or None when
+                no mesh was fitted.
+            passed_checks: The single-frame verdict for the same crop.
+
+        Returns:
+            True (live) or False (spoof) once decided, otherwise None.
+        """
+        if self.decision is not None:
+            return self.decision
+
+        self.frames += 1
+        if not passed_checks:
+            self.failed_frames += 1
+            if self.failed_frames >= self.max_spoof_frames:
+                return self._decide(False, "checks")
+        elif landmarks is not None and len(landmarks) >= MESH_POINTS:
+            if self._blinked(landmarks):
+                return self._decide(True, "blink")
+            if self._moved(landmarks):
+                return self._decide(True, "motion")
+
+        if self.frames >= self.max_frames:
+            if self.require_motion:
+                return self._decide(False, "static")
+            passed = self.frames - self.failed_frames
+            return self._decide(passed > self.failed_frames, "single-frame")
+        return None
+
+    def _blinked(self, landmarks: np.ndarray) -> bool:
+        ear = (
+            eye_aspect_ratio(landmarks, RIGHT_EYE)
+            + eye_aspect_ratio(landmarks, LEFT_EYE)
+        ) / 2
+        if ear < self.closed_ratio * self._open_ear:
+            self._eyes_closed = True
+            return False
+        reopened = self._eyes_closed
+        self._eyes_closed = False
+        self._open_ear = max(self._open_ear, ear)
+        return reopened
+
+    def _moved(self, landmarks: np.ndarray) -> bool:
+        pose = head_pose_ratios(landmarks)
+        if self._pose_min is None:
+            self._pose_min = self._pose_max = pose
+            return False
+        self._pose_min = np.minimum(self._pose_min, pose)
+        self._pose_max = np.maximum(self._pose_max, pose)
+        return bool(np.max(self._pose_max - self._pose_min) >= self.motion_threshold)
+
+    def _decide(self, live: bool, reason: str) -> bool:
+        self.decision = live
+        self.reason = reason
+        LIVENESS_FRAMES_PER_DECISION.labels(
+            decision="live" if live else "spoof"
+        ).observe(self.frames)
+        return live
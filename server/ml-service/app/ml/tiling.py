@@ -0,0 +1,177 @@
+"""
+Tiled face detection for large group photos.
+
+BlazeFace short-range sees every input at 128x128, so in a 4000px
+lecture-hall photo downscaled for detection the back rows shrink to a few
+pixels and are missed. Tiled detection also runs the detector on
+overlapping full-resolution tiles of ``ML_DETECTION_TILE_SIDE`` pixels, where
+those faces are large enough to find, and merges everything with
+non-max suppression.
+
+The tiles overlap by ``ML_DETECTION_TILE_OVERLAP`` of their side, so a face
+smaller than the overlap lies whole in at least one tile. Larger faces that a
+tile edge cuts are still found whole by the downscaled pass over the full
+image, which runs alongside the tiles.
+"""
+
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.ml.inference import FaceDetection
+
+# DetectFacesRequest.model value selecting tiled detection
+DETECTION_MODEL_TILED = "tiled"
+
+# (top, left, bottom, right) of a tile in image pixels
+Tile = Tuple[int, int, int, int]
+
+# Detections overlapping the kept one by more than this IoU are duplicates
+TILE_MERGE_IOU = 0.3
+# A detection covering at least this share of a smaller one (or covered by a
+# larger one) is the same face; catches a face cut by a tile edge, whose
+# partial box has a low IoU with the whole one
+TILE_MERGE_CONTAINMENT = 0.6
+
+
+def tile_grid(height: int, width: int, side: int, overlap: float) -> List[Tile]:
+    """
+    Overlapping ``side`` x ``side`` tiles covering the image.
+
+    Consecutive tiles are ``side * (1 - overlap)`` apart and the last tile of
+    each row and column is flush with the image edge. An image that fits in
+    one tile (or ``side <= 0``) is a single tile.
+    """
+    if side <= 0 or max(height, width) <= side:
+        return [(0, 0, height, width)]
+
+    stride = max(1, int(side * (1 - overlap)))
+
+    def starts(length: int) -> List[int]:
+        if length <= side:
+            return [0]
+        return list(range(0, length - side, stride)) + [length - side]
+
+    return [
+        (top, left, min(height, top + side), min(width, left + side))
+        for top in starts(height)
+        for left in starts(width)
+    ]
+
+
+def merge_detections(
+    faces: Sequence[FaceDetection],
+    iou_threshold: float = TILE_MERGE_IOU,
+    containment: float = TILE_MERGE_CONTAINMENT,
+) -> List[FaceDetection]:
+    """
+    Non-max suppression across tiles.
+
+    The best-scoring remaining face takes every face overlapping it by more
+    than ``iou_threshold`` IoU or ``containment`` of the smaller box. The
+    group is reported with the largest box in it, so a face cut by a tile
+    edge keeps the whole box another tile found, and the best score.
+    """
+    if not faces:
+        return []
+
+    boxes = np.array([face.box for face in faces], dtype=np.float64)
+    top, right, bottom, left = boxes.T
+    areas = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    scores = np.array([face.score for face in faces])
+
+    merged = []
+    # Ties on score go to the larger box
+    remaining = np.lexsort((-areas, -scores))
+    while remaining.size:
+        best = remaining[0]
+        inter = np.clip(
+            np.minimum(right[best], right[remaining])
+            - np.maximum(left[best], left[remaining]),
+            0,
+            None,
+        ) * np.clip(
+            np.minimum(bottom[best], bottom[remaining])
+            - np.maximum(top[best], top[remaining]),
+            0,
+            None,
+        )
+        union = areas[best] + areas[remaining] - inter
+        smaller = np.minimum(areas[best], areas[remaining])
+        same = (inter > iou_threshold * np.maximum(union, 1e-9)) | (
+            inter > containment * np.maximum(smaller, 1e-9)
+        )
+        same[0] = True
+        group = remaining[same]
+        largest = faces[group[np.argmax(areas[group])]]
+        merged.append(
+            FaceDetection(largest.box, largest.keypoints, float(scores[best]))
+        )
+        remaining = remaining[~same]
+    return merged
+
+
+def detect_tiled(
+    image: np.ndarray,
+    detect: Callable[[List[np.ndarray]], List[List[FaceDetection]]],
+    side: int,
+    overlap: float,
+    overview: Tuple[np.ndarray, float] = None,
+    chunks: int = 1,
+    map_fn: Callable = None,
+) -> List[FaceDetection]:
+    """
+    Faces in ``image`` from overlapping tiles, merged across tiles.
+
+    Args:
+        image: Full-resolution RGB image.
+        detect: Batched detector, e.g. ``InferenceBackend.detect``.
+        side: Tile side in image pixels.
+        overlap: Share of ``side`` overlapping the neighbouring tile.
+        overview: Optional ``(image, scale)`` downscaled copy detected along
+            with the tiles, so faces larger than the overlap are found whole.
+        chunks: Number of detector calls the tiles are split into.
+        map_fn: ``map``-like callable the calls are run through, e.g. one
+            spreading them over worker threads. Default: in turn.
+
+    Returns:
+        Detections in image pixels, boxes clipped to the image.
+    """
+    h, w = image.shape[:2]
+    # Each input: (view, top, left, scale) of a tile or the overview
+    inputs = [
+        (image[top:bottom, left:right], top, left, 1.0)
+        for top, left, bottom, right in tile_grid(h, w, side, overlap)
+    ]
+    chunks = max(1, min(chunks, len(inputs)))
+    calls = [inputs[i::chunks] for i in range(chunks)]
+    if overview is not None:
+        small, scale = overview
+        calls.append([(small, 0, 0, scale)])
+
+    def run(call):
+        # Tiles are views; the copies happen on whichever thread runs the call
+        pixels = [np.ascontiguousarray(view) for view, *_ in call]
+        return list(zip(call, detect(pixels)))
+
+    found = []
+    for results in (map_fn or map)(run, calls):
+        for (_, top, left, scale), faces in results:
+            found.extend(_to_image(face, top, left, scale, h, w) for face in faces)
+    return merge_detections(found)
+
+
+def _to_image(
+    face: FaceDetection, top: int, left: int, scale: float, h: int, w: int
+) -> FaceDetection:
+    """``face`` from a tile at ``(top, left)`` or a copy at ``scale``, in image
+    pixels."""
+    y1, x2, y2, x1 = face.box
+    box = (
+        max(0, min(h, int(np.floor(y1 / scale)) + top)),
+        max(0, min(w, int(np.ceil(x2 / scale)) + left)),
+        max(0, min(h, int(np.ceil(y2 / scale)) + top)),
+        max(0, min(w, int(np.floor(x1 / scale)) + left)),
+    )
+    keypoints = [(x / scale + left, y / scale + top) for x, y in face.keypoints]
+    return FaceDetection(box, keypoints, face.score)
@@ -0,0 +1,102 @@
+"""
+Model warm-up and readiness at service startup.
+
+The inference backend's models are created lazily (for MediaPipe, a detector
+per worker thread and FaceMesh instances on first checkout), and each graph
+pays extra initialisation on its first inference. Left alone, the first
+classroom photo after a deploy or a scale-out pays several seconds of cold
+start. The lifespan hook runs ``warm_up_models`` instead: every worker loads
+its models and runs one synthetic inference, and only then is the service
+marked ready. ``/health`` answers 503 until that point, so load balancers
+route to warm instances only.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.executor import EXECUTOR_PROCESS, MLExecutor
+from app.core.metrics import MODEL_WARMUP_SECONDS, MODELS_LOADED
+from app.ml.face_detector import detect_faces
+from app.ml.face_encoder import get_face_embedding
+from app.ml.inference import get_backend
+
+logger = logging.getLogger(__name__)
+
+# Seconds a worker waits for the others to pick up their warm-up job
+WARMUP_BARRIER_TIMEOUT = 60.0
+
+
+class ModelReadiness:
+    """Whether the models are loaded and warm, as reported by ``/health``."""
+
+    def __init__(self):
+        self.models_loaded = False
+        self.warmup_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def mark_loaded(self, seconds: float) -> None:
+        self.models_loaded = True
+        self.warmup_seconds = seconds
+        self.error = None
+        MODELS_LOADED.set(1)
+        MODEL_WARMUP_SECONDS.set(seconds)
+
+    def mark_failed(self, error: str) -> None:
+        self.models_loaded = False
+        self.error = error
+        MODELS_LOADED.set(0)
+
+    def reset(self) -> None:
+        self.models_loaded = False
+        self.warmup_seconds = None
+        self.error = None
+        MODELS_LOADED.set(0)
+
+
+model_readiness = ModelReadiness()
+
+
+def warm_up_worker(barrier: Optional[threading.Barrier] = None) -> None:
+    """Load this worker's models and run one synthetic inference on each.
+
+    Thread workers first meet at ``barrier``, so each pool thread runs exactly
+    one warm-up job and creates its own detector.
+    """
+    if barrier is not None:
+        barrier.wait(timeout=WARMUP_BARRIER_TIMEOUT)
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (256, 256, 3), dtype=np.uint8)
+    detect_faces(image)
+    get_face_embedding(image[:128, :128])
+    if settings.ML_LIVENESS_CHECK:
+        get_backend().landmarks([image])
+
+
+async def warm_up_models(executor: MLExecutor) -> float:
+    """
+    Warm every worker of ``executor``; returns the seconds it took.
+
+    Raises whatever loading a model raised (e.g. a missing model file).
+    """
+    start = time.perf_counter()
+    barrier = threading.Barrier(executor.workers)
+    await asyncio.gather(
+        *(
+            executor.run_in_thread(warm_up_worker, barrier)
+            for _ in range(executor.workers)
+        )
+    )
+    if executor.kind == EXECUTOR_PROCESS:
+        # Worker processes load their models in the pool initializer; one job
+        # each starts them now and runs the first inference
+        await asyncio.gather(
+            *(executor.run(warm_up_worker) for _ in range(executor.workers))
+        )
+    return time.perf_counter() - start
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import List
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+
+from app.utils.embedding_codec import EmbeddingValue
 
 
 class EncodeFaceRequest(BaseModel):
@@ -17,32 +19,83 @@ class EncodeFaceRequest(BaseModel):
     )
 
 
-class DetectFacesRequest(BaseModel):
-    """Request to detect multiple faces from an image"""
+class BatchImage(BaseModel):
+    """One image in a batch encode request"""
 
+    image_id: Optional[str] = Field(
+        default=None, description="Caller reference echoed back with the result"
+    )
     image_base64: str = Field(..., description="Base64 encoded image string")
+
+
+class EncodeFacesBatchOptions(BaseModel):
+    """Options applied to every image of a batch encode request"""
+
+    validate_single: bool = Field(
+        default=True, description="Validate that exactly one face exists"
+    )
+    min_face_area_ratio: float = Field(
+        default=0.05, description="Minimum face area ratio"
+    )
+    num_jitters: int = Field(
+        default=5, description="Number of times to re-sample face for encoding"
+    )
+
+
+class EncodeFacesBatchRequest(EncodeFacesBatchOptions):
+    """Request to encode one face from each of many images"""
+
+    images: List[BatchImage] = Field(..., description="Images to encode")
+
+
+class DetectFacesOptions(BaseModel):
+    """Detection options; query parameters of the binary upload route"""
+
     min_face_area_ratio: float = Field(
         default=0.01, description="Minimum face area ratio"
     )
     num_jitters: int = Field(
         default=3, description="Number of times to re-sample face for encoding"
     )
-    model: str = Field(default="hog", description="Detection model: hog or cnn")
+    model: str = Field(
+        default="hog",
+        description=(
+            "Detection mode: 'tiled' also detects on overlapping full-resolution "
+            "tiles, for small faces in large group photos; other values (hog, cnn) "
+            "detect on the downscaled photo only"
+        ),
+    )
+
+
+class DetectFacesRequest(DetectFacesOptions):
+    """Request to detect multiple faces from an image"""
+
+    image_base64: str = Field(..., description="Base64 encoded image string")
 
 
 class CandidateEmbedding(BaseModel):
     """Candidate student embeddings for matching"""
 
     student_id: str = Field(..., description="Student ID")
-    embeddings: List[List[float]] = Field(
+    embeddings: List[EmbeddingValue] = Field(
         ..., description="List of face embeddings for this student"
     )
+    embedding_version: Optional[str] = Field(
+        default=None, description="Format of these embeddings (default: raw)"
+    )
+    template: Optional[EmbeddingValue] = Field(
+        default=None,
+        description="Mean template of the student (default: mean of embeddings)",
+    )
 
 
 class MatchFacesRequest(BaseModel):
     """Request to match a single face embedding against candidates"""
 
-    query_embedding: List[float] = Field(..., description="Face embedding to match")
+    query_embedding: EmbeddingValue = Field(..., description="Face embedding to match")
+    query_embedding_version: Optional[str] = Field(
+        default=None, description="Format of the query embedding (default: raw)"
+    )
     candidate_embeddings: List[CandidateEmbedding] = Field(
         ..., description="Candidate students with embeddings"
     )
@@ -55,7 +108,10 @@ class MatchFacesRequest(BaseModel):
 class DetectedFace(BaseModel):
     """A detected face with embedding"""
 
-    embedding: List[float] = Field(..., description="Face embedding")
+    embedding: EmbeddingValue = Field(..., description="Face embedding")
+    embedding_version: Optional[str] = Field(
+        default=None, description="Format of the embedding (default: raw)"
+    )
     is_live: bool = Field(
         default=True, description="Whether the face was detected as live"
     )
@@ -67,8 +123,39 @@ class BatchMatchRequest(BaseModel):
     detected_faces: List[DetectedFace] = Field(
         ..., description="List of detected faces to match"
     )
-    candidate_embeddings: List[CandidateEmbedding] = Field(
-        ..., description="Candidate students with embeddings"
+    candidate_embeddings: Optional[List[CandidateEmbedding]] = Field(
+        default=None, description="Candidate students with embeddings"
+    )
+    gallery_id: Optional[str] = Field(
+        default=None,
+        description="Cached gallery to match against instead of candidate_embeddings",
+    )
+    gallery_version: Optional[str] = Field(
+        default=None, description="Expected gallery version (e.g. roster hash)"
+    )
+    confident_threshold: float = Field(
+        default=0.50, description="Threshold for confident match"
+    )
+    uncertain_threshold: float = Field(
+        default=0.60, description="Threshold for uncertain match"
+    )
+
+    @model_validator(mode="after")
+    def validate_candidates_source(self) -> "BatchMatchRequest":
+        if self.candidate_embeddings is None and self.gallery_id is None:
+            raise ValueError("Either candidate_embeddings or gallery_id is required")
+        return self
+
+
+class RecognizeOptions(DetectFacesOptions):
+    """Detection and matching options shared by the recognize routes"""
+
+    gallery_id: Optional[str] = Field(
+        default=None,
+        description="Cached gallery to match against instead of candidate_embeddings",
+    )
+    gallery_version: Optional[str] = Field(
+        default=None, description="Expected gallery version (e.g. roster hash)"
     )
     confident_threshold: float = Field(
         default=0.50, description="Threshold for confident match"
@@ -76,3 +163,98 @@ class BatchMatchRequest(BaseModel):
     uncertain_threshold: float = Field(
         default=0.60, description="Threshold for uncertain match"
     )
+    return_embeddings: bool = Field(
+        default=False, description="Include face embeddings in the response"
+    )
+
+
+class RecognizeRequest(RecognizeOptions):
+    """Request to detect and match faces in one call"""
+
+    image_base64: str = Field(..., description="Base64 encoded image string")
+    candidate_embeddings: Optional[List[CandidateEmbedding]] = Field(
+        default=None, description="Candidate students with embeddings"
+    )
+
+    @model_validator(mode="after")
+    def validate_candidates_source(self) -> "RecognizeRequest":
+        if self.candidate_embeddings is None and self.gallery_id is None:
+            raise ValueError("Either candidate_embeddings or gallery_id is required")
+        return self
+
+
+class RecognizeUploadOptions(RecognizeOptions):
+    """Query parameters of the binary recognize route (gallery matching only)"""
+
+    gallery_id: str = Field(..., description="Cached gallery to match against")
+
+
+class UpsertGalleryRequest(BaseModel):
+    """Request to create or replace a cached roster gallery"""
+
+    version: str = Field(..., description="Gallery version (e.g. roster hash)")
+    candidate_embeddings: List[CandidateEmbedding] = Field(
+        ..., description="Candidate students with embeddings"
+    )
+
+
+class IndexStudentsRequest(BaseModel):
+    """Add students to the institution-wide search index"""
+
+    candidate_embeddings: List[CandidateEmbedding] = Field(
+        ..., description="Students with embeddings to index"
+    )
+    replace: bool = Field(
+        default=True, description="Drop each student's indexed embeddings first"
+    )
+
+
+class TrainIndexRequest(BaseModel):
+    """Request to (re)partition the search index"""
+
+    nlist: Optional[int] = Field(
+        default=None, ge=1, description="Number of IVF cells (default sqrt(size))"
+    )
+
+
+class SearchFacesRequest(BaseModel):
+    """Request to search the institution-wide index for the closest students"""
+
+    query_embeddings: List[EmbeddingValue] = Field(
+        ..., description="Face embeddings to identify"
+    )
+    embedding_version: Optional[str] = Field(
+        default=None, description="Format of the query embeddings (default: raw)"
+    )
+    top_k: int = Field(default=5, ge=1, le=100, description="Students per query")
+    nprobe: Optional[int] = Field(
+        default=None, ge=1, description="IVF cells to scan (default ML_ANN_NPROBE)"
+    )
+    threshold: float = Field(
+        default=0.0, description="Minimum cosine similarity for a result"
+    )
+
+
+class ConvertEmbeddingsRequest(BaseModel):
+    """Request to re-encode stored embeddings into the active format"""
+
+    embeddings: List[EmbeddingValue] = Field(..., description="Embeddings to convert")
+    embedding_version: Optional[str] = Field(
+        default=None, description="Current format of the embeddings (default: raw)"
+    )
+
+
+class StartStreamRequest(BaseModel):
+    """Request to open a video-stream attendance session"""
+
+    gallery_id: str = Field(..., description="Cached gallery to match against")
+    gallery_version: Optional[str] = Field(
+        default=None, description="Expected gallery version (e.g. roster hash)"
+    )
+    confident_threshold: float = Field(
+        default=0.50, description="Threshold for confident match"
+    )
+    min_face_area_ratio: float = Field(
+        default=0.002,
+        description="Minimum face area ratio (faces are small in room-wide frames)",
+    )
@@ -1,6 +1,8 @@
 from pydantic import BaseModel
 from typing import Optional, List
 
+from app.utils.embedding_codec import EmbeddingValue
+
 
 class FaceLocation(BaseModel):
     """Face location in image"""
@@ -11,31 +13,50 @@ class FaceLocation(BaseModel):
     left: int
 
 
+class FaceQuality(BaseModel):
+    """Enrollment quality of a face crop; every score is in [0, 1]"""
+
+    score: float
+    sharpness: float
+    face_size: float
+    pose: Optional[float] = None  # None when keypoints were unavailable
+
+
 class EncodeFaceMetadata(BaseModel):
     """Metadata for face encoding"""
 
     face_area_ratio: float
     image_dimensions: List[int]
+    quality: Optional[FaceQuality] = None
 
 
 class EncodeFaceResponse(BaseModel):
     """Response from encode face endpoint"""
 
     success: bool
-    embedding: Optional[List[float]] = None
+    embedding: Optional[EmbeddingValue] = None
+    embedding_version: Optional[str] = None
     face_location: Optional[FaceLocation] = None
     metadata: Optional[EncodeFaceMetadata] = None
     error: Optional[str] = None
     error_code: Optional[str] = None
 
 
+class EncodeFaceBatchItem(EncodeFaceResponse):
+    """One NDJSON line streamed from the batch encode endpoint"""
+
+    index: int
+    image_id: Optional[str] = None
+
+
 class DetectedFaceInfo(BaseModel):
     """Information about a detected face"""
 
-    embedding: List[float]
+    embedding: EmbeddingValue
     location: FaceLocation
     face_area_ratio: float
     is_live: bool = True
+    embedding_version: Optional[str] = None
 
 
 class DetectFacesMetadata(BaseModel):
@@ -53,6 +74,28 @@ class DetectFacesResponse(BaseModel):
     count: int = 0
     metadata: Optional[DetectFacesMetadata] = None
     error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class ProfileStage(BaseModel):
+    """Latency and allocations of one pipeline stage"""
+
+    name: str
+    calls: int
+    total_ms: float
+    peak_bytes: int
+    retained_bytes: int
+
+
+class ProfileDetectFacesResponse(BaseModel):
+    """Response from the detection profile endpoint"""
+
+    success: bool
+    stages: List[ProfileStage] = []
+    count: int = 0
+    metadata: Optional[DetectFacesMetadata] = None
+    error: Optional[str] = None
+    error_code: Optional[str] = None
 
 
 class MatchResult(BaseModel):
@@ -88,6 +131,8 @@ class BatchMatchResult(BaseModel):
     distance: float
     status: str  # "present", "unknown", "spoof"
     liveness: bool = True
+    # Another face in the photo competed for the same student
+    uncertain: bool = False
 
 
 class BatchMatchResponse(BaseModel):
@@ -96,6 +141,54 @@ class BatchMatchResponse(BaseModel):
     success: bool
     matches: List[BatchMatchResult] = []
     error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class RecognizedFace(BaseModel):
+    """A detected face together with its match"""
+
+    face_index: int
+    location: FaceLocation
+    face_area_ratio: float
+    is_live: bool = True
+    student_id: Optional[str] = None
+    distance: Optional[float] = None
+    status: Optional[str] = None  # "present", "unknown", "spoof"
+    uncertain: bool = False
+    embedding: Optional[EmbeddingValue] = None
+    embedding_version: Optional[str] = None
+
+
+class RecognizeResponse(BaseModel):
+    """Response from recognize endpoint"""
+
+    success: bool
+    faces: List[RecognizedFace] = []
+    count: int = 0
+    metadata: Optional[DetectFacesMetadata] = None
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class GalleryResponse(BaseModel):
+    """Response from gallery upsert/lookup endpoints"""
+
+    success: bool
+    gallery_id: str
+    version: Optional[str] = None
+    num_students: int = 0
+    num_embeddings: int = 0
+    size_bytes: int = 0
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class InvalidateGalleryResponse(BaseModel):
+    """Response from gallery invalidation endpoint"""
+
+    success: bool
+    gallery_id: str
+    removed: bool
 
 
 class HealthResponse(BaseModel):
@@ -106,3 +199,103 @@ class HealthResponse(BaseModel):
     version: str
     models_loaded: bool
     uptime_seconds: float
+
+
+class IndexResponse(BaseModel):
+    """State of the institution-wide search index"""
+
+    success: bool
+    size: int = 0
+    num_students: int = 0
+    trained: bool = False
+    nlist: int = 0
+    size_bytes: int = 0
+    removed: Optional[int] = None
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class SearchHit(BaseModel):
+    """One candidate student for a searched face"""
+
+    student_id: str
+    similarity: float
+    distance: float
+
+
+class SearchResult(BaseModel):
+    """Closest students for one query embedding"""
+
+    query_index: int
+    matches: List[SearchHit]
+
+
+class SearchFacesResponse(BaseModel):
+    """Response from the face search endpoint"""
+
+    success: bool
+    results: List[SearchResult] = []
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class ConvertEmbeddingsResponse(BaseModel):
+    """Embeddings re-encoded into the active format"""
+
+    success: bool
+    embeddings: List[EmbeddingValue] = []
+    embedding_version: Optional[str] = None
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class StreamTrack(BaseModel):
+    """A face tracked on the current frame of a video stream"""
+
+    track_id: int
+    location: FaceLocation
+    student_id: Optional[str] = None
+    distance: Optional[float] = None
+    # "present", "unknown", "spoof", or "pending" while liveness is undecided;
+    # None until matched
+    status: Optional[str] = None
+
+
+class StreamStudent(BaseModel):
+    """A student recognised during a video stream"""
+
+    student_id: str
+    distance: float
+    track_id: int
+    first_seen_frame: int
+
+
+class StreamFrameResponse(BaseModel):
+    """Result of sending one frame to a video stream"""
+
+    success: bool
+    session_id: str
+    frame_index: int = 0
+    processed: bool = False
+    # Frames sent before this many milliseconds have passed are skipped
+    retry_after_ms: int = 0
+    tracks: List[StreamTrack] = []
+    new_students: List[StreamStudent] = []
+    embedded: int = 0
+    processing_time_ms: Optional[float] = None
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class StreamSessionResponse(BaseModel):
+    """State of a video stream and the students recognised so far"""
+
+    success: bool
+    session_id: Optional[str] = None
+    gallery_id: Optional[str] = None
+    frames_received: int = 0
+    frames_processed: int = 0
+    tracks_seen: int = 0
+    students: List[StreamStudent] = []
+    error: Optional[str] = None
+    error_code: Optional[str] = None
@@ -0,0 +1,99 @@
+"""Embedding wire formats negotiated via the X-Embedding-Encoding header"""
+
+import base64
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+from fastapi import Header, HTTPException
+from starlette.status import HTTP_400_BAD_REQUEST
+
+EMBEDDING_ENCODING_HEADER = "X-Embedding-Encoding"
+
+ENCODING_JSON = "json"  # List[float], the original format
+ENCODING_BASE64_F32 = "base64-f32"  # base64 of little-endian float32
+ENCODING_BASE64_F16 = "base64-f16"  # base64 of little-endian float16
+ENCODING_BASE64_I8 = "base64-i8"  # base64 of int8, scaled to max |value| = 127
+
+_PACKED_DTYPES = {
+    ENCODING_BASE64_F32: np.dtype("<f4"),
+    ENCODING_BASE64_F16: np.dtype("<f2"),
+    ENCODING_BASE64_I8: np.dtype("i1"),
+}
+
+SUPPORTED_ENCODINGS = {ENCODING_JSON, *_PACKED_DTYPES}
+
+# A single embedding on the wire: a float list, or a packed base64 string
+EmbeddingValue = Union[List[float], str]
+
+
+async def get_embedding_encoding(
+    x_embedding_encoding: Optional[str] = Header(default=None),
+) -> str:
+    """Resolve the negotiated embedding encoding; clients without it get JSON."""
+    encoding = (x_embedding_encoding or ENCODING_JSON).lower()
+    if encoding not in SUPPORTED_ENCODINGS:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Unsupported {EMBEDDING_ENCODING_HEADER} '{x_embedding_encoding}'. "
+                f"Supported: {', '.join(sorted(SUPPORTED_ENCODINGS))}"
+            ),
+        )
+    return encoding
+
+
+def encode_embedding(
+    embedding: Union[Sequence[float], np.ndarray], encoding: str
+) -> EmbeddingValue:
+    """Encode one embedding for the response in the negotiated format."""
+    if encoding == ENCODING_JSON:
+        if isinstance(embedding, np.ndarray):
+            return embedding.tolist()
+        return list(embedding)
+    if encoding == ENCODING_BASE64_I8:
+        packed = quantize_int8(embedding).tobytes()
+    else:
+        packed = np.asarray(embedding, dtype=_PACKED_DTYPES[encoding]).tobytes()
+    return base64.b64encode(packed).decode("ascii")
+
+
+def quantize_int8(embedding: Union[Sequence[float], np.ndarray]) -> np.ndarray:
+    """
+    Scale so the largest component is +/-127 and round to int8.
+
+    The scale is not kept: matching is cosine, which ignores vector length, so
+    decoded int8 embeddings are used as-is.
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+    if peak == 0.0:
+        return np.zeros(vector.shape, dtype=np.int8)
+    return np.round(vector * (127.0 / peak)).astype(np.int8)
+
+
+def decode_embedding(value: EmbeddingValue, encoding: str) -> np.ndarray:
+    """
+    Decode one embedding from a request into a float32 vector.
+
+    Float lists are always accepted so mixed or older clients keep working;
+    strings are only valid when a packed encoding was negotiated.
+    """
+    if not isinstance(value, str):
+        return np.asarray(value, dtype=np.float32)
+    dtype = _PACKED_DTYPES.get(encoding)
+    if dtype is None:
+        raise ValueError(
+            f"String embeddings require {EMBEDDING_ENCODING_HEADER} to be one of "
+            f"{', '.join(sorted(_PACKED_DTYPES))}"
+        )
+    raw = base64.b64decode(value, validate=True)
+    if len(raw) % dtype.itemsize:
+        raise ValueError("Packed embedding length is not a multiple of item size")
+    return np.frombuffer(raw, dtype=dtype).astype(np.float32)
+
+
+def decode_embeddings(values: Sequence[EmbeddingValue], encoding: str) -> np.ndarray:
+    """Decode a list of embeddings into a ``(n, dim)`` float32 matrix."""
+    if not values:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([decode_embedding(value, encoding) for value in values])
@@ -2,8 +2,12 @@
 
 import base64
 from io import BytesIO
+
+import cv2
+import numpy as np
 from PIL import Image
-from typing import Tuple, Optional
+from starlette.requests import Request
+from typing import Tuple, Optional, Union
 
 from app.core.constants import (
     MAX_BASE64_SIZE,
@@ -11,28 +15,109 @@ from app.core.constants import (
     MAX_IMAGE_DIMENSION,
     ALLOWED_IMAGE_FORMATS,
     ERROR_IMAGE_TOO_LARGE,
+    ERROR_INVALID_IMAGE,
     ERROR_INVALID_FORMAT,
     ERROR_INVALID_DIMENSIONS,
 )
 
 
-def validate_and_decode_image(
-    image_base64: str,
-) -> Tuple[bool, Optional[bytes], Optional[Image.Image], Optional[str], Optional[str]]:
+async def read_image_body(
+    request: Request,
+) -> Tuple[Optional[bytes], Optional[str], Optional[str]]:
+    """
+    Read a raw image request body, enforcing the size limit while streaming.
+
+    A ``Content-Length`` over the limit is rejected before anything is read;
+    chunked bodies are abandoned as soon as the running total passes it.
+
+    Returns:
+        Tuple of (image_bytes, error_message, error_code)
+    """
+    too_large = (
+        None,
+        f"Image too large. Maximum size is {MAX_IMAGE_SIZE_BYTES // 1024 // 1024}MB",
+        ERROR_IMAGE_TOO_LARGE,
+    )
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_IMAGE_SIZE_BYTES:
+        return too_large
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_IMAGE_SIZE_BYTES:
+            return too_large
+
+    if not body:
+        return None, "Empty image upload", ERROR_INVALID_IMAGE
+    return bytes(body), None, None
+
+
+def decode_image_array(
+    image: Union[str, bytes], reduce_max_side: int = 0
+) -> Tuple[Optional[np.ndarray], Optional[str], Optional[str]]:
     """
-    Validate and decode base64 image with size and format checks.
+    Validate a base64 string or raw image bytes and decode it to RGB pixels.
+
+    PIL only reads the header, to check the encoded size, format and
+    dimensions. The pixels are decoded once, by OpenCV, into a single
+    contiguous ``(h, w, 3)`` uint8 array and swapped to RGB in place, and the
+    encoded bytes are wrapped rather than copied. EXIF orientation is ignored.
 
     Args:
-        image_base64: Base64 encoded image string
+        image: Base64 encoded string or encoded JPEG/PNG bytes
+        reduce_max_side: If > 0, JPEGs are decoded with ``IMREAD_REDUCED_*``
+            at the largest 1/2, 1/4 or 1/8 scale whose longest side is still
+            at least this many pixels
 
     Returns:
-        Tuple of (success, image_bytes, image_pil, error_message, error_code)
+        Tuple of (image_rgb, error_message, error_code)
     """
+    if isinstance(image, str):
+        image, error_msg, error_code = _decode_base64(image)
+        if image is None:
+            return None, error_msg, error_code
+
+    header, error_msg, error_code = _open_checked(image)
+    if header is None:
+        return None, error_msg, error_code
+
+    flags = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+    if header.format == "JPEG":
+        # libjpeg pads a truncated file with grey instead of failing
+        if image.rfind(b"\xff\xd9") == -1:
+            return None, "Failed to process image", ERROR_INVALID_FORMAT
+        flags = _reduced_flags(max(header.size), reduce_max_side, flags)
+
+    pixels = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), flags)
+    if pixels is None:
+        return None, "Failed to process image", ERROR_INVALID_FORMAT
+    return cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB, dst=pixels), None, None
+
+
+# IMREAD_REDUCED_COLOR_* flag by scale denominator, largest first
+_REDUCED_COLOR = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def _reduced_flags(longest: int, max_side: int, flags: int) -> int:
+    if max_side <= 0:
+        return flags
+    for denominator, reduced in _REDUCED_COLOR:
+        if longest / denominator >= max_side:
+            return flags | reduced
+    return flags
+
+
+def _decode_base64(
+    image_base64: str,
+) -> Tuple[Optional[bytes], Optional[str], Optional[str]]:
     # 1. Validate base64 string length (before decoding to save memory)
     if len(image_base64) > MAX_BASE64_SIZE:
         return (
-            False,
-            None,
             None,
             f"Image too large. Maximum size is "
             f"{MAX_IMAGE_SIZE_BYTES // 1024 // 1024}MB",
@@ -41,21 +126,19 @@ def validate_and_decode_image(
 
     # 2. Decode base64 with strict validation
     try:
-        image_bytes = base64.b64decode(image_base64, validate=True)
+        return base64.b64decode(image_base64, validate=True), None, None
     except Exception:
-        return (
-            False,
-            None,
-            None,
-            "Invalid base64 encoding",
-            ERROR_INVALID_FORMAT,
-        )
+        return None, "Invalid base64 encoding", ERROR_INVALID_FORMAT
+
 
+def _open_checked(
+    image_bytes: bytes,
+) -> Tuple[Optional[Image.Image], Optional[str], Optional[str]]:
+    """Open the image header (no pixels are decoded) and check the encoded
+    size, format and dimensions."""
     # 3. Validate decoded image size
     if len(image_bytes) > MAX_IMAGE_SIZE_BYTES:
         return (
-            False,
-            None,
             None,
             f"Image size {len(image_bytes) // 1024 // 1024}MB exceeds maximum "
             f"{MAX_IMAGE_SIZE_BYTES // 1024 // 1024}MB",
@@ -65,44 +148,23 @@ def validate_and_decode_image(
     # 4. Open and validate image format
     try:
         image = Image.open(BytesIO(image_bytes))
-
-        # Validate format
-        if image.format not in ALLOWED_IMAGE_FORMATS:
-            return (
-                False,
-                None,
-                None,
-                f"Invalid image format '{image.format}'. Only JPEG and PNG are "
-                "supported",
-                ERROR_INVALID_FORMAT,
-            )
-
-        # 5. Validate dimensions
-        width, height = image.size
-        if width > MAX_IMAGE_DIMENSION or height > MAX_IMAGE_DIMENSION:
-            return (
-                False,
-                None,
-                None,
-                f"Image dimensions {width}x{height} exceed maximum "
-                f"{MAX_IMAGE_DIMENSION}x{MAX_IMAGE_DIMENSION}",
-                ERROR_INVALID_DIMENSIONS,
-            )
-
-        # Force decode to catch corrupted/truncated images during validation
-        image.load()
-
-        # Convert to RGB if needed
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-
-        return (True, image_bytes, image, None, None)
-
     except Exception:
+        return None, "Failed to process image", ERROR_INVALID_FORMAT
+
+    if image.format not in ALLOWED_IMAGE_FORMATS:
         return (
-            False,
-            None,
             None,
-            "Failed to process image",
+            f"Invalid image format '{image.format}'. Only JPEG and PNG are supported",
             ERROR_INVALID_FORMAT,
         )
+
+    # 5. Validate dimensions
+    width, height = image.size
+    if width > MAX_IMAGE_DIMENSION or height > MAX_IMAGE_DIMENSION:
+        return (
+            None,
+            f"Image dimensions {width}x{height} exceed maximum "
+            f"{MAX_IMAGE_DIMENSION}x{MAX_IMAGE_DIMENSION}",
+            ERROR_INVALID_DIMENSIONS,
+        )
+    return image, None, None
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark IVFIndex recall and latency against the exact FaceMatcher.
+
+Synthetic embeddings are clustered per student (a random centre plus noise),
+and queries are fresh noisy samples of known students, so recall@1 is measured
+against the exact matcher's answer. Latency is per query, averaged over the
+query batch, for a range of nprobe values.
+
+Usage:
+    python benchmarks/bench_ann_index.py
+    python benchmarks/bench_ann_index.py --students 20000 --dim 9216 --nprobe 1 4 16
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ml.ann_index import IVFIndex  # noqa: E402
+from app.ml.face_matcher import FaceMatcher  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--per-student", type=int, default=2)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(args.students, args.dim)).astype(np.float32)
+    noise = args.noise * rng.normal(size=(args.students, args.per_student, args.dim))
+    embeddings = (centres[:, None, :] + noise).astype(np.float32)
+    student_ids = [f"student_{i}" for i in range(args.students)]
+
+    picked = rng.choice(args.students, args.queries, replace=False)
+    queries = centres[picked] + args.noise * rng.normal(size=(args.queries, args.dim))
+    queries = queries.astype(np.float32)
+
+    start = time.perf_counter()
+    matcher = FaceMatcher.from_candidates(zip(student_ids, embeddings))
+    exact_build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    best_idx, _ = matcher.best_matches(queries)
+    exact_s = (time.perf_counter() - start) / args.queries
+    truth = [matcher.student_ids[i] for i in best_idx]
+
+    index = IVFIndex()
+    start = time.perf_counter()
+    for student_id, embs in zip(student_ids, embeddings):
+        index.add(student_id, embs)
+    nlist = index.train(args.nlist)
+    ivf_build_s = time.perf_counter() - start
+
+    print(
+        f"students={args.students} embeddings={index.size} dim={args.dim} "
+        f"queries={args.queries} nlist={nlist}"
+    )
+    print(
+        f"build: exact {exact_build_s * 1000:.0f} ms, "
+        f"ivf (add + train) {ivf_build_s * 1000:.0f} ms"
+    )
+    print(f"{'method':>12} | {'recall@1':>8} | {'ms/query':>8} | {'speedup':>7}")
+    print(f"{'exact':>12} | {1.0:>8.3f} | {exact_s * 1000:>8.2f} | {1.0:>6.1f}x")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        hits = index.search(queries, top_k=1, nprobe=nprobe)
+        ivf_s = (time.perf_counter() - start) / args.queries
+        recall = np.mean([h[0][0] == t for h, t in zip(hits, truth)])
+        print(
+            f"{f'nprobe={nprobe}':>12} | {recall:>8.3f} | {ivf_s * 1000:>8.2f} | "
+            f"{exact_s / ivf_s:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark coarse-to-fine matching against the exact full-gallery scan.
+
+Rosters are synthetic clusters: each student has a centre and
+``--per-student`` noisy embeddings around it, as after several enrollments.
+Most faces in the photo belong to a student and the rest are strangers. The
+exact scan scores every face against every embedding. The two-stage matcher
+scores the per-student templates first and then the student's own
+embeddings (early exit) or a shortlist.
+
+Both are timed through ``top_matches`` with ``--top-k`` candidates per face,
+as ``/batch-match`` and ``/recognize`` use them for one-to-one assignment
+(``ML_ASSIGNMENT_TOP_K``); ``--top-k 0`` times ``best_matches`` instead.
+
+Usage:
+    python benchmarks/bench_coarse_to_fine.py
+    python benchmarks/bench_coarse_to_fine.py --students 100 1000 --per-student 30
+    python benchmarks/bench_coarse_to_fine.py --top-k 0
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ml.face_matcher import FaceMatcher  # noqa: E402
+
+
+def timed(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run(num_students, args, rng):
+    centres = rng.normal(size=(num_students, args.dim)).astype(np.float32)
+    candidates = [
+        (
+            f"student_{i}",
+            centres[i] + args.noise * rng.normal(size=(args.per_student, args.dim)),
+        )
+        for i in range(num_students)
+    ]
+
+    known = int(args.faces * args.known)
+    present = rng.choice(num_students, size=known, replace=False)
+    faces = np.concatenate(
+        [
+            centres[present] + args.noise * rng.normal(size=(known, args.dim)),
+            rng.normal(size=(args.faces - known, args.dim)),
+        ]
+    )
+
+    exact = FaceMatcher.from_candidates(candidates)
+    two_stage = FaceMatcher.from_candidates(
+        candidates, template_margin=args.margin, shortlist=args.shortlist
+    )
+
+    def match(matcher):
+        if args.top_k > 0:
+            indices, scores = matcher.top_matches(faces, args.top_k)
+            return indices[:, 0], scores[:, 0]
+        return matcher.best_matches(faces)
+
+    (exact_idx, exact_scores), exact_s = timed(lambda: match(exact), args.repeats)
+    (fast_idx, fast_scores), fast_s = timed(lambda: match(two_stage), args.repeats)
+
+    # Only the decision matters for faces above the threshold
+    confident = exact_scores >= args.threshold
+    agree = (
+        np.mean(fast_idx[confident] == exact_idx[confident]) if confident.any() else 1
+    )
+    print(
+        f"{num_students:>9} | {exact.num_embeddings:>10} | {exact_s * 1000:>9.1f} | "
+        f"{fast_s * 1000:>9.1f} | {exact_s / fast_s:>7.1f}x | {agree:>8.1%}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--faces", type=int, default=80)
+    parser.add_argument("--students", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--per-student", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument(
+        "--known", type=float, default=0.8, help="share of faces enrolled"
+    )
+    parser.add_argument("--margin", type=float, default=0.1)
+    parser.add_argument("--shortlist", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(
+        f"faces={args.faces} embeddings/student={args.per_student} dim={args.dim} "
+        f"margin={args.margin} shortlist={args.shortlist} top_k={args.top_k}"
+    )
+    print("  students | embeddings |  exact(ms) | 2-stage(ms) | speedup | agreement")
+    for num_students in args.students:
+        run(num_students, args, rng)
+
+
+if __name__ == "__main__":
+    main()
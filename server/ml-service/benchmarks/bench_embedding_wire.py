@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark embedding wire formats for a batch-match payload.
+
+Compares the original JSON float lists against packed base64 float32/float16
+(negotiated with the X-Embedding-Encoding header). Encode covers building and
+serialising the request body; decode covers Pydantic validation of
+BatchMatchRequest plus turning the embeddings into float32 arrays, which is
+what the route does before matching.
+
+Usage:
+    python benchmarks/bench_embedding_wire.py
+    python benchmarks/bench_embedding_wire.py --faces 60 --candidates 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("ML_API_KEY", "benchmark")
+
+from app.schemas.requests import BatchMatchRequest  # noqa: E402
+from app.utils.embedding_codec import (  # noqa: E402
+    ENCODING_BASE64_F16,
+    ENCODING_BASE64_F32,
+    ENCODING_JSON,
+    decode_embedding,
+    decode_embeddings,
+    encode_embedding,
+)
+
+
+def build_body(faces, candidates, encoding):
+    return json.dumps(
+        {
+            "detected_faces": [
+                {"embedding": encode_embedding(face, encoding)} for face in faces
+            ],
+            "candidate_embeddings": [
+                {
+                    "student_id": f"student_{i}",
+                    "embeddings": [encode_embedding(emb, encoding) for emb in embs],
+                }
+                for i, embs in enumerate(candidates)
+            ],
+        }
+    ).encode()
+
+
+def parse_body(body, encoding):
+    request = BatchMatchRequest.model_validate_json(body)
+    faces = [
+        decode_embedding(face.embedding, encoding) for face in request.detected_faces
+    ]
+    candidates = [
+        decode_embeddings(c.embeddings, encoding) for c in request.candidate_embeddings
+    ]
+    return faces, candidates
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--faces", type=int, default=30)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--per-student", type=int, default=2)
+    parser.add_argument("--dim", type=int, default=96 * 96)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+
+    def unit(n):
+        vectors = rng.random((n, args.dim), dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    faces = unit(args.faces)
+    candidates = [unit(args.per_student) for _ in range(args.candidates)]
+    reference = list(faces)
+
+    print(
+        f"faces={args.faces} candidates={args.candidates} "
+        f"embeddings/student={args.per_student} dim={args.dim}"
+    )
+    print(
+        f"{'encoding':>11} | {'payload (KB)':>12} | {'KB/embedding':>12} | "
+        f"{'encode (ms)':>11} | {'decode (ms)':>11} | {'max abs err':>11}"
+    )
+
+    total_embeddings = args.faces + args.candidates * args.per_student
+    for encoding in (ENCODING_JSON, ENCODING_BASE64_F32, ENCODING_BASE64_F16):
+        encode_s, body = timed(
+            lambda: build_body(faces, candidates, encoding), args.repeat
+        )
+        decode_s, (decoded_faces, _) = timed(
+            lambda: parse_body(body, encoding), args.repeat
+        )
+        error = max(
+            float(np.max(np.abs(a - b))) for a, b in zip(decoded_faces, reference)
+        )
+        print(
+            f"{encoding:>11} | {len(body) / 1024:>12.0f} | "
+            f"{len(body) / 1024 / total_embeddings:>12.1f} | "
+            f"{encode_s * 1000:>11.1f} | {decode_s * 1000:>11.1f} | {error:>11.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
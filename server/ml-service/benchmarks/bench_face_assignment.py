@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark one-to-one face assignment on top of the matcher.
+
+Each photo has ``--faces`` faces of distinct enrolled students, plus
+``--twins`` faces that look like a student already in the photo, which is
+when independent best matches assign one student twice. The table shows the
+cost of the top-k scan and of the assignment itself next to plain best
+matching, and how many students independent matching assigned more than once.
+
+Usage:
+    python benchmarks/bench_face_assignment.py
+    python benchmarks/bench_face_assignment.py --students 500 --dim 1024 --top-k 10
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ml.face_assignment import assign_faces  # noqa: E402
+from app.ml.face_matcher import FaceMatcher  # noqa: E402
+
+
+def timed(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run(num_students, args, rng):
+    centres = rng.normal(size=(num_students, args.dim)).astype(np.float32)
+    matcher = FaceMatcher.from_candidates(
+        (
+            f"student_{i}",
+            centres[i] + args.noise * rng.normal(size=(args.per_student, args.dim)),
+        )
+        for i in range(num_students)
+    )
+
+    present = rng.choice(num_students, size=args.faces, replace=False)
+    twins = present[: args.twins]
+    faces = centres[np.concatenate([present, twins])] + args.noise * rng.normal(
+        size=(args.faces + args.twins, args.dim)
+    )
+
+    (best_idx, best_scores), best_s = timed(
+        lambda: matcher.best_matches(faces), args.repeats
+    )
+    (top_idx, top_scores), top_s = timed(
+        lambda: matcher.top_matches(faces, args.top_k), args.repeats
+    )
+    (assigned, _, uncertain), assign_s = timed(
+        lambda: assign_faces(top_idx, top_scores, args.threshold, args.margin),
+        args.repeats,
+    )
+
+    confident = best_idx[best_scores >= args.threshold]
+    duplicated = len(confident) - len(np.unique(confident))
+    taken = assigned[assigned >= 0]
+    assert len(taken) == len(np.unique(taken))
+    print(
+        f"{num_students:>9} | {best_s * 1000:>8.2f} | {top_s * 1000:>8.2f} | "
+        f"{assign_s * 1000:>9.2f} | {duplicated:>10} | {int(uncertain.sum()):>9}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--faces", type=int, default=80)
+    parser.add_argument("--twins", type=int, default=4)
+    parser.add_argument("--students", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--per-student", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--margin", type=float, default=0.05)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(
+        f"faces={args.faces}+{args.twins} embeddings/student={args.per_student} "
+        f"dim={args.dim} top_k={args.top_k}"
+    )
+    print("  students |  best(ms) | top-k(ms) | assign(ms) | duplicated | uncertain")
+    for num_students in args.students:
+        run(num_students, args, rng)
+
+
+if __name__ == "__main__":
+    main()
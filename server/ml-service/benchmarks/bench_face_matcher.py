@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorised FaceMatcher against the per-pair cosine scan.
+
+The legacy path is what /api/ml/batch-match used to do: one
+``cosine_similarity`` call per (face x candidate x embedding), rebuilding
+float64 arrays from Python lists every time. Its cost is linear in the number
+of faces, so it is timed on a few faces and extrapolated to the full photo.
+
+Usage:
+    python benchmarks/bench_face_matcher.py
+    python benchmarks/bench_face_matcher.py --faces 60 --candidates 50 500 5000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ml.face_matcher import FaceMatcher, cosine_similarity  # noqa: E402
+
+
+def legacy_best(query, candidates):
+    best_id, best_score = None, -1.0
+    for student_id, embeddings in candidates:
+        score = max(cosine_similarity(query, emb) for emb in embeddings)
+        if score > best_score:
+            best_id, best_score = student_id, score
+    return best_id, best_score
+
+
+def run(num_candidates, args, rng):
+    candidates = [
+        (
+            f"student_{i}",
+            rng.random((args.per_student, args.dim), dtype=np.float32).tolist(),
+        )
+        for i in range(num_candidates)
+    ]
+    faces = rng.random((args.faces, args.dim), dtype=np.float32).tolist()
+
+    # Legacy scan, timed on a subset of faces and extrapolated
+    sample = faces[: args.legacy_faces]
+    start = time.perf_counter()
+    legacy = [legacy_best(face, candidates) for face in sample]
+    legacy_s = (time.perf_counter() - start) * args.faces / len(sample)
+
+    # Vectorised path includes building the gallery, as the route does per call
+    start = time.perf_counter()
+    matcher = FaceMatcher.from_candidates(candidates)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indices, scores = matcher.best_matches(faces)
+    match_s = time.perf_counter() - start
+
+    for (legacy_id, legacy_score), idx, score in zip(legacy, indices, scores):
+        assert matcher.student_ids[idx] == legacy_id
+        assert abs(score - legacy_score) < 1e-4
+
+    total_s = build_s + match_s
+    print(
+        f"{num_candidates:>10} | {legacy_s * 1000:>12.1f} | {build_s * 1000:>9.1f} | "
+        f"{match_s * 1000:>9.1f} | {legacy_s / total_s:>7.1f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--faces", type=int, default=60)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--per-student", type=int, default=3)
+    parser.add_argument("--dim", type=int, default=96 * 96)
+    parser.add_argument(
+        "--legacy-faces",
+        type=int,
+        default=2,
+        help="faces actually run through the legacy scan before extrapolating",
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"faces={args.faces} embeddings/student={args.per_student} dim={args.dim}")
+    print(" candidates |  legacy (ms) | build(ms) | match(ms) | speedup")
+    for num_candidates in args.candidates:
+        run(num_candidates, args, rng)
+
+
+if __name__ == "__main__":
+    main()
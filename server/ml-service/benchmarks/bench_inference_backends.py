@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark detection and landmarking latency/throughput per inference backend.
+
+Each backend gets the same inputs: ``--batch`` photos downscaled to the
+detection size for ``detect`` and ``--batch`` face crops for ``landmarks``,
+passed in one call as the service does. Latency is the best wall time of a
+call; throughput is inputs per second at that latency. The ONNX backend
+needs ``onnxruntime`` and the exported models (see the README); a backend that
+cannot load is reported and skipped.
+
+Usage:
+    python benchmarks/bench_inference_backends.py
+    python benchmarks/bench_inference_backends.py --batch 1 8 32 --intra-op 1 4
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.ml.inference import BACKEND_ONNX, create_backend  # noqa: E402
+
+
+def timed(fn, repeats):
+    fn()  # first call pays graph initialisation
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(backend, label, args, rng):
+    try:
+        backend.load()
+    except Exception as e:
+        print(f"{label:<22} | skipped: {e}")
+        return
+
+    for batch in args.batch:
+        images = list(rng.integers(0, 256, (batch, 768, 1024, 3), dtype=np.uint8))
+        crops = list(rng.integers(0, 256, (batch, 160, 128, 3), dtype=np.uint8))
+        detect_s = timed(lambda: backend.detect(images), args.repeats)
+        mesh_s = timed(lambda: backend.landmarks(crops), args.repeats)
+        print(
+            f"{label:<22} | {batch:>5} | {detect_s * 1000:>10.1f} | "
+            f"{batch / detect_s:>9.0f} | {mesh_s * 1000:>10.1f} | "
+            f"{batch / mesh_s:>9.0f}"
+        )
+    backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--backends", nargs="+", default=["mediapipe", "onnx"], help="ML_MODEL values"
+    )
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument(
+        "--intra-op", type=int, nargs="+", default=[1], help="ONNX intra-op threads"
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(
+        "backend                | batch | detect(ms) | detect/s | mesh(ms)   |   mesh/s"
+    )
+    for name in args.backends:
+        if name != BACKEND_ONNX:
+            run(create_backend(name), name, args, rng)
+            continue
+        for threads in args.intra_op:
+            settings.ML_ORT_INTRA_OP_THREADS = threads
+            run(create_backend(name), f"{name} (intra-op {threads})", args, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Fit a compact embedding projection for the ML service.
+
+The output ``.npz`` is loaded from ``ML_EMBEDDING_PROJECTION_PATH``. Once it is
+set, new embeddings are produced in the projection's version (128-512 dims
+instead of 9216) and raw embeddings already enrolled are projected on the fly.
+Run the backend's ``scripts/migrate_face_embeddings.py`` afterwards to convert
+stored embeddings for good.
+
+PCA needs a sample of raw embeddings, either a ``.npy`` matrix or a JSONL file
+with one ``{"embeddings": [[...], ...]}`` record per student (as written by
+``migrate_face_embeddings.py --export``). A random projection needs no data.
+
+Usage:
+    python fit_embedding_projection.py --method pca --input raw.jsonl --dims 256
+    python fit_embedding_projection.py --method random --dims 256 --seed 7
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.ml.embedding_format import RAW_DIM, EmbeddingProjection  # noqa: E402
+
+
+def load_samples(path: str) -> np.ndarray:
+    if path.endswith(".npy"):
+        return np.load(path).astype(np.float32)
+    rows = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                rows.extend(json.loads(line)["embeddings"])
+    return np.asarray(rows, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--method", choices=["pca", "random"], default="pca")
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--input", help="Raw embeddings (.npy or .jsonl) for PCA")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--version", help="Version tag (default: <method><dims>-v1)")
+    parser.add_argument("--output", default="embedding_projection.npz")
+    args = parser.parse_args()
+
+    version = args.version or f"{args.method}{args.dims}-v1"
+    if args.method == "pca":
+        if not args.input:
+            parser.error("--method pca needs --input")
+        samples = load_samples(args.input)
+        print(f"Fitting PCA on {len(samples)} embeddings of dim {samples.shape[1]}")
+        projection = EmbeddingProjection.fit_pca(samples, args.dims, version)
+    else:
+        projection = EmbeddingProjection.random(
+            RAW_DIM, args.dims, version, seed=args.seed
+        )
+
+    projection.save(args.output)
+    print(
+        f"Wrote {version} ({projection.input_dim} -> {projection.output_dim}) "
+        f"to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
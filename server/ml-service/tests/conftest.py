@@ -44,6 +44,10 @@ def create_mock_mediapipe():
     mock_vision.RunningMode.IMAGE = "IMAGE"
     mock_vision.FaceDetectorOptions = Mock
 
+    # FaceMesh fits no face, as on the synthetic test images
+    mock_face_mesh = mock_mp.solutions.face_mesh.FaceMesh.return_value
+    mock_face_mesh.process.return_value = Mock(multi_face_landmarks=None)
+
     # Wire up the module structure
     mock_python.vision = mock_vision
     mock_tasks.python = mock_python
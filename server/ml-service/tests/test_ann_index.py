@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from app.ml.ann_index import IVFIndex
+from app.ml.face_matcher import FaceMatcher
+
+
+def _clustered(num_students=200, per_student=3, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_students, dim))
+    return [
+        (f"s{i}", centers[i] + 0.1 * rng.normal(size=(per_student, dim)))
+        for i in range(num_students)
+    ]
+
+
+def _build(candidates):
+    index = IVFIndex()
+    for student_id, embeddings in candidates:
+        index.add(student_id, embeddings)
+    return index
+
+
+def test_untrained_search_matches_exact_matcher():
+    candidates = _clustered(50)
+    index = _build(candidates)
+    matcher = FaceMatcher.from_candidates(candidates)
+    queries = np.random.default_rng(1).normal(size=(10, 32))
+
+    best_idx, best_scores = matcher.best_matches(queries)
+    hits = index.search(queries, top_k=1)
+
+    for (student_id, score), idx, exact in zip(
+        (h[0] for h in hits), best_idx, best_scores
+    ):
+        assert student_id == matcher.student_ids[idx]
+        assert score == pytest.approx(exact, abs=1e-5)
+
+
+def test_trained_search_full_probe_is_exact_and_partial_probe_recalls():
+    candidates = _clustered(300)
+    index = _build(candidates)
+    assert index.train(nlist=16) == 16
+
+    rng = np.random.default_rng(2)
+    queries = np.stack([embs[0] for _, embs in candidates[:50]])
+    queries = queries + 0.05 * rng.normal(size=queries.shape)
+    expected = [student_id for student_id, _ in candidates[:50]]
+
+    exact = [h[0][0] for h in index.search(queries, top_k=1, nprobe=16)]
+    assert exact == expected
+
+    approx = [h[0][0] for h in index.search(queries, top_k=1, nprobe=4)]
+    recall = np.mean([a == e for a, e in zip(approx, expected)])
+    assert recall >= 0.9
+
+
+def test_results_are_unique_students_best_first():
+    index = _build(_clustered(20, per_student=5))
+    hits = index.search(np.ones((1, 32)), top_k=5)[0]
+
+    ids = [student_id for student_id, _ in hits]
+    scores = [score for _, score in hits]
+    assert len(set(ids)) == len(ids) == 5
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_incremental_add_and_remove_after_training():
+    candidates = _clustered(100)
+    index = _build(candidates)
+    index.train(nlist=8)
+
+    assert index.remove("s3") == 3
+    assert index.remove("missing") == 0
+    assert index.size == 297
+    assert "s3" not in [h[0] for h in index.search(candidates[3][1], top_k=3)[0]]
+
+    index.add("s3", candidates[3][1])
+    assert index.search(candidates[3][1][:1], top_k=1, nprobe=8)[0][0][0] == "s3"
+
+
+def test_dimension_mismatch_raises():
+    index = _build(_clustered(5))
+    with pytest.raises(ValueError):
+        index.add("x", np.ones((1, 8)))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    candidates = _clustered(60)
+    index = _build(candidates)
+    index.train(nlist=6)
+    index.remove("s0")
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+
+    loaded = IVFIndex().load(path)
+    assert loaded.trained and loaded.nlist == 6
+    assert loaded.size == index.size
+    assert loaded.num_students == 59
+
+    queries = np.random.default_rng(3).normal(size=(5, 32))
+    assert loaded.search(queries, nprobe=2) == index.search(queries, nprobe=2)
@@ -1,12 +1,14 @@
 from fastapi.testclient import TestClient
 from app.main import app
 import base64
+import json
 import numpy as np
 import io
 from PIL import Image
 from app.core.config import settings
 from unittest.mock import patch
 import app.api.routes.face_recognition as fr_module
+from app.ml.ann_index import IVFIndex
 
 client = TestClient(app)
 client.headers = {"X-API-KEY": settings.API_KEY}
@@ -28,11 +30,24 @@ def test_root():
 
 
 def test_health():
-    response = client.get("/health")
+    # Entering the client runs the lifespan, which warms up the models
+    with TestClient(app) as warm_client:
+        warm_client.headers = {"X-API-KEY": settings.API_KEY}
+        response = warm_client.get("/health")
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "healthy"
     assert "timestamp" in data
+    assert data["models_loaded"] is True
+    assert data["warmup_seconds"] >= 0
+
+
+def test_health_unavailable_until_models_are_warm():
+    response = client.get("/health")
+    assert response.status_code == 503
+    data = response.json()
+    assert data["status"] == "starting"
+    assert data["models_loaded"] is False
 
 
 def test_encode_face_no_face():
@@ -104,6 +119,11 @@ def test_encode_face_success():
         assert data["success"] is True
         assert "embedding" in data
         assert len(data["embedding"]) > 0
+        assert data["embedding_version"] == "raw96-v1"
+        quality = data["metadata"]["quality"]
+        assert 0 <= quality["score"] <= 1
+        # The mocked detector finds no keypoints, so pose is left out
+        assert quality["pose"] is None
 
 
 def test_detect_faces_success():
@@ -124,3 +144,574 @@ def test_detect_faces_success():
         assert loc["bottom"] == 60
         assert loc["right"] == 60
         assert loc["bottom"] == 60
+
+
+def test_detect_faces_tiled_model_uses_tiled_detection():
+    b64_img = create_dummy_image_b64(1500, 1500)
+    # A 70px back-row face: 0.2% of the photo but 1.2% of a 640px tile
+    small_face = [(100, 170, 170, 100)]
+    with (
+        patch.object(fr_module, "detect_faces", return_value=small_face),
+        patch.object(fr_module, "detect_faces_tiled", return_value=small_face),
+    ):
+        tiled = client.post(
+            "/api/ml/detect-faces",
+            json={"image_base64": b64_img, "model": "tiled"},
+        ).json()
+        full = client.post(
+            "/api/ml/detect-faces", json={"image_base64": b64_img}
+        ).json()
+
+    assert tiled["success"] is True
+    assert tiled["faces"][0]["location"]["top"] == 100
+    # Reported against the whole photo
+    assert tiled["faces"][0]["face_area_ratio"] < 0.01
+    # The same face is below the default floor without tiling
+    assert full["success"] is True and full["count"] == 0
+
+
+def test_encode_faces_batch_streams_ndjson():
+    images = [
+        {"image_id": "ok", "image_base64": create_dummy_image_b64()},
+        {"image_id": "bad", "image_base64": "not-base64!"},
+    ]
+    with patch.object(fr_module, "detect_faces") as mock_detect:
+        mock_detect.return_value = [(10, 60, 60, 10)]
+        response = client.post("/api/ml/encode-faces-batch", json={"images": images})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    by_id = {line["image_id"]: line for line in lines}
+    assert sorted(line["index"] for line in lines) == [0, 1]
+    assert by_id["ok"]["success"] is True
+    assert len(by_id["ok"]["embedding"]) > 0
+    assert by_id["bad"]["success"] is False
+    assert by_id["bad"]["error_code"] == "INVALID_FORMAT"
+
+
+def test_encode_faces_batch_multipart():
+    files = [
+        ("images", (f"student_{i}.jpg", base64.b64decode(create_dummy_image_b64())))
+        for i in range(3)
+    ]
+    with patch.object(fr_module, "detect_faces") as mock_detect:
+        mock_detect.return_value = [(10, 60, 60, 10)]
+        response = client.post(
+            "/api/ml/encode-faces-batch",
+            files=files,
+            data={"min_face_area_ratio": "0.1"},
+        )
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["image_id"] for line in lines) == [
+        "student_0.jpg",
+        "student_1.jpg",
+        "student_2.jpg",
+    ]
+    assert all(line["success"] for line in lines)
+
+
+def test_encode_faces_batch_requires_images():
+    response = client.post("/api/ml/encode-faces-batch", json={"images": []})
+    assert response.status_code == 422
+
+    response = client.post("/api/ml/encode-faces-batch", json={"wrong": 1})
+    assert response.status_code == 422
+
+
+def test_batch_match():
+    emb_a = [1.0, 0.0, 0.0]
+    emb_b = [0.0, 1.0, 0.0]
+    payload = {
+        "detected_faces": [
+            {"embedding": [0.9, 0.1, 0.0]},
+            {"embedding": [0.0, 0.0, 1.0]},
+            {"embedding": [0.0, 1.0, 0.0], "is_live": False},
+        ],
+        "candidate_embeddings": [
+            {"student_id": "student_a", "embeddings": [emb_a]},
+            {"student_id": "student_b", "embeddings": [emb_b, emb_a]},
+        ],
+    }
+
+    response = client.post("/api/ml/batch-match", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+
+    matches = data["matches"]
+    assert [m["face_index"] for m in matches] == [0, 1, 2]
+    assert matches[0]["student_id"] == "student_a"
+    assert matches[0]["status"] == "present"
+    assert matches[1]["student_id"] is None
+    assert matches[1]["status"] == "unknown"
+    assert matches[2]["status"] == "spoof"
+    assert matches[2]["liveness"] is False
+
+
+def test_batch_match_assigns_each_student_to_one_face():
+    # Both faces are closest to student_a; the closer one keeps it and the
+    # other falls back to student_b, flagged as contested
+    payload = {
+        "detected_faces": [
+            {"embedding": [1.0, 0.8, 0.0]},
+            {"embedding": [1.0, 0.05, 0.0]},
+        ],
+        "candidate_embeddings": [
+            {"student_id": "student_a", "embeddings": [[1.0, 0.0, 0.0]]},
+            {"student_id": "student_b", "embeddings": [[0.0, 1.0, 0.0]]},
+        ],
+    }
+
+    data = client.post("/api/ml/batch-match", json=payload).json()
+
+    assert data["success"] is True
+    first, second = data["matches"]
+    assert second["student_id"] == "student_a"
+    assert second["uncertain"] is False
+    assert first["student_id"] == "student_b"
+    assert first["status"] == "present"
+    assert first["uncertain"] is True
+
+
+def test_batch_match_with_cached_gallery():
+    gallery = {
+        "version": "roster-v1",
+        "candidate_embeddings": [
+            {"student_id": "student_a", "embeddings": [[1.0, 0.0, 0.0]]},
+            {"student_id": "student_b", "embeddings": [[0.0, 1.0, 0.0]]},
+        ],
+    }
+    response = client.put("/api/ml/galleries/subject:test", json=gallery)
+    data = response.json()
+    assert data["success"] is True
+    assert data["num_students"] == 2
+    assert data["num_embeddings"] == 2
+
+    payload = {
+        "detected_faces": [{"embedding": [0.1, 0.9, 0.0]}],
+        "gallery_id": "subject:test",
+        "gallery_version": "roster-v1",
+    }
+    data = client.post("/api/ml/batch-match", json=payload).json()
+    assert data["success"] is True
+    assert data["matches"][0]["student_id"] == "student_b"
+
+    # A different roster version is a miss so the caller re-uploads
+    payload["gallery_version"] = "roster-v2"
+    data = client.post("/api/ml/batch-match", json=payload).json()
+    assert data["success"] is False
+    assert data["error_code"] == "GALLERY_NOT_FOUND"
+
+    data = client.delete("/api/ml/galleries/subject:test").json()
+    assert data["removed"] is True
+    assert client.get("/api/ml/galleries/subject:test").json()["success"] is False
+
+
+def test_batch_match_requires_candidates_or_gallery():
+    payload = {"detected_faces": [{"embedding": [1.0, 0.0]}]}
+    response = client.post("/api/ml/batch-match", json=payload)
+    assert response.status_code == 422
+
+
+def test_recognize_matches_without_returning_embeddings():
+    b64_img = create_dummy_image_b64()
+    with (
+        patch.object(fr_module, "detect_faces") as mock_detect,
+        patch.object(fr_module, "get_face_embedding") as mock_embed,
+        patch.object(
+            fr_module, "are_live", side_effect=lambda crops: [True] * len(crops)
+        ),
+    ):
+        mock_detect.return_value = [(10, 60, 60, 10)]
+        mock_embed.return_value = [0.0, 1.0, 0.0]
+
+        payload = {
+            "image_base64": b64_img,
+            "candidate_embeddings": [
+                {"student_id": "student_a", "embeddings": [[1.0, 0.0, 0.0]]},
+                {"student_id": "student_b", "embeddings": [[0.0, 1.0, 0.0]]},
+            ],
+        }
+        data = client.post("/api/ml/recognize", json=payload).json()
+
+    assert data["success"] is True
+    assert data["count"] == 1
+    face = data["faces"][0]
+    assert face["student_id"] == "student_b"
+    assert face["status"] == "present"
+    assert face["location"]["top"] == 10
+    assert face["embedding"] is None
+
+
+def test_recognize_gallery_miss_returns_embeddings():
+    b64_img = create_dummy_image_b64()
+    with (
+        patch.object(fr_module, "detect_faces") as mock_detect,
+        patch.object(fr_module, "get_face_embedding") as mock_embed,
+        patch.object(
+            fr_module, "are_live", side_effect=lambda crops: [True] * len(crops)
+        ),
+    ):
+        mock_detect.return_value = [(10, 60, 60, 10)]
+        mock_embed.return_value = [0.0, 1.0, 0.0]
+
+        payload = {"image_base64": b64_img, "gallery_id": "subject:missing"}
+        data = client.post("/api/ml/recognize", json=payload).json()
+
+    assert data["success"] is False
+    assert data["error_code"] == "GALLERY_NOT_FOUND"
+    assert data["faces"][0]["embedding"] == [0.0, 1.0, 0.0]
+
+
+def test_batch_match_with_packed_embeddings():
+    from app.utils.embedding_codec import encode_embedding
+
+    def packed(values):
+        return encode_embedding(values, "base64-f16")
+
+    payload = {
+        "detected_faces": [{"embedding": packed([0.9, 0.1, 0.0])}],
+        "candidate_embeddings": [
+            {"student_id": "student_a", "embeddings": [packed([1.0, 0.0, 0.0])]},
+            {"student_id": "student_b", "embeddings": [[0.0, 1.0, 0.0]]},
+        ],
+    }
+
+    response = client.post(
+        "/api/ml/batch-match",
+        json=payload,
+        headers={"X-Embedding-Encoding": "base64-f16"},
+    )
+    data = response.json()
+    assert data["success"] is True
+    assert data["matches"][0]["student_id"] == "student_a"
+
+    # Without the header packed strings are not interpreted
+    data = client.post("/api/ml/batch-match", json=payload).json()
+    assert data["success"] is False
+
+
+def test_encode_face_packed_response():
+    b64_img = create_dummy_image_b64()
+    with patch.object(fr_module, "detect_faces") as mock_detect:
+        mock_detect.return_value = [(10, 60, 60, 10)]
+
+        response = client.post(
+            "/api/ml/encode-face",
+            json={"image_base64": b64_img},
+            headers={"X-Embedding-Encoding": "base64-f32"},
+        )
+    data = response.json()
+    assert data["success"] is True
+    assert isinstance(data["embedding"], str)
+    assert len(base64.b64decode(data["embedding"])) == 96 * 96 * 4
+
+
+def test_unsupported_embedding_encoding():
+    b64_img = create_dummy_image_b64()
+    response = client.post(
+        "/api/ml/encode-face",
+        json={"image_base64": b64_img},
+        headers={"X-Embedding-Encoding": "msgpack"},
+    )
+    assert response.status_code == 400
+
+
+def test_saturated_executor_returns_503_with_retry_after():
+    executor = fr_module.ml_executor
+    with (
+        patch.dict(executor._running, {"thread": executor.workers}),
+        patch.object(executor, "max_queue", 0),
+    ):
+        response = client.post(
+            "/api/ml/detect-faces", json={"image_base64": create_dummy_image_b64()}
+        )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(fr_module.ml_executor.retry_after)
+
+
+def test_index_and_search_faces():
+    payload = {
+        "candidate_embeddings": [
+            {"student_id": "a", "embeddings": [[1.0, 0.0, 0.0]]},
+            {"student_id": "b", "embeddings": [[0.0, 1.0, 0.0]]},
+        ]
+    }
+    with patch.object(fr_module, "ann_index", IVFIndex()):
+        response = client.post("/api/ml/search", json={"query_embeddings": [[1, 0, 0]]})
+        assert response.json()["error_code"] == "INDEX_EMPTY"
+
+        response = client.put("/api/ml/index/students", json=payload)
+        assert response.json()["success"] is True
+        assert response.json()["size"] == 2
+
+        response = client.post(
+            "/api/ml/search",
+            json={"query_embeddings": [[0.9, 0.1, 0.0]], "top_k": 2},
+        )
+        data = response.json()
+        assert data["success"] is True
+        matches = data["results"][0]["matches"]
+        assert [m["student_id"] for m in matches] == ["a", "b"]
+
+        response = client.delete("/api/ml/index/students/a")
+        assert response.json()["removed"] == 1
+        assert response.json()["size"] == 1
+
+
+def test_convert_embeddings_to_active_version():
+    from app.ml.embedding_format import EmbeddingFormat, EmbeddingProjection
+
+    fmt = EmbeddingFormat(EmbeddingProjection.random(4, 2, "rp2-v1"))
+    with patch.object(fr_module, "embedding_format", fmt):
+        response = client.post(
+            "/api/ml/embeddings/convert",
+            json={"embeddings": [[1.0, 0.0, 0.0, 0.0]]},
+        )
+        data = response.json()
+        assert data["success"] is True
+        assert data["embedding_version"] == "rp2-v1"
+        assert len(data["embeddings"][0]) == 2
+
+        response = client.post(
+            "/api/ml/embeddings/convert",
+            json={"embeddings": [[1.0, 0.0]], "embedding_version": "pca2-v1"},
+        )
+        assert response.json()["error_code"] == "EMBEDDING_VERSION_MISMATCH"
+
+
+def test_detect_faces_upload_takes_raw_image_bytes():
+    image_bytes = base64.b64decode(create_dummy_image_b64())
+    with patch.object(fr_module, "detect_faces") as mock_detect:
+        mock_detect.return_value = [(10, 60, 60, 10)]
+
+        response = client.post(
+            "/api/ml/detect-faces/upload?min_face_area_ratio=0.01",
+            content=image_bytes,
+            headers={"Content-Type": "image/jpeg"},
+        )
+
+    data = response.json()
+    assert data["success"] is True
+    assert data["faces"][0]["location"]["top"] == 10
+
+
+def test_detect_faces_upload_rejects_oversized_body():
+    from app.core.constants import MAX_IMAGE_SIZE_BYTES
+
+    def chunks():
+        for _ in range(MAX_IMAGE_SIZE_BYTES // 65536 + 2):
+            yield b"\0" * 65536
+
+    data = client.post(
+        "/api/ml/detect-faces/upload",
+        content=chunks(),
+        headers={"Content-Type": "application/octet-stream"},
+    ).json()
+
+    assert data["success"] is False
+    assert data["error_code"] == "IMAGE_TOO_LARGE"
+
+
+def test_recognize_upload_requires_gallery_and_reports_miss():
+    image_bytes = base64.b64decode(create_dummy_image_b64())
+    response = client.post("/api/ml/recognize/upload", content=image_bytes)
+    assert response.status_code == 422
+
+    with (
+        patch.object(fr_module, "detect_faces") as mock_detect,
+        patch.object(fr_module, "get_face_embedding") as mock_embed,
+        patch.object(
+            fr_module, "are_live", side_effect=lambda crops: [True] * len(crops)
+        ),
+    ):
+        mock_detect.return_value = [(10, 60, 60, 10)]
+        mock_embed.return_value = [0.0, 1.0, 0.0]
+
+        data = client.post(
+            "/api/ml/recognize/upload?gallery_id=subject:missing",
+            content=image_bytes,
+            headers={"Content-Type": "image/jpeg"},
+        ).json()
+
+    assert data["error_code"] == "GALLERY_NOT_FOUND"
+    assert data["faces"][0]["embedding"] == [0.0, 1.0, 0.0]
+
+
+def test_repeated_image_is_served_from_result_cache():
+    from app.ml.result_cache import detection_cache
+
+    b64_img = create_dummy_image_b64()
+    image_bytes = base64.b64decode(b64_img)
+    detection_cache.clear()
+    with (
+        patch.object(fr_module, "detect_faces") as mock_detect,
+        patch.object(fr_module, "get_face_embedding", return_value=[1.0, 0.0]),
+        patch.object(
+            fr_module, "are_live", side_effect=lambda crops: [True] * len(crops)
+        ),
+    ):
+        mock_detect.return_value = [(10, 60, 60, 10)]
+
+        first = client.post("/api/ml/detect-faces", json={"image_base64": b64_img})
+        second = client.post(
+            "/api/ml/detect-faces/upload",
+            content=image_bytes,
+            headers={"X-Embedding-Encoding": "base64-f32"},
+        )
+        third = client.post("/api/ml/detect-faces", json={"image_base64": b64_img})
+
+    assert mock_detect.call_count == 1
+    assert second.json()["faces"][0]["location"] == first.json()["faces"][0]["location"]
+    assert isinstance(second.json()["faces"][0]["embedding"], str)
+    # The packed response did not leak into the cached faces
+    assert third.json()["faces"][0]["embedding"] == [1.0, 0.0]
+
+
+def _face_landmarks(nose_x=0.5):
+    """FaceMesh-sized landmarks with eyes open and the nose at ``nose_x``."""
+    from app.ml import temporal_liveness as tl
+
+    points = np.zeros((478, 3), dtype=np.float32)
+    for eye, x0 in ((tl.RIGHT_EYE, 0.0), (tl.LEFT_EYE, 0.7)):
+        p1, p2, p3, p4, p5, p6 = eye
+        points[[p1, p4], 0] = [x0, x0 + 0.3]
+        points[[p2, p6], 0] = x0 + 0.1
+        points[[p3, p5], 0] = x0 + 0.2
+        points[[p2, p3], 1] = -0.05
+        points[[p5, p6], 1] = 0.05
+    points[tl.RIGHT_EYE_OUTER] = [0.0, 0.0, 0.0]
+    points[tl.LEFT_EYE_OUTER] = [1.0, 0.0, 0.0]
+    points[tl.NOSE_TIP] = [nose_x, 0.5, 0.0]
+    points[tl.CHIN] = [0.5, 1.0, 0.0]
+    return points * 100
+
+
+def test_video_stream_embeds_each_track_once():
+    from app.ml.stream_session import FrameSampler, stream_sessions
+
+    gallery = {
+        "version": "roster-v1",
+        "candidate_embeddings": [
+            {"student_id": "student_a", "embeddings": [[1.0, 0.0, 0.0]]},
+            {"student_id": "student_b", "embeddings": [[0.0, 1.0, 0.0]]},
+        ],
+    }
+    client.put("/api/ml/galleries/subject:stream", json=gallery)
+    data = client.post(
+        "/api/ml/streams",
+        json={"gallery_id": "subject:stream", "gallery_version": "roster-v1"},
+    ).json()
+    assert data["success"] is True
+    session_id = data["session_id"]
+    # Process every frame so the test does not depend on timing
+    stream_sessions.get(session_id).sampler = FrameSampler(0, 0, 0)
+
+    frame = base64.b64decode(create_dummy_image_b64())
+    # The nose tip moves from the centre towards one eye: a head turn
+    landmarks = [_face_landmarks(nose_x=x) for x in (0.5, 0.56, 0.62)]
+    statuses = []
+    with (
+        patch.object(fr_module, "detect_faces") as mock_detect,
+        patch.object(fr_module, "get_face_embedding") as mock_embed,
+        patch.object(
+            fr_module, "analyze_faces", side_effect=[[(True, lm)] for lm in landmarks]
+        ),
+    ):
+        mock_embed.return_value = [0.0, 1.0, 0.0]
+        for top in (10, 14, 18):
+            mock_detect.return_value = [(top, 60, top + 50, 10)]
+            data = client.post(
+                f"/api/ml/streams/{session_id}/frames", content=frame
+            ).json()
+            assert data["success"] is True
+            assert data["tracks"][0]["track_id"] == 1
+            assert data["tracks"][0]["student_id"] == "student_b"
+            statuses.append(data["tracks"][0]["status"])
+
+    assert mock_embed.call_count == 1
+    assert data["embedded"] == 0
+    # Recognised on the first frame, live once the head turned far enough
+    assert statuses == ["pending", "pending", "present"]
+    assert data["new_students"][0]["student_id"] == "student_b"
+
+    data = client.delete(f"/api/ml/streams/{session_id}").json()
+    assert data["frames_processed"] == 3
+    assert data["tracks_seen"] == 1
+    assert [s["student_id"] for s in data["students"]] == ["student_b"]
+    assert client.get(f"/api/ml/streams/{session_id}").json()["error_code"] == (
+        "STREAM_NOT_FOUND"
+    )
+
+
+def test_video_stream_skips_frames_sent_too_soon():
+    client.put(
+        "/api/ml/galleries/subject:stream-skip",
+        json={
+            "version": "v1",
+            "candidate_embeddings": [
+                {"student_id": "student_a", "embeddings": [[1.0, 0.0, 0.0]]}
+            ],
+        },
+    )
+    session_id = client.post(
+        "/api/ml/streams", json={"gallery_id": "subject:stream-skip"}
+    ).json()["session_id"]
+
+    frame = base64.b64decode(create_dummy_image_b64())
+    with patch.object(fr_module, "detect_faces", return_value=[]):
+        first = client.post(f"/api/ml/streams/{session_id}/frames", content=frame)
+        second = client.post(f"/api/ml/streams/{session_id}/frames", content=frame)
+
+    assert first.json()["processed"] is True
+    assert second.json()["processed"] is False
+    assert second.json()["retry_after_ms"] > 0
+    client.delete(f"/api/ml/streams/{session_id}")
+
+
+def test_video_stream_requires_cached_gallery():
+    data = client.post("/api/ml/streams", json={"gallery_id": "subject:none"}).json()
+    assert data["success"] is False
+    assert data["error_code"] == "GALLERY_NOT_FOUND"
+
+
+def test_profile_endpoint_is_off_by_default():
+    image_bytes = base64.b64decode(create_dummy_image_b64())
+    response = client.post(
+        "/api/ml/profile/detect-faces",
+        content=image_bytes,
+        headers={"Content-Type": "image/jpeg"},
+    )
+    assert response.status_code == 404
+
+
+def test_profile_reports_each_stage_and_a_single_decode_copy():
+    width, height = 1600, 1200
+    image_bytes = base64.b64decode(create_dummy_image_b64(width, height))
+    with (
+        patch.object(settings, "ML_PROFILING_ENABLED", True),
+        patch.object(fr_module, "detect_faces", return_value=[(10, 210, 210, 10)]),
+        patch.object(
+            fr_module, "are_live", side_effect=lambda crops: [True] * len(crops)
+        ),
+    ):
+        response = client.post(
+            "/api/ml/profile/detect-faces?min_face_area_ratio=0.01",
+            content=image_bytes,
+            headers={"Content-Type": "image/jpeg"},
+        )
+
+    data = response.json()
+    assert data["success"] is True
+    assert data["count"] == 1
+    stages = {stage["name"]: stage for stage in data["stages"]}
+    assert list(stages) == ["decode", "detect", "crop", "liveness", "embed"]
+    assert all(stage["calls"] == 1 for stage in stages.values())
+    # Decoding holds the RGB pixels once; the PIL path held them at least twice
+    pixels = width * height * 3
+    assert pixels <= stages["decode"]["peak_bytes"] < 1.2 * pixels
+    # Crops are views
+    assert stages["crop"]["retained_bytes"] < 10_000
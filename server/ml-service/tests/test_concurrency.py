@@ -0,0 +1,225 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.core.concurrency import AdaptiveLimiter, request_timeout
+from app.core.exceptions import ServiceOverloadedError
+from app.core.priority import PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+def _limiter(**kwargs):
+    options = dict(initial_limit=2, target_latency=1.0, window=4, backoff=0.5)
+    options.update(kwargs)
+    return AdaptiveLimiter(**options)
+
+
+async def test_waiters_get_freed_slots_in_arrival_order():
+    limiter = _limiter()
+    await limiter.acquire()
+    await limiter.acquire()
+
+    order = []
+
+    async def wait(name):
+        await limiter.acquire(timeout=5)
+        order.append(name)
+
+    waiting = [asyncio.ensure_future(wait(name)) for name in ("a", "b")]
+    await asyncio.sleep(0)
+    assert limiter.queued == 2 and order == []
+
+    limiter.release(0.1)
+    limiter.release(0.1)
+    await asyncio.gather(*waiting)
+    assert order == ["a", "b"]
+    assert limiter.in_flight == 2 and limiter.queued == 0
+
+
+async def test_interactive_waiters_are_served_ahead_of_bulk_ones():
+    limiter = _limiter(initial_limit=1)
+    await limiter.acquire()
+    order = []
+
+    async def wait(name, priority):
+        await limiter.acquire(timeout=5, priority=priority)
+        order.append(name)
+        limiter.release(0.1)
+
+    waiting = [asyncio.ensure_future(wait("bulk", PRIORITY_BULK))]
+    await asyncio.sleep(0)
+    waiting.append(asyncio.ensure_future(wait("interactive", PRIORITY_INTERACTIVE)))
+    await asyncio.sleep(0)
+
+    limiter.release(0.1)
+    await asyncio.gather(*waiting)
+    assert order == ["interactive", "bulk"]
+
+
+async def test_bulk_backlog_does_not_count_against_interactive_deadlines():
+    limiter = _limiter(initial_limit=1, max_queue=2)
+    await limiter.acquire()
+    limiter.latency = 1.0
+    bulk = [
+        asyncio.ensure_future(limiter.acquire(timeout=30, priority=PRIORITY_BULK))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+
+    with pytest.raises(ServiceOverloadedError):
+        await limiter.acquire(timeout=30, priority=PRIORITY_BULK)
+    # Next in line for 4 of every 5 slots: 1.25s wait plus 1s of work
+    assert limiter.expected_wait(PRIORITY_INTERACTIVE) == 1.25
+    interactive = asyncio.ensure_future(limiter.acquire(timeout=3))
+    await asyncio.sleep(0)
+    assert limiter.queued == 3
+
+    for _ in range(3):
+        limiter.release(0.1)
+        await asyncio.sleep(0)
+    await asyncio.gather(interactive, *bulk)
+
+
+async def test_rejects_up_front_when_the_deadline_cannot_be_met():
+    limiter = _limiter(initial_limit=1)
+    await limiter.acquire()
+    limiter.latency = 2.0
+
+    with pytest.raises(ServiceOverloadedError) as exc_info:
+        await limiter.acquire(timeout=3)
+    assert exc_info.value.status_code == 503
+    # One request ahead at 2s each
+    assert exc_info.value.headers == {"Retry-After": "2"}
+    assert limiter.queued == 0
+
+
+async def test_rejects_when_no_slot_frees_up_in_time():
+    limiter = _limiter(initial_limit=1)
+    await limiter.acquire()
+
+    with pytest.raises(ServiceOverloadedError):
+        await limiter.acquire(timeout=0.01)
+    assert limiter.queued == 0
+    assert limiter.in_flight == 1
+
+
+async def test_rejects_when_the_queue_is_full():
+    limiter = _limiter(initial_limit=1, max_queue=1)
+    await limiter.acquire()
+    waiting = asyncio.ensure_future(limiter.acquire(timeout=5))
+    await asyncio.sleep(0)
+
+    with pytest.raises(ServiceOverloadedError):
+        await limiter.acquire(timeout=5)
+
+    limiter.release(0.1)
+    await waiting
+    assert limiter.in_flight == 1
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    limiter = _limiter(initial_limit=1)
+    await limiter.acquire()
+    waiting = asyncio.ensure_future(limiter.acquire(timeout=5))
+    await asyncio.sleep(0)
+
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert limiter.queued == 0
+    limiter.release(0.1)
+    assert limiter.in_flight == 0
+
+
+async def _complete(limiter, latencies, overloaded=False):
+    for latency in latencies:
+        await limiter.acquire()
+        limiter.release(latency, overloaded=overloaded)
+
+
+async def test_limit_backs_off_when_p95_latency_is_above_target():
+    limiter = _limiter(initial_limit=8)
+    await _complete(limiter, [0.1, 0.1, 0.1, 3.0])
+    assert limiter.limit == 4
+
+    # Overload reported further in counts as above target
+    await _complete(limiter, [0.01] * 4, overloaded=True)
+    assert limiter.limit == 2
+
+
+async def test_limit_grows_only_while_it_is_fully_used():
+    limiter = _limiter(initial_limit=2, max_limit=3)
+    # One request at a time never reaches the limit of 2
+    await _complete(limiter, [0.1] * 4)
+    assert limiter.limit == 2
+
+    for _ in range(2):
+        await limiter.acquire()
+        await limiter.acquire()
+        limiter.release(0.1)
+        limiter.release(0.1)
+    assert limiter.limit == 3
+    for _ in range(2):
+        await limiter.acquire()
+        await limiter.acquire()
+        limiter.release(0.1)
+        limiter.release(0.1)
+    assert limiter.limit == 3
+
+
+def test_request_timeout_header():
+    assert request_timeout("2.5") == 2.5
+    assert request_timeout(None) is None
+    assert request_timeout("soon") is None
+    assert request_timeout("0") is None
+    assert request_timeout("inf") is None
+
+
+def test_overloaded_requests_get_503_with_retry_after():
+    from fastapi.testclient import TestClient
+
+    from app.core.config import settings
+    from app.main import app
+    from app.middleware import concurrency
+
+    limiter = _limiter(initial_limit=1, max_queue=0)
+    with patch.object(concurrency, "concurrency_limiter", limiter):
+        client = TestClient(app, headers={"X-API-KEY": settings.API_KEY})
+        limiter.in_flight = 1
+        response = client.get("/api/ml/index")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        # Routes outside /api/ml/* are not limited
+        assert client.get("/").status_code == 200
+
+        limiter.in_flight = 0
+        assert client.get("/api/ml/index").status_code == 200
+        assert limiter.in_flight == 0
+
+
+def test_priority_header_reaches_executor_jobs():
+    from fastapi.testclient import TestClient
+    from prometheus_client import REGISTRY
+
+    from app.core.config import settings
+    from app.main import app
+
+    def jobs(priority):
+        return (
+            REGISTRY.get_sample_value(
+                "ml_executor_queue_wait_seconds_count", {"priority": priority}
+            )
+            or 0
+        )
+
+    client = TestClient(app, headers={"X-API-KEY": settings.API_KEY})
+    interactive = jobs(PRIORITY_INTERACTIVE)
+    bulk = jobs(PRIORITY_BULK)
+    response = client.post(
+        "/api/ml/embeddings/convert",
+        json={"embeddings": [[1.0, 0.0]], "embedding_version": None},
+        headers={"X-Request-Priority": "bulk"},
+    )
+    assert response.status_code == 200
+    assert jobs(PRIORITY_BULK) == bulk + 1
+    assert jobs(PRIORITY_INTERACTIVE) == interactive
@@ -0,0 +1,68 @@
+import base64
+
+import numpy as np
+import pytest
+
+from app.utils.embedding_codec import (
+    ENCODING_BASE64_F16,
+    ENCODING_BASE64_F32,
+    ENCODING_BASE64_I8,
+    ENCODING_JSON,
+    decode_embedding,
+    decode_embeddings,
+    encode_embedding,
+)
+
+
+def test_json_encoding_is_a_float_list():
+    emb = np.array([0.25, -0.5, 1.0], dtype=np.float32)
+    assert encode_embedding(emb, ENCODING_JSON) == [0.25, -0.5, 1.0]
+    assert encode_embedding([0.25, 1.0], ENCODING_JSON) == [0.25, 1.0]
+
+
+def test_f32_round_trip_is_exact():
+    emb = np.random.default_rng(0).normal(size=9216).astype(np.float32)
+    packed = encode_embedding(emb, ENCODING_BASE64_F32)
+
+    assert isinstance(packed, str)
+    assert len(base64.b64decode(packed)) == 9216 * 4
+    assert np.array_equal(decode_embedding(packed, ENCODING_BASE64_F32), emb)
+
+
+def test_f16_round_trip_is_close():
+    emb = np.random.default_rng(1).normal(size=256).astype(np.float32)
+    emb /= np.linalg.norm(emb)
+    decoded = decode_embedding(encode_embedding(emb, ENCODING_BASE64_F16), "base64-f16")
+
+    assert decoded.dtype == np.float32
+    assert np.allclose(decoded, emb, atol=1e-3)
+
+
+def test_i8_round_trip_preserves_direction():
+    emb = np.random.default_rng(2).normal(size=256).astype(np.float32)
+    packed = encode_embedding(emb, ENCODING_BASE64_I8)
+    decoded = decode_embedding(packed, ENCODING_BASE64_I8)
+
+    assert len(base64.b64decode(packed)) == 256
+    assert np.abs(decoded).max() == 127
+    cosine = decoded @ emb / (np.linalg.norm(decoded) * np.linalg.norm(emb))
+    assert cosine > 0.999
+
+
+def test_lists_are_accepted_under_any_encoding():
+    decoded = decode_embedding([1.0, 2.0], ENCODING_BASE64_F16)
+    assert decoded.dtype == np.float32
+    assert decoded.tolist() == [1.0, 2.0]
+
+
+def test_string_without_packed_encoding_is_rejected():
+    packed = encode_embedding([1.0, 2.0], ENCODING_BASE64_F32)
+    with pytest.raises(ValueError):
+        decode_embedding(packed, ENCODING_JSON)
+
+
+def test_decode_embeddings_stacks_mixed_values():
+    packed = encode_embedding([0.0, 1.0], ENCODING_BASE64_F32)
+    matrix = decode_embeddings([[1.0, 0.0], packed], ENCODING_BASE64_F32)
+    assert matrix.shape == (2, 2)
+    assert decode_embeddings([], ENCODING_JSON).size == 0
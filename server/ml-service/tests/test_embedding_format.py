@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from app.api.routes import face_recognition as fr_module
+from app.ml.embedding_format import (
+    RAW_VERSION,
+    EmbeddingFormat,
+    EmbeddingProjection,
+    EmbeddingVersionError,
+)
+from app.utils.embedding_codec import ENCODING_JSON
+
+
+def _raw(n, dim=64, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_raw_format_is_identity():
+    fmt = EmbeddingFormat()
+    raw = _raw(3)
+    assert fmt.version == RAW_VERSION
+    assert np.array_equal(fmt.encode(raw), raw)
+    assert np.array_equal(fmt.convert(raw, None), raw)
+
+
+def test_pca_projection_keeps_nearest_neighbours():
+    centres = _raw(20, dim=256)
+    noisy = centres + 0.1 * _raw(20, dim=256, seed=1)
+    projection = EmbeddingProjection.fit_pca(
+        np.vstack([centres, noisy]), 16, "pca16-v1"
+    )
+
+    a, b = projection.project(centres), projection.project(noisy)
+    assert a.shape == (20, 16)
+    assert np.allclose(np.linalg.norm(a, axis=1), 1.0, atol=1e-5)
+    assert (np.argmax(b @ a.T, axis=1) == np.arange(20)).all()
+
+
+def test_projection_ignores_input_scale():
+    projection = EmbeddingProjection.random(64, 8, "rp8-v1")
+    raw = _raw(2)
+    assert np.allclose(projection.project(raw), projection.project(raw * 37.0))
+
+
+def test_projected_format_converts_raw_but_not_other_versions():
+    fmt = EmbeddingFormat(EmbeddingProjection.random(64, 8, "rp8-v1"))
+    raw = _raw(4)
+
+    assert fmt.version == "rp8-v1"
+    assert fmt.encode(raw[0]).shape == (8,)
+    assert np.allclose(fmt.convert(raw, RAW_VERSION), fmt.encode(raw))
+    assert np.array_equal(fmt.convert(fmt.encode(raw), "rp8-v1"), fmt.encode(raw))
+    with pytest.raises(EmbeddingVersionError):
+        fmt.convert(_raw(1, dim=8), "pca8-v1")
+
+
+def test_raw_format_rejects_projected_embeddings():
+    with pytest.raises(EmbeddingVersionError):
+        EmbeddingFormat().convert(_raw(1, dim=8), "rp8-v1")
+
+
+def test_projection_save_and_load(tmp_path):
+    projection = EmbeddingProjection.random(64, 8, "rp8-v1", seed=3)
+    path = str(tmp_path / "projection.npz")
+    projection.save(path)
+
+    fmt = EmbeddingFormat.from_path(path)
+    assert fmt.version == "rp8-v1"
+    assert np.allclose(fmt.projection.components, projection.components)
+    assert EmbeddingFormat.from_path("").projection is None
+
+
+def test_missing_projection_file_fails_instead_of_falling_back_to_raw(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        EmbeddingFormat.from_path(str(tmp_path / "missing.npz"))
+
+
+def test_matcher_merges_candidates_across_versions(monkeypatch):
+    fmt = EmbeddingFormat(EmbeddingProjection.random(64, 8, "rp8-v1"))
+    monkeypatch.setattr(fr_module, "embedding_format", fmt)
+    raw = _raw(2)
+
+    matcher = fr_module._build_matcher(
+        [
+            fr_module.CandidateEmbedding(student_id="s1", embeddings=[raw[0].tolist()]),
+            fr_module.CandidateEmbedding(
+                student_id="s1",
+                embeddings=[fmt.encode(raw[1]).tolist()],
+                embedding_version="rp8-v1",
+            ),
+        ],
+        ENCODING_JSON,
+    )
+
+    scores = matcher.student_scores(fmt.encode(raw))
+    assert matcher.student_ids == ["s1"]
+    assert np.allclose(scores[:, 0], 1.0, atol=1e-5)
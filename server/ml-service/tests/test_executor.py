@@ -0,0 +1,172 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.exceptions import ExecutorSaturatedError
+from app.core.executor import MLExecutor
+from app.core.priority import (
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    reset_priority,
+    set_priority,
+)
+
+
+@pytest.fixture
+def executor():
+    executor = MLExecutor(workers=1, max_queue=1, retry_after=7)
+    yield executor
+    executor.shutdown()
+
+
+async def test_run_returns_result_off_the_event_loop(executor):
+    loop_thread = threading.get_ident()
+    result, worker_thread = await executor.run(
+        lambda x: (x * 2, threading.get_ident()), 21
+    )
+    assert result == 42
+    assert worker_thread != loop_thread
+    assert executor.admitted == 0
+
+
+async def test_rejects_when_workers_and_queue_are_full(executor):
+    release = threading.Event()
+    running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(ExecutorSaturatedError) as exc_info:
+        await executor.run(lambda: None)
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers == {"Retry-After": "7"}
+
+    release.set()
+    await asyncio.gather(*running)
+    assert executor.admitted == 0
+    assert await executor.run(lambda: "ok") == "ok"
+
+
+async def test_errors_propagate_and_release_the_slot(executor):
+    def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await executor.run_in_thread(boom)
+    assert executor.admitted == 0
+
+
+def test_unknown_executor_kind():
+    with pytest.raises(ValueError):
+        MLExecutor(kind="gpu")
+
+
+def test_fan_out_spreads_items_over_idle_workers():
+    executor = MLExecutor(workers=3)
+    try:
+        threads = set()
+        barrier = threading.Barrier(3, timeout=5)
+
+        def work(item):
+            threads.add(threading.get_ident())
+            barrier.wait()
+            return item * 2
+
+        # The caller and two idle workers each take one item
+        assert executor.fan_out(work, [1, 2, 3]) == [2, 4, 6]
+        assert len(threads) == 3
+    finally:
+        executor.shutdown()
+
+
+def test_fan_out_helpers_hold_worker_slots_while_they_run():
+    executor = MLExecutor(workers=3)
+    try:
+        admitted = []
+        barrier = threading.Barrier(3, timeout=5)
+
+        def work(item):
+            barrier.wait()
+            admitted.append(executor.admitted)
+            barrier.wait()
+            return item
+
+        # Jobs submitted meanwhile queue behind the two helpers
+        assert executor.fan_out(work, [1, 2, 3]) == [1, 2, 3]
+        assert admitted == [2, 2, 2]
+        assert executor.admitted == 0
+    finally:
+        executor.shutdown()
+
+
+async def test_fan_out_runs_in_turn_when_workers_are_busy():
+    executor = MLExecutor(workers=2, max_queue=1)
+    release = threading.Event()
+    try:
+        blocked = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+
+        # One worker is blocked and the other runs this job: the caller
+        # processes every item itself instead of waiting for a helper
+        threads = await executor.run(
+            executor.fan_out, lambda _: threading.get_ident(), range(4)
+        )
+        assert len(set(threads)) == 1
+
+        release.set()
+        await blocked
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+async def test_queued_interactive_jobs_go_before_earlier_bulk_jobs():
+    executor = MLExecutor(workers=1, max_queue=8)
+    release = threading.Event()
+    order = []
+    try:
+        blocked = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+
+        async def submit(priority, name):
+            token = set_priority(priority)
+            try:
+                await executor.run(order.append, name)
+            finally:
+                reset_priority(token)
+
+        queued = [
+            asyncio.ensure_future(submit(PRIORITY_BULK, f"b{i}")) for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        queued.append(asyncio.ensure_future(submit(PRIORITY_INTERACTIVE, "i0")))
+        await asyncio.sleep(0)
+
+        release.set()
+        await asyncio.gather(blocked, *queued)
+        assert order == ["i0", "b0", "b1", "b2"]
+        assert executor.admitted == 0
+    finally:
+        executor.shutdown()
+
+
+async def test_bulk_backlog_does_not_fill_the_interactive_queue():
+    executor = MLExecutor(workers=1, max_queue=1)
+    release = threading.Event()
+    try:
+        blocked = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        token = set_priority(PRIORITY_BULK)
+        bulk = asyncio.ensure_future(executor.run(lambda: "bulk"))
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorSaturatedError):
+            await executor.run(lambda: None)
+        reset_priority(token)
+
+        interactive = asyncio.ensure_future(executor.run(lambda: "interactive"))
+        await asyncio.sleep(0)
+        release.set()
+        assert await interactive == "interactive"
+        assert await bulk == "bulk"
+        await blocked
+    finally:
+        executor.shutdown()
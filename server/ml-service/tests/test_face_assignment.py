@@ -0,0 +1,117 @@
+import numpy as np
+
+from app.ml.face_assignment import assign_faces
+from app.ml.face_matcher import FaceMatcher
+
+
+def test_each_student_goes_to_its_best_face():
+    # Both faces prefer student 0; face 1 scores it higher, so face 0 falls
+    # back to its second choice
+    student_idx = np.array([[0, 1], [0, 2]])
+    scores = np.array([[0.80, 0.70], [0.90, 0.40]])
+
+    assigned, assigned_scores, uncertain = assign_faces(student_idx, scores, 0.5)
+
+    assert list(assigned) == [1, 0]
+    assert np.allclose(assigned_scores, [0.70, 0.90])
+    assert list(uncertain) == [True, False]
+
+
+def test_face_without_remaining_candidates_is_left_unassigned():
+    student_idx = np.array([[0, 1], [0, 1]])
+    scores = np.array([[0.90, 0.30], [0.85, 0.20]])
+
+    assigned, assigned_scores, uncertain = assign_faces(
+        student_idx, scores, 0.5, margin=0.1
+    )
+
+    assert list(assigned) == [0, -1]
+    # An unassigned face reports its best score
+    assert np.allclose(assigned_scores, [0.90, 0.85])
+    assert list(uncertain) == [True, True]
+
+
+def test_close_rival_marks_the_winner_uncertain():
+    student_idx = np.array([[0], [0]])
+    scores = np.array([[0.90, 0.60]]).T
+
+    # The losing face is always uncertain; the winner only with a close rival
+    _, _, uncertain = assign_faces(student_idx, scores, 0.5, margin=0.05)
+    assert list(uncertain) == [False, True]
+
+    scores = np.array([[0.90, 0.88]]).T
+    _, _, uncertain = assign_faces(student_idx, scores, 0.5, margin=0.05)
+    assert list(uncertain) == [True, True]
+
+
+def test_rival_from_an_already_assigned_face_marks_the_winner_uncertain():
+    # Face 0 is assigned student 0 before its higher score for student 1 is
+    # seen; student 1 still goes to face 1, but not confidently
+    student_idx = np.array([[0, 1], [1, 2]])
+    scores = np.array([[0.90, 0.85], [0.80, 0.10]])
+
+    assigned, assigned_scores, uncertain = assign_faces(
+        student_idx, scores, 0.5, margin=0.05
+    )
+
+    assert list(assigned) == [0, 1]
+    assert np.allclose(assigned_scores, [0.90, 0.80])
+    assert list(uncertain) == [False, True]
+
+
+def test_uncontested_faces_keep_their_best_students():
+    student_idx = np.array([[2, 0], [1, 2], [0, 1]])
+    scores = np.array([[0.9, 0.6], [0.8, 0.7], [0.7, 0.3]])
+
+    assigned, _, uncertain = assign_faces(student_idx, scores, 0.5)
+
+    assert list(assigned) == [2, 1, 0]
+    assert not uncertain.any()
+
+
+def test_scores_below_threshold_are_never_assigned():
+    student_idx = np.array([[0, 1]])
+    scores = np.array([[0.45, 0.30]])
+
+    assigned, assigned_scores, uncertain = assign_faces(student_idx, scores, 0.5)
+
+    assert list(assigned) == [-1]
+    assert assigned_scores[0] == 0.45
+    assert not uncertain[0]
+
+
+def test_ties_go_to_the_earlier_face():
+    student_idx = np.array([[0], [0]])
+    scores = np.array([[0.8], [0.8]])
+
+    assigned, _, _ = assign_faces(student_idx, scores, 0.5)
+    assert list(assigned) == [0, -1]
+
+
+def test_no_candidates():
+    assigned, assigned_scores, uncertain = assign_faces(
+        np.zeros((2, 0), dtype=np.intp), np.zeros((2, 0)), 0.5
+    )
+    assert list(assigned) == [-1, -1]
+    assert list(assigned_scores) == [-1.0, -1.0]
+    assert not uncertain.any()
+
+
+def test_assignment_is_unique_on_a_large_roster():
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(500, 64))
+    matcher = FaceMatcher.from_candidates(
+        (f"s{i}", centres[i] + 0.3 * rng.normal(size=(3, 64))) for i in range(500)
+    )
+    present = rng.choice(500, size=80, replace=False)
+    faces = centres[present] + 0.3 * rng.normal(size=(80, 64))
+    # A second photo of student 0 in the same picture
+    faces[1] = centres[present[0]] + 0.3 * rng.normal(size=64)
+
+    top_idx, top_scores = matcher.top_matches(faces, 5)
+    assigned, _, uncertain = assign_faces(top_idx, top_scores, 0.5)
+
+    taken = assigned[assigned >= 0]
+    assert len(set(taken)) == len(taken)
+    assert uncertain[:2].any()
+    assert list(assigned[2:]) == list(present[2:])
@@ -1,5 +1,9 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
 import numpy as np
-from app.ml.face_detector import detect_faces
+import app.ml.face_detector as face_detector
+from app.ml.face_detector import detect_faces, face_keypoints
 
 
 def test_detect_faces_empty_image():
@@ -20,3 +24,33 @@ def test_detect_faces_grayscale():
 
     faces = detect_faces(img)
     assert len(faces) == 0
+
+
+def _detection(width, height, points):
+    return SimpleNamespace(
+        bounding_box=SimpleNamespace(
+            origin_x=0, origin_y=0, width=width, height=height
+        ),
+        keypoints=[SimpleNamespace(x=x, y=y) for x, y in points],
+    )
+
+
+def test_face_keypoints_maps_largest_detection_to_image_pixels():
+    img = np.zeros((300, 300, 3), dtype=np.uint8)
+    result = SimpleNamespace(
+        detections=[
+            _detection(10, 10, [(0.0, 0.0)]),
+            _detection(80, 80, [(0.25, 0.5), (0.75, 0.5)]),
+        ]
+    )
+    with patch.object(face_detector, "_get_detector") as get_detector:
+        get_detector.return_value.detect.return_value = result
+        # Box (top, right, bottom, left) padded by 25% -> crop x 75..225, y 75..225
+        keypoints = face_keypoints(img, (100, 200, 200, 100))
+
+    assert keypoints == [(112.5, 150.0), (187.5, 150.0)]
+
+
+def test_face_keypoints_none_when_face_not_found_again():
+    img = np.zeros((300, 300, 3), dtype=np.uint8)
+    assert face_keypoints(img, (100, 200, 200, 100)) is None
@@ -1,4 +1,6 @@
-from app.ml.face_matcher import cosine_similarity
+import numpy as np
+
+from app.ml.face_matcher import FaceMatcher, cosine_similarity
 
 
 def test_cosine_similarity_identical():
@@ -23,3 +25,219 @@ def test_cosine_similarity_zeros():
     a = [0, 0, 0]
     b = [1, 2, 3]
     assert cosine_similarity(a, b) == 0.0
+
+
+def _naive_best(query, candidates):
+    best_id, best_score = None, -1.0
+    for student_id, embeddings in candidates:
+        score = max(cosine_similarity(query, emb) for emb in embeddings)
+        if score > best_score:
+            best_id, best_score = student_id, score
+    return best_id, best_score
+
+
+def test_face_matcher_matches_naive_scan():
+    rng = np.random.default_rng(0)
+    candidates = [
+        (f"s{i}", rng.normal(size=(rng.integers(1, 4), 32)).tolist()) for i in range(20)
+    ]
+    queries = rng.normal(size=(7, 32))
+
+    matcher = FaceMatcher.from_candidates(candidates)
+    indices, scores = matcher.best_matches(queries)
+
+    for query, idx, score in zip(queries, indices, scores):
+        expected_id, expected_score = _naive_best(query.tolist(), candidates)
+        assert matcher.student_ids[idx] == expected_id
+        assert abs(score - expected_score) < 1e-5
+
+
+def test_face_matcher_segmented_max():
+    candidates = [
+        ("a", [[1, 0, 0], [0, 1, 0]]),
+        ("b", [[0, 0, 1]]),
+    ]
+    matcher = FaceMatcher.from_candidates(candidates)
+    scores = matcher.student_scores([[0, 2, 0], [0, 0, 3]])
+
+    assert scores.shape == (2, 2)
+    assert np.allclose(scores, [[1.0, 0.0], [0.0, 1.0]])
+
+
+def test_face_matcher_skips_empty_and_handles_zero_vectors():
+    matcher = FaceMatcher.from_candidates([("empty", []), ("zero", [[0, 0, 0]])])
+    assert matcher.student_ids == ["zero"]
+
+    indices, scores = matcher.best_matches([[1, 2, 3]])
+    assert indices[0] == 0
+    assert scores[0] == 0.0
+
+
+def test_face_matcher_empty_gallery():
+    matcher = FaceMatcher.from_candidates([])
+    indices, scores = matcher.best_matches([[1.0, 2.0]])
+    assert indices[0] == -1
+    assert scores[0] == -1.0
+
+
+def _two_stage(candidates, **options):
+    matcher = FaceMatcher.from_candidates(candidates, **options)
+    # Tiny test galleries would otherwise take the single full scan
+    matcher.coarse_to_fine_min_embeddings = 0
+    return matcher
+
+
+def test_template_first_scores_clear_winners_on_their_embeddings_only():
+    candidates = [
+        ("a", [[1, 0.1, 0], [1, -0.1, 0]]),
+        ("b", [[0, 1, 0]]),
+        ("c", [[0, 0, 1]]),
+    ]
+    matcher = _two_stage(candidates, template_margin=0.2)
+    full = FaceMatcher.from_candidates(candidates)
+
+    queries = [[1, 0.1, 0], [0, 1, 1.02]]
+    indices, scores = matcher.best_matches(queries)
+    expected_indices, expected_scores = full.best_matches(queries)
+
+    # The first query is decided by its template, the second is borderline
+    assert list(indices) == list(expected_indices) == [0, 2]
+    assert np.allclose(scores, expected_scores)
+
+
+def test_template_first_uses_given_templates():
+    candidates = [("a", [[1, 0], [0.6, 0.8]]), ("b", [[0, 1]])]
+    # A template pulled towards "b" leaves the query borderline, so the full
+    # gallery is scored and "a" still wins on its second embedding
+    matcher = _two_stage(candidates, templates={"a": [0.1, 1.0]}, template_margin=0.5)
+    indices, scores = matcher.best_matches([[0.6, 0.8]])
+
+    assert matcher.templates.shape == (2, 2)
+    assert indices[0] == 0
+    assert abs(scores[0] - 1.0) < 1e-6
+
+
+def _clustered_candidates(rng, students=40, per_student=8, dim=32):
+    centres = rng.normal(size=(students, dim))
+    return [
+        (f"s{i}", centres[i] + 0.3 * rng.normal(size=(per_student, dim)))
+        for i in range(students)
+    ], centres
+
+
+def test_shortlist_matches_exact_scan_on_clustered_gallery():
+    rng = np.random.default_rng(1)
+    candidates, centres = _clustered_candidates(rng)
+    queries = centres[[3, 17, 29]] + 0.3 * rng.normal(size=(3, 32))
+
+    exact = FaceMatcher.from_candidates(candidates)
+    two_stage = _two_stage(candidates, shortlist=5)
+
+    indices, scores = two_stage.best_matches(queries)
+    expected_indices, expected_scores = exact.best_matches(queries)
+    assert list(indices) == list(expected_indices) == [3, 17, 29]
+    assert np.allclose(scores, expected_scores)
+
+
+def test_shortlist_only_scores_students_with_the_best_templates():
+    # "b" holds one stray embedding equal to the query, but its template
+    # points elsewhere, so a shortlist of one never scores it
+    candidates = [
+        ("a", [[1, 0.2, 0], [1, -0.2, 0]]),
+        ("b", [[0, 0, 1], [0, 0, 1], [0, 0, 1], [1, 0, 0]]),
+    ]
+    exact = FaceMatcher.from_candidates(candidates)
+    two_stage = _two_stage(candidates, shortlist=1)
+
+    assert exact.best_matches([[1, 0, 0]])[0][0] == 1
+    indices, scores = two_stage.best_matches([[1, 0, 0]])
+    assert indices[0] == 0
+    assert abs(scores[0] - 1 / np.sqrt(1.04)) < 1e-6
+
+
+def test_match_stage_counter_records_each_path():
+    from app.core.metrics import MATCHER_QUERIES
+
+    def count(stage):
+        return MATCHER_QUERIES.labels(stage=stage)._value.get()
+
+    before = {stage: count(stage) for stage in ("template", "shortlist", "full")}
+    candidates = [("a", [[1, 0, 0]]), ("b", [[0, 1, 0]]), ("c", [[0, 0, 1]])]
+    matcher = _two_stage(candidates, template_margin=0.5, shortlist=2)
+    matcher.best_matches([[1, 0, 0], [1, 1, 0]])
+
+    assert count("template") - before["template"] == 1
+    assert count("shortlist") - before["shortlist"] == 1
+    assert count("full") == before["full"]
+
+
+def test_small_galleries_use_the_full_scan():
+    from app.core.metrics import MATCHER_QUERIES
+
+    full = MATCHER_QUERIES.labels(stage="full")
+    before = full._value.get()
+    candidates = [("a", [[1, 0, 0]]), ("b", [[0, 1, 0]]), ("c", [[0, 0, 1]])]
+    matcher = FaceMatcher.from_candidates(candidates, template_margin=0.5)
+    matcher.best_matches([[1, 0, 0]])
+
+    assert full._value.get() - before == 1
+
+
+def test_top_matches_are_sorted_best_first():
+    candidates = [("a", [[1, 0, 0]]), ("b", [[1, 1, 0]]), ("c", [[0, 0, 1]])]
+    matcher = FaceMatcher.from_candidates(candidates)
+
+    indices, scores = matcher.top_matches([[1, 0.1, 0], [0, 0.1, 1]], 2)
+
+    assert indices.tolist() == [[0, 1], [2, 1]]
+    assert np.allclose(scores, np.sort(scores, axis=1)[:, ::-1])
+    full = matcher.student_scores([[1, 0.1, 0]])[0]
+    assert np.allclose(scores[0], full[[0, 1]])
+
+
+def test_top_matches_caps_k_at_the_roster_size():
+    matcher = FaceMatcher.from_candidates([("a", [[1, 0]]), ("b", [[0, 1]])])
+    indices, scores = matcher.top_matches([[1, 0]], 5)
+    assert indices.shape == scores.shape == (1, 2)
+
+    empty = FaceMatcher.from_candidates([])
+    indices, scores = empty.top_matches([[1, 0]], 5)
+    assert indices.shape == (1, 0)
+
+
+def test_top_matches_on_the_shortlist_agree_with_the_full_scan():
+    rng = np.random.default_rng(2)
+    candidates, centres = _clustered_candidates(rng)
+    queries = centres[[5, 11]] + 0.3 * rng.normal(size=(2, 32))
+
+    exact = FaceMatcher.from_candidates(candidates).top_matches(queries, 3)
+    shortlisted = _two_stage(candidates, shortlist=8).top_matches(queries, 3)
+
+    assert exact[0][:, 0].tolist() == shortlisted[0][:, 0].tolist() == [5, 11]
+    assert np.allclose(exact[1][:, 0], shortlisted[1][:, 0])
+
+
+def test_top_matches_exit_early_on_clear_template_winners():
+    from app.core.metrics import MATCHER_QUERIES
+
+    def count(stage):
+        return MATCHER_QUERIES.labels(stage=stage)._value.get()
+
+    rng = np.random.default_rng(3)
+    candidates, centres = _clustered_candidates(rng)
+    queries = centres[[7, 21]] + 0.1 * rng.normal(size=(2, 32))
+    before = {stage: count(stage) for stage in ("template", "full")}
+
+    matcher = _two_stage(candidates, template_margin=0.1)
+    indices, scores = matcher.top_matches(queries, 3)
+
+    assert count("template") - before["template"] == 2
+    assert count("full") == before["full"]
+    assert indices[:, 0].tolist() == [7, 21]
+    full = FaceMatcher.from_candidates(candidates).student_scores(queries)
+    assert np.allclose(scores[:, 0], full[[0, 1], [7, 21]])
+    # The runners-up follow by template, at least the margin behind
+    templates = matcher._normalize_queries(queries) @ matcher.templates.T
+    expected = np.argsort(-templates, axis=1, kind="stable")[:, 1:3]
+    assert indices[:, 1:].tolist() == expected.tolist()
+    assert (scores[:, 1:] <= scores[:, :1] - 0.1 + 1e-6).all()
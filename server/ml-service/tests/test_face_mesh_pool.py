@@ -0,0 +1,79 @@
+import queue
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.ml.liveness import FaceMeshPool
+
+
+def _factory():
+    factory = MagicMock(side_effect=lambda: MagicMock())
+    return factory
+
+
+def test_instances_are_reused():
+    factory = _factory()
+    pool = FaceMeshPool(2, factory=factory)
+
+    with pool.acquire() as first:
+        pass
+    with pool.acquire() as second:
+        pass
+
+    assert first is second
+    assert factory.call_count == 1
+
+
+def test_pool_never_exceeds_size():
+    factory = _factory()
+    pool = FaceMeshPool(2, factory=factory)
+
+    with pool.acquire() as a, pool.acquire() as b:
+        assert a is not b
+        with pytest.raises(queue.Empty):
+            with pool.acquire(timeout=0.01):
+                pass
+
+    assert factory.call_count == 2
+
+
+def test_waiter_gets_released_instance():
+    pool = FaceMeshPool(1, factory=_factory())
+    got = []
+
+    with pool.acquire() as held:
+        waiter = threading.Thread(
+            target=lambda: got.append(pool.acquire(timeout=5).__enter__())
+        )
+        waiter.start()
+    waiter.join(timeout=5)
+
+    assert got == [held]
+
+
+def test_failed_instance_is_discarded():
+    factory = _factory()
+    pool = FaceMeshPool(1, factory=factory)
+
+    with pytest.raises(RuntimeError):
+        with pool.acquire() as broken:
+            raise RuntimeError("graph failure")
+    broken.close.assert_called_once()
+
+    with pool.acquire() as replacement:
+        assert replacement is not broken
+    assert factory.call_count == 2
+
+
+def test_warm_up_and_close():
+    factory = _factory()
+    pool = FaceMeshPool(3, factory=factory)
+
+    assert pool.warm_up() == 3
+    assert pool.warm_up() == 0
+    assert factory.call_count == 3
+
+    pool.close()
+    assert pool.warm_up() == 3
+    assert factory.call_count == 6
@@ -0,0 +1,39 @@
+import numpy as np
+
+from app.ml.face_quality import face_quality, pose_score
+
+
+def _textured_face(side):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (side, side, 3), dtype=np.uint8)
+
+
+def test_frontal_pose_scores_high_and_turned_pose_low():
+    frontal = [(40, 50), (80, 50), (60, 70), (60, 90)]
+    turned = [(40, 50), (80, 50), (76, 70), (70, 90)]
+    tilted = [(40, 40), (80, 60), (60, 70), (60, 90)]
+
+    assert pose_score(frontal) == 1.0
+    assert pose_score(turned) < 0.1
+    assert pose_score(tilted) < 0.2
+
+
+def test_blurry_or_small_faces_score_lower():
+    sharp = face_quality(_textured_face(160))
+    blurry = face_quality(np.full((160, 160, 3), 128, dtype=np.uint8))
+    small = face_quality(_textured_face(32))
+
+    assert sharp["score"] == 1.0
+    assert sharp["pose"] is None
+    assert blurry["sharpness"] == 0.0
+    assert blurry["score"] == 0.0
+    assert small["face_size"] == 0.25
+    assert small["score"] < sharp["score"]
+
+
+def test_pose_is_part_of_the_score():
+    keypoints = [(40, 50), (80, 50), (70, 70), (66, 90)]
+    quality = face_quality(_textured_face(160), keypoints)
+
+    assert 0.2 < quality["pose"] < 0.4
+    assert abs(quality["score"] - quality["pose"] ** (1 / 3)) < 1e-9
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from app.ml.face_matcher import FaceMatcher
+from app.ml.face_tracker import FaceTracker, iou_matrix
+from app.ml.stream_session import (
+    FrameSampler,
+    StreamLimitError,
+    StreamSession,
+    StreamSessionStore,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_iou_matrix():
+    a = [(0, 10, 10, 0)]
+    b = [(0, 10, 10, 0), (0, 15, 10, 5), (20, 30, 30, 20)]
+    np.testing.assert_allclose(iou_matrix(a, b), [[1.0, 50 / 150, 0.0]])
+
+
+def test_tracker_keeps_ids_for_moving_faces():
+    tracker = FaceTracker()
+    first = tracker.update([(0, 50, 50, 0), (0, 250, 50, 200)])
+    # Both faces drift right; the second moved too far to overlap its old box
+    second = tracker.update([(0, 60, 50, 10), (0, 290, 50, 240)])
+
+    assert [t.track_id for t in first] == [1, 2]
+    assert [t.track_id for t in second] == [1, 2]
+    assert second[0].hits == 2
+    assert tracker.total_tracks == 2
+
+
+def test_tracker_starts_new_tracks_and_drops_missing_ones():
+    tracker = FaceTracker(max_misses=1)
+    tracker.update([(0, 50, 50, 0)])
+
+    tracks = tracker.update([(0, 1050, 50, 1000)])
+    assert tracks[0].track_id == 2
+    assert len(tracker.tracks) == 2
+
+    tracker.update([(0, 1050, 50, 1000)])
+    assert [t.track_id for t in tracker.tracks] == [2]
+
+
+def test_sampler_spaces_frames_by_cpu_budget():
+    clock = FakeClock()
+    sampler = FrameSampler(max_fps=10, cpu_budget=0.5, idle_interval=1.0, clock=clock)
+
+    assert sampler.admit() == 0.0
+    # Only one frame is processed at a time
+    assert sampler.admit() > 0
+    clock.now = 0.2
+    # 0.2s of work at half a core means the next frame is due at 0.4s
+    assert sampler.finish() == pytest.approx(0.2)
+
+    clock.now = 0.3
+    assert sampler.admit() == pytest.approx(0.1)
+    clock.now = 0.4
+    assert sampler.admit() == 0.0
+    clock.now = 0.41
+    # Nothing left to identify: slow down to the idle interval
+    assert sampler.finish(idle=True) == pytest.approx(0.99)
+
+
+def test_session_accumulates_best_live_sighting_per_student():
+    tracker = FaceTracker()
+    session = StreamSession(
+        "s", "g", FaceMatcher.from_candidates([]), 0.5, 0.0, tracker=tracker
+    )
+    a, b, c, d = tracker.update(
+        [(0, 50, 50, 0), (0, 250, 50, 200), (0, 450, 50, 400), (0, 650, 50, 600)]
+    )
+    for track, student_id, distance, live in (
+        (a, "x", 0.3, True),
+        (b, "x", 0.2, True),
+        (c, None, 0.6, True),
+        (d, "y", 0.1, None),
+    ):
+        track.attempts = 1
+        track.student_id = student_id
+        track.distance = distance
+        track.live = live
+
+    assert [t.status for t in (a, c, d)] == ["present", "unknown", "pending"]
+    assert session.record([a, b, c, d], frame_index=4) == ["x"]
+    assert session.students == {"x": (0.2, 2, 4)}
+    assert session.pending([a, b, c, d]) == [c, d]
+
+
+def test_session_without_liveness_check_marks_tracks_live():
+    session = StreamSession(
+        "s", "g", FaceMatcher.from_candidates([]), 0.5, 0.0, liveness_check=False
+    )
+    (track,) = session.track([(0, 50, 50, 0)])
+    assert track.live is True
+    assert not session.needs_liveness(track)
+
+
+def test_store_limits_and_expires_sessions():
+    clock = FakeClock()
+    store = StreamSessionStore(max_sessions=1, idle_timeout=10.0, clock=clock)
+    matcher = FaceMatcher.from_candidates([])
+    options = {"confident_threshold": 0.5, "min_face_area_ratio": 0.0}
+
+    session = store.open("g", matcher, **options)
+    assert store.get(session.session_id) is session
+    with pytest.raises(StreamLimitError):
+        store.open("g", matcher, **options)
+
+    clock.now = 11.0
+    assert store.get(session.session_id) is None
+    assert store.open("g", matcher, **options) is not None
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from app.ml.face_matcher import FaceMatcher
+from app.ml.gallery_cache import GalleryCache, GalleryTooLargeError
+
+
+def _matcher(num_students=2, dim=16):
+    rng = np.random.default_rng(num_students)
+    return FaceMatcher.from_candidates(
+        (f"s{i}", rng.normal(size=(1, dim))) for i in range(num_students)
+    )
+
+
+def test_get_respects_version():
+    cache = GalleryCache(max_bytes=10**6)
+    cache.upsert("subject:1", "v1", _matcher())
+
+    assert cache.get("subject:1").version == "v1"
+    assert cache.get("subject:1", "v1") is not None
+    assert cache.get("subject:1", "v2") is None
+    assert cache.get("subject:2") is None
+
+
+def test_upsert_replaces_and_tracks_bytes():
+    cache = GalleryCache(max_bytes=10**6)
+    small = _matcher(2)
+    large = _matcher(8)
+
+    cache.upsert("g", "v1", small)
+    cache.upsert("g", "v2", large)
+
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["bytes"] == large.nbytes
+    assert cache.peek("g").version == "v2"
+
+
+def test_lru_eviction_by_memory_budget():
+    size = _matcher().nbytes
+    cache = GalleryCache(max_bytes=size * 2)
+
+    cache.upsert("a", "v", _matcher())
+    cache.upsert("b", "v", _matcher())
+    cache.get("a")  # touch "a" so "b" becomes least recently used
+    cache.upsert("c", "v", _matcher())
+
+    assert cache.peek("a") is not None
+    assert cache.peek("b") is None
+    assert cache.peek("c") is not None
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_oversized_gallery_rejected():
+    matcher = _matcher()
+    cache = GalleryCache(max_bytes=matcher.nbytes - 1)
+    with pytest.raises(GalleryTooLargeError):
+        cache.upsert("g", "v", matcher)
+
+
+def test_invalidate():
+    cache = GalleryCache(max_bytes=10**6)
+    cache.upsert("g", "v", _matcher())
+
+    assert cache.invalidate("g") is True
+    assert cache.invalidate("g") is False
+    assert cache.stats() == {"entries": 0, "bytes": 0, "max_bytes": 10**6}
@@ -4,9 +4,11 @@ Tests for image validation in ML service
 
 import base64
 from io import BytesIO
+
+import numpy as np
 from PIL import Image
 
-from app.utils.image_validation import validate_and_decode_image
+from app.utils.image_validation import decode_image_array
 from app.core.constants import (
     ERROR_IMAGE_TOO_LARGE,
     ERROR_INVALID_FORMAT,
@@ -25,29 +27,23 @@ def create_test_image(width=100, height=100, format="JPEG"):
 
 def test_valid_jpeg_image():
     """Test that valid JPEG image passes validation"""
-    image_base64 = create_test_image(500, 500, "JPEG")
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-        image_base64
-    )
+    image_base64 = create_test_image(500, 400, "JPEG")
+    image, error_msg, error_code = decode_image_array(image_base64)
 
-    assert success is True
-    assert image_bytes is not None
     assert image is not None
     assert error_msg is None
     assert error_code is None
-    assert image.format == "JPEG"
+    assert image.shape == (400, 500, 3)
 
 
 def test_valid_png_image():
     """Test that valid PNG image passes validation"""
     image_base64 = create_test_image(500, 500, "PNG")
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-        image_base64
-    )
+    image, error_msg, error_code = decode_image_array(image_base64)
 
-    assert success is True
     assert image is not None
-    assert image.format == "PNG"
+    assert error_code is None
+    assert image[0, 0].tolist() == [255, 0, 0]
 
 
 def test_image_too_large_base64():
@@ -55,11 +51,9 @@ def test_image_too_large_base64():
     # Create a string larger than MAX_BASE64_SIZE
     large_base64 = "A" * 8_000_000  # 8MB base64 string
 
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-        large_base64
-    )
+    image, error_msg, error_code = decode_image_array(large_base64)
 
-    assert success is False
+    assert image is None
     assert error_code == ERROR_IMAGE_TOO_LARGE
     assert "too large" in error_msg.lower()
 
@@ -68,11 +62,9 @@ def test_invalid_base64():
     """Test that invalid base64 string is rejected"""
     invalid_base64 = "not-valid-base64!@#$%"
 
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-        invalid_base64
-    )
+    image, error_msg, error_code = decode_image_array(invalid_base64)
 
-    assert success is False
+    assert image is None
     assert error_code == ERROR_INVALID_FORMAT
     assert "invalid base64" in error_msg.lower()
 
@@ -86,11 +78,9 @@ def test_invalid_image_format():
     buffer.seek(0)
     image_base64 = base64.b64encode(buffer.read()).decode("utf-8")
 
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-        image_base64
-    )
+    image, error_msg, error_code = decode_image_array(image_base64)
 
-    assert success is False
+    assert image is None
     assert error_code == ERROR_INVALID_FORMAT
     assert "invalid image format" in error_msg.lower()
 
@@ -100,11 +90,9 @@ def test_image_dimensions_too_large():
     # Create image larger than MAX_IMAGE_DIMENSION (4096)
     image_base64 = create_test_image(5000, 5000, "JPEG")
 
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-        image_base64
-    )
+    image, error_msg, error_code = decode_image_array(image_base64)
 
-    assert success is False
+    assert image is None
     assert error_code == ERROR_INVALID_DIMENSIONS
     assert "dimensions" in error_msg.lower()
 
@@ -113,12 +101,10 @@ def test_image_at_max_dimensions():
     """Test that image at exactly max dimensions is accepted"""
     image_base64 = create_test_image(4096, 4096, "JPEG")
 
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-        image_base64
-    )
+    image, error_msg, error_code = decode_image_array(image_base64)
 
-    assert success is True
     assert image is not None
+    assert image.shape == (4096, 4096, 3)
 
 
 def test_corrupted_image_data():
@@ -126,34 +112,60 @@ def test_corrupted_image_data():
     # Create valid base64 but invalid image data
     corrupted_base64 = base64.b64encode(b"not an image").decode("utf-8")
 
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-        corrupted_base64
-    )
+    image, error_msg, error_code = decode_image_array(corrupted_base64)
 
-    assert success is False
+    assert image is None
     assert error_code == ERROR_INVALID_FORMAT
 
 
 def test_empty_base64():
     """Test that empty base64 string is rejected"""
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image("")
+    image, error_msg, error_code = decode_image_array("")
 
-    assert success is False
+    assert image is None
     assert error_code == ERROR_INVALID_FORMAT
 
 
-def test_rgb_conversion():
-    """Test that non-RGB images are converted to RGB"""
-    # Create RGBA image
-    img = Image.new("RGBA", (100, 100), color=(255, 0, 0, 128))
+def test_decode_image_array_returns_contiguous_rgb():
+    """Pixels come back as one RGB uint8 array, not OpenCV's BGR"""
+    image, error_msg, error_code = decode_image_array(create_test_image(64, 48))
+
+    assert error_code is None
+    assert image.shape == (48, 64, 3) and image.dtype == np.uint8
+    assert image.flags["C_CONTIGUOUS"]
+    # Red, allowing for JPEG error
+    r, g, b = image[24, 32].astype(int)
+    assert r > 200 and g < 60 and b < 60
+
+
+def test_decode_image_array_takes_raw_bytes_and_drops_alpha():
+    img = Image.new("RGBA", (40, 30), color=(0, 0, 255, 128))
     buffer = BytesIO()
     img.save(buffer, format="PNG")
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.read()).decode("utf-8")
 
-    success, image_bytes, image, error_msg, error_code = validate_and_decode_image(
-        image_base64
-    )
+    image, _, _ = decode_image_array(buffer.getvalue())
+
+    assert image.shape == (30, 40, 3)
+    assert image[0, 0].tolist() == [0, 0, 255]
 
-    assert success is True
-    assert image.mode == "RGB"
+
+def test_decode_image_array_reduces_large_jpegs_only():
+    """JPEGs are decoded at a DCT-scaled size no smaller than reduce_max_side"""
+    jpeg = create_test_image(4000, 3000, "JPEG")
+    png = create_test_image(2000, 1000, "PNG")
+
+    assert decode_image_array(jpeg, reduce_max_side=1000)[0].shape == (750, 1000, 3)
+    assert decode_image_array(jpeg, reduce_max_side=800)[0].shape == (750, 1000, 3)
+    assert decode_image_array(jpeg, reduce_max_side=2000)[0].shape == (1500, 2000, 3)
+    assert decode_image_array(png, reduce_max_side=500)[0].shape == (1000, 2000, 3)
+
+
+def test_decode_image_array_rejects_invalid_images():
+    truncated = base64.b64decode(create_test_image(200, 200, "JPEG"))[:-200]
+
+    assert decode_image_array("not base64!")[2] == ERROR_INVALID_FORMAT
+    assert decode_image_array(b"not an image")[2] == ERROR_INVALID_FORMAT
+    assert decode_image_array(truncated)[2] == ERROR_INVALID_FORMAT
+    assert (
+        decode_image_array(create_test_image(5000, 100))[2] == ERROR_INVALID_DIMENSIONS
+    )
@@ -0,0 +1,200 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import app.ml.liveness as liveness
+from app.ml.inference import FaceDetection, InferenceBackend, create_backend
+from app.ml.mediapipe_backend import MediaPipeBackend
+from app.ml.onnx_backend import (
+    ANCHORS,
+    OnnxBackend,
+    blazeface_anchors,
+    letterbox,
+    weighted_nms,
+)
+
+
+class FakeSession:
+    """Stands in for an onnxruntime InferenceSession."""
+
+    def __init__(self, input_shape, outputs):
+        self.input_shape = input_shape
+        self.outputs = outputs
+        self.batches = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input", shape=self.input_shape)]
+
+    def run(self, output_names, feeds):
+        batch = feeds["input"]
+        self.batches.append(batch.shape)
+        return [output(batch) for output in self.outputs]
+
+
+def _detector_outputs(anchor, offset=(0.0, 0.0), size=(32.0, 32.0)):
+    """Raw BlazeFace outputs with one confident face on ``anchor``."""
+
+    def regressors(batch):
+        raw = np.zeros((len(batch), 896, 16), dtype=np.float32)
+        raw[:, anchor, :2] = offset
+        raw[:, anchor, 2:4] = size
+        raw[:, anchor, 4:6] = (-8.0, -8.0)  # right eye up and left of centre
+        return raw
+
+    def logits(batch):
+        scores = np.full((len(batch), 896, 1), -10.0, dtype=np.float32)
+        scores[:, anchor] = 5.0
+        return scores
+
+    return [regressors, logits]
+
+
+def test_ml_model_selects_the_backend():
+    assert isinstance(create_backend("mediapipe"), MediaPipeBackend)
+    # Values from before the setting chose a backend
+    assert isinstance(create_backend("hog"), MediaPipeBackend)
+    assert isinstance(create_backend("ONNX"), OnnxBackend)
+    with pytest.raises(ValueError):
+        create_backend("tensorrt")
+
+
+def test_blazeface_anchors_follow_the_model_layout():
+    anchors = blazeface_anchors()
+    assert anchors.shape == (896, 2)
+    # Stride 8: 16x16 cells with two anchors each, row by row
+    assert np.allclose(anchors[0], anchors[1])
+    assert np.allclose(anchors[0], [0.5 / 16, 0.5 / 16])
+    assert np.allclose(anchors[2], [1.5 / 16, 0.5 / 16])
+    # Stride 16: 8x8 cells with six anchors each
+    assert np.allclose(anchors[512:518], [0.5 / 8, 0.5 / 8])
+    assert np.allclose(anchors[-1], [7.5 / 8, 7.5 / 8])
+
+
+def test_letterbox_centres_the_image():
+    image = np.full((50, 100, 3), 255, dtype=np.uint8)
+    square, scale, pad_x, pad_y = letterbox(image, 128)
+    assert square.shape == (128, 128, 3)
+    assert scale == 1.28 and pad_x == 0 and pad_y == 32
+    assert square[31].max() == 0 and square[32].min() == 255
+
+
+def test_weighted_nms_merges_overlapping_detections():
+    boxes = np.array(
+        [[0.1, 0.1, 0.3, 0.3], [0.12, 0.1, 0.32, 0.3], [0.6, 0.6, 0.8, 0.8]]
+    )
+    keypoints = np.zeros((3, 6, 2))
+    scores = np.array([0.9, 0.9, 0.7])
+
+    faces = weighted_nms(boxes, keypoints, scores)
+
+    assert len(faces) == 2
+    assert np.allclose(faces[0][0], [0.11, 0.1, 0.31, 0.3])
+    assert faces[0][2] == 0.9
+    assert faces[1][2] == 0.7
+
+
+def test_onnx_detect_maps_faces_back_through_the_letterbox():
+    # Centre anchor of the stride-16 grid at (4.5/8, 4.5/8) of the square
+    anchor = 512 + (4 * 8 + 4) * 6
+    session = FakeSession([None, 128, 128, 3], _detector_outputs(anchor))
+    backend = OnnxBackend(detector_session=session)
+    images = [np.zeros((200, 400, 3), np.uint8), np.zeros((400, 400), np.uint8)]
+
+    faces = backend.detect(images)
+
+    # Both images ran in one batch
+    assert session.batches == [(2, 128, 128, 3)]
+    assert [len(f) for f in faces] == [1, 1]
+    # 400x200 letterboxes at scale 0.32 with 32px bars above and below
+    face = faces[0][0]
+    assert isinstance(face, FaceDetection)
+    centre = ANCHORS[anchor] * 128
+    top, right, bottom, left = face.box
+    assert (left, right) == (int((centre[0] - 16) / 0.32), int((centre[0] + 16) / 0.32))
+    assert (top, bottom) == (
+        int((centre[1] - 16 - 32) / 0.32),
+        int((centre[1] + 16 - 32) / 0.32),
+    )
+    assert np.allclose(
+        face.keypoints[0], ((centre[0] - 8) / 0.32, (centre[1] - 40) / 0.32)
+    )
+    assert face.score > 0.99
+
+
+def test_onnx_runs_fixed_batch_models_one_input_at_a_time():
+    session = FakeSession([1, 3, 128, 128], _detector_outputs(0))
+    backend = OnnxBackend(detector_session=session)
+
+    backend.detect([np.zeros((64, 64, 3), np.uint8)] * 3)
+
+    # NCHW input, one run per image
+    assert session.batches == [(1, 3, 128, 128)] * 3
+
+
+def test_onnx_batches_are_capped_at_max_batch():
+    session = FakeSession(["batch", 128, 128, 3], _detector_outputs(0))
+    backend = OnnxBackend(detector_session=session, max_batch=2)
+
+    faces = backend.detect([np.zeros((64, 64, 3), np.uint8)] * 5)
+
+    assert [shape[0] for shape in session.batches] == [2, 2, 1]
+    assert len(faces) == 5
+
+
+def test_onnx_landmarks_are_normalised_to_the_crop():
+    def points(batch):
+        # Every landmark at the centre of the 192x192 input, z = 19.2
+        mesh = np.tile([96.0, 96.0, 19.2], (len(batch), 468))
+        return mesh.reshape(len(batch), 1, 1, 1404).astype(np.float32)
+
+    def presence(batch):
+        # Face on the first crop only
+        logits = np.full((len(batch), 1, 1, 1), -5.0, dtype=np.float32)
+        logits[0] = 5.0
+        return logits
+
+    session = FakeSession([None, 192, 192, 3], [points, presence])
+    backend = OnnxBackend(landmark_session=session)
+    crops = [np.zeros((100, 80, 3), np.uint8), np.zeros((60, 60, 3), np.uint8)]
+
+    first, second = backend.landmarks(crops)
+
+    assert session.batches == [(2, 192, 192, 3)]
+    assert first.shape == (468, 3)
+    # The centre of the padded crop is the centre of the crop
+    assert np.allclose(first[0, :2], [0.5, 0.5], atol=0.01)
+    # z is scaled like x: 19.2 input px = 15 crop px (scale 1.28) = 0.1875 widths
+    assert np.allclose(first[0, 2], 19.2 / (192 / 150) / 80)
+    assert second is None
+
+
+class RecordingBackend(InferenceBackend):
+    def __init__(self):
+        self.calls = []
+
+    def landmarks(self, crops):
+        self.calls.append(len(crops))
+        return [np.full((468, 3), 0.5, np.float32) for _ in crops]
+
+
+def test_liveness_fits_every_crop_in_one_backend_call():
+    rng = np.random.default_rng(0)
+    textured = rng.integers(0, 256, (40, 40, 3), dtype=np.uint8)
+    flat = np.full((40, 40, 3), 128, dtype=np.uint8)
+    backend = RecordingBackend()
+
+    with (
+        patch.object(liveness, "ML_LIVENESS_CHECK", True),
+        patch.object(liveness, "LIVENESS_BLUR_MAX_THRESHOLD", 10**9),
+        patch.object(liveness, "get_backend", return_value=backend),
+    ):
+        results = liveness.analyze_faces([textured, flat, textured])
+        live = liveness.are_live([textured, textured])
+
+    # The flat crop fails the texture checks and never reaches the mesh
+    assert backend.calls == [2, 2]
+    assert [passed for passed, _ in results] == [True, False, True]
+    assert np.allclose(results[0][1][0], [20, 20, 20])
+    assert live == [True, True]
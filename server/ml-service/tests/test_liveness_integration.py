@@ -7,6 +7,7 @@ import base64
 
 # Import the app
 from app.main import app
+from app.ml.liveness import face_mesh_pool
 
 client = TestClient(app)
 
@@ -30,10 +31,13 @@ def create_spoof_base64_image(width=100, height=100):
 @pytest.fixture
 def mock_face_mesh():
     """Mock the FaceMesh class used in liveness check."""
+    face_mesh_pool.close()
     with patch("app.ml.liveness.mp_face_mesh.FaceMesh") as MockFaceMesh:
         mock_instance = MockFaceMesh.return_value
         mock_instance.__enter__.return_value = mock_instance
         yield mock_instance
+    # Drop pooled mocks so later tests build fresh instances
+    face_mesh_pool.close()
 
 
 @pytest.fixture
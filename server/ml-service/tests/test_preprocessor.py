@@ -0,0 +1,43 @@
+import numpy as np
+
+from app.ml.preprocessor import (
+    detect_on_downscaled,
+    downscale_for_detection,
+    map_boxes_to_original,
+)
+
+
+def test_small_images_are_not_resized():
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    small, scale = downscale_for_detection(image, 1024)
+    assert small is image
+    assert scale == 1.0
+
+    assert downscale_for_detection(image, 0)[1] == 1.0
+
+
+def test_large_images_fit_longest_side():
+    image = np.zeros((3000, 4000, 3), dtype=np.uint8)
+    small, scale = downscale_for_detection(image, 1000)
+    assert small.shape == (750, 1000, 3)
+    assert scale == 0.25
+
+
+def test_boxes_map_back_and_clip_to_original():
+    boxes = [(10, 60, 60, 10), (700, 1000, 750, 950)]
+    mapped = map_boxes_to_original(boxes, 0.25, (3000, 4000, 3))
+    assert mapped == [(40, 240, 240, 40), (2800, 4000, 3000, 3800)]
+
+
+def test_detection_runs_on_downscaled_copy():
+    image = np.zeros((2048, 2048, 3), dtype=np.uint8)
+    seen = []
+
+    def detect(img):
+        seen.append(img.shape)
+        return [(100, 300, 300, 100)]
+
+    boxes = detect_on_downscaled(image, detect, max_side=512)
+
+    assert seen == [(512, 512, 3)]
+    assert boxes == [(400, 1200, 1200, 400)]
@@ -0,0 +1,39 @@
+from app.core.priority import (
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    PriorityLanes,
+    request_priority,
+)
+
+
+def test_lanes_interleave_by_weight():
+    lanes = PriorityLanes({PRIORITY_INTERACTIVE: 4, PRIORITY_BULK: 1})
+    for i in range(10):
+        lanes.append(PRIORITY_BULK, f"b{i}")
+        lanes.append(PRIORITY_INTERACTIVE, f"i{i}")
+
+    first = [lanes.popleft() for _ in range(10)]
+
+    assert first == ["i0", "i1", "b0", "i2", "i3", "i4", "i5", "b1", "i6", "i7"]
+    assert lanes.count(PRIORITY_INTERACTIVE) == 2
+    assert lanes.count(PRIORITY_BULK) == 8
+
+
+def test_a_lone_lane_drains_in_order():
+    lanes = PriorityLanes({PRIORITY_INTERACTIVE: 4, PRIORITY_BULK: 1})
+    for i in range(3):
+        lanes.append(PRIORITY_BULK, i)
+
+    assert [lanes.popleft() for _ in range(3)] == [0, 1, 2]
+    assert not lanes
+    assert lanes.share(PRIORITY_BULK) == 1.0
+    lanes.append(PRIORITY_BULK, 3)
+    assert lanes.share(PRIORITY_INTERACTIVE) == 0.8
+
+
+def test_request_priority_header():
+    assert request_priority("bulk") == PRIORITY_BULK
+    assert request_priority(" Bulk ") == PRIORITY_BULK
+    assert request_priority("interactive") == PRIORITY_INTERACTIVE
+    assert request_priority("urgent") == PRIORITY_INTERACTIVE
+    assert request_priority(None) == PRIORITY_INTERACTIVE
@@ -0,0 +1,120 @@
+import gc
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from prometheus_client import REGISTRY
+
+import app.core.profiling as profiling
+from app.core.executor import MLExecutor
+from app.core.profiling import (
+    face_count_bucket,
+    image_size_bucket,
+    label_stages,
+    profile,
+    stage,
+    track_stages,
+)
+
+
+def _observed(stage_name, image_size, faces):
+    return REGISTRY.get_sample_value(
+        "ml_stage_duration_seconds_count",
+        {"stage": stage_name, "image_size": image_size, "faces": faces},
+    )
+
+
+def test_label_buckets():
+    assert image_size_bucket(640) == "le640"
+    assert image_size_bucket(2000) == "le2560"
+    assert image_size_bucket(4000) == "gt2560"
+    assert image_size_bucket(None) == "unknown"
+    assert [face_count_bucket(n) for n in (0, 1, 3, 20, 40)] == [
+        "0",
+        "1",
+        "2-5",
+        "6-20",
+        "21+",
+    ]
+
+
+def test_stage_times_are_summed_per_job_and_labelled_at_the_end():
+    before = _observed("embed", "le1280", "2-5") or 0
+
+    with track_stages() as timings:
+        for _ in range(3):
+            with stage("embed"):
+                pass
+        # Face count only known after the stages ran
+        label_stages(1024, 3)
+
+    assert set(timings.seconds) == {"embed"}
+    # One observation for the job, not one per face
+    assert _observed("embed", "le1280", "2-5") == before + 1
+
+
+async def test_executor_jobs_record_their_stages():
+    def job():
+        with stage("decode"):
+            pass
+        label_stages(4000, 0)
+
+    executor = MLExecutor(workers=1)
+    try:
+        before = _observed("decode", "gt2560", "0") or 0
+        await executor.run(job)
+        assert _observed("decode", "gt2560", "0") == before + 1
+    finally:
+        executor.shutdown()
+
+
+def test_stage_is_a_no_op_outside_jobs_and_profiles():
+    with stage("decode"):
+        pass
+    label_stages(100, 1)
+
+
+def test_profile_peak_of_an_outer_stage_covers_its_inner_stages():
+    # Garbage left by earlier tests, freed mid-stage, lowers the measured peak;
+    # collect it first and allocate well above the asserted threshold
+    gc.collect()
+    with profile() as stages:
+        with stage("liveness"):
+            with stage("liveness.blur"):
+                scratch = np.ones(4_000_000, dtype=np.uint8)
+                del scratch
+            with stage("liveness.mesh"):
+                pass
+
+    assert list(stages) == ["liveness", "liveness.blur", "liveness.mesh"]
+    assert stages["liveness.blur"].peak_bytes >= 1_000_000
+    assert stages["liveness"].peak_bytes >= 1_000_000
+    assert stages["liveness.mesh"].peak_bytes < 1_000_000
+    assert stages["liveness"].retained_bytes < 100_000
+
+
+def test_stages_become_spans_when_tracing():
+    spans = []
+
+    @contextmanager
+    def start_as_current_span(name):
+        spans.append(name)
+        yield
+
+    tracer = MagicMock()
+    tracer.start_as_current_span.side_effect = start_as_current_span
+    current_span = MagicMock()
+    trace = MagicMock()
+    trace.get_current_span.return_value = current_span
+
+    with (
+        patch.object(profiling, "_tracer", tracer),
+        patch.object(profiling, "trace", trace),
+    ):
+        with stage("detect"):
+            pass
+        label_stages(800, 2)
+
+    assert spans == ["ml.detect"]
+    current_span.set_attribute.assert_any_call("ml.image.longest_side", 800)
+    current_span.set_attribute.assert_any_call("ml.faces", 2)
@@ -0,0 +1,68 @@
+import base64
+
+from app.ml.result_cache import ResultCache, content_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(max_bytes=100, ttl=10.0, clock=None):
+    return ResultCache(max_bytes, ttl, sizeof=len, clock=clock or FakeClock())
+
+
+def test_content_key_matches_base64_and_raw_bytes():
+    raw = b"\xff\xd8 fake jpeg"
+    b64 = base64.b64encode(raw).decode()
+
+    assert content_key(b64, 0.01) == content_key(raw, 0.01)
+    assert content_key(raw, 0.01) != content_key(raw, 0.02)
+    assert content_key(raw + b"!", 0.01) != content_key(raw, 0.01)
+    assert content_key("not base64!", 0.01) is None
+
+
+def test_get_returns_stored_value_until_ttl():
+    clock = FakeClock()
+    cache = _cache(clock=clock)
+    cache.put("k", "value")
+
+    assert cache.get("k") == "value"
+    clock.now = 10.0
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction_by_size():
+    cache = _cache(max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    cache.get("a")  # b is now least recently used
+    cache.put("c", "cccc")
+
+    assert cache.get("a") == "aaaa"
+    assert cache.get("b") is None
+    assert cache.get("c") == "cccc"
+    assert cache.stats()["bytes"] == 8
+
+
+def test_oversized_values_and_disabled_cache_are_not_stored():
+    cache = _cache(max_bytes=4)
+    assert cache.put("k", "too long") is False
+    assert cache.get("k") is None
+
+    disabled = _cache(ttl=0)
+    assert disabled.enabled is False
+    assert disabled.put("k", "v") is False
+
+
+def test_hit_ratio():
+    cache = _cache()
+    cache.put("k", "v")
+    cache.get("k")
+    cache.get("missing")
+
+    assert cache.stats()["hit_ratio"] == 0.5
@@ -0,0 +1,71 @@
+import numpy as np
+
+from app.ml import temporal_liveness as tl
+from app.ml.temporal_liveness import (
+    TemporalLiveness,
+    eye_aspect_ratio,
+    head_pose_ratios,
+)
+
+
+def _landmarks(eye_open=0.1, nose=(0.5, 0.5), shift=(0.0, 0.0), scale=1.0):
+    """Synthetic FaceMesh landmarks: eye lids ``eye_open`` apart, nose at
+    ``nose`` in face units, the whole face moved by ``shift`` and scaled."""
+    points = np.zeros((478, 3))
+    for eye, x0 in ((tl.RIGHT_EYE, 0.0), (tl.LEFT_EYE, 0.7)):
+        p1, p2, p3, p4, p5, p6 = eye
+        points[[p1, p4], 0] = [x0, x0 + 0.3]
+        points[[p2, p6], 0] = x0 + 0.1
+        points[[p3, p5], 0] = x0 + 0.2
+        points[[p2, p3], 1] = -eye_open / 2
+        points[[p5, p6], 1] = eye_open / 2
+    points[tl.RIGHT_EYE_OUTER, :2] = [0.0, 0.0]
+    points[tl.LEFT_EYE_OUTER, :2] = [1.0, 0.0]
+    points[tl.NOSE_TIP, :2] = nose
+    points[tl.CHIN, :2] = [0.5, 1.0]
+    points[:, :2] = points[:, :2] * scale + shift
+    return points * 100
+
+
+def test_eye_aspect_ratio_and_pose_are_scale_invariant():
+    open_eyes = _landmarks(eye_open=0.1)
+    assert np.isclose(eye_aspect_ratio(open_eyes), 0.1 / 0.3)
+    np.testing.assert_allclose(head_pose_ratios(open_eyes), [0.5, 0.5])
+    moved = _landmarks(shift=(3.0, -2.0), scale=2.5)
+    np.testing.assert_allclose(head_pose_ratios(moved), [0.5, 0.5])
+
+
+def test_blink_decides_live_early():
+    liveness = TemporalLiveness(max_frames=10)
+    assert liveness.update(_landmarks(eye_open=0.1), True) is None
+    assert liveness.update(_landmarks(eye_open=0.02), True) is None
+    assert liveness.update(_landmarks(eye_open=0.1), True) is True
+    assert (liveness.frames, liveness.reason) == (3, "blink")
+
+
+def test_head_turn_decides_live():
+    liveness = TemporalLiveness(motion_threshold=0.08, max_frames=10)
+    assert liveness.update(_landmarks(nose=(0.5, 0.5)), True) is None
+    assert liveness.update(_landmarks(nose=(0.62, 0.5)), True) is True
+    assert liveness.reason == "motion"
+
+
+def test_moving_photo_is_not_motion():
+    liveness = TemporalLiveness(max_frames=4, require_motion=True)
+    for i in range(3):
+        frame = _landmarks(shift=(i * 0.3, i * 0.1), scale=1 + i * 0.2)
+        assert liveness.update(frame, True) is None
+    assert liveness.update(_landmarks(), True) is False
+    assert liveness.reason == "static"
+
+
+def test_failed_frames_decide_spoof_and_fallback_uses_majority():
+    spoof = TemporalLiveness(max_spoof_frames=2)
+    assert spoof.update(None, False) is None
+    assert spoof.update(None, False) is False
+
+    still = TemporalLiveness(max_frames=3, max_spoof_frames=5)
+    assert still.update(_landmarks(), True) is None
+    assert still.update(None, False) is None
+    assert still.update(_landmarks(), True) is True
+    assert still.reason == "single-frame"
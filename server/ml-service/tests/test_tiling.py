@@ -0,0 +1,69 @@
+import numpy as np
+
+from app.ml.inference import FaceDetection
+from app.ml.tiling import detect_tiled, merge_detections, tile_grid
+
+
+def _face(box, score=0.9):
+    top, right, bottom, left = box
+    return FaceDetection(box, [(left, top)], score)
+
+
+def test_tile_grid_overlaps_and_ends_flush_with_the_image():
+    tiles = tile_grid(1000, 1500, side=640, overlap=0.25)
+
+    # Stride 480: rows start at 0 and 360, columns at 0, 480 and 860
+    assert sorted({(t[0], t[2]) for t in tiles}) == [(0, 640), (360, 1000)]
+    assert sorted({(t[1], t[3]) for t in tiles}) == [(0, 640), (480, 1120), (860, 1500)]
+    assert len(tiles) == 6
+
+
+def test_small_images_are_a_single_tile():
+    assert tile_grid(480, 640, side=640, overlap=0.25) == [(0, 0, 480, 640)]
+    assert tile_grid(3000, 4000, side=0, overlap=0.25) == [(0, 0, 3000, 4000)]
+
+
+def test_merge_keeps_the_whole_box_of_a_face_cut_by_a_tile_edge():
+    whole = _face((100, 200, 200, 100), score=0.8)
+    # Same face cut at x=150 by a tile edge, scored higher
+    cut = _face((100, 150, 200, 100), score=0.95)
+    other = _face((100, 400, 200, 300), score=0.7)
+
+    merged = merge_detections([cut, whole, other])
+
+    assert [face.box for face in merged] == [whole.box, other.box]
+    assert merged[0].score == 0.95
+
+
+def test_detect_tiled_maps_tiles_and_overview_back_to_the_image():
+    image = np.zeros((1000, 1000, 3), dtype=np.uint8)
+    overview = (np.zeros((500, 500, 3), dtype=np.uint8), 0.5)
+    calls = []
+
+    def detect(images):
+        calls.append([img.shape[:2] for img in images])
+        results = []
+        for img in images:
+            if img.shape[:2] == (500, 500):
+                # A large face only the overview sees whole
+                results.append([_face((50, 250, 250, 50))])
+            else:
+                # Every tile sees a small face at its own (10, 10)
+                results.append([_face((10, 40, 40, 10), score=0.7)])
+        return results
+
+    faces = detect_tiled(
+        image, detect, side=600, overlap=0.25, overview=overview, chunks=2
+    )
+
+    # 4 tiles over 2 calls, plus the overview
+    assert sorted(len(call) for call in calls) == [1, 2, 2]
+    boxes = sorted(face.box for face in faces)
+    # Tiles start at 0 and 400 on each axis. The overview face is scaled back
+    # to full size and absorbs the last tile's face, which lies inside it
+    assert boxes == [
+        (10, 40, 40, 10),
+        (10, 440, 40, 410),
+        (100, 500, 500, 100),
+        (410, 40, 440, 10),
+    ]
@@ -0,0 +1,57 @@
+import threading
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import app.ml.warmup as warmup_module
+from app.core.config import settings
+from app.core.executor import MLExecutor
+from app.core.metrics import MODEL_WARMUP_SECONDS, MODELS_LOADED
+from app.main import app
+from app.ml.warmup import ModelReadiness, warm_up_models
+
+
+async def test_every_worker_thread_runs_a_warm_up_inference():
+    executor = MLExecutor(workers=3)
+    threads = set()
+    try:
+        with patch.object(
+            warmup_module,
+            "detect_faces",
+            side_effect=lambda image: threads.add(threading.get_ident()),
+        ):
+            seconds = await warm_up_models(executor)
+    finally:
+        executor.shutdown()
+
+    assert len(threads) == 3
+    assert seconds >= 0
+    assert executor.admitted == 0
+
+
+def test_readiness_updates_metrics():
+    readiness = ModelReadiness()
+    readiness.mark_loaded(1.5)
+    assert readiness.models_loaded is True
+    assert MODELS_LOADED._value.get() == 1
+    assert MODEL_WARMUP_SECONDS._value.get() == 1.5
+
+    readiness.mark_failed("model file missing")
+    assert readiness.models_loaded is False
+    assert readiness.error == "model file missing"
+    assert MODELS_LOADED._value.get() == 0
+
+
+def test_failed_warm_up_keeps_service_unready():
+    with patch.object(
+        warmup_module, "detect_faces", side_effect=FileNotFoundError("no model")
+    ):
+        with TestClient(app) as client:
+            client.headers = {"X-API-KEY": settings.API_KEY}
+            response = client.get("/health")
+            detailed = client.get("/health/detailed")
+
+    assert response.status_code == 503
+    assert response.json()["status"] == "unhealthy"
+    assert response.json()["models_loaded"] is False
+    assert detailed.json()["checks"]["models"]["error"] == "no model"